@@ -1,6 +1,8 @@
 import { useState, useEffect, useMemo } from "react";
-import { uploadFile, runDetect, listResults, getSummary } from "./api";
-const BASE = import.meta.env.VITE_API_URL;
+import {
+  uploadAndDetect, waitAnnotated, listResults, getSummary, imageUrl,
+  subscribeFeed, applySummaryDelta, prependDetection, applyDetectionUpdate,
+} from "./api";
 
 export default function App() {
   const [tab, setTab] = useState("detect");
@@ -14,9 +16,9 @@ export default function App() {
     if (!file) return;
     setLoadingDet(true);
     try {
-      const up = await uploadFile(file);
-      const det = await runDetect(up.file_id);
+      const det = await uploadAndDetect(file);
       setResult(det);
+      if (det.total_objects > 0 && !det.annotated_url) setResult(await waitAnnotated(det));
     } catch (e) {
       alert(e.message || "Detect failed");
     } finally {
@@ -26,14 +28,15 @@ export default function App() {
 
   // ========= History =========
   const [rows, setRows] = useState([]);
+  const [nextCursor, setNextCursor] = useState(null);
   const [loading, setLoading] = useState(false);
-  async function loadHistory() {
+  // server sudah urut terbaru dulu; halaman berikut di-append
+  async function loadHistory(cursor = null) {
     setLoading(true);
     try {
-      const data = await listResults();
-      setRows(
-        [...data].sort((a, b) => new Date(b.created_at) - new Date(a.created_at))
-      );
+      const page = await listResults({ cursor });
+      setRows((prev) => (cursor ? [...prev, ...page.results] : page.results));
+      setNextCursor(page.nextCursor);
     } finally {
       setLoading(false);
     }
@@ -58,6 +61,25 @@ export default function App() {
   }
   useEffect(() => { if (tab === "analytics") loadAnalytics(); }, [tab]);
 
+  // ========= Live feed =========
+  // history & analytics di-update dari stream SSE (bukan polling / Refresh manual)
+  useEffect(() => {
+    if (tab !== "history" && tab !== "analytics") return;
+    const history = tab === "history";
+    return subscribeFeed({
+      onReady: (reconnect) => { if (reconnect) history ? loadHistory() : loadAnalytics(); },
+      onDetection: (det) => {
+        if (history) setRows((prev) => prependDetection(prev, det));
+        else setAna((prev) => prev && { ...prev, latest: prependDetection(prev.latest, det, 5) });
+      },
+      onSummary: (d) => { if (!history) setAna((prev) => applySummaryDelta(prev, d)); },
+      onUpdate: (u) => {
+        if (history) setRows((prev) => applyDetectionUpdate(prev, u));
+        else setAna((prev) => prev && { ...prev, latest: applyDetectionUpdate(prev.latest, u) });
+      },
+    });
+  }, [tab, days]);
+
   // inject CSS sekali (tema gelap + glass cards)
   useEffect(() => {
     const id = "ptm-ui";
@@ -108,7 +130,7 @@ export default function App() {
                 {result ? (
                   <img
                     className="ptm-result-img"
-                    src={`${BASE}${result.annotated_url || result.file_url}?t=${Date.now()}`}
+                    src={imageUrl(result, "medium")}
                     alt=""
                   />
                 ) : (
@@ -133,10 +155,10 @@ export default function App() {
             <div className="ptm-card">
               <div className="ptm-row-between">
                 <div>
-                  <button className="ptm-btn" onClick={loadHistory} disabled={loading}>
+                  <button className="ptm-btn" onClick={() => loadHistory()} disabled={loading}>
                     {loading ? "Refreshing..." : "Refresh"}
                   </button>
-                  <span className="ptm-total">Total: {rows.length}</span>
+                  <span className="ptm-total">Loaded: {rows.length}</span>
                 </div>
               </div>
 
@@ -158,13 +180,13 @@ export default function App() {
                       <tr key={r.id}>
                         <Td>{new Date(r.created_at).toLocaleString()}</Td>
                         <Td className="ptm-ellipsis" title={r.filename}>{r.filename}</Td>
-                        <Td>{r.total_objects ?? r.items?.length ?? 0}</Td>
+                        <Td>{r.total_objects ?? 0}</Td>
                         <Td>{(r.avg_conf ?? 0).toFixed(3)}</Td>
                         <Td>{r.model_version}</Td>
                         <Td className="ptm-mono">{r.pod_id}</Td>
                         <Td>
                           <img
-                            src={`${BASE}${r.annotated_url || r.file_url}`}
+                            src={imageUrl(r)}
                             alt=""
                             className="ptm-thumb"
                           />
@@ -174,6 +196,12 @@ export default function App() {
                   </tbody>
                 </table>
               </div>
+
+              {nextCursor && (
+                <button className="ptm-btn" onClick={() => loadHistory(nextCursor)} disabled={loading}>
+                  {loading ? "Loading..." : "Load more"}
+                </button>
+              )}
             </div>
           </>
         )}
@@ -224,7 +252,7 @@ export default function App() {
                   <div className="ptm-chart-title">Latest Detections</div>
                   {(ana.latest || []).map((r) => (
                     <div className="ptm-latest-item" key={r.id}>
-                      <img className="ptm-latest-thumb" src={`${BASE}${r.annotated_url || r.file_url}`} alt="" />
+                      <img className="ptm-latest-thumb" src={imageUrl(r)} alt="" />
                       <div className="ptm-latest-info">
                         <div className="ptm-latest-date">{new Date(r.created_at).toLocaleString()}</div>
                         <div className="ptm-latest-file">{r.filename}</div>
@@ -1,5 +1,7 @@
 import { useEffect, useState } from "react";
-import { getSummary } from "./api";
+import {
+  applyDetectionUpdate, applySummaryDelta, getSummary, imageUrl, prependDetection, subscribeFeed,
+} from "./api";
 import { LineChart, Line, XAxis, YAxis, Tooltip, CartesianGrid, BarChart, Bar, ResponsiveContainer } from "recharts";
 
 export default function Dashboard() {
@@ -14,6 +16,13 @@ export default function Dashboard() {
   }
 
   useEffect(() => { load(days); }, [days]);
+  // angka, grafik, dan latest di-update dari live feed (SSE), bukan polling
+  useEffect(() => subscribeFeed({
+    onReady: (reconnect) => { if (reconnect) load(days); },
+    onSummary: (d) => setData(prev => applySummaryDelta(prev, d)),
+    onDetection: (det) => setData(prev => prev && { ...prev, latest: prependDetection(prev.latest, det, 5) }),
+    onUpdate: (u) => setData(prev => prev && { ...prev, latest: applyDetectionUpdate(prev.latest, u) }),
+  }), [days]);
 
   if (!data) return <div style={{padding:16}}>{loading ? "Loading..." : "No data"}</div>;
 
@@ -92,7 +101,7 @@ export default function Dashboard() {
                   <Td title={r.filename} style={{maxWidth:260, whiteSpace:"nowrap", overflow:"hidden", textOverflow:"ellipsis"}}>{r.filename}</Td>
                   <Td>{r.total_objects}</Td>
                   <Td>{r.avg_conf.toFixed(3)}</Td>
-                  <Td><img src={`${import.meta.env.VITE_API_URL}${r.annotated_url || r.file_url}`} style={{height:56, borderRadius:6}}/></Td>
+                  <Td><img src={imageUrl(r)} style={{height:56, borderRadius:6}}/></Td>
                 </tr>
               ))}
             </tbody>
@@ -1,23 +1,33 @@
 import { useEffect, useState } from "react";
-const BASE = import.meta.env.VITE_API_URL;
+import { applyDetectionUpdate, imageUrl, listResults, prependDetection, subscribeFeed } from "./api";
 
 export default function HistoryPage() {
   const [rows, setRows] = useState([]);
+  const [nextCursor, setNextCursor] = useState(null);
   const [loading, setLoading] = useState(false);
 
-  async function load() {
+  async function load(cursor = null) {
     setLoading(true);
-    const r = await fetch(`${BASE}/api/results`);
-    const data = await r.json();
-    setRows([...data].sort((a,b)=> new Date(b.created_at)-new Date(a.created_at)));
-    setLoading(false);
+    try {
+      const page = await listResults({ cursor });
+      setRows(prev => cursor ? [...prev, ...page.results] : page.results);
+      setNextCursor(page.nextCursor);
+    } finally {
+      setLoading(false);
+    }
   }
   useEffect(()=>{ load(); },[]);
+  // detection baru / annotated yang selesai langsung masuk lewat live feed (SSE)
+  useEffect(()=> subscribeFeed({
+    onReady: (reconnect) => { if (reconnect) load(); },
+    onDetection: (det) => setRows(prev => prependDetection(prev, det)),
+    onUpdate: (u) => setRows(prev => applyDetectionUpdate(prev, u)),
+  }), []);
 
   return (
     <div style={{maxWidth:1000, margin:"24px auto", padding:16}}>
       <h2>History</h2>
-      <button onClick={load} disabled={loading}>{loading?"Refreshing...":"Refresh"}</button>
+      <button onClick={()=>load()} disabled={loading}>{loading?"Refreshing...":"Refresh"}</button>
       <div style={{overflowX:"auto", marginTop:12}}>
         <table style={{width:"100%", borderCollapse:"collapse"}}>
           <thead>
@@ -34,16 +44,21 @@ export default function HistoryPage() {
               <tr key={r.id} style={{borderTop:"1px solid #eee"}}>
                 <td style={{padding:8}}>{new Date(r.created_at).toLocaleString()}</td>
                 <td style={{padding:8, maxWidth:260, whiteSpace:"nowrap", overflow:"hidden", textOverflow:"ellipsis"}}>{r.filename}</td>
-                <td style={{padding:8}}>{r.total_objects ?? r.items?.length ?? 0}</td>
+                <td style={{padding:8}}>{r.total_objects ?? 0}</td>
                 <td style={{padding:8}}>{(r.avg_conf ?? 0).toFixed(3)}</td>
                 <td style={{padding:8}}>
-                  <img src={`${BASE}${r.annotated_url || r.file_url}`} alt="" style={{height:56, borderRadius:6}}/>
+                  <img src={imageUrl(r)} alt="" style={{height:56, borderRadius:6}}/>
                 </td>
               </tr>
             ))}
           </tbody>
         </table>
       </div>
+      {nextCursor && (
+        <button onClick={()=>load(nextCursor)} disabled={loading} style={{marginTop:12}}>
+          {loading?"Loading...":"Load more"}
+        </button>
+      )}
     </div>
   );
 }
\ No newline at end of file
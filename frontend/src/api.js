@@ -17,21 +17,28 @@ async function request(path, { method = "GET", headers = {}, body, auth = true }
   if (res.status !== 401 || !auth) return res;
 
   // 401 -> refresh
+  const access = await refreshAccess();
+  if (!access) return res;
+
+  headers.Authorization = `Bearer ${access}`;
+  return fetch(`${BASE}${path}`, { method, headers, body: payload });
+}
+
+// access token baru dari refresh token (null kalau gagal)
+async function refreshAccess() {
   const refresh = localStorage.getItem("refresh");
-  if (!refresh) return res;
+  if (!refresh) return null;
 
   const rr = await fetch(`${BASE}/api/auth/token/refresh/`, {
     method: "POST",
     headers: { "Content-Type": "application/json" },
     body: JSON.stringify({ refresh }),
   });
-  if (!rr.ok) return res;
+  if (!rr.ok) return null;
 
   const { access } = await rr.json();
   localStorage.setItem("access", access);
-
-  headers.Authorization = `Bearer ${access}`;
-  return fetch(`${BASE}${path}`, { method, headers, body: payload });
+  return access;
 }
 
 function ensureOk(r) {
@@ -51,6 +58,15 @@ export async function uploadFile(file) {
   return r.json();
 }
 
+// upload + detect dalam satu request (gambar di-stream ke inference selagi disimpan)
+export async function uploadAndDetect(file) {
+  const fd = new FormData();
+  fd.append("file", file);
+  const r = await request(`/api/detect/upload-detect`, { method: "POST", body: fd });
+  await ensureOk(r);
+  return r.json();
+}
+
 export async function runDetect(file_id) {
   const r = await request(`/api/detect/detect`, {
     method: "POST",
@@ -60,18 +76,153 @@ export async function runDetect(file_id) {
   return r.json();
 }
 
-export async function listResults() {
-  const r = await request(`/api/detect/results`);
+export async function getResult(id) {
+  const r = await request(`/api/detect/results/${id}`);
   await ensureOk(r);
   return r.json();
 }
 
+// URL gambar detection: varian thumb/medium (WebP, di-cache immutable) kalau sudah
+// dibuat, selain itu annotated / gambar asli
+export function imageUrl(det, size = "thumb") {
+  return `${BASE}${det.variants?.[size] || det.annotated_url || det.file_url}`;
+}
+
+// annotated image (+ varian) dirender di background → tunggu sampai annotated_url terisi
+export async function waitAnnotated(det, { tries = 20, delay = 500 } = {}) {
+  let cur = det;
+  for (let i = 0; i < tries && cur.total_objects > 0 && !cur.annotated_url; i++) {
+    await new Promise((res) => setTimeout(res, delay));
+    cur = await getResult(det.id);
+  }
+  return cur;
+}
+
+// cursor pagination: { results, next, previous }; next/previous berisi ?cursor=
+export function cursorOf(url) {
+  return url ? new URL(url).searchParams.get("cursor") : null;
+}
+
+export async function listResults({ cursor, pageSize, from, to, klass, modelVersion } = {}) {
+  const q = new URLSearchParams();
+  if (cursor) q.set("cursor", cursor);
+  if (pageSize) q.set("page_size", pageSize);
+  if (from) q.set("from", from);
+  if (to) q.set("to", to);
+  if (klass) q.set("klass", klass);
+  if (modelVersion) q.set("model_version", modelVersion);
+  const qs = q.toString();
+  const r = await request(`/api/detect/results${qs ? `?${qs}` : ""}`);
+  await ensureOk(r);
+  const page = await r.json();
+  return { ...page, nextCursor: cursorOf(page.next) };
+}
+
 export async function getSummary(days = 7) {
   const r = await request(`/api/detect/summary?days=${days}`);
   await ensureOk(r);
   return r.json();
 }
 
+// ==== Live feed (SSE) ====
+// detection baru, delta summary, dan annotated/varian yang selesai di-push server
+// (GET /api/detect/stream) → dashboard tidak perlu polling.
+// Stream dibuka dengan tiket sekali pakai (bukan JWT di URL, yang tercatat di access log);
+// tiap (re)connect minta tiket baru. Gateway WSGI → 501, live feed dimatikan (Refresh manual).
+// onReady(reconnect): reconnect=true → event selama putus mungkin terlewat, muat ulang.
+// Return fungsi untuk menutup stream.
+export function subscribeFeed({ onDetection, onSummary, onUpdate, onReady } = {}) {
+  let es = null;
+  let closed = false;
+  let opened = false;
+  let timer = null;
+
+  const retry = () => { if (!closed) timer = setTimeout(open, 3000); };
+
+  async function open() {
+    let ticket;
+    try {
+      const r = await request(`/api/detect/stream/ticket`, { method: "POST" });
+      if (r.status === 501) return;
+      await ensureOk(r);
+      ({ ticket } = await r.json());
+    } catch {
+      return retry();
+    }
+    if (closed) return;
+
+    es = new EventSource(`${BASE}/api/detect/stream?ticket=${encodeURIComponent(ticket)}`);
+    const on = (name, fn) => fn && es.addEventListener(name, (e) => fn(JSON.parse(e.data)));
+    es.addEventListener("ready", () => {
+      onReady?.(opened);
+      opened = true;
+    });
+    on("detection", onDetection);
+    on("summary", onSummary);
+    on("update", onUpdate);
+    es.onerror = () => {
+      // tiket sudah terpakai → reconnect bawaan EventSource pasti ditolak; buka ulang dengan tiket baru
+      es.close();
+      retry();
+    };
+  }
+
+  open();
+  return () => {
+    closed = true;
+    clearTimeout(timer);
+    es?.close();
+  };
+}
+
+// payload /summary + delta dari event "summary" (field sama dengan rollup harian)
+export function applySummaryDelta(sum, d) {
+  if (!sum) return sum;
+  const series = [...(sum.series || [])];
+  const i = series.findIndex((r) => r.date === d.date);
+  if (i < 0 && series.length && d.date < series[0].date) return sum;   // di luar jendela
+  const prev = i >= 0 ? series[i] : { date: d.date, images: 0, objects: 0, avg_conf: 0 };
+  const images = prev.images + d.images;
+  const confSum = prev.avg_conf * prev.images + d.conf_sum;
+  const row = {
+    ...prev,
+    images,
+    objects: prev.objects + d.objects,
+    avg_conf: +(confSum / images).toFixed(3),
+  };
+  if (i >= 0) series[i] = row;
+  else series.push(row);
+  series.sort((a, b) => a.date.localeCompare(b.date));
+
+  const counts = Object.fromEntries((sum.by_class || []).map((r) => [r.klass, r.count]));
+  for (const [k, n] of Object.entries(d.by_class || {})) counts[k] = (counts[k] || 0) + n;
+  const by_class = Object.entries(counts)
+    .map(([klass, count]) => ({ klass, count }))
+    .sort((a, b) => b.count - a.count);
+
+  const total_images = sum.total_images + d.images;
+  const totalConf = sum.avg_conf * sum.total_images + d.conf_sum;
+  return {
+    ...sum,
+    total_images,
+    total_objects: sum.total_objects + d.objects,
+    avg_conf: total_images ? +(totalConf / total_images).toFixed(3) : 0,
+    series,
+    by_class,
+  };
+}
+
+// detection baru di depan list (tanpa duplikat), dipotong `limit` kalau ada
+export function prependDetection(rows, det, limit) {
+  const out = [det, ...(rows || []).filter((r) => r.id !== det.id)];
+  return limit ? out.slice(0, limit) : out;
+}
+
+// event "update": annotated_url / varian untuk detection yang sudah ada di list
+export function applyDetectionUpdate(rows, upd) {
+  return (rows || []).map((r) => (r.id === upd.id ? { ...r, ...upd } : r));
+}
+
 // ==== Auth ====
 export async function loginApi(username, password) {
   const r = await fetch(`${BASE}/api/auth/token/`, {
@@ -4,4 +4,13 @@ from django.apps import AppConfig
 class DetectsvcConfig(AppConfig):
     default_auto_field = "django.db.models.BigAutoField"
     name = "detect_svc"   # <-- penting: path paket yang benar
-    label = "detections"             # label bebas (hindari bentrok)
\ No newline at end of file
+    label = "detections"             # label bebas (hindari bentrok)
+
+    def ready(self):
+        from django.db.models.signals import pre_delete
+
+        from . import rollup
+        from .models import Detection
+
+        # pre_delete: DetectionItem (CASCADE) masih bisa dibaca saat rollup dikurangi
+        pre_delete.connect(rollup.detection_deleted, sender=Detection, dispatch_uid="rollup_detection_deleted")
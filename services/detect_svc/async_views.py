@@ -0,0 +1,168 @@
+"""
+Endpoint detect versi async untuk ASGI (GATEWAY_ASYNC=1, uvicorn asgi:application).
+
+APIView DRF belum punya handler async, jadi `detect` adalah view Django async
+biasa yang memakai ulang DetectView untuk bagian sync-nya: APIView.initial()
+(JWT, permission, throttle), parser, dan render response, sehingga body,
+status, dan header error sama dengan versi WSGI. Selama menunggu inference
+tidak ada thread yang dipegang (httpx), jadi satu worker bisa menampung
+ratusan deteksi bersamaan; ORM / cache / file tetap sync di thread lewat
+services.db_to_async, yang melepas koneksi DB sebelum inference di-await.
+
+`job_detail` (GET /api/detect/jobs/<id>?wait=N) adalah long-poll job: di
+antara pengecekan status ia menunggu dengan asyncio.sleep, jadi menunggu
+sampai 30 detik tidak memegang thread. Versi WSGI (JobDetailView) membatasi
+wait ke DETECT_JOB_WAIT_MAX_SYNC.
+
+Upload tidak punya bagian yang perlu ditunggu selain body request, dan di
+ASGI body sudah dibaca async oleh handler sebelum view dipanggil, jadi
+UploadView (hashing + tulis file) tetap view sync yang dijalankan Django di
+thread.
+
+`stream` (GET /api/detect/stream) adalah live feed dashboard lewat
+Server-Sent Events (feed.py): koneksi terbuka lama yang hanya bisa murah di
+ASGI, jadi hanya didaftarkan kalau GATEWAY_ASYNC=1. Di WSGI Django membaca
+iterator async sampai habis sebelum mengirim apa pun, dan stream yang tidak
+pernah selesai akan memegang worker selamanya.
+"""
+import asyncio
+import os
+
+import requests
+from asgiref.sync import sync_to_async
+from django.http import StreamingHttpResponse
+from django.views.decorators.csrf import csrf_exempt
+from rest_framework.authentication import BaseAuthentication
+from rest_framework.exceptions import AuthenticationFailed, MethodNotAllowed
+from rest_framework.permissions import IsAuthenticated
+from rest_framework.response import Response
+from rest_framework.views import APIView
+
+from . import feed, jobs
+from .pipeline import run_detection_async, upload_path
+from .serializers import DetectionSerializer
+from .services import db_to_async
+from .views import (JOB_WAIT_MAX, JOB_WAIT_STEP, DetectView, JobDetailView, _job_payload,
+                    _job_state, _job_wait, _truthy)
+
+
+def _prepare(request, view_class):
+    """
+    Jalankan bagian awal APIView.dispatch: autentikasi, permission, throttle,
+    dan parse body. Return (view, error); error = response DRF yang sudah
+    dirender kalau request ditolak.
+    """
+    view = view_class()
+    view.args, view.kwargs = (), {}
+    view.request = view.initialize_request(request)
+    view.headers = view.default_response_headers
+    try:
+        view.initial(view.request)
+        view.request.data   # parse body sekarang (masih di thread), error → 400
+    except Exception as exc:
+        return view, _render(view, view.handle_exception(exc))
+    return view, None
+
+
+def _render(view, response):
+    return view.finalize_response(view.request, response).render()
+
+
+def _respond(view, data, status=200):
+    return _render(view, Response(data, status=status))
+
+
+def _enqueue(file_id, tiled):
+    return _job_payload(jobs.enqueue(file_id, tiled=tiled), depth=True)
+
+
+def _serialize(det):
+    return DetectionSerializer(det).data
+
+
+@csrf_exempt
+async def detect(request):
+    """Sama dengan DetectView.post (body, ?async=1, ?tiled=1, error 400/404/502/500)."""
+    if request.method != "POST":
+        return await sync_to_async(DetectView.as_view())(request)
+    view, error = await db_to_async(_prepare)(request, DetectView)
+    if error is not None:
+        return error
+    data, query = view.request.data, view.request.query_params
+
+    file_id = data.get("file_id")
+    if not file_id:
+        return _respond(view, {"detail": "file_id required"}, 400)
+
+    if not await asyncio.to_thread(os.path.exists, upload_path(file_id)):
+        return _respond(view, {"detail": "file not found"}, 404)
+
+    tiled = _truthy(data.get("tiled")) or _truthy(query.get("tiled"))
+    if _truthy(data.get("async")) or _truthy(query.get("async")):
+        return _respond(view, await db_to_async(_enqueue)(file_id, tiled), 202)
+
+    try:
+        det = await run_detection_async(file_id, tiled=tiled)
+    except (requests.ConnectionError, requests.Timeout) as e:
+        return _respond(view, {"detail": f"inference backend unavailable: {e.__class__.__name__}"}, 502)
+    except Exception as e:
+        return _respond(view, {"detail": f"inference error: {e}"}, 500)
+
+    return _respond(view, await db_to_async(_serialize)(det))
+
+
+@csrf_exempt
+async def job_detail(request, id):
+    """Sama dengan JobDetailView.get, tapi ?wait= sampai JOB_WAIT_MAX detik tanpa memegang thread."""
+    if request.method != "GET":
+        return await sync_to_async(JobDetailView.as_view())(request, id=id)
+    view, error = await db_to_async(_prepare)(request, JobDetailView)
+    if error is not None:
+        return error
+    loop = asyncio.get_running_loop()
+    deadline = loop.time() + _job_wait(view.request, JOB_WAIT_MAX)
+    while True:
+        state = await db_to_async(_job_state)(id)
+        if state is None:
+            return _respond(view, {"detail": "job not found"}, 404)
+        done, payload = state
+        if done or loop.time() >= deadline:
+            return _respond(view, payload)
+        await asyncio.sleep(JOB_WAIT_STEP)
+
+
+class StreamTicketAuthentication(BaseAuthentication):
+    """?ticket= sekali pakai dari POST /api/detect/stream/ticket (EventSource tidak bisa kirim header)."""
+
+    def authenticate(self, request):
+        raw = request.query_params.get("ticket")
+        if not raw:
+            return None
+        user = feed.redeem_ticket(raw)
+        if user is None or not user.is_active:
+            raise AuthenticationFailed("invalid or expired stream ticket")
+        return user, None
+
+    def authenticate_header(self, request):
+        return "Ticket"   # → 401 (bukan 403) tanpa tiket
+
+
+class _StreamAccess(APIView):
+    # koneksi lama, bukan request berulang → tidak ikut throttle
+    authentication_classes = [StreamTicketAuthentication]
+    permission_classes = [IsAuthenticated]
+    throttle_classes = []
+
+
+async def stream(request):
+    """GET /api/detect/stream?ticket=<tiket sekali pakai> → text/event-stream (lihat feed.py)."""
+    view, error = await db_to_async(_prepare)(request, _StreamAccess)
+    if error is not None:
+        return error
+    if request.method != "GET":
+        return _render(view, view.handle_exception(MethodNotAllowed(request.method)))
+    response = StreamingHttpResponse(feed.events(), content_type="text/event-stream")
+    response["Cache-Control"] = "no-cache"
+    response["X-Accel-Buffering"] = "no"   # nginx: kirim tiap event langsung
+    return response
+
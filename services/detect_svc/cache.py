@@ -0,0 +1,211 @@
+import hashlib
+import os
+import threading
+import time
+from collections import OrderedDict
+
+import requests
+from django.db import IntegrityError, transaction
+
+from . import metrics, preprocess
+from .models import InferenceCacheEntry
+from .services import call_inference, call_inference_async, db_to_async, inference_client
+
+# ============================================================
+# Cache hasil inferensi (content-addressed)
+#   key = sha256(isi gambar) + konfigurasi model di inference service
+#   tier 1: LRU in-memory per proses gunicorn
+#   tier 2: tabel DB (dipakai bersama semua worker/replica)
+# ============================================================
+CACHE_ENABLED = os.getenv("INFER_CACHE", "1") not in ("0", "false", "False", "no", "NO")
+LRU_SIZE = int(os.getenv("INFER_CACHE_LRU_SIZE", "256"))
+CONFIG_TTL = float(os.getenv("INFER_CACHE_CONFIG_TTL", "30"))
+
+# field konfigurasi yang mempengaruhi hasil deteksi (runtime export bisa beda tipis dari torch)
+CONFIG_FIELDS = ("model_version", "conf", "iou", "imgsz", "max_det", "backend")
+# konfigurasi mode tile: hanya ikut key hasil ?tiled=1
+TILING_FIELD = "tiling"
+
+_lock = threading.Lock()
+_lru = OrderedDict()
+_config = {"value": None, "fetched_at": 0.0}
+_stats = {"lru_hits": 0, "db_hits": 0, "misses": 0, "stores": 0, "bypass": 0, "invalidations": 0}
+
+
+def _count(name):
+    with _lock:
+        _stats[name] += 1
+
+
+def file_digest(file_path: str) -> str:
+    h = hashlib.sha256()
+    with open(file_path, "rb") as f:
+        for chunk in iter(lambda: f.read(1024 * 1024), b""):
+            h.update(chunk)
+    return h.hexdigest()
+
+
+def bytes_digest(data: bytes) -> str:
+    return hashlib.sha256(data).hexdigest()
+
+
+def cache_key(digest: str, config: dict) -> str:
+    cfg = "|".join(f"{k}={config.get(k)}" for k in CONFIG_FIELDS)
+    return hashlib.sha256(f"{digest}|{cfg}".encode()).hexdigest()
+
+
+def model_config():
+    """
+    Konfigurasi model aktif dari GET /config (di-cache CONFIG_TTL detik).
+    Kalau versi model berubah, entry lama dibuang. Return None kalau
+    inference tidak bisa dihubungi → cache di-bypass.
+    """
+    now = time.monotonic()
+    cached = _config["value"]
+    if cached is not None and now - _config["fetched_at"] < CONFIG_TTL:
+        return cached
+    try:
+        body = inference_client().get_json("/config", timeout=3)
+        cfg = {k: body.get(k) for k in CONFIG_FIELDS + (TILING_FIELD,)}
+    except (requests.RequestException, ValueError):
+        return None
+
+    # versi berubah (atau proses baru start) → buang entry versi lain
+    if cached is None or cached["model_version"] != cfg["model_version"]:
+        invalidate(keep_version=cfg["model_version"])
+    _config.update(value=cfg, fetched_at=now)
+    return cfg
+
+
+def invalidate(keep_version=None):
+    """Kosongkan LRU dan hapus entry DB milik versi model lain."""
+    with _lock:
+        _lru.clear()
+        _stats["invalidations"] += 1
+    qs = InferenceCacheEntry.objects.all()
+    if keep_version is not None:
+        qs = qs.exclude(model_version=keep_version)
+    qs.delete()
+
+
+def _lru_get(key):
+    with _lock:
+        if key in _lru:
+            _lru.move_to_end(key)
+            return _lru[key]
+    return None
+
+
+def _lru_put(key, result):
+    with _lock:
+        _lru[key] = result
+        _lru.move_to_end(key)
+        while len(_lru) > LRU_SIZE:
+            _lru.popitem(last=False)
+
+
+def get(key):
+    result = _lru_get(key)
+    if result is not None:
+        _count("lru_hits")
+        return result
+    entry = InferenceCacheEntry.objects.filter(key=key).only("result").first()
+    if entry is not None:
+        _count("db_hits")
+        result = entry.result
+        _lru_put(key, result)
+        return result
+    _count("misses")
+    return None
+
+
+def put(key, config, result):
+    _lru_put(key, result)
+    try:
+        with transaction.atomic():
+            InferenceCacheEntry.objects.create(
+                key=key, model_version=str(config["model_version"]), result=result
+            )
+    except IntegrityError:
+        pass  # worker lain sudah menyimpan key yang sama
+    _count("stores")
+
+
+def lookup(file_path: str = None, data: bytes = None, digest: str = None, tiled: bool = False):
+    """
+    Return (key, config, result). key None → cache tidak bisa dipakai (bypass);
+    result None → miss, panggil inference lalu store(key, config, result).
+    `digest` (sha256 yang sudah dihitung saat upload) menghindari hash ulang.
+    tiled=True → key terpisah dari hasil biasa (ikut konfigurasi tile).
+    """
+    with metrics.stage("cache"):
+        config = model_config() if CACHE_ENABLED else None
+        if config is None or config.get("model_version") is None:
+            _count("bypass")
+            return None, None, None
+        if digest is None:
+            digest = bytes_digest(data) if data is not None else file_digest(file_path)
+        if tiled:
+            digest = f"{digest}|tiled={config.get(TILING_FIELD)}"
+        elif preprocess.PRERESIZE:
+            # gambar dikecilkan gateway → input model beda dari gambar asli
+            digest = f"{digest}|preresize={preprocess.PRERESIZE_SIDE}"
+        key = cache_key(digest, config)
+        result = get(key)
+    return key, config, (dict(result, cached=True) if result is not None else None)
+
+
+def store(key, config, result):
+    # jangan simpan kalau versi model yang menjawab beda dengan config (mis. sedang rollout)
+    if key is not None and str(result.get("model_version")) == str(config["model_version"]):
+        put(key, config, result)
+
+
+def cached_inference(file_path: str, tiled: bool = False) -> dict:
+    """
+    Sama seperti call_inference, tapi gambar identik dengan konfigurasi model
+    yang sama tidak dikirim ulang ke model. Hasil dari cache diberi "cached": True.
+    """
+    # baca file sekali: bytes yang sama dipakai untuk hash dan dikirim ke inference
+    with open(file_path, "rb") as f:
+        data = f.read()
+    key, config, result = lookup(data=data, tiled=tiled)
+    if result is not None:
+        return result
+    result = call_inference(data=data, tiled=tiled)
+    store(key, config, result)
+    return result
+
+
+def _read_and_lookup(file_path, tiled):
+    with open(file_path, "rb") as f:
+        data = f.read()
+    return data, lookup(data=data, tiled=tiled)
+
+
+async def cached_inference_async(file_path: str, tiled: bool = False) -> dict:
+    """cached_inference untuk view async: baca file + cache (DB) di thread, inference di-await."""
+    data, (key, config, result) = await db_to_async(_read_and_lookup)(file_path, tiled)
+    if result is not None:
+        return result
+    result = await call_inference_async(data, tiled=tiled)
+    if key is not None:
+        await db_to_async(store)(key, config, result)
+    return result
+
+
+metrics.REGISTRY.counter_fn(
+    "gateway_inference_cache_events_total", "Event cache hasil inferensi (lihat stats())",
+    lambda: {(k,): v for k, v in _stats.items()}, ("event",))
+
+
+def stats() -> dict:
+    with _lock:
+        s = dict(_stats)
+        s["lru_size"] = len(_lru)
+    lookups = s["lru_hits"] + s["db_hits"] + s["misses"]
+    s["hit_ratio"] = round((s["lru_hits"] + s["db_hits"]) / lookups, 3) if lookups else 0.0
+    s["db_entries"] = InferenceCacheEntry.objects.count()
+    s["enabled"] = CACHE_ENABLED
+    s["model_config"] = _config["value"]
+    return s
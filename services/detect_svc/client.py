@@ -0,0 +1,523 @@
+import asyncio
+import os
+import threading
+import time
+import uuid
+import weakref
+
+import httpx
+import requests
+from requests.adapters import HTTPAdapter
+from urllib3.util.retry import Retry
+
+from . import metrics
+
+# ============================================================
+# HTTP client ke inference service: satu Session per proses
+# (per worker gunicorn), koneksi keep-alive di-pool dan dipakai ulang.
+# ============================================================
+INFER_POOL_SIZE = int(os.getenv("INFER_POOL_SIZE", "10"))
+INFER_CONNECT_TIMEOUT = float(os.getenv("INFER_CONNECT_TIMEOUT", "3.05"))
+INFER_READ_TIMEOUT = float(os.getenv("INFER_READ_TIMEOUT", "30"))
+INFER_CONNECT_RETRIES = int(os.getenv("INFER_CONNECT_RETRIES", "3"))
+INFER_RETRY_BACKOFF = float(os.getenv("INFER_RETRY_BACKOFF", "0.2"))
+
+# multi replica: health check berkala + circuit breaker per replica
+INFER_HEALTH_INTERVAL = float(os.getenv("INFER_HEALTH_INTERVAL", "5"))
+INFER_CB_FAILURES = int(os.getenv("INFER_CB_FAILURES", "3"))     # gagal beruntun → eject
+INFER_CB_COOLDOWN = float(os.getenv("INFER_CB_COOLDOWN", "15"))  # detik sebelum dicoba lagi
+
+# view async (ASGI): satu proses bisa menunggu ratusan request inference sekaligus
+INFER_ASYNC_POOL_SIZE = int(os.getenv("INFER_ASYNC_POOL_SIZE", "100"))
+
+
+class InferenceClient:
+    def __init__(self, base_url, pool_size=INFER_POOL_SIZE,
+                 connect_timeout=INFER_CONNECT_TIMEOUT, read_timeout=INFER_READ_TIMEOUT,
+                 retries=INFER_CONNECT_RETRIES, backoff=INFER_RETRY_BACKOFF):
+        self.base_url = base_url.rstrip("/")
+        self.timeout = (connect_timeout, read_timeout)
+
+        # retry HANYA untuk gagal connect: request belum terkirim, jadi aman
+        # walau POST. Read timeout / 5xx tidak di-retry di sini.
+        retry = Retry(
+            total=retries, connect=retries, read=False, status=0, other=0,
+            backoff_factor=backoff, allowed_methods=None, raise_on_status=False,
+        )
+        self.adapter = HTTPAdapter(pool_connections=1, pool_maxsize=pool_size,
+                                   max_retries=retry, pool_block=False)
+        self.session = requests.Session()
+        self.session.mount("http://", self.adapter)
+        self.session.mount("https://", self.adapter)
+
+        self._lock = threading.Lock()
+        self._calls = 0
+        self._errors = 0
+        self._latency_sum = 0.0
+        self._latency_max = 0.0
+
+    # ---------- request ----------
+    def request(self, method, path, timeout=None, **kw):
+        # request id ikut dikirim → log gateway dan inference bisa dicocokkan
+        request_id = metrics.request_id()
+        if request_id:
+            kw["headers"] = dict(kw.get("headers") or {}, **{"X-Request-ID": request_id})
+        t0 = time.perf_counter()
+        ok = False
+        try:
+            r = self.session.request(method, f"{self.base_url}{path}",
+                                     timeout=timeout or self.timeout, **kw)
+            ok = r.status_code < 500
+            # stage di sisi inference (decode, queue, forward, ...) masuk trace request ini
+            for name, seconds in metrics.parse_server_timing(r.headers.get("Server-Timing")):
+                metrics.add_timing("infer_" + name, seconds)
+            return r
+        finally:
+            self._record(time.perf_counter() - t0, ok)
+
+    def post_image(self, path="/infer", file_path=None, data=None, params=None):
+        """
+        Kirim satu gambar. `data` (bytes yang sudah ada di memori) dipakai kalau
+        ada; kalau tidak, file dibaca dari `file_path`.
+        """
+        if data is None:
+            with open(file_path, "rb") as f:
+                data = f.read()
+        r = self.request("POST", path, files={"file": ("image.jpg", data, "image/jpeg")},
+                         params=params)
+        r.raise_for_status()
+        return r.json()
+
+    def post_stream(self, chunks, path="/infer", filename="image.jpg", content_type="image/jpeg",
+                    params=None):
+        """
+        Kirim satu gambar sebagai multipart dengan body chunked: `chunks`
+        (iterable bytes) dikirim begitu tersedia, tanpa menunggu file lengkap.
+        """
+        boundary = uuid.uuid4().hex
+        head = (f'--{boundary}\r\nContent-Disposition: form-data; name="file"; '
+                f'filename="{filename}"\r\nContent-Type: {content_type}\r\n\r\n').encode()
+
+        def body():
+            yield head
+            for c in chunks:
+                if c:
+                    yield c
+            yield f"\r\n--{boundary}--\r\n".encode()
+
+        r = self.request("POST", path, data=body(), params=params,
+                         headers={"Content-Type": f"multipart/form-data; boundary={boundary}"})
+        r.raise_for_status()
+        return r.json()
+
+    def post_images(self, file_paths, path="/infer/batch", params=None):
+        """`file_paths`: path file, atau bytes gambar yang sudah ada di memori."""
+        handles = [p if isinstance(p, bytes) else open(p, "rb") for p in file_paths]
+        try:
+            r = self.request(
+                "POST", path,
+                files=[("files", (f"image{i}.jpg", f, "image/jpeg")) for i, f in enumerate(handles)],
+                timeout=(self.timeout[0], self.timeout[1] + 5 * len(handles)),
+                params=params,
+            )
+        finally:
+            for f in handles:
+                if not isinstance(f, bytes):
+                    f.close()
+        r.raise_for_status()
+        return r.json()
+
+    def get_json(self, path, timeout=3):
+        r = self.request("GET", path, timeout=(self.timeout[0], timeout))
+        r.raise_for_status()
+        return r.json()
+
+    # ---------- metrics ----------
+    def _record(self, elapsed, ok):
+        with self._lock:
+            self._calls += 1
+            self._errors += 0 if ok else 1
+            self._latency_sum += elapsed
+            self._latency_max = max(self._latency_max, elapsed)
+
+    def stats(self):
+        # urllib3 menghitung koneksi baru vs request per pool → sisanya koneksi dipakai ulang
+        opened = sent = 0
+        pm = self.adapter.poolmanager
+        for key in list(pm.pools.keys()):
+            pool = pm.pools.get(key)
+            if pool is not None:
+                opened += pool.num_connections
+                sent += pool.num_requests
+        with self._lock:
+            calls, errors = self._calls, self._errors
+            lat_sum, lat_max = self._latency_sum, self._latency_max
+        return {
+            "base_url": self.base_url,
+            "calls": calls,
+            "errors": errors,
+            "avg_ms": round(lat_sum / calls * 1000.0, 2) if calls else 0.0,
+            "max_ms": round(lat_max * 1000.0, 2),
+            "connections_opened": opened,
+            "http_requests": sent,
+            "connections_reused": max(0, sent - opened),
+            "pool_size": self.adapter._pool_maxsize,
+            "timeouts": {"connect": self.timeout[0], "read": self.timeout[1]},
+        }
+
+
+class AsyncInferenceClient:
+    """
+    Versi asyncio (httpx) untuk view async di ASGI: selama menunggu inference
+    tidak ada thread yang dipegang. Satu httpx.AsyncClient (pool keep-alive)
+    per event loop. Error dipetakan ke exception requests, jadi penanganan di
+    view, job, dan balancer sama dengan InferenceClient.
+    """
+
+    def __init__(self, base_url, pool_size=INFER_ASYNC_POOL_SIZE,
+                 connect_timeout=INFER_CONNECT_TIMEOUT, read_timeout=INFER_READ_TIMEOUT,
+                 retries=INFER_CONNECT_RETRIES):
+        self.base_url = base_url.rstrip("/")
+        self.timeout = httpx.Timeout(read_timeout, connect=connect_timeout)
+        self.limits = httpx.Limits(max_connections=pool_size, max_keepalive_connections=pool_size)
+        self.retries = retries   # httpx hanya me-retry gagal connect (sama dengan client sync)
+        self._clients = weakref.WeakKeyDictionary()
+        self._lock = threading.Lock()
+        self._calls = 0
+        self._errors = 0
+        self._latency_sum = 0.0
+        self._latency_max = 0.0
+
+    def _client(self):
+        loop = asyncio.get_running_loop()
+        c = self._clients.get(loop)
+        if c is None or c.is_closed:
+            transport = httpx.AsyncHTTPTransport(retries=self.retries, limits=self.limits)
+            c = self._clients[loop] = httpx.AsyncClient(transport=transport, timeout=self.timeout)
+        return c
+
+    async def request(self, method, path, timeout=None, **kw):
+        request_id = metrics.request_id()
+        if request_id:
+            kw["headers"] = dict(kw.get("headers") or {}, **{"X-Request-ID": request_id})
+        t0 = time.perf_counter()
+        ok = False
+        try:
+            r = await self._client().request(method, f"{self.base_url}{path}",
+                                             timeout=timeout or self.timeout, **kw)
+        except httpx.TimeoutException as e:
+            raise requests.Timeout(str(e) or e.__class__.__name__) from e
+        except httpx.TransportError as e:
+            raise requests.ConnectionError(str(e) or e.__class__.__name__) from e
+        else:
+            ok = r.status_code < 500
+            for name, seconds in metrics.parse_server_timing(r.headers.get("Server-Timing")):
+                metrics.add_timing("infer_" + name, seconds)
+            return r
+        finally:
+            self._record(time.perf_counter() - t0, ok)
+
+    async def post_image(self, path="/infer", file_path=None, data=None, params=None):
+        if data is None:
+            data = await asyncio.to_thread(_read_file, file_path)
+        r = await self.request("POST", path, files={"file": ("image.jpg", data, "image/jpeg")},
+                               params=params)
+        if r.status_code >= 400:
+            raise requests.HTTPError(f"{r.status_code} Error for url: {r.url}", response=r)
+        return r.json()
+
+    def _record(self, elapsed, ok):
+        with self._lock:
+            self._calls += 1
+            self._errors += 0 if ok else 1
+            self._latency_sum += elapsed
+            self._latency_max = max(self._latency_max, elapsed)
+
+    def stats(self):
+        with self._lock:
+            calls, errors = self._calls, self._errors
+            lat_sum, lat_max = self._latency_sum, self._latency_max
+        return {
+            "base_url": self.base_url,
+            "calls": calls,
+            "errors": errors,
+            "avg_ms": round(lat_sum / calls * 1000.0, 2) if calls else 0.0,
+            "max_ms": round(lat_max * 1000.0, 2),
+            "pool_size": self.limits.max_connections,
+            "event_loops": len(self._clients),
+        }
+
+
+def _read_file(path):
+    with open(path, "rb") as f:
+        return f.read()
+
+
+class NoReplicaAvailable(requests.ConnectionError):
+    """Semua replica sedang unhealthy / circuit terbuka."""
+
+
+class Replica:
+    def __init__(self, url, **client_kw):
+        self.url = url.rstrip("/")
+        self.client = InferenceClient(self.url, **client_kw)
+        self.in_flight = 0
+        self.healthy = True
+        self.failures = 0
+        self.open_until = 0.0     # circuit terbuka sampai waktu ini (monotonic)
+        self.trial = False        # half-open: satu request percobaan sedang jalan
+        self.served = 0
+        self.last_error = ""
+        self._aclient = None
+
+    @property
+    def aclient(self):
+        if self._aclient is None:
+            self._aclient = AsyncInferenceClient(self.url)
+        return self._aclient
+
+    def state(self, now):
+        if self.open_until > now:
+            return "open"
+        if self.open_until:
+            return "half-open"
+        return "closed"
+
+
+class BalancedInferenceClient:
+    """
+    Client ke beberapa replica inference: pilih replica dengan request aktif
+    paling sedikit (least outstanding requests), lewati replica yang gagal
+    /healthz atau circuit breaker-nya terbuka, dan failover ke replica lain
+    kalau koneksi gagal / 5xx. Interface sama dengan InferenceClient.
+    """
+
+    def __init__(self, urls, health_interval=INFER_HEALTH_INTERVAL,
+                 cb_failures=INFER_CB_FAILURES, cb_cooldown=INFER_CB_COOLDOWN, **client_kw):
+        self.replicas = [Replica(u, **client_kw) for u in urls]
+        self.health_interval = health_interval
+        self.cb_failures = max(1, cb_failures)
+        self.cb_cooldown = cb_cooldown
+        self._lock = threading.Lock()
+        self._rr = 0
+        self._health_thread = None
+        self._stop = threading.Event()
+
+    # ---------- pemilihan replica ----------
+    def _acquire(self, exclude=()):
+        now = time.monotonic()
+        with self._lock:
+            candidates = []
+            for r in self.replicas:
+                if r in exclude or not r.healthy:
+                    continue
+                st = r.state(now)
+                if st == "open" or (st == "half-open" and r.trial):
+                    continue
+                candidates.append(r)
+            if not candidates:
+                raise NoReplicaAvailable("no healthy inference replica")
+            # least outstanding; seri → round robin
+            self._rr += 1
+            n = len(candidates)
+            best = min(range(n), key=lambda i: (candidates[i].in_flight, (i - self._rr) % n))
+            r = candidates[best]
+            if r.state(now) == "half-open":
+                r.trial = True
+            r.in_flight += 1
+            return r
+
+    def _release(self, r, ok, error=""):
+        with self._lock:
+            r.in_flight -= 1
+            r.trial = False
+            if ok:
+                r.failures = 0
+                r.open_until = 0.0
+                r.served += 1
+                return
+            r.failures += 1
+            r.last_error = error
+            if r.failures >= self.cb_failures:
+                r.open_until = time.monotonic() + self.cb_cooldown
+
+    def _failed(self, r, e):
+        """Catat kegagalan request ke replica r. Return True kalau boleh failover."""
+        if isinstance(e, (requests.ConnectionError, requests.Timeout)):
+            self._release(r, False, e.__class__.__name__)
+            return True
+        if isinstance(e, requests.HTTPError):
+            code = e.response.status_code if e.response is not None else 0
+            # 4xx = salah request, bukan salah replica → jangan eject / failover
+            self._release(r, code < 500, f"HTTP {code}")
+            return code >= 500
+        self._release(r, True)
+        return False
+
+    def _served(self, r, result):
+        self._release(r, True)
+        if isinstance(result, dict):
+            # catat replica yang melayani (pod_id dari inference, fallback URL)
+            result.setdefault("pod_id", r.url)
+            result["replica"] = r.url
+        return result
+
+    def _next(self, tried, last_exc):
+        try:
+            r = self._acquire(exclude=tried)
+        except NoReplicaAvailable:
+            if last_exc is not None:
+                raise last_exc
+            raise
+        tried.append(r)
+        return r
+
+    def _call(self, fn, failover=True):
+        self._ensure_health_thread()
+        tried = []
+        last_exc = None
+        for _ in range(len(self.replicas) if failover else 1):
+            r = self._next(tried, last_exc)
+            try:
+                result = fn(r.client)
+            except Exception as e:
+                if not self._failed(r, e):
+                    raise
+                last_exc = e
+                continue
+            return self._served(r, result)
+        raise last_exc
+
+    async def _acall(self, fn):
+        """Seperti _call untuk fn async (AsyncInferenceClient replica); state replica sama."""
+        self._ensure_health_thread()
+        tried = []
+        last_exc = None
+        for _ in range(len(self.replicas)):
+            r = self._next(tried, last_exc)
+            try:
+                result = await fn(r.aclient)
+            except Exception as e:
+                if not self._failed(r, e):
+                    raise
+                last_exc = e
+                continue
+            return self._served(r, result)
+        raise last_exc
+
+    # ---------- interface InferenceClient ----------
+    def post_image(self, path="/infer", file_path=None, data=None, params=None):
+        if data is None and file_path is not None:
+            with open(file_path, "rb") as f:
+                data = f.read()   # dibaca sekali, bisa dikirim ulang saat failover
+        return self._call(lambda c: c.post_image(path, data=data, params=params))
+
+    def post_stream(self, chunks, path="/infer", filename="image.jpg", content_type="image/jpeg",
+                    params=None):
+        # stream tidak bisa diputar ulang → tanpa failover ke replica lain
+        return self._call(lambda c: c.post_stream(chunks, path, filename, content_type, params),
+                          failover=False)
+
+    def post_images(self, file_paths, path="/infer/batch", params=None):
+        return self._call(lambda c: c.post_images(file_paths, path, params))
+
+    def get_json(self, path, timeout=3):
+        return self._call(lambda c: c.get_json(path, timeout))
+
+    def as_async(self):
+        return AsyncBalancedInferenceClient(self)
+
+    # ---------- health check ----------
+    def check_health(self):
+        for r in self.replicas:
+            try:
+                resp = r.client.session.get(f"{r.url}/healthz",
+                                            timeout=(r.client.timeout[0], 2))
+                ok = resp.status_code == 200
+            except requests.RequestException:
+                ok = False
+            with self._lock:
+                r.healthy = ok
+
+    def _ensure_health_thread(self):
+        if self._health_thread is not None or self.health_interval <= 0:
+            return
+        with self._lock:
+            if self._health_thread is None:
+                t = threading.Thread(target=self._health_loop, name="inference-health", daemon=True)
+                self._health_thread = t
+                t.start()
+
+    def _health_loop(self):
+        while not self._stop.wait(self.health_interval):
+            self.check_health()
+
+    def close(self):
+        self._stop.set()
+
+    def stats(self):
+        now = time.monotonic()
+        reps = []
+        for r in self.replicas:
+            s = r.client.stats()
+            s.update(in_flight=r.in_flight, healthy=r.healthy, circuit=r.state(now),
+                     consecutive_failures=r.failures, served=r.served,
+                     last_error=r.last_error or None)
+            reps.append(s)
+        return {"replicas": reps, "calls": sum(s["calls"] for s in reps),
+                "errors": sum(s["errors"] for s in reps)}
+
+
+class AsyncBalancedInferenceClient:
+    """Interface AsyncInferenceClient di atas BalancedInferenceClient (replica, health, circuit sama)."""
+
+    def __init__(self, balanced):
+        self.balanced = balanced
+
+    async def post_image(self, path="/infer", file_path=None, data=None, params=None):
+        if data is None and file_path is not None:
+            data = await asyncio.to_thread(_read_file, file_path)
+        return await self.balanced._acall(lambda c: c.post_image(path, data=data, params=params))
+
+    def stats(self):
+        reps = [r.aclient.stats() for r in self.balanced.replicas]
+        return {"replicas": reps, "calls": sum(s["calls"] for s in reps),
+                "errors": sum(s["errors"] for s in reps)}
+
+
+_client = None
+_async_client = None
+_client_lock = threading.Lock()
+
+
+def get_client(base_urls):
+    """
+    Client per proses, dibuat saat pertama dipakai (setelah fork gunicorn).
+    Satu URL → InferenceClient; beberapa URL → BalancedInferenceClient.
+    """
+    global _client
+    if _client is None:
+        with _client_lock:
+            if _client is None:
+                if isinstance(base_urls, str):
+                    base_urls = [base_urls]
+                if len(base_urls) == 1:
+                    _client = InferenceClient(base_urls[0])
+                else:
+                    _client = BalancedInferenceClient(base_urls)
+    return _client
+
+
+def get_async_client(base_urls):
+    """Client async per proses; beberapa URL → berbagi state replica dengan get_client()."""
+    global _async_client
+    if _async_client is None:
+        with _client_lock:
+            if _async_client is None:
+                if isinstance(base_urls, str):
+                    base_urls = [base_urls]
+                if len(base_urls) == 1:
+                    _async_client = AsyncInferenceClient(base_urls[0])
+        if _async_client is None:
+            _async_client = get_client(base_urls).as_async()
+    return _async_client
@@ -0,0 +1,55 @@
+import os
+
+# ============================================================
+# Hasil inference format kolom (INFER_RESPONSE_FORMAT=columns)
+#   result["boxes"] = {"classes": [...], "cls": [...], "conf": [...],
+#                      "x": [...], "y": [...], "w": [...], "h": [...]}
+#   array paralel per box; cls = index ke "classes".
+# Inference versi lama (tanpa ?format) tetap membalas "items" (list dict);
+# fungsi di sini menerima keduanya, jadi hasil lama di cache tetap terbaca.
+# ============================================================
+RESPONSE_FORMAT = os.getenv("INFER_RESPONSE_FORMAT", "columns")
+
+
+def request_params():
+    """Query string untuk /infer dan /infer/batch."""
+    return {"format": RESPONSE_FORMAT} if RESPONSE_FORMAT != "items" else None
+
+
+def count(result):
+    b = result.get("boxes")
+    return len(b["conf"]) if b is not None else len(result.get("items", []))
+
+
+def confidences(result):
+    b = result.get("boxes")
+    if b is not None:
+        return b["conf"]
+    return [i["confidence"] for i in result.get("items", [])]
+
+
+def rows(result):
+    """Iterator (klass, confidence, x, y, w, h) per box, tanpa membuat dict per box."""
+    b = result.get("boxes")
+    if b is None:
+        return ((i["klass"], i["confidence"], i["x"], i["y"], i["w"], i["h"])
+                for i in result.get("items", []))
+    names = b["classes"]
+    return zip((names[c] for c in b["cls"]), b["conf"], b["x"], b["y"], b["w"], b["h"])
+
+
+def class_confidences(result):
+    """(klass, confidence) per box, untuk rollup."""
+    b = result.get("boxes")
+    if b is None:
+        return [(i.get("klass"), i.get("confidence")) for i in result.get("items", [])]
+    names = b["classes"]
+    return [(names[c], conf) for c, conf in zip(b["cls"], b["conf"])]
+
+
+def items(result):
+    """List dict {klass, confidence, x, y, w, h} (annotate, payload lama)."""
+    if result.get("boxes") is None:
+        return result.get("items", [])
+    return [{"klass": k, "confidence": c, "x": x, "y": y, "w": w, "h": h}
+            for k, c, x, y, w, h in rows(result)]
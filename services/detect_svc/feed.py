@@ -0,0 +1,274 @@
+import asyncio
+import hashlib
+import json
+import logging
+import os
+import secrets
+import threading
+from collections import Counter, defaultdict
+from datetime import timedelta
+
+from django.core.serializers.json import DjangoJSONEncoder
+from django.db import close_old_connections, connection
+from django.db.models import Count, Q
+from django.utils import timezone
+
+from .models import Detection, DetectionItem, StreamTicket
+from .packing import class_stats
+from .serializers import DetectionListSerializer
+
+log = logging.getLogger(__name__)
+
+# ============================================================
+# Live feed (Server-Sent Events) untuk dashboard
+#   Satu thread poller per proses membaca Detection baru dari DB (query
+#   range created_at berindeks per interval, hanya selama ada client
+#   yang terhubung) lalu membagikan event ke semua stream di proses itu.
+#   Tidak butuh broker eksternal: DB yang jadi jalur antar proses (worker
+#   uvicorn lain, job worker, ingest); penyimpanan di proses yang sama
+#   membangunkan poller langsung (notify) tanpa menunggu interval.
+#
+#   event: detection  DetectionListSerializer detection baru
+#   event: summary    delta /summary per hari {date, images, objects, conf_sum, by_class}
+#   event: update     {id, annotated_url, variants} setelah annotate di background selesai
+#   event: ready      stream siap; setelah reconnect client memuat ulang data
+# ============================================================
+FEED_POLL_INTERVAL = float(os.getenv("FEED_POLL_INTERVAL", "1.0"))
+FEED_HEARTBEAT = float(os.getenv("FEED_HEARTBEAT", "15"))     # komentar SSE agar proxy tidak memutus
+FEED_QUEUE_MAX = int(os.getenv("FEED_QUEUE_MAX", "1000"))     # per client; penuh → diputus, reconnect
+FEED_BATCH = int(os.getenv("FEED_BATCH", "200"))              # detection per poll
+# transaksi yang commit belakangan bisa punya created_at lebih lama dari yang
+# sudah terkirim → tiap poll melihat mundur FEED_LAG detik (id yang sudah dikirim dilewati)
+FEED_LAG = timedelta(seconds=float(os.getenv("FEED_LAG", "5")))
+FEED_PENDING = timedelta(seconds=float(os.getenv("FEED_PENDING", "60")))  # tunggu annotate maks
+# tiket stream: didapat lewat POST ber-JWT, dipakai sekali sebagai ?ticket= saat EventSource dibuka
+FEED_TICKET_TTL = timedelta(seconds=float(os.getenv("FEED_TICKET_TTL", "30")))
+
+
+def _ticket_key(raw):
+    return hashlib.sha256(raw.encode()).hexdigest()
+
+
+def issue_ticket(user, now=None):
+    """Tiket baru untuk `user` (string acak); tiket kedaluwarsa dibersihkan sekalian."""
+    now = now or timezone.now()
+    StreamTicket.objects.filter(expires_at__lte=now).delete()
+    raw = secrets.token_urlsafe(32)
+    StreamTicket.objects.create(key=_ticket_key(raw), user=user, expires_at=now + FEED_TICKET_TTL)
+    return raw
+
+
+def redeem_ticket(raw, now=None):
+    """User pemilik tiket, atau None kalau tiket tidak dikenal / kedaluwarsa / sudah dipakai."""
+    ticket = (StreamTicket.objects.select_related("user")
+              .filter(key=_ticket_key(raw), expires_at__gt=now or timezone.now()).first())
+    # delete() yang berhasil = pemakaian pertama (dua request bersamaan → hanya satu yang lolos)
+    if ticket is None or not StreamTicket.objects.filter(key=ticket.key).delete()[0]:
+        return None
+    return ticket.user
+
+
+def message(event, data):
+    return f"event: {event}\ndata: {json.dumps(data, cls=DjangoJSONEncoder)}\n\n"
+
+
+def _class_counts(dets):
+    """{detection id: Counter(kelas)}: satu query agregat untuk mode row, decode blob untuk packed."""
+    out = defaultdict(Counter)
+    rows = [d.id for d in dets if d.boxes is None and d.total_objects]
+    if rows:
+        q = (DetectionItem.objects.filter(detection_id__in=rows)
+             .values("detection_id", "klass").annotate(n=Count("id")))
+        for r in q:
+            out[r["detection_id"]][r["klass"] or "Unknown"] += r["n"]
+    for d in dets:
+        if d.boxes is not None:
+            for klass, (n, _) in class_stats(d.boxes, d.box_classes).items():
+                out[d.id][klass] += n
+    return out
+
+
+def summary_deltas(dets):
+    """Delta /summary per hari untuk detection baru (sama dengan yang dicatat rollup.record)."""
+    counts = _class_counts(dets)
+    per_day = {}
+    for d in dets:
+        day = timezone.localdate(d.created_at).isoformat()
+        s = per_day.setdefault(day, {"date": day, "images": 0, "objects": 0, "conf_sum": 0.0,
+                                     "by_class": Counter()})
+        s["images"] += 1
+        s["objects"] += d.total_objects or 0
+        s["conf_sum"] += d.avg_conf or 0.0
+        s["by_class"].update(counts[d.id])
+    return [dict(s, conf_sum=round(s["conf_sum"], 6), by_class=dict(s["by_class"]))
+            for s in per_day.values()]
+
+
+class Poller:
+    """
+    Detection yang tersimpan sejak poll sebelumnya → pesan SSE.
+
+    Dua query per poll, keduanya lewat index (created_at, id):
+      maju    : baris setelah cursor (created_at, id) terakhir yang terkirim,
+                per halaman FEED_BATCH → burst besar terkirim bertahap, tidak macet
+      mundur  : id di jendela FEED_LAG sebelum cursor yang belum terkirim
+                (transaksi yang commit belakangan dengan created_at lebih lama)
+    """
+
+    def __init__(self, now=None):
+        self.cursor = (now or timezone.now(), None)   # (created_at, id) terakhir yang terkirim
+        self.seen = {}       # id → created_at, id yang sudah dikirim dalam jendela FEED_LAG
+        self.pending = {}    # id → batas waktu menunggu annotated_url / variants
+
+    def _forward(self):
+        ts, last_id = self.cursor
+        after = Q(created_at__gt=ts)
+        if last_id is not None:
+            after |= Q(created_at=ts, id__gt=last_id)
+        dets = list(Detection.objects.filter(after).order_by("created_at", "id")[:FEED_BATCH])
+        if dets:
+            self.cursor = (dets[-1].created_at, dets[-1].id)
+        return dets
+
+    def _late(self):
+        ts = self.cursor[0]
+        ids = (Detection.objects.filter(created_at__gt=ts - FEED_LAG, created_at__lte=ts)
+               .values_list("id", flat=True))
+        missed = [i for i in ids if i not in self.seen][:FEED_BATCH]
+        if not missed:
+            return []
+        return list(Detection.objects.filter(id__in=missed).order_by("created_at", "id"))
+
+    def poll(self, now=None):
+        now = now or timezone.now()
+        new = [d for d in self._forward() if d.id not in self.seen]
+        for d in new:
+            self.seen[d.id] = d.created_at
+        late = self._late()   # setelah _forward: cursor sudah maju, baris barusan sudah di seen
+        for d in late:
+            self.seen[d.id] = d.created_at
+        new += late
+        floor = self.cursor[0] - FEED_LAG
+        self.seen = {k: v for k, v in self.seen.items() if v > floor}
+
+        out = [message("detection", DetectionListSerializer(d).data) for d in new]
+        if new:
+            out += [message("summary", s) for s in summary_deltas(new)]
+        for d in new:
+            if d.annotated_url is None and d.variants is None:   # annotate masih di background
+                self.pending[d.id] = now + FEED_PENDING
+        return out + self._updates(now)
+
+    def _updates(self, now):
+        self.pending = {k: t for k, t in self.pending.items() if t > now}
+        if not self.pending:
+            return []
+        done = (Detection.objects.filter(id__in=list(self.pending))
+                .filter(Q(annotated_url__isnull=False) | Q(variants__isnull=False))
+                .values("id", "annotated_url", "variants"))
+        out = []
+        for r in done:
+            del self.pending[r["id"]]
+            out.append(message("update", r))
+        return out
+
+
+def _deliver(q, messages):
+    for m in messages:
+        try:
+            q.put_nowait(m)
+        except asyncio.QueueFull:
+            # client terlalu lambat: putuskan; EventSource reconnect lalu memuat ulang
+            while not q.empty():
+                q.get_nowait()
+            q.put_nowait(None)
+            return
+
+
+class Broker:
+    """Fan-out in-process: satu poller DB per proses untuk semua stream yang terbuka."""
+
+    def __init__(self, interval=FEED_POLL_INTERVAL):
+        self.interval = interval
+        self._subs = {}      # asyncio.Queue → event loop pemiliknya
+        self._lock = threading.Lock()
+        self._wake = threading.Event()
+        self._thread = None
+
+    def subscribe(self):
+        q = asyncio.Queue(maxsize=FEED_QUEUE_MAX)
+        with self._lock:
+            self._subs[q] = asyncio.get_running_loop()
+            if self._thread is None:
+                self._thread = threading.Thread(target=self._run, name="detect-feed", daemon=True)
+                self._thread.start()
+        return q
+
+    def unsubscribe(self, q):
+        with self._lock:
+            self._subs.pop(q, None)
+
+    def subscribers(self):
+        with self._lock:
+            return len(self._subs)
+
+    def notify(self):
+        """Ada detection baru di proses ini (setelah commit) → poll sekarang."""
+        self._wake.set()
+
+    def publish(self, messages):
+        with self._lock:
+            subs = list(self._subs.items())
+        for q, loop in subs:
+            try:
+                loop.call_soon_threadsafe(_deliver, q, messages)
+            except RuntimeError:   # event loop sudah ditutup
+                self.unsubscribe(q)
+
+    def _run(self):
+        poller = Poller()
+        try:
+            while True:
+                # berhenti kalau tidak ada yang mendengarkan → nol query
+                with self._lock:
+                    if not self._subs:
+                        self._thread = None
+                        return
+                self._wake.wait(self.interval)
+                self._wake.clear()
+                close_old_connections()
+                try:
+                    messages = poller.poll()
+                except Exception:
+                    log.exception("detect feed poll error")
+                    continue
+                if messages:
+                    self.publish(messages)
+        finally:
+            connection.close()
+
+
+broker = Broker()
+
+
+def notify():
+    broker.notify()
+
+
+async def events(heartbeat=None):
+    """Isi response text/event-stream untuk satu client (sampai client menutup koneksi)."""
+    heartbeat = heartbeat or FEED_HEARTBEAT
+    q = broker.subscribe()
+    try:
+        yield f"retry: 3000\n{message('ready', {'poll_interval': broker.interval})}"
+        while True:
+            try:
+                item = await asyncio.wait_for(q.get(), heartbeat)
+            except asyncio.TimeoutError:
+                yield ": ping\n\n"
+                continue
+            if item is None:
+                return
+            yield item
+    finally:
+        broker.unsubscribe(q)
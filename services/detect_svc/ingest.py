@@ -0,0 +1,181 @@
+import logging
+import os
+
+from PIL import Image
+
+from . import pipeline, storage
+from .models import IngestSession
+
+# ============================================================
+# Ingest video / urutan frame (CCTV)
+#   frame diambil tiap 1/INGEST_SAMPLE_FPS detik → frame yang hampir sama
+#   dengan frame terakhir yang diinferensi dilewati (diff thumbnail warna 16x16)
+#   → sisanya disimpan sebagai upload dan diinferensi per batch
+#   (pipeline.run_detection_batch) → satu Detection per frame, terhubung
+#   ke IngestSession.
+# Mode async berjalan sebagai DetectionJob (jobs.enqueue_ingest): sumber dan
+# opsi disimpan di IngestSession, jadi kalau worker mati job di-requeue
+# (jobs.requeue_stale) dan dilanjutkan dari IngestSession.resume_index.
+# ============================================================
+INGEST_SAMPLE_FPS = float(os.getenv("INGEST_SAMPLE_FPS", "2"))
+# rata-rata selisih abs per channel (0..255) thumbnail warna; di bawah ini = duplikat
+# (warna, bukan grayscale: rompi/helm berwarna bisa punya luminance mirip latar)
+INGEST_DIFF_THRESHOLD = float(os.getenv("INGEST_DIFF_THRESHOLD", "3"))
+# paksa inferensi setelah N frame sampel berturut-turut dilewati
+INGEST_KEYFRAME_EVERY = int(os.getenv("INGEST_KEYFRAME_EVERY", "30"))
+INGEST_MAX_FRAMES = int(os.getenv("INGEST_MAX_FRAMES", "2000"))
+FRAME_JPEG_QUALITY = 90
+SIG_SIZE = 16
+
+log = logging.getLogger(__name__)
+
+
+# ---------- sumber frame ----------
+# setiap sumber menghasilkan (frame_index, frame_ms, signature, get_file_id)
+# get_file_id() baru dipanggil untuk frame yang diinferensi (encode + simpan)
+
+def video_frames(path, sample_fps=None, max_frames=None):
+    """Frame sampel dari file video (OpenCV). Frame di antara sampel hanya di-grab, tidak di-decode."""
+    try:
+        import cv2
+    except ImportError as e:
+        raise RuntimeError("video ingest butuh opencv-python-headless") from e
+
+    cap = cv2.VideoCapture(path)
+    if not cap.isOpened():
+        raise ValueError("cannot open video")
+    try:
+        fps = cap.get(cv2.CAP_PROP_FPS) or 25.0
+        step = max(1, round(fps / (sample_fps or INGEST_SAMPLE_FPS)))
+        limit = max_frames or INGEST_MAX_FRAMES
+        index = sampled = 0
+        while sampled < limit and cap.grab():
+            if index % step == 0:
+                ok, frame = cap.retrieve()
+                if not ok:
+                    break
+                sampled += 1
+                sig = cv2.resize(frame, (SIG_SIZE, SIG_SIZE), interpolation=cv2.INTER_AREA).tobytes()
+                yield index, round(index * 1000.0 / fps), sig, _frame_saver(cv2, frame)
+            index += 1
+    finally:
+        cap.release()
+
+
+def _frame_saver(cv2, frame):
+    def save():
+        ok, buf = cv2.imencode(".jpg", frame, [cv2.IMWRITE_JPEG_QUALITY, FRAME_JPEG_QUALITY])
+        if not ok:
+            raise ValueError("cannot encode frame")
+        return storage.save_bytes(buf.tobytes(), ".jpg")[0]
+    return save
+
+
+def image_signature(path):
+    im = Image.open(path)
+    im.draft("RGB", (SIG_SIZE * 4, SIG_SIZE * 4))
+    return im.convert("RGB").resize((SIG_SIZE, SIG_SIZE), Image.BOX).tobytes()
+
+
+def uploaded_frames(file_ids):
+    """Frame dari gambar yang sudah diupload (urutan = urutan list)."""
+    for i, file_id in enumerate(file_ids):
+        path = pipeline.upload_path(str(file_id))
+        yield i, None, image_signature(path), (lambda f=str(file_id): f)
+
+
+# ---------- dedup ----------
+
+def frame_diff(a: bytes, b: bytes) -> float:
+    return sum(abs(x - y) for x, y in zip(a, b)) / len(a)
+
+
+class FrameDeduper:
+    """
+    Bandingkan dengan frame terakhir yang DIINFERENSI (bukan frame sebelumnya),
+    jadi perubahan pelan yang menumpuk tetap memicu inferensi; setelah
+    keyframe_every frame dilewati berturut-turut, frame berikut tetap diinferensi.
+    """
+
+    def __init__(self, threshold=INGEST_DIFF_THRESHOLD, keyframe_every=INGEST_KEYFRAME_EVERY):
+        self.threshold = threshold
+        self.keyframe_every = keyframe_every
+        self.reference = None
+        self.skipped = 0
+
+    def keep(self, sig) -> bool:
+        if (self.reference is None or self.skipped >= self.keyframe_every
+                or frame_diff(sig, self.reference) >= self.threshold):
+            self.reference = sig
+            self.skipped = 0
+            return True
+        self.skipped += 1
+        return False
+
+
+# ---------- pipeline ----------
+
+def session_frames(session):
+    """Iterator frame dari sumber yang tersimpan di session (video upload / file_ids)."""
+    if session.kind == IngestSession.VIDEO:
+        return video_frames(pipeline.upload_path(session.file_id), sample_fps=session.sample_fps)
+    return uploaded_frames(session.file_ids or [])
+
+
+def session_deduper(session):
+    return FrameDeduper(
+        threshold=INGEST_DIFF_THRESHOLD if session.diff_threshold is None else session.diff_threshold,
+        keyframe_every=INGEST_KEYFRAME_EVERY if session.keyframe_every is None else session.keyframe_every,
+    )
+
+
+def run_session(session, frames=None, deduper=None, progress=None):
+    """
+    Proses semua frame untuk satu IngestSession; counter (+ resume_index) disimpan per batch.
+    Frame sampai resume_index hanya diputar ulang lewat deduper (sudah dihitung
+    dan diinferensi sebelumnya) supaya keputusan dedup berikutnya tetap sama.
+    `progress()` dipanggil setiap batch tersimpan (heartbeat job).
+    """
+    frames = session_frames(session) if frames is None else frames
+    deduper = deduper or session_deduper(session)
+    resume = session.resume_index
+    flush_size = max(1, pipeline.BATCH_CHUNK * pipeline.BATCH_CONCURRENCY)
+    pending = []
+
+    def flush():
+        ids = [p[0] for p in pending]
+        results = pipeline.run_detection_batch(ids, attrs=[p[1] for p in pending])
+        ok = sum("detection" in r for r in results)
+        session.frames_detected += ok
+        session.frames_failed += len(results) - ok
+        session.resume_index = pending[-1][1]["frame_index"]
+        pending.clear()
+        session.save()
+        if progress is not None:
+            progress()
+
+    try:
+        for index, frame_ms, sig, get_file_id in frames:
+            if resume is not None and index <= resume:
+                deduper.keep(sig)
+                continue
+            session.frames_sampled += 1
+            if not deduper.keep(sig):
+                session.frames_skipped += 1
+                continue
+            file_id = get_file_id()
+            pending.append((file_id, {
+                "session": session, "frame_index": index, "frame_ms": frame_ms,
+                "filename": f"{session.source}#{index}",
+            }))
+            if len(pending) >= flush_size:
+                flush()
+        if pending:
+            flush()
+        session.status = IngestSession.DONE
+    except Exception as e:
+        log.exception("ingest %s gagal", session.id)
+        session.status = IngestSession.FAILED
+        session.error = str(e)[:1000]
+    session.save()
+    return session
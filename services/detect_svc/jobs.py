@@ -0,0 +1,195 @@
+import logging
+import os
+import threading
+from datetime import timedelta
+
+import requests
+from django.db import close_old_connections, connection
+from django.db.models import Count, F
+from django.utils import timezone
+
+from . import ingest, metrics
+from .models import DetectionJob, IngestSession
+from .pipeline import run_detection
+
+log = logging.getLogger(__name__)
+
+# ============================================================
+# Antrean job deteksi berbasis DB (tanpa broker eksternal)
+#   - POST detect {"async": true} → enqueue, balas job id
+#   - worker thread mengambil job (claim atomik via UPDATE ... WHERE status)
+#   - inference 5xx / error jaringan → retry dengan backoff
+#   - ingest video / frame async juga berjalan sebagai job (enqueue_ingest)
+# Worker jalan embedded di proses gateway (default; start saat wsgi/asgi
+# dimuat → job yang tertinggal di antrean sebelum restart langsung diambil)
+# atau terpisah:
+#   python manage.py run_detect_worker
+# ============================================================
+JOB_WORKERS = int(os.getenv("DETECT_JOB_WORKERS", "2"))
+JOB_EMBEDDED = os.getenv("DETECT_JOB_EMBEDDED", "1") not in ("0", "false", "False", "no", "NO")
+JOB_MAX_ATTEMPTS = int(os.getenv("DETECT_JOB_MAX_ATTEMPTS", "3"))
+JOB_RETRY_BACKOFF = float(os.getenv("DETECT_JOB_RETRY_BACKOFF", "2"))   # detik, x2 per attempt
+JOB_POLL_INTERVAL = float(os.getenv("DETECT_JOB_POLL_INTERVAL", "1"))
+JOB_STALE_AFTER = float(os.getenv("DETECT_JOB_STALE_AFTER", "300"))     # running terlalu lama → requeue
+
+
+def _retryable(exc) -> bool:
+    if isinstance(exc, (requests.ConnectionError, requests.Timeout)):
+        return True
+    if isinstance(exc, requests.HTTPError) and exc.response is not None:
+        return exc.response.status_code >= 500
+    return False
+
+
+def _submit(**fields) -> DetectionJob:
+    job = DetectionJob.objects.create(**fields)
+    if JOB_EMBEDDED:
+        pool.start()
+    pool.wake()
+    return job
+
+
+def start_embedded():
+    """Dipanggil wsgi.py / asgi.py: worker embedded hidup sejak proses start, bukan baru saat enqueue."""
+    if JOB_EMBEDDED:
+        pool.start()
+
+
+def enqueue(file_id: str, tiled: bool = False) -> DetectionJob:
+    return _submit(file_id=file_id, tiled=tiled)
+
+
+def enqueue_ingest(session: IngestSession) -> DetectionJob:
+    """IngestSession (sumber + opsi sudah tersimpan) → job; progres di GET ingest/<id>."""
+    return _submit(file_id=session.file_id or session.source, ingest=session)
+
+
+def queue_depth() -> dict:
+    counts = dict(DetectionJob.objects.values_list("status").annotate(n=Count("id")))
+    return {s: counts.get(s, 0) for s, _ in DetectionJob.STATUS_CHOICES}
+
+
+def requeue_stale():
+    """Job 'running' yang ditinggal worker mati dikembalikan ke antrean."""
+    cutoff = timezone.now() - timedelta(seconds=JOB_STALE_AFTER)
+    return DetectionJob.objects.filter(status=DetectionJob.RUNNING, updated_at__lt=cutoff).update(
+        status=DetectionJob.QUEUED, updated_at=timezone.now()
+    )
+
+
+def claim_next():
+    """Ambil satu job siap jalan. Aman dipanggil paralel dari banyak proses."""
+    now = timezone.now()
+    candidates = (
+        DetectionJob.objects.filter(status=DetectionJob.QUEUED, run_after__lte=now)
+        .order_by("run_after", "created_at")
+        .values_list("id", flat=True)[:10]
+    )
+    for job_id in candidates:
+        claimed = DetectionJob.objects.filter(id=job_id, status=DetectionJob.QUEUED).update(
+            status=DetectionJob.RUNNING, attempts=F("attempts") + 1, updated_at=now
+        )
+        if claimed:
+            return DetectionJob.objects.get(id=job_id)
+    return None
+
+
+def _process_ingest(job: DetectionJob):
+    # heartbeat per batch: ingest panjang tidak dianggap stale selama masih jalan
+    beat = lambda: DetectionJob.objects.filter(id=job.id).update(updated_at=timezone.now())
+    metrics.begin(job.id.hex)
+    try:
+        session = ingest.run_session(job.ingest, progress=beat)
+    finally:
+        metrics.end()
+    job.status = DetectionJob.DONE if session.status == IngestSession.DONE else DetectionJob.FAILED
+    job.error = session.error
+    job.save(update_fields=["status", "error", "updated_at"])
+    return job
+
+
+def process(job: DetectionJob):
+    if job.ingest_id:
+        return _process_ingest(job)
+    # id job dipakai sebagai X-Request-ID ke inference
+    metrics.begin(job.id.hex)
+    try:
+        det = run_detection(job.file_id, tiled=job.tiled)
+    except Exception as e:
+        job.error = f"{e.__class__.__name__}: {e}"
+        if _retryable(e) and job.attempts < JOB_MAX_ATTEMPTS:
+            job.status = DetectionJob.QUEUED
+            job.run_after = timezone.now() + timedelta(
+                seconds=JOB_RETRY_BACKOFF * 2 ** (job.attempts - 1)
+            )
+        else:
+            job.status = DetectionJob.FAILED
+        job.save(update_fields=["status", "error", "run_after", "updated_at"])
+        return job
+    finally:
+        metrics.end()
+
+    job.status = DetectionJob.DONE
+    job.detection = det
+    job.error = ""
+    job.save(update_fields=["status", "detection", "error", "updated_at"])
+    return job
+
+
+def run_pending(limit=None) -> int:
+    """Proses job yang siap sekarang (dipakai worker & test). Return jumlah job."""
+    done = 0
+    while limit is None or done < limit:
+        job = claim_next()
+        if job is None:
+            break
+        process(job)
+        done += 1
+    return done
+
+
+class WorkerPool:
+    def __init__(self, workers=JOB_WORKERS):
+        self.workers = max(1, workers)
+        self._threads = []
+        self._wake = threading.Event()
+        self._stop = threading.Event()
+        self._lock = threading.Lock()
+
+    def start(self):
+        with self._lock:
+            if self._threads:
+                return
+            self._stop.clear()
+            for i in range(self.workers):
+                t = threading.Thread(target=self._loop, name=f"detect-job-{i}", daemon=True)
+                t.start()
+                self._threads.append(t)
+
+    def stop(self, timeout=None):
+        self._stop.set()
+        self._wake.set()
+        for t in self._threads:
+            t.join(timeout)
+        self._threads = []
+
+    def wake(self):
+        self._wake.set()
+
+    def _loop(self):
+        try:
+            while not self._stop.is_set():
+                close_old_connections()
+                try:
+                    requeue_stale()
+                    if run_pending(limit=1):
+                        continue
+                except Exception:
+                    log.exception("detect job worker error")
+                self._wake.wait(JOB_POLL_INTERVAL)
+                self._wake.clear()
+        finally:
+            connection.close()
+
+
+pool = WorkerPool()
@@ -0,0 +1,19 @@
+from datetime import date
+
+from django.core.management.base import BaseCommand
+
+from detect_svc import rollup
+from detect_svc.models import DailyClassCount, DailySummary
+
+
+class Command(BaseCommand):
+    help = "Bangun ulang rollup harian /summary dari tabel Detection/DetectionItem."
+
+    def add_arguments(self, parser):
+        parser.add_argument("--from", dest="since", type=date.fromisoformat, default=None,
+                            help="YYYY-MM-DD; hanya hari ini dan sesudahnya yang dihitung ulang")
+
+    def handle(self, *args, **opts):
+        rollup.rebuild(since=opts["since"])
+        self.stdout.write(f"rollup: {DailySummary.objects.count()} hari, "
+                          f"{DailyClassCount.objects.count()} baris per kelas")
@@ -0,0 +1,106 @@
+import json
+import os
+import random
+import shutil
+import statistics
+import tempfile
+import time
+
+from django.core.management.base import BaseCommand
+from django.test import override_settings
+from PIL import Image, ImageDraw, ImageFont
+
+from detect_svc.services import _get_color, draw_boxes_and_save, render_annotations
+
+
+def render_full_overlay(img, items):
+    """
+    Renderer lama (sebelum optimasi) sebagai pembanding: font di-load tiap
+    panggilan, overlay RGBA seukuran frame, alpha_composite seluruh gambar.
+    """
+    W, H = img.size
+    overlay = Image.new("RGBA", img.size, (0, 0, 0, 0))
+    draw = ImageDraw.Draw(overlay)
+    try:
+        font = ImageFont.truetype("DejaVuSans.ttf", size=max(14, int(W * 0.018)))
+    except Exception:
+        font = ImageFont.load_default()
+    for it in items:
+        x, y, w, h = it["x"], it["y"], it["w"], it["h"]
+        label = f'{it["klass"]} {it["confidence"]:.2f}'
+        color = _get_color(it["klass"])
+        draw.rectangle([x, y, x + w, y + h], outline=color + (255,), width=3)
+        pad = 4
+        l, t, r, b = draw.textbbox((0, 0), label, font=font)
+        tw, th = r - l, b - t
+        label_y = y - (th + pad * 2)
+        if label_y < 0:
+            label_y = y
+        draw.rectangle([x, label_y, x + tw + pad * 2, label_y + th + pad * 2],
+                       fill=(0, 255, 255, 220), outline=color + (255,), width=1)
+        draw.text((x + pad, label_y + pad), label, fill=(0, 43, 43, 255), font=font)
+    return Image.alpha_composite(img.convert("RGBA"), overlay).convert("RGB")
+
+
+def synthetic_items(W, H, n, seed=0):
+    rnd = random.Random(seed)
+    klasses = ["Safety helmet", "Hand gloves", "No safety glasses", "Wearpack"]
+    items = []
+    for _ in range(n):
+        w, h = rnd.randint(20, W // 6), rnd.randint(20, H // 6)
+        items.append({"klass": rnd.choice(klasses), "confidence": rnd.random(),
+                      "x": rnd.randint(0, W - w - 1), "y": rnd.randint(0, H - h - 1), "w": w, "h": h})
+    return items
+
+
+class Command(BaseCommand):
+    help = ("Benchmark biaya render annotated image: renderer lama vs baru, "
+            "plus draw_boxes_and_save utuh (decode + render + encode JPEG + tulis file).")
+
+    def add_arguments(self, parser):
+        parser.add_argument("--sizes", nargs="+", default=["1280x720", "1920x1080", "3840x2160"])
+        parser.add_argument("--boxes", nargs="+", type=int, default=[5, 50, 300])
+        parser.add_argument("--runs", type=int, default=5)
+        parser.add_argument("--json", default=None, help="simpan hasil ke file JSON")
+
+    def handle(self, *args, **opts):
+        media = tempfile.mkdtemp(prefix="bench-annotate-")
+        try:
+            with override_settings(MEDIA_ROOT=media):
+                rows = self.run(opts, media)
+        finally:
+            shutil.rmtree(media, ignore_errors=True)
+        if opts["json"]:
+            with open(opts["json"], "w") as f:
+                json.dump(rows, f, indent=2)
+
+    def run(self, opts, media):
+        rows = []
+        for size in opts["sizes"]:
+            W, H = map(int, size.lower().split("x"))
+            base = Image.new("RGB", (W, H), (90, 110, 130))
+            src = os.path.join(media, f"src_{size}.jpg")
+            base.save(src, "JPEG", quality=90)
+            for n in opts["boxes"]:
+                items = synthetic_items(W, H, n)
+                row = {"size": size, "boxes": n}
+                for name, fn in (("before_ms", render_full_overlay), ("after_ms", render_annotations)):
+                    times = []
+                    for _ in range(opts["runs"]):
+                        img = base.copy()
+                        t = time.perf_counter()
+                        fn(img, items)
+                        times.append((time.perf_counter() - t) * 1000.0)
+                    row[name] = round(statistics.median(times), 2)
+                row["speedup"] = round(row["before_ms"] / row["after_ms"], 2) if row["after_ms"] else None
+                times = []
+                for _ in range(opts["runs"]):
+                    t = time.perf_counter()
+                    draw_boxes_and_save(src, items)
+                    times.append((time.perf_counter() - t) * 1000.0)
+                row["save_ms"] = round(statistics.median(times), 2)
+                rows.append(row)
+                self.stdout.write(f'{size:>10} {n:>4} box  before {row["before_ms"]:>8} ms'
+                                  f'  after {row["after_ms"]:>8} ms  x{row["speedup"]}'
+                                  f'  draw_boxes_and_save {row["save_ms"]:>8} ms')
+        return rows
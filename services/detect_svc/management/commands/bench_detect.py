@@ -0,0 +1,366 @@
+import importlib
+import io
+import json
+import os
+import platform
+import random
+import shutil
+import statistics
+import sys
+import subprocess
+import tempfile
+import threading
+import time
+from collections import Counter
+from concurrent.futures import ThreadPoolExecutor
+
+import requests
+from django.conf import settings
+from django.contrib.auth import get_user_model
+from django.core.handlers.asgi import ASGIHandler
+from django.core.handlers.wsgi import WSGIHandler
+from django.core.management.base import BaseCommand
+from django.core.servers.basehttp import ThreadedWSGIServer, WSGIRequestHandler, WSGIServer
+from django.db import connection
+from django.test import override_settings
+from django.urls import clear_url_caches
+from PIL import Image, ImageDraw
+from rest_framework.throttling import UserRateThrottle
+from rest_framework_simplejwt.tokens import AccessToken
+
+from detect_svc import cache, client, pipeline, rollup, storage
+from detect_svc.management.commands.bench_summary import seed
+from detect_svc.stubs import StubInferenceServer
+
+SCENARIOS = ("upload", "detect", "results", "summary")
+SERVERS = ("wsgi", "asgi")
+
+
+class _QuietHandler(WSGIRequestHandler):
+    def log_message(self, *args):
+        pass
+
+
+class _PooledWSGIServer(WSGIServer):
+    """
+    WSGI dengan N thread tetap, meniru gunicorn --workers N (worker sync).
+    Bukan ThreadingMixIn → Django membalas Connection: close, tanpa keep-alive
+    seperti worker sync gunicorn.
+    """
+    request_queue_size = 2048   # backlog default gunicorn
+
+    def __init__(self, *args, workers, **kwargs):
+        super().__init__(*args, **kwargs)
+        self.pool = ThreadPoolExecutor(max_workers=workers, thread_name_prefix="wsgi-worker")
+
+    def process_request(self, request, client_address):
+        self.pool.submit(self._process, request, client_address)
+
+    def _process(self, request, client_address):
+        try:
+            self.finish_request(request, client_address)
+        except Exception:
+            self.handle_error(request, client_address)
+        finally:
+            self.shutdown_request(request)
+
+    def server_close(self):
+        super().server_close()
+        self.pool.shutdown(wait=False)
+
+
+def start_wsgi(workers=0):
+    """Return (base_url, stop). workers 0 → thread per koneksi (runserver), N → pool N."""
+    if workers:
+        httpd = _PooledWSGIServer(("127.0.0.1", 0), _QuietHandler, allow_reuse_address=False,
+                                  workers=workers)
+    else:
+        httpd = ThreadedWSGIServer(("127.0.0.1", 0), _QuietHandler, allow_reuse_address=False)
+    httpd.set_app(WSGIHandler())
+    threading.Thread(target=httpd.serve_forever, daemon=True).start()
+
+    def stop():
+        httpd.shutdown()
+        httpd.server_close()
+    return "http://127.0.0.1:%d" % httpd.server_address[1], stop
+
+
+def start_asgi():
+    """uvicorn (satu event loop, seperti satu worker) di thread lain. Return (base_url, stop)."""
+    import uvicorn
+
+    # port 0 dipilih OS; socket dibuat uvicorn sendiri (sockets=[...] dari luar
+    # kena delay ~40 ms per request keep-alive)
+    server = uvicorn.Server(uvicorn.Config(ASGIHandler(), host="127.0.0.1", port=0, lifespan="off",
+                                           log_level="warning", access_log=False))
+    thread = threading.Thread(target=server.run, daemon=True)
+    thread.start()
+    deadline = time.monotonic() + 10
+    while not server.started:
+        if not thread.is_alive() or time.monotonic() > deadline:
+            raise RuntimeError("uvicorn gagal start")
+        time.sleep(0.01)
+    port = server.servers[0].sockets[0].getsockname()[1]
+
+    def stop():
+        server.should_exit = True
+        thread.join(timeout=10)
+    return "http://127.0.0.1:%d" % port, stop
+
+
+def reload_urlconf():
+    """Import ulang urlconf supaya perubahan GATEWAY_ASYNC (pilihan view detect) terpakai."""
+    importlib.reload(importlib.import_module("detect_svc.urls"))
+    if settings.ROOT_URLCONF in sys.modules:
+        importlib.reload(sys.modules[settings.ROOT_URLCONF])
+    clear_url_caches()
+
+
+def synthetic_corpus(n, size, seed=0):
+    """Gambar JPEG sintetis: latar noise + beberapa kotak berwarna (ukuran file mirip foto)."""
+    rnd = random.Random(seed)
+    W, H = size
+    out = []
+    for i in range(n):
+        # noise dari Random ber-seed (bukan effect_noise) → korpus sama persis antar run
+        im = Image.frombytes("RGB", (W // 4, H // 4), rnd.randbytes(W // 4 * H // 4 * 3))
+        im = im.resize((W, H), Image.BILINEAR)
+        draw = ImageDraw.Draw(im)
+        for _ in range(rnd.randint(2, 8)):
+            w, h = rnd.randint(20, W // 5), rnd.randint(20, H // 5)
+            x, y = rnd.randint(0, W - w - 1), rnd.randint(0, H - h - 1)
+            draw.rectangle([x, y, x + w, y + h], fill=tuple(rnd.randint(0, 255) for _ in range(3)))
+        buf = io.BytesIO()
+        im.save(buf, "JPEG", quality=90)
+        out.append(buf.getvalue())
+    return out
+
+
+def percentiles(values):
+    """(p50, p95, p99) dalam satuan yang sama dengan input."""
+    if len(values) < 2:
+        v = values[0] if values else 0.0
+        return v, v, v
+    q = statistics.quantiles(values, n=100, method="inclusive")
+    return q[49], q[94], q[98]
+
+
+def git_commit():
+    try:
+        return subprocess.run(["git", "rev-parse", "--short", "HEAD"], capture_output=True,
+                              text=True, timeout=5, check=True).stdout.strip() or None
+    except (OSError, subprocess.SubprocessError):
+        return None
+
+
+class Command(BaseCommand):
+    help = ("Load test pipeline deteksi secara lokal: gateway (WSGI dan/atau ASGI, in-process, "
+            "DB terpisah) + stub inference dengan latency yang bisa diatur. Skenario upload / "
+            "detect / results / summary di beberapa level concurrency → p50/p95/p99 + throughput.")
+
+    def add_arguments(self, parser):
+        parser.add_argument("--scenarios", nargs="+", choices=SCENARIOS, default=list(SCENARIOS))
+        parser.add_argument("--server", nargs="+", choices=SERVERS, default=["wsgi"],
+                            help="wsgi (view sync) dan/atau asgi (uvicorn + GATEWAY_ASYNC=1)")
+        parser.add_argument("--workers", type=int, default=0,
+                            help="wsgi: N thread tetap tanpa keep-alive seperti gunicorn --workers N "
+                                 "(0 = thread per koneksi)")
+        parser.add_argument("--concurrency", nargs="+", type=int, default=[1, 4, 16])
+        parser.add_argument("--requests", type=int, default=200, help="request per skenario per level")
+        parser.add_argument("--warmup", type=int, default=5)
+        parser.add_argument("--latency", type=float, default=0.03, help="latency stub inference (detik)")
+        parser.add_argument("--jitter", type=float, default=0.01)
+        parser.add_argument("--corpus", type=int, default=32, help="jumlah gambar sintetis")
+        parser.add_argument("--size", default="1280x720")
+        parser.add_argument("--seed-images", type=int, default=2000,
+                            help="Detection sintetis untuk results/summary")
+        parser.add_argument("--cache", action="store_true",
+                            help="pakai cache inferensi (default mati: tiap detect sampai ke stub)")
+        parser.add_argument("--json", default=None, help="simpan hasil ke file JSON")
+        parser.add_argument("--compare", default=None, help="JSON hasil sebelumnya untuk dibandingkan")
+
+    def handle(self, *args, **opts):
+        W, H = map(int, opts["size"].lower().split("x"))
+        media = tempfile.mkdtemp(prefix="bench-media-")
+        stub = StubInferenceServer(pod_id="bench-stub", latency=opts["latency"], jitter=opts["jitter"])
+        stub.record = False
+
+        # DB terpisah; sqlite pakai file (bukan :memory:) supaya thread server
+        # punya koneksi sendiri seperti worker sungguhan
+        old_name = connection.settings_dict["NAME"]
+        if connection.vendor == "sqlite":
+            connection.settings_dict.setdefault("TEST", {})["NAME"] = os.path.join(media, "bench.sqlite3")
+        connection.creation.create_test_db(verbosity=0, autoclobber=True)
+
+        old_client, old_async, old_cache = client._client, client._async_client, cache.CACHE_ENABLED
+        old_rates = UserRateThrottle.THROTTLE_RATES
+        settings_patch = override_settings(MEDIA_ROOT=media)
+        rows = []
+        try:
+            settings_patch.enable()
+            stub.start()
+            client._client = client.InferenceClient(stub.url)
+            client._async_client = client.AsyncInferenceClient(stub.url)
+            cache.CACHE_ENABLED = opts["cache"]
+            # throttle 60/min per user akan membuat bench hanya mengukur 429
+            UserRateThrottle.THROTTLE_RATES = dict(old_rates, user=None)
+
+            t = time.perf_counter()
+            corpus = synthetic_corpus(opts["corpus"], (W, H))
+            file_ids = [storage.save_bytes(data, ".jpg")[0] for data in corpus]
+            seed(opts["seed_images"], 5, 30)
+            rollup.rebuild()
+            user = get_user_model().objects.create_user("bench", password="bench")
+            token = str(AccessToken.for_user(user))
+            self.stdout.write(f"setup: {len(corpus)} gambar {W}x{H}, {opts['seed_images']} detection "
+                              f"({time.perf_counter() - t:.1f}s)")
+
+            for server in opts["server"]:
+                rows += self.run_server(server, opts, token, corpus, file_ids)
+        finally:
+            stub.stop()
+            # annotate background masih bisa menulis ke DB bench
+            if pipeline._annotate_pool is not None:
+                pipeline._annotate_pool.shutdown(wait=True)
+                pipeline._annotate_pool = None
+            client._client, client._async_client, cache.CACHE_ENABLED = old_client, old_async, old_cache
+            UserRateThrottle.THROTTLE_RATES = old_rates
+            settings_patch.disable()
+            connection.creation.destroy_test_db(old_name, verbosity=0)
+            shutil.rmtree(media, ignore_errors=True)
+
+        report = {
+            "meta": {
+                "commit": git_commit(),
+                "timestamp": time.strftime("%Y-%m-%dT%H:%M:%S%z"),
+                "python": platform.python_version(),
+                "db": connection.vendor,
+                "cpu_count": os.cpu_count(),
+                "options": {k: opts[k] for k in ("scenarios", "server", "workers", "concurrency",
+                                                  "requests", "latency", "jitter", "corpus", "size",
+                                                  "seed_images", "cache")},
+            },
+            "results": rows,
+        }
+        if len(opts["server"]) > 1:
+            base = opts["server"][0]
+            for server in opts["server"][1:]:
+                self.compare(f"{server} vs {base}", [dict(r, server=base) for r in rows
+                                                     if r["server"] == server],
+                             [r for r in rows if r["server"] == base])
+        if opts["compare"]:
+            with open(opts["compare"]) as f:
+                self.compare(f'vs {opts["compare"]}', rows, json.load(f)["results"])
+        if opts["json"]:
+            with open(opts["json"], "w") as f:
+                json.dump(report, f, indent=2)
+
+    def run_server(self, server, opts, token, corpus, file_ids):
+        # asgi: view detect async dipilih lewat GATEWAY_ASYNC saat urlconf di-import
+        patch = override_settings(GATEWAY_ASYNC=server == "asgi")
+        patch.enable()
+        reload_urlconf()
+        stop = None
+        rows = []
+        try:
+            base, stop = start_asgi() if server == "asgi" else start_wsgi(opts["workers"])
+            runner = _Runner(base, token, corpus, file_ids)
+            for scenario in opts["scenarios"]:
+                for c in opts["concurrency"]:
+                    runner.run(scenario, c, opts["warmup"])
+                    row = dict(runner.run(scenario, c, opts["requests"]), server=server)
+                    rows.append(row)
+                    self.stdout.write(
+                        f'{server} {scenario:>8} c={c:<3} p50 {row["p50_ms"]:>8} ms'
+                        f'  p95 {row["p95_ms"]:>8} ms  p99 {row["p99_ms"]:>8} ms'
+                        f'  {row["throughput_rps"]:>8} req/s  err {row["errors"]}')
+        finally:
+            if stop is not None:
+                stop()
+            patch.disable()
+            reload_urlconf()
+        return rows
+
+    def compare(self, title, rows, baseline):
+        # hasil lama (sebelum ada --server) dianggap wsgi
+        old = {(r.get("server", "wsgi"), r["scenario"], r["concurrency"]): r for r in baseline}
+        self.stdout.write(f"\n{title}:")
+        for r in rows:
+            o = old.get((r["server"], r["scenario"], r["concurrency"]))
+            if o is None:
+                continue
+            p95 = (r["p95_ms"] / o["p95_ms"] - 1) * 100 if o["p95_ms"] else 0.0
+            rps = (r["throughput_rps"] / o["throughput_rps"] - 1) * 100 if o["throughput_rps"] else 0.0
+            self.stdout.write(f'{r["scenario"]:>8} c={r["concurrency"]:<3} '
+                              f'p95 {o["p95_ms"]} → {r["p95_ms"]} ms ({p95:+.1f}%)  '
+                              f'throughput {o["throughput_rps"]} → {r["throughput_rps"]} ({rps:+.1f}%)')
+
+
+class _Runner:
+    """Kirim N request skenario dengan C thread (masing-masing Session keep-alive sendiri)."""
+
+    def __init__(self, base, token, corpus, file_ids):
+        self.base = base
+        self.headers = {"Authorization": f"Bearer {token}"}
+        self.corpus = corpus
+        self.file_ids = file_ids
+        self.seq = 0
+        self._lock = threading.Lock()
+        self._local = threading.local()
+
+    def _next(self):
+        with self._lock:
+            self.seq += 1
+            return self.seq
+
+    def _session(self):
+        s = getattr(self._local, "session", None)
+        if s is None:
+            s = self._local.session = requests.Session()
+            s.headers.update(self.headers)
+        return s
+
+    def _request(self, scenario):
+        i = self._next()
+        s = self._session()
+        if scenario == "upload":
+            # byte ekstra setelah EOI → isi unik, jadi tiap upload benar-benar disimpan
+            data = self.corpus[i % len(self.corpus)] + i.to_bytes(8, "big")
+            return s.post(self.base + "/api/detect/upload",
+                          files={"file": (f"bench_{i}.jpg", data, "image/jpeg")})
+        if scenario == "detect":
+            return s.post(self.base + "/api/detect/detect",
+                          json={"file_id": self.file_ids[i % len(self.file_ids)]})
+        if scenario == "results":
+            return s.get(self.base + "/api/detect/results")
+        return s.get(self.base + "/api/detect/summary", params={"days": 30})
+
+    def _one(self, scenario):
+        t = time.perf_counter()
+        try:
+            status = self._request(scenario).status_code
+        except requests.RequestException as e:
+            status = e.__class__.__name__
+        return (time.perf_counter() - t) * 1000.0, status
+
+    def run(self, scenario, concurrency, n):
+        t = time.perf_counter()
+        with ThreadPoolExecutor(max_workers=concurrency) as ex:
+            samples = list(ex.map(lambda _: self._one(scenario), range(n)))
+        wall = time.perf_counter() - t
+        ok = [ms for ms, status in samples if isinstance(status, int) and status < 400]
+        p50, p95, p99 = percentiles(ok)
+        return {
+            "scenario": scenario,
+            "concurrency": concurrency,
+            "requests": n,
+            "ok": len(ok),
+            "errors": n - len(ok),
+            "statuses": {str(k): v for k, v in sorted(Counter(s for _, s in samples).items(), key=str)},
+            "mean_ms": round(statistics.fmean(ok), 2) if ok else 0.0,
+            "p50_ms": round(p50, 2),
+            "p95_ms": round(p95, 2),
+            "p99_ms": round(p99, 2),
+            "throughput_rps": round(len(ok) / wall, 2) if wall else 0.0,
+            "wall_s": round(wall, 3),
+        }
@@ -0,0 +1,85 @@
+import json
+import statistics
+import time
+from unittest import mock
+
+from django.core.management.base import BaseCommand
+from django.db import connection, transaction
+
+from detect_svc import pipeline
+from detect_svc.management.commands.bench_annotate import synthetic_items
+from detect_svc.models import Detection, DetectionItem
+from detect_svc.serializers import DetectionSerializer
+
+
+def table_bytes(*tables):
+    """Ukuran tabel + index di disk; None kalau backend tidak mendukung."""
+    with connection.cursor() as c:
+        if connection.vendor == "postgresql":
+            c.execute("SELECT SUM(pg_total_relation_size(t::regclass)) FROM unnest(%s) t", [list(tables)])
+        elif connection.vendor == "sqlite":
+            try:
+                c.execute("SELECT SUM(pgsize) FROM dbstat WHERE name IN "
+                          "(SELECT name FROM sqlite_master WHERE tbl_name IN (%s))"
+                          % ",".join("%s" for _ in tables), list(tables))
+            except Exception:
+                return None
+        else:
+            return None
+        return c.fetchone()[0]
+
+
+class Command(BaseCommand):
+    help = ("Benchmark penyimpanan box: baris DetectionItem vs packed blob "
+            "(waktu insert, waktu baca detail, ukuran tabel) di database test terpisah.")
+
+    def add_arguments(self, parser):
+        parser.add_argument("--images", type=int, default=200)
+        parser.add_argument("--boxes", type=int, default=300, help="box per gambar (MAX_DET)")
+        parser.add_argument("--json", default=None, help="simpan hasil ke file JSON")
+
+    def handle(self, *args, **opts):
+        results = [synthetic_items(1920, 1080, opts["boxes"], seed=i) for i in range(opts["images"])]
+        results = [{"model_version": "1.0", "pod_id": "bench", "items": items} for items in results]
+
+        old_name = connection.settings_dict["NAME"]
+        connection.creation.create_test_db(verbosity=0, autoclobber=True)
+        rows = []
+        try:
+            for mode in ("rows", "packed"):
+                Detection.objects.all().delete()
+                insert_ms = []
+                with mock.patch.object(pipeline, "DETECTION_STORAGE", mode):
+                    for r in results:
+                        t = time.perf_counter()
+                        with transaction.atomic():
+                            det, det_rows = pipeline.build_detection("bench.jpg", r)
+                            det.save()
+                            DetectionItem.objects.bulk_create(det_rows)
+                        insert_ms.append((time.perf_counter() - t) * 1000.0)
+
+                read_ms = []
+                for det_id in Detection.objects.values_list("id", flat=True)[:50]:
+                    t = time.perf_counter()
+                    DetectionSerializer(Detection.objects.prefetch_related("items").get(id=det_id)).data
+                    read_ms.append((time.perf_counter() - t) * 1000.0)
+
+                with connection.cursor() as c:
+                    if connection.vendor == "sqlite":
+                        c.execute("VACUUM")
+                size = table_bytes("detections_detection", "detections_detectionitem")
+                row = {"mode": mode, "images": opts["images"], "boxes": opts["boxes"],
+                       "insert_ms_p50": round(statistics.median(insert_ms), 2),
+                       "detail_ms_p50": round(statistics.median(read_ms), 2),
+                       "item_rows": DetectionItem.objects.count(),
+                       "table_bytes": size}
+                rows.append(row)
+                self.stdout.write(f'{mode:>6}: insert {row["insert_ms_p50"]:>8} ms/img  '
+                                  f'detail {row["detail_ms_p50"]:>7} ms  '
+                                  f'rows {row["item_rows"]:>7}  size {size} B')
+        finally:
+            connection.creation.destroy_test_db(old_name, verbosity=0)
+
+        if opts["json"]:
+            with open(opts["json"], "w") as f:
+                json.dump(rows, f, indent=2)
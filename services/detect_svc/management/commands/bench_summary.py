@@ -0,0 +1,101 @@
+import json
+import random
+import statistics
+import time
+import uuid
+from datetime import timedelta
+
+from django.core.management.base import BaseCommand
+from django.db import connection
+from django.utils import timezone
+
+from detect_svc import rollup
+from detect_svc.models import Detection, DetectionItem
+
+KLASSES = ["Safety helmet", "Hand gloves", "No safety glasses", "Wearpack", "No helmet", "Safety shoes"]
+
+
+def seed(images, boxes, spread_days, seed=0):
+    """Isi Detection + DetectionItem sintetis tersebar di `spread_days` hari terakhir."""
+    rnd = random.Random(seed)
+    now = timezone.now()
+    dets, rows = [], []
+
+    def flush():
+        Detection.objects.bulk_create(dets, batch_size=2000)
+        DetectionItem.objects.bulk_create(rows, batch_size=5000)
+        dets.clear()
+        rows.clear()
+
+    for i in range(images):
+        n = rnd.randint(0, boxes * 2)
+        confs = [rnd.random() for _ in range(n)]
+        det = Detection(filename=f"bench_{i}.jpg", file_url=f"/media/uploads/bench_{i}.jpg",
+                        total_objects=n, avg_conf=statistics.fmean(confs) if confs else 0.0)
+        dets.append(det)
+        for c in confs:
+            rows.append(DetectionItem(id=uuid.uuid4(), detection=det, klass=rnd.choice(KLASSES),
+                                      confidence=c, x=0, y=0, w=10, h=10))
+        if len(rows) >= 50000:
+            flush()
+    flush()
+    # created_at auto_now_add → sebar ulang lewat UPDATE per hari
+    ids = list(Detection.objects.values_list("id", flat=True))
+    per_day = max(1, len(ids) // spread_days + 1)
+    for d in range(spread_days):
+        chunk = ids[d * per_day:(d + 1) * per_day]
+        for k in range(0, len(chunk), 900):
+            Detection.objects.filter(id__in=chunk[k:k + 900]).update(
+                created_at=now - timedelta(days=d, minutes=rnd.randint(0, 600)))
+
+
+def timed(fn, runs):
+    times = []
+    for _ in range(runs):
+        t = time.perf_counter()
+        out = fn()
+        times.append((time.perf_counter() - t) * 1000.0)
+    return out, round(statistics.median(times), 2)
+
+
+class Command(BaseCommand):
+    help = ("Benchmark /summary: query mentah vs rollup harian, "
+            "di database test terpisah yang diisi data sintetis.")
+
+    def add_arguments(self, parser):
+        parser.add_argument("--images", type=int, default=100_000)
+        parser.add_argument("--boxes", type=int, default=10, help="rata-rata box per gambar")
+        parser.add_argument("--spread-days", type=int, default=120)
+        parser.add_argument("--days", nargs="+", type=int, default=[1, 7, 30, 90])
+        parser.add_argument("--runs", type=int, default=5)
+        parser.add_argument("--json", default=None, help="simpan hasil ke file JSON")
+
+    def handle(self, *args, **opts):
+        # DB terpisah (test_<nama>) supaya data sintetis tidak masuk DB asli
+        old_name = connection.settings_dict["NAME"]
+        connection.creation.create_test_db(verbosity=0, autoclobber=True)
+        try:
+            t = time.perf_counter()
+            seed(opts["images"], opts["boxes"], opts["spread_days"])
+            rollup.rebuild()
+            self.stdout.write(f"seed: {Detection.objects.count()} detection, "
+                              f"{DetectionItem.objects.count()} item "
+                              f"({time.perf_counter() - t:.1f}s)")
+
+            rows = []
+            for days in opts["days"]:
+                raw, raw_ms = timed(lambda: rollup.raw_summary(days), opts["runs"])
+                fast, fast_ms = timed(lambda: rollup.summary(days), opts["runs"])
+                row = {"days": days, "raw_ms": raw_ms, "rollup_ms": fast_ms,
+                       "speedup": round(raw_ms / fast_ms, 1) if fast_ms else None,
+                       "same_totals": (raw["total_images"], raw["total_objects"])
+                       == (fast["total_images"], fast["total_objects"])}
+                rows.append(row)
+                self.stdout.write(f'days={days:>3}  raw {raw_ms:>9} ms  rollup {fast_ms:>7} ms'
+                                  f'  x{row["speedup"]}  parity={row["same_totals"]}')
+        finally:
+            connection.creation.destroy_test_db(old_name, verbosity=0)
+
+        if opts["json"]:
+            with open(opts["json"], "w") as f:
+                json.dump(rows, f, indent=2)
@@ -0,0 +1,40 @@
+import os
+
+from django.conf import settings
+from django.core.management.base import BaseCommand
+
+from detect_svc import variants
+from detect_svc.models import Detection
+
+
+def media_path(url):
+    """/media/annotated/x.jpg → MEDIA_ROOT/annotated/x.jpg (None kalau bukan URL media)."""
+    if not url or not url.startswith(settings.MEDIA_URL):
+        return None
+    return os.path.join(settings.MEDIA_ROOT, url[len(settings.MEDIA_URL):])
+
+
+class Command(BaseCommand):
+    help = ("Buat varian thumbnail/medium (variants.py) untuk detection lama yang belum punya. "
+            "Sumber: annotated image, atau upload kalau tidak ada box.")
+
+    def add_arguments(self, parser):
+        parser.add_argument("--batch", type=int, default=200, help="detection per query")
+
+    def handle(self, *args, **opts):
+        done = missing = 0
+        while True:
+            dets = list(Detection.objects.filter(variants__isnull=True)
+                        .only("id", "file_url", "annotated_url")[:opts["batch"]])
+            if not dets:
+                break
+            for det in dets:
+                path = media_path(det.annotated_url) or media_path(det.file_url)
+                if path is None or not os.path.exists(path):
+                    # {} = sudah dicoba, sumber hilang (dashboard pakai URL asli)
+                    result, missing = {}, missing + 1
+                else:
+                    result, done = variants.render(variants.open_source(path)), done + 1
+                Detection.objects.filter(id=det.id).update(variants=result)
+            self.stdout.write(f"{done + missing} detection diproses")
+        self.stdout.write(f"selesai: {done} detection, {missing} tanpa file sumber")
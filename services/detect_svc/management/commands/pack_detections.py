@@ -0,0 +1,49 @@
+from django.core.management.base import BaseCommand
+from django.db import transaction
+
+from detect_svc import packing
+from detect_svc.models import Detection, DetectionItem
+
+
+class Command(BaseCommand):
+    help = ("Migrasi penyimpanan box: DetectionItem per box → Detection.boxes (packed), "
+            "atau sebaliknya dengan --unpack.")
+
+    def add_arguments(self, parser):
+        parser.add_argument("--unpack", action="store_true", help="packed → baris DetectionItem")
+        parser.add_argument("--batch", type=int, default=500, help="detection per transaksi")
+
+    def handle(self, *args, **opts):
+        step = self._unpack if opts["unpack"] else self._pack
+        done = 0
+        while True:
+            n = step(opts["batch"])
+            if not n:
+                break
+            done += n
+            self.stdout.write(f"{done} detection dikonversi")
+        self.stdout.write(f"selesai: {done} detection")
+
+    @transaction.atomic
+    def _pack(self, batch):
+        dets = list(Detection.objects.filter(boxes__isnull=True).defer("boxes")
+                    .prefetch_related("items")[:batch])
+        for det in dets:
+            items = [{"klass": i.klass, "confidence": i.confidence,
+                      "x": i.x, "y": i.y, "w": i.w, "h": i.h} for i in det.items.all()]
+            det.boxes, det.box_classes = packing.pack(items)
+        Detection.objects.bulk_update(dets, ["boxes", "box_classes"])
+        DetectionItem.objects.filter(detection__in=[d.id for d in dets]).delete()
+        return len(dets)
+
+    @transaction.atomic
+    def _unpack(self, batch):
+        dets = list(Detection.objects.filter(boxes__isnull=False)[:batch])
+        rows = []
+        for det in dets:
+            rows += [DetectionItem(detection=det, **{k: v for k, v in it.items() if k != "id"})
+                     for it in packing.unpack(det.boxes, det.box_classes)]
+            det.boxes, det.box_classes = None, ""
+        DetectionItem.objects.bulk_create(rows, batch_size=1000)
+        Detection.objects.bulk_update(dets, ["boxes", "box_classes"])
+        return len(dets)
@@ -0,0 +1,27 @@
+import signal
+import time
+
+from django.core.management.base import BaseCommand
+
+from detect_svc import jobs
+
+
+class Command(BaseCommand):
+    help = "Jalankan worker job deteksi async di proses terpisah (tanpa broker)."
+
+    def add_arguments(self, parser):
+        parser.add_argument("--workers", type=int, default=jobs.JOB_WORKERS)
+
+    def handle(self, *args, **opts):
+        pool = jobs.WorkerPool(workers=opts["workers"])
+        stopping = []
+        signal.signal(signal.SIGTERM, lambda *_: stopping.append(1))
+
+        pool.start()
+        self.stdout.write(f"detect worker jalan ({pool.workers} thread), Ctrl+C untuk berhenti")
+        try:
+            while not stopping:
+                time.sleep(1)
+        except KeyboardInterrupt:
+            pass
+        pool.stop(timeout=30)
@@ -0,0 +1,106 @@
+import contextvars
+import re
+import time
+import uuid
+from contextlib import contextmanager
+
+from promtext import CONTENT_TYPE, Counter, Gauge, Histogram, Registry  # noqa: F401
+
+# ============================================================
+# Metrics format Prometheus (promtext.py, dipakai bersama inference_svc)
+#   Counter / Histogram berlabel per proses; dengan beberapa worker
+#   (uvicorn --workers) set METRICS_MULTIPROC_DIR → /metrics di worker mana
+#   pun menjumlahkan nilai semua worker.
+# Tracing per request
+#   request id (X-Request-ID) + daftar durasi stage disimpan di contextvar,
+#   diteruskan ke inference (client.py) dan dibalas sebagai Server-Timing
+#   (middleware.py).
+# ============================================================
+REGISTRY = Registry(buckets=(0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0, 30.0))
+REQUESTS = REGISTRY.counter(
+    "gateway_requests_total", "HTTP request per route dan status", ("method", "route", "status"))
+REQUEST_ERRORS = REGISTRY.counter(
+    "gateway_request_errors_total", "HTTP request berstatus >= 500 atau exception", ("method", "route"))
+REQUEST_SECONDS = REGISTRY.histogram(
+    "gateway_request_seconds", "Latency HTTP request", ("method", "route"))
+STAGE_SECONDS = REGISTRY.histogram(
+    "gateway_stage_seconds", "Durasi per stage pipeline deteksi", ("stage",))
+STAGE_ERRORS = REGISTRY.counter(
+    "gateway_stage_errors_total", "Stage pipeline yang berakhir exception", ("stage",))
+
+
+# ---------- tracing per request ----------
+# trace: list (nama stage, detik); objek list yang sama dipakai thread lain
+# yang menjalankan contextvars.copy_context() dari request ini
+_request_id = contextvars.ContextVar("request_id", default=None)
+_trace = contextvars.ContextVar("trace", default=None)
+_REQUEST_ID_RE = re.compile(r"^[A-Za-z0-9._:-]{1,128}$")
+
+
+def begin(request_id=None):
+    """Mulai trace untuk request ini; id dari client dipakai kalau formatnya aman."""
+    if not request_id or not _REQUEST_ID_RE.match(request_id):
+        request_id = uuid.uuid4().hex
+    _request_id.set(request_id)
+    _trace.set([])
+    return request_id
+
+
+def end():
+    _request_id.set(None)
+    _trace.set(None)
+
+
+def request_id():
+    return _request_id.get()
+
+
+def add_timing(name, seconds):
+    trace = _trace.get()
+    if trace is not None:
+        trace.append((name, seconds))
+
+
+@contextmanager
+def stage(name):
+    """Ukur satu stage: masuk histogram gateway_stage_seconds + trace request aktif."""
+    t0 = time.perf_counter()
+    try:
+        yield
+    except BaseException:
+        STAGE_ERRORS.inc(stage=name)
+        raise
+    finally:
+        elapsed = time.perf_counter() - t0
+        STAGE_SECONDS.observe(elapsed, stage=name)
+        add_timing(name, elapsed)
+
+
+def timings():
+    """{stage: detik} request aktif; stage yang muncul beberapa kali dijumlah."""
+    out = {}
+    for name, seconds in _trace.get() or ():
+        out[name] = out.get(name, 0.0) + seconds
+    return out
+
+
+_SERVER_TIMING_RE = re.compile(r"\s*([!#$%&'*+.^_`|~0-9A-Za-z-]+)\s*(?:;([^,]*))?")
+
+
+def parse_server_timing(header):
+    """'decode;dur=3.1, forward;dur=20' → [("decode", 0.0031), ("forward", 0.02)]."""
+    out = []
+    for part in (header or "").split(","):
+        m = _SERVER_TIMING_RE.match(part)
+        if not m:
+            continue
+        dur = re.search(r"dur=([0-9.]+)", m.group(2) or "")
+        if dur:
+            out.append((m.group(1), float(dur.group(1)) / 1000.0))
+    return out
+
+
+def server_timing(extra=()):
+    """Nilai header Server-Timing dari trace request aktif (durasi dalam ms)."""
+    entries = list(timings().items()) + list(extra)
+    return ", ".join(f"{name};dur={seconds * 1000.0:.1f}" for name, seconds in entries)
@@ -0,0 +1,69 @@
+import time
+
+from asgiref.sync import iscoroutinefunction, markcoroutinefunction
+
+from . import metrics
+
+
+class RequestMetricsMiddleware:
+    """
+    Hitung request/error/latency per route (metrics.py), beri setiap request
+    X-Request-ID (dari header client atau dibuat baru) dan balas durasi
+    stage-nya di header Server-Timing.
+    """
+
+    sync_capable = True
+    async_capable = True
+
+    def __init__(self, get_response):
+        self.get_response = get_response
+        # ASGI: middleware ikut async, view async tidak dibungkus async_to_sync
+        self.is_async = iscoroutinefunction(get_response)
+        if self.is_async:
+            markcoroutinefunction(self)
+
+    def __call__(self, request):
+        if self.is_async:
+            return self.__acall__(request)
+        t0 = self._begin(request)
+        response = None
+        try:
+            response = self.get_response(request)
+            return self._finish(request, response, t0)
+        finally:
+            self._record(request, response, t0)
+
+    async def __acall__(self, request):
+        t0 = self._begin(request)
+        response = None
+        try:
+            response = await self.get_response(request)
+            return self._finish(request, response, t0)
+        finally:
+            self._record(request, response, t0)
+
+    def _begin(self, request):
+        request.request_id = metrics.begin(request.headers.get("X-Request-ID"))
+        return time.perf_counter()
+
+    def _finish(self, request, response, t0):
+        elapsed = time.perf_counter() - t0
+        response["X-Request-ID"] = request.request_id
+        response["Server-Timing"] = metrics.server_timing([("total", elapsed)])
+        return response
+
+    def _record(self, request, response, t0):
+        elapsed = time.perf_counter() - t0
+        status = response.status_code if response is not None else 500
+        method, route = request.method, _route(request)
+        metrics.REQUESTS.inc(method=method, route=route, status=status)
+        metrics.REQUEST_SECONDS.observe(elapsed, method=method, route=route)
+        if status >= 500:
+            metrics.REQUEST_ERRORS.inc(method=method, route=route)
+        metrics.end()
+
+
+def _route(request):
+    # pola URL (mis. api/detect/results/<uuid:id>), bukan path mentah → label terbatas
+    match = getattr(request, "resolver_match", None)
+    return match.route if match is not None and match.route else "unmatched"
@@ -0,0 +1,22 @@
+# Generated by Django 5.2.18 on 2026-10-18 16:34
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('detections', '0001_initial'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='InferenceCacheEntry',
+            fields=[
+                ('key', models.CharField(max_length=64, primary_key=True, serialize=False)),
+                ('model_version', models.CharField(db_index=True, max_length=20)),
+                ('result', models.JSONField()),
+                ('created_at', models.DateTimeField(auto_now_add=True)),
+            ],
+        ),
+    ]
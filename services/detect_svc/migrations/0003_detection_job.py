@@ -0,0 +1,33 @@
+# Generated by Django 5.2.18 on 2026-10-18 16:35
+
+import django.db.models.deletion
+import django.utils.timezone
+import uuid
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('detections', '0002_inference_cache'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='DetectionJob',
+            fields=[
+                ('id', models.UUIDField(default=uuid.uuid4, editable=False, primary_key=True, serialize=False)),
+                ('file_id', models.CharField(max_length=255)),
+                ('status', models.CharField(choices=[('queued', 'queued'), ('running', 'running'), ('done', 'done'), ('failed', 'failed')], default='queued', max_length=10)),
+                ('attempts', models.IntegerField(default=0)),
+                ('error', models.TextField(blank=True, default='')),
+                ('run_after', models.DateTimeField(default=django.utils.timezone.now)),
+                ('created_at', models.DateTimeField(auto_now_add=True)),
+                ('updated_at', models.DateTimeField(auto_now=True)),
+                ('detection', models.ForeignKey(blank=True, null=True, on_delete=django.db.models.deletion.SET_NULL, to='detections.detection')),
+            ],
+            options={
+                'indexes': [models.Index(fields=['status', 'run_after'], name='detections__status_c8c080_idx')],
+            },
+        ),
+    ]
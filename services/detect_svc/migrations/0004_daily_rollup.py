@@ -0,0 +1,65 @@
+# Generated by Django 5.2.18 on 2026-10-18 16:41
+
+from django.db import migrations, models
+from django.db.models import Count, Sum
+from django.db.models.functions import TruncDate
+
+
+def backfill(apps, schema_editor):
+    # isi rollup dari data yang sudah ada (sama dengan rollup.rebuild)
+    Detection = apps.get_model("detections", "Detection")
+    DetectionItem = apps.get_model("detections", "DetectionItem")
+    DailySummary = apps.get_model("detections", "DailySummary")
+    DailyClassCount = apps.get_model("detections", "DailyClassCount")
+
+    days = (
+        Detection.objects.annotate(d=TruncDate("created_at")).values("d")
+        .annotate(images=Count("id"), objects=Sum("total_objects"), conf=Sum("avg_conf"))
+    )
+    DailySummary.objects.bulk_create([
+        DailySummary(day=r["d"], images=r["images"], total_objects=r["objects"] or 0,
+                     conf_sum=r["conf"] or 0.0)
+        for r in days
+    ], batch_size=1000)
+    classes = (
+        DetectionItem.objects.annotate(d=TruncDate("detection__created_at")).values("d", "klass")
+        .annotate(n=Count("id"), conf=Sum("confidence"))
+    )
+    DailyClassCount.objects.bulk_create([
+        DailyClassCount(day=r["d"], klass=r["klass"] or "Unknown", count=r["n"],
+                        conf_sum=r["conf"] or 0.0)
+        for r in classes
+    ], batch_size=1000)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('detections', '0003_detection_job'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='DailySummary',
+            fields=[
+                ('day', models.DateField(primary_key=True, serialize=False)),
+                ('images', models.IntegerField(default=0)),
+                ('total_objects', models.IntegerField(default=0)),
+                ('conf_sum', models.FloatField(default=0.0)),
+            ],
+        ),
+        migrations.CreateModel(
+            name='DailyClassCount',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('day', models.DateField()),
+                ('klass', models.CharField(max_length=50)),
+                ('count', models.IntegerField(default=0)),
+                ('conf_sum', models.FloatField(default=0.0)),
+            ],
+            options={
+                'constraints': [models.UniqueConstraint(fields=('day', 'klass'), name='uniq_daily_class')],
+            },
+        ),
+        migrations.RunPython(backfill, migrations.RunPython.noop),
+    ]
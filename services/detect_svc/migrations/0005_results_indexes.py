@@ -0,0 +1,25 @@
+# Generated by Django 5.2.18 on 2026-10-18 16:45
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('detections', '0004_daily_rollup'),
+    ]
+
+    operations = [
+        migrations.AddIndex(
+            model_name='detection',
+            index=models.Index(fields=['-created_at', '-id'], name='det_created_id_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='detection',
+            index=models.Index(fields=['model_version', '-created_at'], name='det_model_created_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='detectionitem',
+            index=models.Index(fields=['klass', 'detection'], name='item_klass_det_idx'),
+        ),
+    ]
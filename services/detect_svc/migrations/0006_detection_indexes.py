@@ -0,0 +1,28 @@
+# Generated by Django 5.2.18 on 2026-10-18 16:46
+
+import django.db.models.deletion
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('detections', '0005_results_indexes'),
+    ]
+
+    # index baru dibuat dulu, baru index lama dilepas
+    operations = [
+        migrations.AddIndex(
+            model_name='detectionitem',
+            index=models.Index(fields=['detection', 'klass'], name='item_det_klass_idx'),
+        ),
+        migrations.AlterField(
+            model_name='detectionitem',
+            name='detection',
+            field=models.ForeignKey(db_index=False, on_delete=django.db.models.deletion.CASCADE, related_name='items', to='detections.detection'),
+        ),
+        migrations.RemoveIndex(
+            model_name='detectionitem',
+            name='item_klass_det_idx',
+        ),
+    ]
@@ -0,0 +1,23 @@
+# Generated by Django 5.2.18 on 2026-10-18 16:48
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('detections', '0006_detection_indexes'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='detection',
+            name='box_classes',
+            field=models.TextField(blank=True, default='', editable=False),
+        ),
+        migrations.AddField(
+            model_name='detection',
+            name='boxes',
+            field=models.BinaryField(null=True),
+        ),
+    ]
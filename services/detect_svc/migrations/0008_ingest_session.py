@@ -0,0 +1,47 @@
+# Generated by Django 5.2.18 on 2026-10-18 16:56
+
+import django.db.models.deletion
+import uuid
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('detections', '0007_packed_boxes'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='IngestSession',
+            fields=[
+                ('id', models.UUIDField(default=uuid.uuid4, editable=False, primary_key=True, serialize=False)),
+                ('kind', models.CharField(default='video', max_length=10)),
+                ('source', models.CharField(max_length=255)),
+                ('status', models.CharField(choices=[('running', 'running'), ('done', 'done'), ('failed', 'failed')], default='running', max_length=10)),
+                ('sample_fps', models.FloatField(blank=True, null=True)),
+                ('frames_sampled', models.IntegerField(default=0)),
+                ('frames_skipped', models.IntegerField(default=0)),
+                ('frames_detected', models.IntegerField(default=0)),
+                ('frames_failed', models.IntegerField(default=0)),
+                ('error', models.TextField(blank=True, default='')),
+                ('created_at', models.DateTimeField(auto_now_add=True)),
+                ('updated_at', models.DateTimeField(auto_now=True)),
+            ],
+        ),
+        migrations.AddField(
+            model_name='detection',
+            name='frame_index',
+            field=models.IntegerField(blank=True, null=True),
+        ),
+        migrations.AddField(
+            model_name='detection',
+            name='frame_ms',
+            field=models.IntegerField(blank=True, null=True),
+        ),
+        migrations.AddField(
+            model_name='detection',
+            name='session',
+            field=models.ForeignKey(blank=True, null=True, on_delete=django.db.models.deletion.SET_NULL, related_name='detections', to='detections.ingestsession'),
+        ),
+    ]
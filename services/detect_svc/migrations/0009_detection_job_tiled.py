@@ -0,0 +1,18 @@
+# Generated by Django 5.2.18 on 2026-10-18 17:18
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('detections', '0008_ingest_session'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='detectionjob',
+            name='tiled',
+            field=models.BooleanField(default=False),
+        ),
+    ]
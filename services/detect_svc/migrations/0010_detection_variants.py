@@ -0,0 +1,18 @@
+# Generated by Django 5.2.18 on 2026-10-18 17:42
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('detections', '0009_detection_job_tiled'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='detection',
+            name='variants',
+            field=models.JSONField(blank=True, null=True),
+        ),
+    ]
@@ -0,0 +1,44 @@
+# Generated by Django 5.2.18 on 2026-10-18 18:10
+
+import django.db.models.deletion
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('detections', '0011_stream_ticket'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='detectionjob',
+            name='ingest',
+            field=models.ForeignKey(blank=True, null=True, on_delete=django.db.models.deletion.CASCADE, related_name='jobs', to='detections.ingestsession'),
+        ),
+        migrations.AddField(
+            model_name='ingestsession',
+            name='diff_threshold',
+            field=models.FloatField(blank=True, null=True),
+        ),
+        migrations.AddField(
+            model_name='ingestsession',
+            name='file_id',
+            field=models.CharField(blank=True, default='', max_length=255),
+        ),
+        migrations.AddField(
+            model_name='ingestsession',
+            name='file_ids',
+            field=models.JSONField(blank=True, null=True),
+        ),
+        migrations.AddField(
+            model_name='ingestsession',
+            name='keyframe_every',
+            field=models.IntegerField(blank=True, null=True),
+        ),
+        migrations.AddField(
+            model_name='ingestsession',
+            name='resume_index',
+            field=models.IntegerField(blank=True, null=True),
+        ),
+    ]
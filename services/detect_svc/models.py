@@ -1,4 +1,6 @@
+from django.conf import settings
 from django.db import models
+from django.utils import timezone
 import uuid
 
 class Detection(models.Model):
@@ -6,18 +8,130 @@ class Detection(models.Model):
     filename = models.CharField(max_length=255)
     file_url = models.TextField()
     annotated_url = models.TextField(null=True, blank=True)
+    # {"thumb": url, "medium": url} hasil variants.py; NULL = belum dibuat
+    variants = models.JSONField(null=True, blank=True)
     model_version = models.CharField(max_length=20, default="1.0")
     pod_id = models.CharField(max_length=64, blank=True, default="")
     total_objects = models.IntegerField(default=0)
     avg_conf = models.FloatField(default=0.0)
     created_at = models.DateTimeField(auto_now_add=True)
+    # mode penyimpanan "packed" (lihat packing.py): semua box dalam satu blob,
+    # tanpa baris DetectionItem. NULL = box disimpan sebagai DetectionItem.
+    boxes = models.BinaryField(null=True, editable=False)
+    box_classes = models.TextField(blank=True, default="", editable=False)
+    # frame video (IngestSession): index frame di sumber + posisi waktu (ms)
+    session = models.ForeignKey("IngestSession", null=True, blank=True, related_name="detections",
+                                on_delete=models.SET_NULL)
+    frame_index = models.IntegerField(null=True, blank=True)
+    frame_ms = models.IntegerField(null=True, blank=True)
+
+    class Meta:
+        indexes = [
+            # keyset pagination /results: ORDER BY created_at DESC, id DESC
+            models.Index(fields=["-created_at", "-id"], name="det_created_id_idx"),
+            models.Index(fields=["model_version", "-created_at"], name="det_model_created_idx"),
+        ]
 
 class DetectionItem(models.Model):
     id = models.UUIDField(primary_key=True, default=uuid.uuid4, editable=False)
-    detection = models.ForeignKey(Detection, related_name="items", on_delete=models.CASCADE)
+    # index FK tunggal diganti komposit (detection, klass) di Meta: prefix kiri-nya
+    # tetap melayani lookup items per detection
+    detection = models.ForeignKey(Detection, related_name="items", on_delete=models.CASCADE, db_index=False)
     klass = models.CharField(max_length=50)
     confidence = models.FloatField()
     x = models.IntegerField()
     y = models.IntegerField()
     w = models.IntegerField()
-    h = models.IntegerField()
\ No newline at end of file
+    h = models.IntegerField()
+
+    class Meta:
+        # items per detection (detail, CASCADE) + filter ?klass= (EXISTS per detection)
+        indexes = [models.Index(fields=["detection", "klass"], name="item_det_klass_idx")]
+
+class InferenceCacheEntry(models.Model):
+    """Hasil /infer per (hash gambar + konfigurasi model), lihat cache.py."""
+    key = models.CharField(max_length=64, primary_key=True)
+    model_version = models.CharField(max_length=20, db_index=True)
+    result = models.JSONField()
+    created_at = models.DateTimeField(auto_now_add=True)
+
+
+class DetectionJob(models.Model):
+    """Job deteksi async: antrean berbasis DB, diproses worker di jobs.py."""
+    QUEUED, RUNNING, DONE, FAILED = "queued", "running", "done", "failed"
+    STATUS_CHOICES = [(s, s) for s in (QUEUED, RUNNING, DONE, FAILED)]
+
+    id = models.UUIDField(primary_key=True, default=uuid.uuid4, editable=False)
+    file_id = models.CharField(max_length=255)
+    tiled = models.BooleanField(default=False)   # inference mode tile (?tiled=1)
+    # job ingest video / frame (ingest.py) alih-alih deteksi satu file
+    ingest = models.ForeignKey("IngestSession", null=True, blank=True, on_delete=models.CASCADE,
+                               related_name="jobs")
+    status = models.CharField(max_length=10, choices=STATUS_CHOICES, default=QUEUED)
+    attempts = models.IntegerField(default=0)
+    error = models.TextField(blank=True, default="")
+    detection = models.ForeignKey(Detection, null=True, blank=True, on_delete=models.SET_NULL)
+    run_after = models.DateTimeField(default=timezone.now)
+    created_at = models.DateTimeField(auto_now_add=True)
+    updated_at = models.DateTimeField(auto_now=True)
+
+    class Meta:
+        indexes = [models.Index(fields=["status", "run_after"])]
+
+
+class DailySummary(models.Model):
+    """Rollup per hari untuk /summary, di-update setiap Detection disimpan (rollup.py)."""
+    day = models.DateField(primary_key=True)
+    images = models.IntegerField(default=0)
+    total_objects = models.IntegerField(default=0)
+    conf_sum = models.FloatField(default=0.0)   # jumlah avg_conf per detection
+
+
+class DailyClassCount(models.Model):
+    """Rollup per hari per kelas: jumlah box + jumlah confidence."""
+    day = models.DateField()
+    klass = models.CharField(max_length=50)
+    count = models.IntegerField(default=0)
+    conf_sum = models.FloatField(default=0.0)
+
+    class Meta:
+        constraints = [models.UniqueConstraint(fields=["day", "klass"], name="uniq_daily_class")]
+
+
+class IngestSession(models.Model):
+    """Ingest video / urutan frame: satu Detection per frame sampel (ingest.py)."""
+    RUNNING, DONE, FAILED = "running", "done", "failed"
+    STATUS_CHOICES = [(s, s) for s in (RUNNING, DONE, FAILED)]
+    VIDEO, FRAMES = "video", "frames"
+
+    id = models.UUIDField(primary_key=True, default=uuid.uuid4, editable=False)
+    kind = models.CharField(max_length=10, default=VIDEO)
+    source = models.CharField(max_length=255)            # file_id video / nama sumber frame
+    status = models.CharField(max_length=10, choices=STATUS_CHOICES, default=RUNNING)
+    sample_fps = models.FloatField(null=True, blank=True)
+    # sumber + opsi disimpan supaya job bisa dijalankan (ulang) oleh worker mana pun
+    file_id = models.CharField(max_length=255, blank=True, default="")   # upload video
+    file_ids = models.JSONField(null=True, blank=True)                  # urutan frame
+    diff_threshold = models.FloatField(null=True, blank=True)
+    keyframe_every = models.IntegerField(null=True, blank=True)
+    # frame terakhir yang counter-nya sudah tersimpan; job yang diulang
+    # (worker mati) melanjutkan dari sini, bukan mendeteksi ulang dari awal
+    resume_index = models.IntegerField(null=True, blank=True)
+    frames_sampled = models.IntegerField(default=0)
+    frames_skipped = models.IntegerField(default=0)      # near-duplicate, tidak diinferensi
+    frames_detected = models.IntegerField(default=0)
+    frames_failed = models.IntegerField(default=0)
+    error = models.TextField(blank=True, default="")
+    created_at = models.DateTimeField(auto_now_add=True)
+    updated_at = models.DateTimeField(auto_now=True)
+
+
+class StreamTicket(models.Model):
+    """
+    Tiket sekali pakai untuk membuka live feed SSE (feed.py): EventSource tidak
+    bisa mengirim header Authorization, dan access JWT di query string ikut
+    tercatat di access log. Yang disimpan hanya sha256 tiketnya.
+    """
+    key = models.CharField(max_length=64, primary_key=True)
+    user = models.ForeignKey(settings.AUTH_USER_MODEL, on_delete=models.CASCADE)
+    expires_at = models.DateTimeField(db_index=True)
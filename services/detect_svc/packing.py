@@ -0,0 +1,66 @@
+import struct
+import uuid
+
+# ============================================================
+# Penyimpanan box "packed": semua box satu Detection disimpan di
+# Detection.boxes sebagai array record fixed-width little-endian
+#   class_id u16 | x u16 | y u16 | w u16 | h u16 | confidence f32   (14 byte)
+# dan tabel nama kelas di Detection.box_classes ("\nHelmet\nGloves\n").
+# class_id = index ke tabel kelas. Koordinat piksel dibatasi 0..65535.
+# ============================================================
+RECORD = struct.Struct("<HHHHHf")
+MAX_COORD = 0xFFFF
+
+
+def _clamp(v):
+    return min(max(int(v), 0), MAX_COORD)
+
+
+def pack(items):
+    """list item {klass, confidence, x, y, w, h} → (blob, box_classes)."""
+    return pack_rows(((it["klass"], it["confidence"], it["x"], it["y"], it["w"], it["h"])
+                      for it in items), len(items))
+
+
+def pack_rows(rows, n):
+    """n tuple (klass, confidence, x, y, w, h) (columns.rows) → (blob, box_classes)."""
+    table = {}
+    out = bytearray(RECORD.size * n)
+    for i, (klass, conf, x, y, w, h) in enumerate(rows):
+        cid = table.setdefault(klass, len(table))
+        RECORD.pack_into(out, i * RECORD.size, cid, _clamp(x), _clamp(y),
+                         _clamp(w), _clamp(h), float(conf))
+    # diapit "\n" supaya filter ?klass= bisa pakai contains("\nKelas\n")
+    classes = "\n" + "".join(k + "\n" for k in table) if table else ""
+    return bytes(out), classes
+
+
+def class_table(box_classes):
+    return box_classes.strip("\n").split("\n") if box_classes else []
+
+
+def unpack(blob, box_classes, det_id=None):
+    """
+    Kebalikan pack(): list dict dengan bentuk sama seperti DetectionItemSerializer.
+    id per box diturunkan dari id Detection (uuid5) supaya stabil antar request.
+    """
+    names = class_table(box_classes)
+    items = []
+    for i, (cid, x, y, w, h, conf) in enumerate(RECORD.iter_unpack(bytes(blob or b""))):
+        items.append({
+            "id": str(uuid.uuid5(det_id, str(i))) if det_id else None,
+            "klass": names[cid],
+            "confidence": round(conf, 6),   # float32 → buang noise presisi
+            "x": x, "y": y, "w": w, "h": h,
+        })
+    return items
+
+
+def class_stats(blob, box_classes):
+    """{klass: (count, conf_sum)} tanpa membangun dict per box (dipakai rollup)."""
+    names = class_table(box_classes)
+    stats = {}
+    for cid, _, _, _, _, conf in RECORD.iter_unpack(bytes(blob or b"")):
+        n, s = stats.get(names[cid], (0, 0.0))
+        stats[names[cid]] = (n + 1, s + conf)
+    return stats
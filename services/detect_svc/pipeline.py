@@ -0,0 +1,261 @@
+import asyncio
+import contextvars
+import logging
+import os
+import statistics
+import threading
+from concurrent.futures import ThreadPoolExecutor
+
+import requests
+from django.conf import settings
+from django.db import close_old_connections, transaction
+
+from . import cache, columns, feed, metrics, packing, rollup, variants
+from .models import Detection, DetectionItem
+from .services import annotate_image, call_inference_batch, db_to_async, save_annotated
+
+# batch: jumlah file per request /infer/batch dan berapa chunk jalan paralel
+BATCH_CHUNK = int(os.getenv("DETECT_BATCH_CHUNK", "8"))
+BATCH_CONCURRENCY = int(os.getenv("DETECT_BATCH_CONCURRENCY", "2"))
+BATCH_MAX_FILES = int(os.getenv("DETECT_BATCH_MAX_FILES", "500"))
+
+# annotated image: "background" (default) → dirender di thread pool setelah
+# commit, annotated_url terisi belakangan; "sync" → dirender sebelum response
+ANNOTATE_MODE = os.getenv("ANNOTATE_MODE", "background")
+ANNOTATE_WORKERS = int(os.getenv("ANNOTATE_WORKERS", "2"))
+
+# penyimpanan box: "rows" (default) → satu DetectionItem per box;
+# "packed" → semua box dalam Detection.boxes (packing.py), tanpa insert per box
+DETECTION_STORAGE = os.getenv("DETECTION_STORAGE", "rows")
+
+log = logging.getLogger(__name__)
+_annotate_pool = None
+_annotate_lock = threading.Lock()
+
+# ============================================================
+# Pipeline deteksi: inference → simpan Detection/Item → annotate
+# Dipakai DetectView (sync) dan worker job (async).
+# ============================================================
+
+
+def upload_path(file_id: str) -> str:
+    # basename → file_id tidak bisa keluar dari MEDIA_ROOT/uploads
+    return os.path.join(settings.MEDIA_ROOT, "uploads", os.path.basename(file_id))
+
+
+def build_detection(file_id: str, result: dict, filename: str = None):
+    """
+    Objek Detection + DetectionItem (belum disimpan) dari hasil inference.
+    Mode packed: box masuk ke det.boxes dan list DetectionItem kosong.
+    Box dibaca langsung dari kolom hasil inference (columns.rows), tanpa dict per box.
+    """
+    n = columns.count(result)
+    det = Detection(
+        filename=filename or file_id,
+        file_url=settings.MEDIA_URL + "uploads/" + file_id,
+        model_version=result.get("model_version", "1.0"),
+        pod_id=result.get("pod_id", "inference-local"),
+        total_objects=n,
+        avg_conf=statistics.fmean(columns.confidences(result)) if n else 0.0,
+    )
+    if DETECTION_STORAGE == "packed":
+        det.boxes, det.box_classes = packing.pack_rows(columns.rows(result), n)
+        return det, []
+    return det, [DetectionItem(detection=det, klass=k, confidence=c, x=x, y=y, w=w, h=h)
+                 for k, c, x, y, w, h in columns.rows(result)]
+
+
+def save_detection(file_id: str, result: dict, src_path: str, filename: str = None) -> Detection:
+    det, rows = build_detection(file_id, result, filename)
+    with metrics.stage("db"), transaction.atomic():
+        det.save()
+        DetectionItem.objects.bulk_create(rows)
+        rollup.record([(det, columns.class_confidences(result))])
+        transaction.on_commit(feed.notify)   # live feed dashboard (feed.py)
+
+    schedule_annotation(det, src_path, result)
+    return det
+
+
+def annotation_pool():
+    global _annotate_pool
+    if _annotate_pool is None:
+        with _annotate_lock:
+            if _annotate_pool is None:
+                _annotate_pool = ThreadPoolExecutor(max_workers=max(1, ANNOTATE_WORKERS),
+                                                    thread_name_prefix="annotate")
+    return _annotate_pool
+
+
+def render_images(src_path, result):
+    """
+    Annotated image (kalau ada box) + varian thumbnail/medium (variants.py).
+    Return field Detection yang terisi: {"annotated_url", "variants"}.
+    """
+    fields = {}
+    img = None
+    if columns.count(result):
+        with metrics.stage("annotate"):
+            img = annotate_image(src_path, columns.items(result))
+            fields["annotated_url"] = save_annotated(img)
+    if variants.VARIANTS_ENABLED:
+        with metrics.stage("variants"):
+            fields["variants"] = variants.render(img if img is not None else variants.open_source(src_path))
+    return fields
+
+
+def _annotate(det_id, src_path, result):
+    close_old_connections()
+    try:
+        fields = render_images(src_path, result)
+        Detection.objects.filter(id=det_id).update(**fields)
+        feed.notify()
+    except Exception:
+        log.exception("annotate gagal untuk detection %s", det_id)
+    finally:
+        close_old_connections()
+
+
+def schedule_annotation(det, src_path, result):
+    """Render annotated image + varian: langsung (sync) atau di background setelah commit."""
+    if not columns.count(result) and not variants.VARIANTS_ENABLED:
+        return
+    if ANNOTATE_MODE == "sync":
+        fields = render_images(src_path, result)
+        for k, v in fields.items():
+            setattr(det, k, v)
+        det.save(update_fields=list(fields))
+        return
+    det_id = det.id
+    transaction.on_commit(lambda: annotation_pool().submit(_annotate, det_id, src_path, result))
+
+
+def run_detection(file_id: str, tiled: bool = False) -> Detection:
+    """
+    Inference (lewat cache) + simpan hasil untuk file yang sudah diupload.
+    tiled=True → inference mode tile (foto resolusi tinggi, objek kecil).
+    Raise FileNotFoundError kalau file tidak ada; error requests diteruskan ke caller.
+    """
+    src_path = upload_path(file_id)
+    if not os.path.exists(src_path):
+        raise FileNotFoundError(file_id)
+
+    # gambar identik + konfigurasi model sama → ambil dari cache
+    result = cache.cached_inference(src_path, tiled=tiled)
+    return save_detection(file_id, result, src_path)
+
+
+async def run_detection_async(file_id: str, tiled: bool = False) -> Detection:
+    """run_detection untuk view async (ASGI); DB dan file tetap sync, di thread."""
+    src_path = upload_path(file_id)
+    if not await asyncio.to_thread(os.path.exists, src_path):
+        raise FileNotFoundError(file_id)
+    result = await cache.cached_inference_async(src_path, tiled=tiled)
+    return await db_to_async(save_detection)(file_id, result, src_path)
+
+
+def _infer_chunk(chunk):
+    """
+    chunk: list (pos, path, key, config) → list (pos, result | error dict).
+    Hanya HTTP (tanpa akses DB) karena dijalankan di thread terpisah.
+    """
+    try:
+        resp = call_inference_batch([c[1] for c in chunk])
+    except requests.HTTPError as e:
+        code = e.response.status_code if e.response is not None else 502
+        return [(c[0], {"error": f"inference error: {e}", "status_code": code}) for c in chunk]
+    except (requests.ConnectionError, requests.Timeout) as e:
+        err = {"error": f"inference backend unavailable: {e.__class__.__name__}", "status_code": 502}
+        return [(c[0], err) for c in chunk]
+
+    out = []
+    for (pos, _, _, _), r in zip(chunk, resp.get("results", [])):
+        if r is None or "error" in r:
+            r = r or {}
+            out.append((pos, {"error": r.get("error", "inference error"),
+                              "status_code": r.get("status_code", 500)}))
+            continue
+        result = {
+            # versi per gambar: model inference bisa berganti di tengah satu batch
+            "model_version": r.get("model_version") or resp.get("model_version", "1.0"),
+            "pod_id": resp.get("pod_id", "inference-local"),
+        }
+        if "boxes" in r:
+            result["boxes"] = r["boxes"]
+        else:
+            result["items"] = r.get("items", [])
+        out.append((pos, result))
+    return out
+
+
+def run_detection_batch(file_ids, attrs=None):
+    """
+    Deteksi banyak file sekaligus. Inference dikirim per chunk BATCH_CHUNK file
+    (BATCH_CONCURRENCY chunk paralel), semua Detection/DetectionItem disimpan
+    dengan bulk insert dalam satu transaksi (plus rollup harian), lalu annotate per gambar.
+    `attrs`: list dict per file (opsional), field tambahan untuk Detection-nya.
+    Return list per file (urutan sama dengan input):
+      {"file_id", "detection": Detection} atau {"file_id", "error", "status_code"}.
+    """
+    outcomes = [None] * len(file_ids)
+    pending = []
+    for pos, file_id in enumerate(file_ids):
+        src_path = upload_path(str(file_id))
+        if not os.path.exists(src_path):
+            outcomes[pos] = {"error": "file not found", "status_code": 404}
+            continue
+        key, config, result = cache.lookup(src_path)
+        if result is not None:
+            outcomes[pos] = result
+        else:
+            pending.append((pos, src_path, key, config))
+
+    chunks = [pending[i:i + BATCH_CHUNK] for i in range(0, len(pending), BATCH_CHUNK)]
+    if chunks:
+        # stage "inference" = waktu tunggu semua chunk; tiap thread chunk membawa
+        # context request (stage infer_* dari tiap chunk dijumlah di trace)
+        with metrics.stage("inference"), \
+                ThreadPoolExecutor(max_workers=max(1, min(BATCH_CONCURRENCY, len(chunks)))) as ex:
+            ctx = [contextvars.copy_context() for _ in chunks]
+            for part in ex.map(lambda c, chunk: c.run(_infer_chunk, chunk), ctx, chunks):
+                for pos, outcome in part:
+                    outcomes[pos] = outcome
+        for pos, _, key, config in pending:
+            if "error" not in outcomes[pos]:
+                cache.store(key, config, outcomes[pos])
+
+    # simpan semua hasil sukses: 2 bulk insert, 1 transaksi
+    dets, rows, ok = [], [], []
+    for pos, outcome in enumerate(outcomes):
+        if "error" in outcome:
+            continue
+        det, det_rows = build_detection(str(file_ids[pos]), outcome)
+        for k, v in (attrs[pos] if attrs else {}).items():
+            setattr(det, k, v)
+        dets.append(det)
+        rows.extend(det_rows)
+        ok.append((pos, det, outcome))
+    with metrics.stage("db"), transaction.atomic():
+        Detection.objects.bulk_create(dets)
+        DetectionItem.objects.bulk_create(rows, batch_size=1000)
+        rollup.record((det, columns.class_confidences(result)) for _, det, result in ok)
+        transaction.on_commit(feed.notify)
+
+    if ANNOTATE_MODE == "sync":
+        annotated = []
+        for pos, det, result in ok:
+            fields = render_images(upload_path(str(file_ids[pos])), result)
+            for k, v in fields.items():
+                setattr(det, k, v)
+            if fields:
+                annotated.append(det)
+        if annotated:
+            Detection.objects.bulk_update(annotated, ["annotated_url", "variants"])
+    else:
+        for pos, det, result in ok:
+            schedule_annotation(det, upload_path(str(file_ids[pos])), result)
+
+    results = [dict(o, file_id=str(f)) for f, o in zip(file_ids, outcomes)]
+    for pos, det, _ in ok:
+        results[pos] = {"file_id": str(file_ids[pos]), "detection": det}
+    return results
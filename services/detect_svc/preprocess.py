@@ -0,0 +1,94 @@
+import io
+import os
+
+from PIL import Image, ImageOps
+
+# ============================================================
+# Pre-resize di gateway sebelum gambar dikirim ke inference
+#   model hanya melihat sisi terpanjang IMG_SIZE (letterbox), jadi gambar
+#   besar dikecilkan dulu (+ orientasi EXIF dibetulkan) di sini: byte yang
+#   dikirim lewat HTTP dan biaya decode di inference jauh lebih kecil.
+#   Box hasil inference diskalakan balik ke piksel gambar asli.
+# ============================================================
+PRERESIZE = os.getenv("INFER_PRERESIZE", "0") in ("1", "true", "True", "yes", "YES")
+# samakan dengan IMG_SIZE inference; sedikit di atasnya tidak mengubah input model
+PRERESIZE_SIDE = int(os.getenv("INFER_PRERESIZE_SIDE", "640"))
+PRERESIZE_QUALITY = int(os.getenv("INFER_PRERESIZE_QUALITY", "90"))
+
+# orientasi EXIF yang menukar lebar/tinggi
+_TRANSPOSED = (5, 6, 7, 8)
+
+
+def _oriented_size(im):
+    w, h = im.size
+    orientation = im.getexif().get(0x0112, 1)
+    if orientation in _TRANSPOSED:
+        w, h = h, w
+    return w, h, orientation
+
+
+def sent_as_is(head: bytes, side: int = None):
+    """
+    Potongan awal file (header) → True kalau shrink() akan mengirim gambar apa
+    adanya, False kalau gambar akan dikecilkan/diputar, None kalau header
+    belum cukup untuk memutuskan.
+    """
+    try:
+        w, h, orientation = _oriented_size(Image.open(io.BytesIO(head)))
+    except (OSError, SyntaxError, ValueError):
+        return None
+    return max(w, h) <= (side or PRERESIZE_SIDE) and orientation == 1
+
+
+def shrink(data: bytes, side: int = None, quality: int = None):
+    """
+    bytes gambar → (bytes yang dikirim ke inference, faktor atau None).
+    faktor (sx, sy, W, H): pengali koordinat hasil inference ke piksel gambar
+    asli W x H (setelah orientasi EXIF, sama seperti yang dilihat inference).
+    Gambar yang sudah kecil dan tanpa rotasi EXIF dikirim apa adanya.
+    """
+    side = side or PRERESIZE_SIDE
+    im = Image.open(io.BytesIO(data))
+    w, h, orientation = _oriented_size(im)
+    if max(w, h) <= side and orientation == 1:
+        return data, None
+
+    # JPEG: decode langsung di skala 1/2, 1/4, 1/8 (DCT) → tidak decode resolusi penuh
+    im.draft("RGB", (side, side))
+    im = ImageOps.exif_transpose(im).convert("RGB")
+    scale = side / max(w, h)
+    if scale < 1:
+        im = im.resize((max(1, round(w * scale)), max(1, round(h * scale))), Image.BILINEAR,
+                       reducing_gap=2.0)
+
+    buf = io.BytesIO()
+    im.save(buf, "JPEG", quality=quality or PRERESIZE_QUALITY)
+    return buf.getvalue(), (w / im.width, h / im.height, w, h)
+
+
+def _rescale_box(x, y, w, h, sx, sy, W, H):
+    x1 = min(max(round(x * sx), 0), W)
+    y1 = min(max(round(y * sy), 0), H)
+    x2 = min(max(round((x + w) * sx), 0), W)
+    y2 = min(max(round((y + h) * sy), 0), H)
+    return x1, y1, x2 - x1, y2 - y1
+
+
+def rescale(result, factors):
+    """
+    Skalakan box hasil inference kembali ke ukuran asli (in place), clamp ke
+    batas gambar. Format kolom ("boxes") maupun "items" (inference versi lama).
+    """
+    if not factors:
+        return result
+    sx, sy, W, H = factors
+    b = result.get("boxes")
+    if b is not None:
+        scaled = [_rescale_box(*box, sx, sy, W, H) for box in zip(b["x"], b["y"], b["w"], b["h"])]
+        if scaled:
+            b["x"], b["y"], b["w"], b["h"] = map(list, zip(*scaled))
+        return result
+    for it in result.get("items", []):
+        x, y, w, h = _rescale_box(it["x"], it["y"], it["w"], it["h"], sx, sy, W, H)
+        it.update(x=x, y=y, w=w, h=h)
+    return result
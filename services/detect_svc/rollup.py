@@ -0,0 +1,261 @@
+from collections import defaultdict
+from datetime import datetime, time, timedelta
+
+from django.db import IntegrityError, transaction
+from django.db.models import Avg, Count, F, Sum
+from django.db.models.functions import TruncDate
+from django.utils import timezone
+
+from .models import DailyClassCount, DailySummary, Detection, DetectionItem
+from .packing import class_stats
+
+# ============================================================
+# Rollup harian untuk /summary
+#   DailySummary     : per hari → images, total_objects, conf_sum
+#   DailyClassCount  : per hari per kelas → count, conf_sum
+# Di-update secara incremental setiap Detection disimpan (record) dan
+# dihapus (forget, signal pre_delete: admin, queryset.delete, CASCADE),
+# bisa dibangun ulang dari data mentah (rebuild / manage.py backfill_rollup).
+# DetectionItem yang dihapus sendiri tanpa Detection-nya tidak dikurangi
+# (pack_detections memindahkan box, bukan menghapus) → jalankan rebuild.
+# ============================================================
+
+
+def _increment(model, lookup, deltas):
+    """UPDATE ... SET f = f + delta; kalau baris belum ada → INSERT (aman race)."""
+    changes = {k: F(k) + v for k, v in deltas.items()}
+    if model.objects.filter(**lookup).update(**changes):
+        return
+    try:
+        with transaction.atomic():
+            model.objects.create(**lookup, **deltas)
+    except IntegrityError:
+        # proses lain membuat baris yang sama duluan
+        model.objects.filter(**lookup).update(**changes)
+
+
+def record(entries):
+    """
+    entries: iterable (Detection tersimpan, list (klass, confidence) per box;
+    lihat columns.class_confidences).
+    Dipanggil di transaksi yang sama dengan penyimpanan Detection.
+    """
+    per_day = defaultdict(lambda: {"images": 0, "total_objects": 0, "conf_sum": 0.0})
+    per_class = defaultdict(lambda: {"count": 0, "conf_sum": 0.0})
+    for det, boxes in entries:
+        day = timezone.localdate(det.created_at)
+        d = per_day[day]
+        d["images"] += 1
+        d["total_objects"] += det.total_objects or 0
+        d["conf_sum"] += det.avg_conf or 0.0
+        for klass, conf in boxes:
+            c = per_class[(day, klass or "Unknown")]
+            c["count"] += 1
+            c["conf_sum"] += float(conf or 0.0)
+
+    for day, deltas in per_day.items():
+        _increment(DailySummary, {"day": day}, deltas)
+    for (day, klass), deltas in per_class.items():
+        _increment(DailyClassCount, {"day": day, "klass": klass}, deltas)
+
+
+def _decrement(model, lookup, deltas):
+    """UPDATE ... SET f = f - delta; baris yang belum ada (rollup belum dibangun) dilewati."""
+    model.objects.filter(**lookup).update(**{k: F(k) - v for k, v in deltas.items()})
+
+
+def forget(det):
+    """
+    Kebalikan record() untuk satu Detection yang akan dihapus. Box dibaca
+    dari DetectionItem (masih ada saat pre_delete) dan/atau blob packed.
+    """
+    day = timezone.localdate(det.created_at)
+    _decrement(DailySummary, {"day": day}, {
+        "images": 1, "total_objects": det.total_objects or 0, "conf_sum": det.avg_conf or 0.0,
+    })
+    per_class = defaultdict(lambda: [0, 0.0])
+    rows = (
+        DetectionItem.objects.filter(detection=det).values("klass")
+        .annotate(n=Count("id"), conf=Sum("confidence"))
+    )
+    for r in rows:
+        c = per_class[r["klass"] or "Unknown"]
+        c[0] += r["n"]
+        c[1] += r["conf"] or 0.0
+    if det.boxes is not None:
+        for klass, (n, conf) in class_stats(det.boxes, det.box_classes).items():
+            c = per_class[klass]
+            c[0] += n
+            c[1] += conf
+    for klass, (n, conf) in per_class.items():
+        _decrement(DailyClassCount, {"day": day, "klass": klass}, {"count": n, "conf_sum": conf})
+    if per_class:
+        # kelas yang habis hilang dari by_class, sama seperti raw_summary
+        DailyClassCount.objects.filter(day=day, klass__in=per_class, count__lte=0).delete()
+
+
+def detection_deleted(sender, instance, **kwargs):
+    forget(instance)
+
+
+@transaction.atomic
+def rebuild(since=None):
+    """Hitung ulang rollup dari tabel mentah (semua hari, atau mulai tanggal `since`)."""
+    dets = Detection.objects.all()
+    items = DetectionItem.objects.all()
+    if since is not None:
+        DailySummary.objects.filter(day__gte=since).delete()
+        DailyClassCount.objects.filter(day__gte=since).delete()
+        # batas datetime (bukan __date) supaya index created_at terpakai
+        start = timezone.make_aware(datetime.combine(since, time.min))
+        dets = dets.filter(created_at__gte=start)
+        items = items.filter(detection__created_at__gte=start)
+    else:
+        DailySummary.objects.all().delete()
+        DailyClassCount.objects.all().delete()
+
+    days = (
+        dets.annotate(d=TruncDate("created_at")).values("d")
+        .annotate(images=Count("id"), objects=Sum("total_objects"), conf=Sum("avg_conf"))
+    )
+    DailySummary.objects.bulk_create([
+        DailySummary(day=r["d"], images=r["images"], total_objects=r["objects"] or 0,
+                     conf_sum=r["conf"] or 0.0)
+        for r in days
+    ], batch_size=1000)
+
+    classes = (
+        items.annotate(d=TruncDate("detection__created_at")).values("d", "klass")
+        .annotate(n=Count("id"), conf=Sum("confidence"))
+    )
+    per_class = defaultdict(lambda: [0, 0.0])
+    for r in classes:
+        c = per_class[(r["d"], r["klass"] or "Unknown")]
+        c[0] += r["n"]
+        c[1] += r["conf"] or 0.0
+    for (day, klass), (n, conf) in _packed_class_stats(dets).items():
+        c = per_class[(day, klass)]
+        c[0] += n
+        c[1] += conf
+    DailyClassCount.objects.bulk_create([
+        DailyClassCount(day=day, klass=klass, count=n, conf_sum=conf)
+        for (day, klass), (n, conf) in per_class.items()
+    ], batch_size=1000)
+
+
+def _packed_class_stats(dets):
+    """{(hari, kelas): (count, conf_sum)} untuk detection mode packed (decode blob)."""
+    out = defaultdict(lambda: (0, 0.0))
+    rows = dets.filter(boxes__isnull=False).values_list("created_at", "boxes", "box_classes")
+    for created_at, blob, classes in rows.iterator(chunk_size=2000):
+        day = timezone.localdate(created_at)
+        for klass, (n, conf) in class_stats(blob, classes).items():
+            cn, cs = out[(day, klass)]
+            out[(day, klass)] = (cn + n, cs + conf)
+    return out
+
+
+def window_start(days, now=None):
+    """Awal jendela summary: jam 00:00 hari ke-(days-1) sebelum hari ini."""
+    now = now or timezone.now()
+    first_day = timezone.localdate(now) - timedelta(days=days - 1)
+    return timezone.make_aware(
+        datetime.combine(first_day, time.min),
+        timezone.get_current_timezone(),
+    )
+
+
+def _latest(start, end):
+    q = Detection.objects.filter(created_at__gte=start, created_at__lte=end).order_by("-created_at")
+    return [{
+        "id": r.id,
+        "created_at": r.created_at.isoformat(),
+        "filename": r.filename,
+        "annotated_url": r.annotated_url,
+        "file_url": r.file_url,
+        "variants": r.variants,
+        "total_objects": r.total_objects or 0,
+        "avg_conf": round(float(r.avg_conf or 0.0), 3),
+    } for r in q[:5]]
+
+
+def summary(days, now=None):
+    """Payload /summary dari rollup: O(jumlah hari), bukan O(jumlah box)."""
+    end = now or timezone.now()
+    start = window_start(days, end)
+    first_day = timezone.localdate(start)
+
+    rows = list(DailySummary.objects.filter(day__gte=first_day).order_by("day"))
+    total_images = sum(r.images for r in rows)
+    total_objects = sum(r.total_objects for r in rows)
+    conf_sum = sum(r.conf_sum for r in rows)
+
+    series = [{
+        "date": r.day.isoformat(),
+        "images": r.images,
+        "avg_conf": round(r.conf_sum / r.images, 3) if r.images else 0.0,
+        "objects": r.total_objects,
+    } for r in rows if r.images]
+
+    per_class = (
+        DailyClassCount.objects.filter(day__gte=first_day)
+        .values("klass").annotate(count=Sum("count")).order_by("-count")
+    )
+    by_class = [{"klass": r["klass"] or "Unknown", "count": r["count"]} for r in per_class]
+
+    return {
+        "range_days": days,
+        "total_images": total_images,
+        "total_objects": total_objects,
+        "avg_conf": round(conf_sum / total_images, 3) if total_images else 0.0,
+        "series": series,
+        "by_class": by_class,
+        "latest": _latest(start, end),
+    }
+
+
+def raw_summary(days, now=None):
+    """
+    Payload yang sama dihitung langsung dari tabel mentah (cara lama).
+    Dipakai untuk cek paritas dan benchmark.
+    """
+    end = now or timezone.now()
+    start = window_start(days, end)
+    q = Detection.objects.filter(created_at__gte=start, created_at__lte=end)
+
+    total_images = q.count()
+    total_objects = q.aggregate(s=Sum("total_objects"))["s"] or 0
+    avg_conf = q.aggregate(a=Avg("avg_conf"))["a"] or 0.0
+
+    per_day = (
+        q.annotate(day=TruncDate("created_at")).values("day")
+        .annotate(images=Count("id"), avg_conf=Avg("avg_conf"), objects=Sum("total_objects"))
+        .order_by("day")
+    )
+    series = [{
+        "date": d["day"].isoformat(),
+        "images": d["images"],
+        "avg_conf": round(float(d["avg_conf"] or 0.0), 3),
+        "objects": int(d["objects"] or 0),
+    } for d in per_day]
+
+    per_class = (
+        DetectionItem.objects.filter(detection__in=q)
+        .values("klass").annotate(count=Count("id")).order_by("-count")
+    )
+    counts = defaultdict(int)
+    for r in per_class:
+        counts[r["klass"] or "Unknown"] += r["count"]
+    for (_, klass), (n, _) in _packed_class_stats(q).items():
+        counts[klass] += n
+    by_class = [{"klass": k, "count": n} for k, n in sorted(counts.items(), key=lambda kv: -kv[1])]
+
+    return {
+        "range_days": days,
+        "total_images": total_images,
+        "total_objects": total_objects,
+        "avg_conf": round(float(avg_conf), 3),
+        "series": series,
+        "by_class": by_class,
+        "latest": _latest(start, end),
+    }
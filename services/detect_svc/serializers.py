@@ -1,5 +1,6 @@
 from rest_framework import serializers
 from .models import Detection, DetectionItem
+from .packing import unpack
 
 class DetectionItemSerializer(serializers.ModelSerializer):
     class Meta:
@@ -7,8 +8,21 @@ class DetectionItemSerializer(serializers.ModelSerializer):
         fields = ("id","klass","confidence","x","y","w","h")
 
 class DetectionSerializer(serializers.ModelSerializer):
-    items = DetectionItemSerializer(many=True, read_only=True)
+    items = serializers.SerializerMethodField()
     class Meta:
         model = Detection
-        fields = ("id","filename","file_url","annotated_url","model_version","pod_id",
-                  "total_objects","avg_conf","created_at","items")
\ No newline at end of file
+        fields = ("id","filename","file_url","annotated_url","variants","model_version","pod_id",
+                  "total_objects","avg_conf","created_at","items")
+
+    def get_items(self, obj):
+        # packed → decode blob; selain itu baris DetectionItem seperti biasa
+        if obj.boxes is not None:
+            return unpack(obj.boxes, obj.box_classes, obj.id)
+        return DetectionItemSerializer(obj.items.all(), many=True).data
+
+class DetectionListSerializer(serializers.ModelSerializer):
+    """Ringkas untuk list/history: tanpa items (items hanya di detail)."""
+    class Meta:
+        model = Detection
+        fields = ("id","filename","file_url","annotated_url","variants","model_version","pod_id",
+                  "total_objects","avg_conf","created_at")
@@ -1,8 +1,17 @@
+import asyncio
+import contextvars
+import functools
 import os
+import threading
 import uuid
-import requests
+from concurrent.futures import ThreadPoolExecutor
+from asgiref.sync import sync_to_async
 from django.conf import settings
-from PIL import Image, ImageDraw, ImageFont
+from django.db import connection
+from PIL import Image, ImageDraw, ImageFont, ImageOps
+
+from . import columns, metrics, preprocess
+from .client import get_async_client, get_client
 
 # ============================================================
 # Konfigurasi koneksi ke service inference (FastAPI)
@@ -13,21 +22,122 @@ INFERENCE_URL = (
     or "http://127.0.0.1:8001"
 ).rstrip("/")
 
+# beberapa replica (dipisah koma) → load balancing + health check di gateway
+INFERENCE_URLS = [
+    u.strip().rstrip("/") for u in os.getenv("INFERENCE_URLS", "").split(",") if u.strip()
+] or [INFERENCE_URL]
+
+
+def inference_client():
+    return get_client(INFERENCE_URLS)
+
+
+def async_inference_client():
+    return get_async_client(INFERENCE_URLS)
+
+
+def db_to_async(fn):
+    """
+    sync_to_async untuk kode ORM di view async: koneksi DB dilepas (kembali ke
+    pool psycopg) begitu `fn` selesai, bukan baru di request_finished. Tanpa
+    ini tiap request memegang satu koneksi selama menunggu inference, jadi
+    konkurensi per worker mentok di DB_POOL_MAX.
+    """
+    @functools.wraps(fn)
+    def run(*args, **kwargs):
+        try:
+            return fn(*args, **kwargs)
+        finally:
+            connection.close()
+    return sync_to_async(run)
+
+
+def _infer_params(tiled):
+    params = columns.request_params()
+    if tiled:
+        params = dict(params or {}, tiled=1)
+    return params
 
-def call_inference(file_path: str) -> dict:
+
+def call_inference(file_path: str = None, data: bytes = None, tiled: bool = False) -> dict:
     """
-    Kirim file ke backend inference (FastAPI) di /infer.
+    Kirim file ke backend inference (FastAPI) di /infer lewat session ber-pool.
+    Kalau `data` (bytes gambar) sudah ada, dikirim langsung tanpa buka file lagi.
+    INFER_PRERESIZE=1 → gambar dikecilkan dulu, box diskalakan balik (preprocess.py).
+    Box dalam format kolom ("boxes", lihat columns.py) atau "items" dari inference lama.
+    tiled=True → ?tiled=1: gambar besar dipecah per tile di inference; pre-resize
+    dilewati karena yang dibutuhkan justru resolusi asli.
     Melempar requests.HTTPError bila status bukan 200.
     """
-    url = f"{INFERENCE_URL}/infer"
-    with open(file_path, "rb") as f:
-        r = requests.post(
-            url,
-            files={"file": ("image.jpg", f, "image/jpeg")},
-            timeout=30,
-        )
-    r.raise_for_status()
-    return r.json()
+    params = _infer_params(tiled)
+    if tiled or not preprocess.PRERESIZE:
+        with metrics.stage("inference"):
+            return inference_client().post_image("/infer", file_path=file_path, data=data,
+                                                 params=params)
+    if data is None:
+        with open(file_path, "rb") as f:
+            data = f.read()
+    with metrics.stage("preresize"):
+        data, factors = preprocess.shrink(data)
+    with metrics.stage("inference"):
+        result = inference_client().post_image("/infer", data=data, params=params)
+    return preprocess.rescale(result, factors)
+
+
+async def call_inference_async(data: bytes, tiled: bool = False) -> dict:
+    """
+    call_inference untuk view async (ASGI): request ke inference di-await
+    (httpx), pre-resize (CPU) jalan di thread pool. Hasil dan exception sama.
+    """
+    params = _infer_params(tiled)
+    if tiled or not preprocess.PRERESIZE:
+        with metrics.stage("inference"):
+            return await async_inference_client().post_image("/infer", data=data, params=params)
+    with metrics.stage("preresize"):
+        data, factors = await asyncio.to_thread(preprocess.shrink, data)
+    with metrics.stage("inference"):
+        result = await async_inference_client().post_image("/infer", data=data, params=params)
+    return preprocess.rescale(result, factors)
+
+
+_stream_pool = None
+_stream_lock = threading.Lock()
+
+
+def stream_inference(chunks, filename="image.jpg", content_type="image/jpeg"):
+    """
+    Mulai /infer di thread lain dengan body yang diisi `chunks` (iterable bytes,
+    boleh masih berjalan). Return Future → hasil seperti call_inference.
+    """
+    global _stream_pool
+    if _stream_pool is None:
+        with _stream_lock:
+            if _stream_pool is None:
+                _stream_pool = ThreadPoolExecutor(max_workers=int(os.getenv("INFER_STREAM_WORKERS", "8")),
+                                                  thread_name_prefix="infer-stream")
+    # context request (request id + trace) ikut ke thread pengirim
+    return _stream_pool.submit(contextvars.copy_context().run, inference_client().post_stream,
+                               chunks, "/infer", filename, content_type, columns.request_params())
+
+
+def call_inference_batch(file_paths) -> dict:
+    """
+    Kirim banyak file sekaligus ke /infer/batch.
+    Return {"model_version", "pod_id", "results": [{"index", "boxes" | "items"} | {"index", "error"}]}.
+    """
+    params = columns.request_params()
+    if not preprocess.PRERESIZE:
+        return inference_client().post_images(file_paths, "/infer/batch", params)
+    shrunk = []
+    with metrics.stage("preresize"):
+        for p in file_paths:
+            with open(p, "rb") as f:
+                shrunk.append(preprocess.shrink(f.read()))
+    resp = inference_client().post_images([data for data, _ in shrunk], "/infer/batch", params)
+    for r in resp.get("results", []):
+        if r and "error" not in r and r.get("index") is not None:
+            preprocess.rescale(r, shrunk[r["index"]][1])
+    return resp
 
 
 # ============================================================
@@ -57,24 +167,45 @@ def _get_color(klass: str):
     return CLASS_COLORS.get(klass, DEFAULT_COLOR)
 
 
-def draw_boxes_and_save(src_path: str, items):
+@functools.lru_cache(maxsize=32)
+def _font(size: int):
+    """Font label di-cache per ukuran (tidak load TrueType dari disk tiap gambar)."""
+    # font: coba DejaVuSans, fallback default
+    try:
+        return ImageFont.truetype("DejaVuSans.ttf", size=size)
+    except Exception:
+        return ImageFont.load_default()
+
+
+@functools.lru_cache(maxsize=4096)
+def _label_mask(label: str, size: int):
     """
-    Gambar bbox + label dan simpan ke MEDIA_ROOT/annotated.
-    items: list of {klass, confidence, x, y, w, h} (pixel absolut)
-    Return: MEDIA_URL path dari file hasil (str).
+    Mask teks label yang sudah dirender (+ offset bbox-nya), di-cache per
+    (teks, ukuran). Label hanya "<kelas> <conf 2 digit>" → jumlahnya terbatas,
+    jadi rasterisasi font (bagian paling mahal) hampir selalu kena cache.
     """
-    img = Image.open(src_path).convert("RGB")
-    W, H = img.size
+    font = _font(size)
+    l, t, r, b = font.getbbox(label)
+    mask = Image.new("L", (max(1, r - l), max(1, b - t)), 0)
+    ImageDraw.Draw(mask).text((-l, -t), label, fill=255, font=font)
+    return mask, l, t
 
-    # overlay RGBA untuk label semi-transparan
-    overlay = Image.new("RGBA", img.size, (0, 0, 0, 0))
-    draw = ImageDraw.Draw(overlay)
 
-    # font: coba DejaVuSans, fallback default
-    try:
-        font = ImageFont.truetype("DejaVuSans.ttf", size=max(14, int(W * 0.018)))
-    except Exception:
-        font = ImageFont.load_default()
+LABEL_FILL = (0, 255, 255)
+LABEL_ALPHA = 220 / 255.0
+LABEL_TEXT = (0, 43, 43)
+
+
+def render_annotations(img, items):
+    """
+    Gambar bbox + label langsung di `img` (RGB, in-place) dan return img.
+    Garis bbox opaque → digambar langsung. Hanya latar label (semi-transparan)
+    yang di-composite, dan hanya di area label itu (bukan seluruh frame).
+    """
+    W, H = img.size
+    draw = ImageDraw.Draw(img)
+    font_size = max(14, int(W * 0.018))
+    pad = 4
 
     for it in items or []:
         x, y, w, h = int(it["x"]), int(it["y"]), int(it["w"]), int(it["h"])
@@ -83,30 +214,50 @@ def draw_boxes_and_save(src_path: str, items):
         color = _get_color(it.get("klass", ""))
 
         # bbox
-        draw.rectangle([x, y, x2, y2], outline=color + (255,), width=3)
+        draw.rectangle([x, y, x2, y2], outline=color, width=3)
 
         # label
-        pad = 4
-        l, t, r, b = draw.textbbox((0, 0), label, font=font)
-        tw, th = r - l, b - t
+        mask, l, t = _label_mask(label, font_size)
+        tw, th = mask.size
         label_y = y - (th + pad * 2)
         if label_y < 0:
             label_y = y
+        box = [x, label_y, x + tw + pad * 2, label_y + th + pad * 2]
+
+        # latar semi-transparan: blend hanya region label (dipotong ke batas gambar)
+        region = (max(0, box[0]), max(0, box[1]), min(W, box[2] + 1), min(H, box[3] + 1))
+        if region[2] > region[0] and region[3] > region[1]:
+            patch = img.crop(region)
+            solid = Image.new("RGB", patch.size, LABEL_FILL)
+            img.paste(Image.blend(patch, solid, LABEL_ALPHA), region[:2])
+
+        draw.rectangle(box, outline=color, width=1)
+        img.paste(LABEL_TEXT, (x + pad + l, label_y + pad + t), mask)
 
-        draw.rectangle(
-            [x, label_y, x + tw + pad * 2, label_y + th + pad * 2],
-            fill=(0, 255, 255, 220),
-            outline=color + (255,),
-            width=1,
-        )
-        draw.text((x + pad, label_y + pad), label, fill=(0, 43, 43, 255), font=font)
+    return img
 
-    out = Image.alpha_composite(img.convert("RGBA"), overlay).convert("RGB")
 
+def annotate_image(src_path: str, items):
+    """Gambar sumber + bbox/label sebagai PIL image RGB (belum disimpan)."""
+    # koordinat dari inference mengikuti orientasi EXIF → gambar juga diputar dulu
+    return render_annotations(ImageOps.exif_transpose(Image.open(src_path)).convert("RGB"), items)
+
+
+def save_annotated(img) -> str:
+    """Simpan annotated image ke MEDIA_ROOT/annotated, return MEDIA_URL path-nya."""
     out_dir = os.path.join(settings.MEDIA_ROOT, "annotated")
     os.makedirs(out_dir, exist_ok=True)
     out_name = f"annotated_{uuid.uuid4().hex}.jpg"
     out_path = os.path.join(out_dir, out_name)
-    out.save(out_path, "JPEG", quality=90)
+    img.save(out_path, "JPEG", quality=90)
+
+    return settings.MEDIA_URL + "annotated/" + out_name
 
-    return settings.MEDIA_URL + "annotated/" + out_name
\ No newline at end of file
+
+def draw_boxes_and_save(src_path: str, items):
+    """
+    Gambar bbox + label dan simpan ke MEDIA_ROOT/annotated.
+    items: list of {klass, confidence, x, y, w, h} (pixel absolut)
+    Return: MEDIA_URL path dari file hasil (str).
+    """
+    return save_annotated(annotate_image(src_path, items))
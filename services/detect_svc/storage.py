@@ -0,0 +1,218 @@
+import hashlib
+import os
+import queue
+import tempfile
+
+from django.conf import settings
+from django.core.files.uploadedfile import UploadedFile
+from django.core.files.uploadhandler import FileUploadHandler, SkipFile
+from rest_framework.parsers import MultiPartParser
+
+from . import preprocess
+from .services import stream_inference
+
+# ============================================================
+# Penyimpanan upload content-addressed
+#   file_id = sha256(isi) + ekstensi → file identik disimpan sekali,
+#   nama tidak bisa bentrok. Hash dihitung sambil chunk ditulis ke
+#   file sementara di MEDIA_ROOT/.tmp (volume yang sama, tanpa buffer
+#   kedua di /tmp), lalu di-rename atomik ke uploads/<nama final>.
+#   File sementara sengaja di luar uploads/: file_id hanya bisa menunjuk
+#   upload yang sudah selesai.
+# ============================================================
+MAX_UPLOAD_BYTES = int(os.getenv("UPLOAD_MAX_BYTES", str(20 * 1024 * 1024)))
+EXTENSIONS = {"image/jpeg": ".jpg", "image/png": ".png"}
+# pre-resize aktif: header gambar dibaca dari potongan awal upload sebelum
+# diputuskan di-stream atau tidak; lewat batas ini → tidak di-stream
+STREAM_PEEK_BYTES = int(os.getenv("UPLOAD_STREAM_PEEK_BYTES", str(256 * 1024)))
+VIDEO_MAX_BYTES = int(os.getenv("INGEST_MAX_BYTES", str(500 * 1024 * 1024)))
+VIDEO_EXTENSIONS = {"video/mp4": ".mp4", "video/x-msvideo": ".avi", "video/avi": ".avi",
+                    "video/quicktime": ".mov", "video/x-matroska": ".mkv", "video/webm": ".webm"}
+
+
+def uploads_dir():
+    path = os.path.join(settings.MEDIA_ROOT, "uploads")
+    os.makedirs(path, exist_ok=True)
+    return path
+
+
+def tmp_dir():
+    # FILE_UPLOAD_TEMP_DIR harus satu filesystem dengan uploads/ (os.replace)
+    path = settings.FILE_UPLOAD_TEMP_DIR or os.path.join(settings.MEDIA_ROOT, ".tmp")
+    os.makedirs(path, exist_ok=True)
+    return path
+
+
+class HashedUploadedFile(UploadedFile):
+    """File upload yang sudah ada di disk (sementara) + sha256 isinya."""
+
+    def __init__(self, file, name, content_type, size, charset, digest, too_large):
+        super().__init__(file, name, content_type, size, charset)
+        self.digest = digest
+        self.too_large = too_large
+        self.inference = None     # Future hasil /infer (TeeUploadHandler)
+
+    def temporary_file_path(self):
+        return self.file.name
+
+
+class HashingUploadHandler(FileUploadHandler):
+    """
+    Tulis chunk langsung ke file sementara (tmp_dir()) sambil
+    menghitung sha256. Lewat MAX_UPLOAD_BYTES berhenti menulis (too_large).
+    Hanya field "file" yang diterima; file lain di request dilewati.
+    """
+
+    def new_file(self, field_name, *args, **kwargs):
+        if field_name != "file":
+            raise SkipFile()
+        super().new_file(field_name, *args, **kwargs)
+        self.hasher = hashlib.sha256()
+        self.size = 0
+        self.too_large = False
+        self.future = None
+        self.file = tempfile.NamedTemporaryFile(dir=tmp_dir(), prefix=".upload-", delete=False)
+        self.queue = self.open_stream()
+
+    def open_stream(self):
+        """Queue tujuan salinan chunk (None = tidak di-stream ke mana-mana)."""
+        return None
+
+    def max_bytes(self):
+        return MAX_UPLOAD_BYTES
+
+    def receive_data_chunk(self, raw_data, start):
+        self.size += len(raw_data)
+        if self.too_large or self.size > self.max_bytes():
+            if not self.too_large:
+                self.too_large = True
+                self._end_stream()
+            return None
+        self.file.write(raw_data)
+        self.hasher.update(raw_data)
+        if self.queue is not None:
+            self.queue.put(raw_data)
+        return None
+
+    def file_complete(self, file_size):
+        self._end_stream()
+        self.file.flush()
+        self.file.seek(0)
+        upload = HashedUploadedFile(self.file, self.file_name, self.content_type, self.size,
+                                    self.charset, self.hasher.hexdigest(), self.too_large)
+        upload.inference = self.future
+        return upload
+
+    def upload_interrupted(self):
+        self._end_stream()
+        if hasattr(self, "file"):
+            self.file.close()
+            _remove(self.file.name)
+
+    def _end_stream(self):
+        if self.queue is not None:
+            self.queue.put(None)
+            self.queue = None
+
+
+class TeeUploadHandler(HashingUploadHandler):
+    """
+    Selain disimpan, chunk langsung di-stream ke /infer di thread lain selagi
+    client masih mengirim. Hasilnya Future di upload.inference.
+
+    Dengan pre-resize, gambar yang akan dikecilkan harus utuh dulu (view
+    memanggil inference biasa). Stream baru dimulai setelah header gambar
+    terbaca dan ternyata gambar dikirim apa adanya (sudah kecil).
+    """
+    head = None     # potongan awal yang ditahan selama belum diputuskan
+
+    def open_stream(self):
+        if self.content_type not in EXTENSIONS:
+            return None
+        if preprocess.PRERESIZE:
+            self.head = b""
+            return None
+        return self._start_stream()
+
+    def _start_stream(self):
+        q = queue.Queue()
+        self.future = stream_inference(iter(q.get, None), self.file_name, self.content_type)
+        return q
+
+    def receive_data_chunk(self, raw_data, start):
+        super().receive_data_chunk(raw_data, start)
+        if self.head is not None and not self.too_large:
+            self.head += raw_data
+            as_is = preprocess.sent_as_is(self.head)
+            if as_is:
+                self.queue = self._start_stream()
+                self.queue.put(self.head)
+            if as_is is not None or len(self.head) >= STREAM_PEEK_BYTES:
+                self.head = None
+        return None
+
+
+class VideoUploadHandler(HashingUploadHandler):
+    """Sama, dengan batas ukuran video (INGEST_MAX_BYTES)."""
+
+    def max_bytes(self):
+        return VIDEO_MAX_BYTES
+
+
+class StreamingUploadParser(MultiPartParser):
+    """MultiPartParser dengan HashingUploadHandler (menggantikan handler default Django)."""
+    handler_class = HashingUploadHandler
+
+    def parse(self, stream, media_type=None, parser_context=None):
+        request = parser_context["request"]._request
+        request.upload_handlers = [self.handler_class(request)]
+        return super().parse(stream, media_type, parser_context)
+
+
+class TeeUploadParser(StreamingUploadParser):
+    handler_class = TeeUploadHandler
+
+
+class VideoUploadParser(StreamingUploadParser):
+    handler_class = VideoUploadHandler
+
+
+def commit(upload, extensions=EXTENSIONS):
+    """
+    Pindahkan upload ke nama content-addressed. Return (file_id, created);
+    created False → isi yang sama sudah pernah diupload (file sementara dibuang).
+    """
+    file_id = upload.digest + extensions.get(upload.content_type, "")
+    final = os.path.join(uploads_dir(), file_id)
+    upload.file.close()
+    if os.path.exists(final):
+        _remove(upload.temporary_file_path())
+        return file_id, False
+    os.replace(upload.temporary_file_path(), final)
+    os.chmod(final, 0o644)    # tempfile dibuat 0600; media dibaca nginx
+    return file_id, True
+
+
+def save_bytes(data: bytes, ext: str = ".jpg"):
+    """Simpan bytes (mis. frame video) dengan nama content-addressed. Return (file_id, created)."""
+    file_id = hashlib.sha256(data).hexdigest() + ext
+    final = os.path.join(uploads_dir(), file_id)
+    if os.path.exists(final):
+        return file_id, False
+    with tempfile.NamedTemporaryFile(dir=tmp_dir(), prefix=".upload-", delete=False) as tmp:
+        tmp.write(data)
+    os.replace(tmp.name, final)
+    os.chmod(final, 0o644)
+    return file_id, True
+
+
+def discard(upload):
+    upload.file.close()
+    _remove(upload.temporary_file_path())
+
+
+def _remove(path):
+    try:
+        os.remove(path)
+    except FileNotFoundError:
+        pass
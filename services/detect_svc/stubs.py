@@ -0,0 +1,139 @@
+"""
+Stub inference service (HTTP/1.1, keep-alive) untuk test lokal tanpa model.
+
+    srv = StubInferenceServer(pod_id="stub-a").start()
+    ... INFERENCE_URL = srv.url ...
+    srv.stop()
+
+Endpoint yang ditiru: GET /healthz, GET /config, POST /infer, POST /infer/batch
+(termasuk ?format=columns → box dalam format kolom "boxes").
+`latency` (detik, + `jitter` acak) meniru waktu model per request; /infer/batch
+menunggu `latency` + `per_image` x jumlah gambar (dipakai bench_detect).
+"""
+import json
+import random
+import re
+import threading
+import time
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from urllib.parse import parse_qs
+
+STUB_ITEMS = [{"klass": "Safety helmet", "confidence": 0.9, "x": 1, "y": 2, "w": 10, "h": 12}]
+
+
+def to_columns(items):
+    """list item → format kolom (sama dengan inference_svc/postprocess.parse_columns)."""
+    classes = list(dict.fromkeys(it["klass"] for it in items))
+    index = {k: i for i, k in enumerate(classes)}
+    out = {"classes": classes, "cls": [index[it["klass"]] for it in items],
+           "conf": [it["confidence"] for it in items]}
+    out.update({k: [it[k] for it in items] for k in ("x", "y", "w", "h")})
+    return out
+
+
+class _Handler(BaseHTTPRequestHandler):
+    protocol_version = "HTTP/1.1"   # keep-alive
+
+    def log_message(self, *args):
+        pass
+
+    def _send(self, status, body):
+        raw = json.dumps(body).encode()
+        self.send_response(status)
+        self.send_header("Content-Type", "application/json")
+        self.send_header("Content-Length", str(len(raw)))
+        if self.server.stub.server_timing:
+            self.send_header("Server-Timing", self.server.stub.server_timing)
+        self.end_headers()
+        self.wfile.write(raw)
+
+    def _read_body(self):
+        if self.headers.get("Transfer-Encoding", "").lower() != "chunked":
+            return self.rfile.read(int(self.headers.get("Content-Length") or 0))
+        parts = []
+        while True:
+            size = int(self.rfile.readline().split(b";")[0].strip(), 16)
+            if size == 0:
+                self.rfile.readline()
+                return b"".join(parts)
+            parts.append(self.rfile.read(size))
+            self.rfile.readline()
+
+    def do_GET(self):
+        srv = self.server.stub
+        srv.hits[self.path] = srv.hits.get(self.path, 0) + 1
+        if self.path == "/healthz":
+            if not srv.healthy:
+                return self._send(503, {"status": "down"})
+            return self._send(200, {"status": "ok", "model_version": srv.model_version})
+        if self.path == "/config":
+            return self._send(200, {"model_version": srv.model_version, "conf": 0.25,
+                                    "iou": 0.7, "imgsz": 640, "max_det": 300, "backend": "torch"})
+        self._send(404, {"detail": "not found"})
+
+    def do_POST(self):
+        srv = self.server.stub
+        body = self._read_body()
+        path, _, query = self.path.partition("?")
+        fmt = parse_qs(query).get("format", ["items"])[0]
+        srv.hits[path] = srv.hits.get(path, 0) + 1
+        if srv.record:
+            srv.bodies.append(body)
+            srv.headers.append(dict(self.headers))
+        if srv.fail_status:
+            return self._send(srv.fail_status, {"detail": "stub failure"})
+        n = len(re.findall(rb'name="files"', body)) if path == "/infer/batch" else 1
+        srv.wait(n)
+        box = ({"boxes": to_columns(srv.items)} if srv.columns and fmt == "columns"
+               else {"items": srv.items})
+        if path == "/infer":
+            return self._send(200, {"model_version": srv.model_version, "pod_id": srv.pod_id, **box})
+        if path == "/infer/batch":
+            return self._send(200, {
+                "model_version": srv.model_version, "pod_id": srv.pod_id,
+                "results": [{"index": i, **box} for i in range(n)],
+            })
+        self._send(404, {"detail": "not found"})
+
+
+class StubInferenceServer:
+    def __init__(self, pod_id="stub", model_version="1.0", items=None, host="127.0.0.1", port=0,
+                 latency=0.0, jitter=0.0, per_image=0.0, seed=0):
+        self.pod_id = pod_id
+        self.model_version = model_version
+        self.items = STUB_ITEMS if items is None else items
+        self.healthy = True
+        self.fail_status = 0      # != 0 → semua POST dibalas status ini
+        self.hits = {}
+        self.bodies = []          # body mentah tiap POST, untuk diperiksa di test
+        self.headers = []         # header tiap POST
+        self.record = True        # False → bodies/headers tidak disimpan (bench, request banyak)
+        self.server_timing = ""   # != "" → dibalas sebagai header Server-Timing
+        self.columns = True       # False → ?format diabaikan (meniru inference versi lama)
+        self.latency, self.jitter, self.per_image = latency, jitter, per_image
+        self._rnd = random.Random(seed)
+        self.httpd = ThreadingHTTPServer((host, port), _Handler)
+        self.httpd.daemon_threads = True
+        self.httpd.stub = self
+        self._thread = None
+
+    def wait(self, n=1):
+        delay = self.latency + self.per_image * max(0, n - 1)
+        if self.jitter:
+            delay += self._rnd.uniform(0, self.jitter)
+        if delay > 0:
+            time.sleep(delay)
+
+    @property
+    def url(self):
+        host, port = self.httpd.server_address[:2]
+        return f"http://{host}:{port}"
+
+    def start(self):
+        self._thread = threading.Thread(target=self.httpd.serve_forever, daemon=True)
+        self._thread.start()
+        return self
+
+    def stop(self):
+        self.httpd.shutdown()
+        self.httpd.server_close()
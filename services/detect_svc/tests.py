@@ -1,3 +1,1974 @@
-from django.test import TestCase
+import asyncio
+import hashlib
+import importlib
+import importlib.util
+import io
+import json
+import os
+import re
+import shutil
+import subprocess
+import sys
+import tempfile
+import threading
+import time
+import unittest
+import uuid
+from datetime import timedelta
+from unittest import mock
 
-# Create your tests here.
+import requests
+from django.contrib.auth import get_user_model
+from django.core.cache import cache as django_cache
+from django.core.files.uploadedfile import SimpleUploadedFile
+from django.core.management import call_command
+from django.db import connection
+from asgiref.sync import async_to_sync, sync_to_async
+from django.test import AsyncClient, TestCase, override_settings
+from django.test.utils import CaptureQueriesContext
+from django.utils import timezone
+from PIL import Image, ImageChops, ImageDraw, ImageOps
+from rest_framework.test import APIClient
+from rest_framework_simplejwt.tokens import AccessToken
+
+from . import cache, columns, feed, jobs, metrics, packing, pipeline, preprocess, rollup, services, storage
+from .client import AsyncInferenceClient, BalancedInferenceClient, InferenceClient
+from .serializers import DetectionSerializer
+from .stubs import StubInferenceServer, to_columns
+from .models import (DailyClassCount, DailySummary, Detection, DetectionItem, DetectionJob,
+                     InferenceCacheEntry, IngestSession)
+
+
+INFERENCE_DIR = os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), "inference_svc")
+
+
+def inference_module(name):
+    """
+    Modul inference_svc, diimpor top-level seperti di container-nya (app.py,
+    tiling.py, ...). Test di-skip kalau dependensi inference tidak terpasang.
+    """
+    if INFERENCE_DIR not in sys.path:
+        sys.path.append(INFERENCE_DIR)
+    try:
+        return importlib.import_module(name)
+    except ImportError as e:
+        raise unittest.SkipTest(f"inference_svc/{name}.py: {e}")
+
+
+def make_image(size=(64, 48), color=(200, 30, 30), fmt="JPEG"):
+    buf = io.BytesIO()
+    Image.new("RGB", size, color).save(buf, fmt)
+    return buf.getvalue()
+
+
+FAKE_RESULT = {
+    "model_version": "1.0",
+    "pod_id": "stub",
+    "items": [{"klass": "Safety helmet", "confidence": 0.9, "x": 1, "y": 2, "w": 10, "h": 12}],
+}
+FAKE_CONFIG = {"model_version": "1.0", "conf": 0.25, "iou": 0.7, "imgsz": 640, "max_det": 300,
+               "backend": "torch"}
+
+
+class DetectTestCase(TestCase):
+    """Base: MEDIA_ROOT sementara + client yang sudah login."""
+
+    def setUp(self):
+        self.media = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, self.media, ignore_errors=True)
+        patcher = override_settings(MEDIA_ROOT=self.media)
+        patcher.enable()
+        self.addCleanup(patcher.disable)
+
+        # render annotated image langsung supaya test tidak bergantung thread
+        p = mock.patch.object(pipeline, "ANNOTATE_MODE", "sync")
+        p.start()
+        self.addCleanup(p.stop)
+
+        # riwayat throttle (60/min per user) ada di cache Django, bukan di DB test
+        django_cache.clear()
+
+        self.user = get_user_model().objects.create_user("tester", password="pw")
+        self.client = APIClient()
+        self.client.force_authenticate(self.user)
+
+    def put_upload(self, name="a.jpg", data=None):
+        os.makedirs(os.path.join(self.media, "uploads"), exist_ok=True)
+        with open(os.path.join(self.media, "uploads", name), "wb") as f:
+            f.write(data if data is not None else make_image())
+        return name
+
+
+class InferenceCacheTests(DetectTestCase):
+    def setUp(self):
+        super().setUp()
+        cache._lru.clear()
+        cache._config.update(value=None, fetched_at=0.0)
+        self.config = dict(FAKE_CONFIG)
+        p = mock.patch.object(cache, "model_config", side_effect=lambda: self.config)
+        p.start()
+        self.addCleanup(p.stop)
+
+    @mock.patch.object(cache, "call_inference", return_value=FAKE_RESULT)
+    def test_same_image_is_inferred_once(self, call):
+        data = make_image()
+        a = self.put_upload("a.jpg", data)
+        b = self.put_upload("b.jpg", data)
+
+        r1 = self.client.post("/api/detect/detect", {"file_id": a}, format="json")
+        r2 = self.client.post("/api/detect/detect", {"file_id": b}, format="json")
+
+        self.assertEqual(r1.status_code, 200)
+        self.assertEqual(r2.status_code, 200)
+        self.assertEqual(call.call_count, 1)
+        self.assertEqual(Detection.objects.count(), 2)
+        self.assertEqual(r2.json()["total_objects"], 1)
+
+    @mock.patch.object(cache, "call_inference", return_value=FAKE_RESULT)
+    def test_db_tier_survives_lru_eviction(self, call):
+        path = os.path.join(self.media, "uploads", self.put_upload())
+        cache.cached_inference(path)
+        cache._lru.clear()
+        result = cache.cached_inference(path)
+
+        self.assertTrue(result["cached"])
+        self.assertEqual(call.call_count, 1)
+
+    @mock.patch.object(cache, "call_inference")
+    def test_model_version_is_part_of_key(self, call):
+        call.side_effect = lambda **_: dict(FAKE_RESULT, model_version=self.config["model_version"])
+        path = os.path.join(self.media, "uploads", self.put_upload())
+        cache.cached_inference(path)
+
+        self.config = dict(FAKE_CONFIG, model_version="2.0")
+        result = cache.cached_inference(path)
+
+        self.assertNotIn("cached", result)
+        self.assertEqual(call.call_count, 2)
+
+    @mock.patch.object(cache, "call_inference", return_value=FAKE_RESULT)
+    def test_backend_is_part_of_key(self, call):
+        path = os.path.join(self.media, "uploads", self.put_upload())
+        cache.cached_inference(path)
+        self.assertIn("cached", cache.cached_inference(path))
+
+        self.config = dict(FAKE_CONFIG, backend="onnx")   # versi sama, runtime lain
+        self.assertNotIn("cached", cache.cached_inference(path))
+        self.assertEqual(call.call_count, 2)
+
+    @mock.patch.object(cache, "call_inference", return_value=FAKE_RESULT)
+    def test_preresize_is_part_of_key(self, call):
+        path = os.path.join(self.media, "uploads", self.put_upload())
+        cache.cached_inference(path)
+        for side in (640, 1280):
+            with mock.patch.object(preprocess, "PRERESIZE", True), \
+                    mock.patch.object(preprocess, "PRERESIZE_SIDE", side):
+                self.assertNotIn("cached", cache.cached_inference(path))
+                self.assertIn("cached", cache.cached_inference(path))
+        self.assertIn("cached", cache.cached_inference(path))
+        self.assertEqual(call.call_count, 3)
+
+    @mock.patch.object(jobs, "JOB_EMBEDDED", False)   # ?async=1 tanpa thread worker yang hidup melewati test
+    @mock.patch.object(cache, "call_inference", return_value=FAKE_RESULT)
+    def test_tiled_results_are_cached_separately(self, call):
+        file_id = self.put_upload()
+        for body in ({}, {"tiled": True}, {"tiled": True}):
+            r = self.client.post("/api/detect/detect", dict(body, file_id=file_id), format="json")
+            self.assertEqual(r.status_code, 200)
+        self.assertEqual(call.call_count, 2)
+        self.assertEqual([c.kwargs["tiled"] for c in call.call_args_list], [False, True])
+
+        job = self.client.post("/api/detect/detect?async=1&tiled=1", {"file_id": file_id}, format="json").json()
+        self.assertTrue(job["tiled"])
+        self.assertTrue(DetectionJob.objects.get(id=job["job_id"]).tiled)
+
+    def test_invalidate_drops_other_versions(self):
+        InferenceCacheEntry.objects.create(key="a" * 64, model_version="1.0", result={})
+        InferenceCacheEntry.objects.create(key="b" * 64, model_version="2.0", result={})
+        cache.invalidate(keep_version="2.0")
+        self.assertEqual(list(InferenceCacheEntry.objects.values_list("model_version", flat=True)), ["2.0"])
+
+
+class DetectJobTests(DetectTestCase):
+    def setUp(self):
+        super().setUp()
+        p = mock.patch.object(jobs, "JOB_EMBEDDED", False)
+        p.start()
+        self.addCleanup(p.stop)
+        p = mock.patch.object(cache, "CACHE_ENABLED", False)
+        p.start()
+        self.addCleanup(p.stop)
+
+    @mock.patch.object(cache, "call_inference", return_value=FAKE_RESULT)
+    def test_async_detect_returns_job_then_completes(self, _):
+        file_id = self.put_upload()
+        r = self.client.post("/api/detect/detect", {"file_id": file_id, "async": True}, format="json")
+        self.assertEqual(r.status_code, 202)
+        self.assertEqual(r.json()["status"], "queued")
+        self.assertEqual(r.json()["queue_depth"]["queued"], 1)
+
+        self.assertEqual(jobs.run_pending(), 1)
+
+        r = self.client.get(f"/api/detect/jobs/{r.json()['job_id']}")
+        self.assertEqual(r.json()["status"], "done")
+        self.assertEqual(r.json()["detection"]["total_objects"], 1)
+
+    @mock.patch.object(cache, "call_inference")
+    def test_inference_5xx_is_retried(self, call):
+        resp = requests.Response()
+        resp.status_code = 503
+        call.side_effect = [requests.HTTPError(response=resp), FAKE_RESULT]
+        job = jobs.enqueue(self.put_upload())
+
+        jobs.run_pending()
+        job.refresh_from_db()
+        self.assertEqual(job.status, DetectionJob.QUEUED)
+        self.assertEqual(job.attempts, 1)
+
+        DetectionJob.objects.filter(id=job.id).update(run_after=timezone.now())
+        jobs.run_pending()
+        job.refresh_from_db()
+        self.assertEqual(job.status, DetectionJob.DONE)
+        self.assertEqual(job.attempts, 2)
+
+    @mock.patch.object(cache, "call_inference")
+    def test_client_error_is_not_retried(self, call):
+        resp = requests.Response()
+        resp.status_code = 415
+        call.side_effect = requests.HTTPError(response=resp)
+        job = jobs.enqueue(self.put_upload())
+
+        jobs.run_pending()
+        job.refresh_from_db()
+        self.assertEqual(job.status, DetectionJob.FAILED)
+
+    def test_long_poll_does_not_hold_a_sync_worker(self):
+        job = jobs.enqueue(self.put_upload())
+        t0 = time.monotonic()
+        r = self.client.get(f"/api/detect/jobs/{job.id}?wait=30")
+        self.assertLess(time.monotonic() - t0, 1.0)   # JOB_WAIT_MAX_SYNC=0 → langsung balas
+        self.assertEqual(r.json()["status"], "queued")
+        self.assertEqual(self.client.get(f"/api/detect/jobs/{uuid.uuid4()}").status_code, 404)
+
+    def test_embedded_worker_starts_at_boot(self):
+        with mock.patch.object(jobs.pool, "start") as start:
+            jobs.start_embedded()                 # JOB_EMBEDDED=False (setUp)
+            start.assert_not_called()
+            with mock.patch.object(jobs, "JOB_EMBEDDED", True):
+                jobs.start_embedded()
+            start.assert_called_once_with()
+
+
+class DetectBatchTests(DetectTestCase):
+    def setUp(self):
+        super().setUp()
+        p = mock.patch.object(cache, "CACHE_ENABLED", False)
+        p.start()
+        self.addCleanup(p.stop)
+
+    @mock.patch.object(pipeline, "call_inference_batch")
+    def test_batch_persists_and_reports_per_file(self, call):
+        call.side_effect = lambda paths: {
+            "model_version": "1.0",
+            "pod_id": "stub",
+            "results": [{"index": i, "items": FAKE_RESULT["items"]} for i in range(len(paths))],
+        }
+        ids = [self.put_upload(f"f{i}.jpg", make_image(color=(i, i, i))) for i in range(3)]
+
+        with mock.patch.object(pipeline, "BATCH_CHUNK", 2):
+            r = self.client.post("/api/detect/detect/batch",
+                                 {"file_ids": ids + ["missing.jpg"]}, format="json")
+
+        body = r.json()
+        self.assertEqual(r.status_code, 200)
+        self.assertEqual(call.call_count, 2)
+        self.assertEqual(body["succeeded"], 3)
+        self.assertEqual(body["results"][3]["status_code"], 404)
+        self.assertEqual(Detection.objects.count(), 3)
+        self.assertEqual(DetectionItem.objects.count(), 3)
+        self.assertTrue(all(d.annotated_url for d in Detection.objects.all()))
+
+    @mock.patch.object(pipeline, "call_inference_batch")
+    def test_chunk_failure_only_fails_that_chunk(self, call):
+        ok = {"model_version": "1.0", "pod_id": "stub",
+              "results": [{"index": 0, "items": []}, {"index": 1, "status_code": 400, "error": "invalid image"}]}
+        call.side_effect = [ok, requests.ConnectionError()]
+        ids = [self.put_upload(f"f{i}.jpg") for i in range(3)]
+
+        with mock.patch.object(pipeline, "BATCH_CHUNK", 2), mock.patch.object(pipeline, "BATCH_CONCURRENCY", 1):
+            body = self.client.post("/api/detect/detect/batch", {"file_ids": ids}, format="json").json()
+
+        self.assertEqual([("detection" in r) for r in body["results"]], [True, False, False])
+        self.assertEqual(body["results"][1]["status_code"], 400)
+        self.assertEqual(body["results"][2]["status_code"], 502)
+
+
+class InferenceClientTests(TestCase):
+    def setUp(self):
+        self.stub = StubInferenceServer(pod_id="stub-a").start()
+        self.addCleanup(self.stub.stop)
+
+    def test_keep_alive_connection_is_reused(self):
+        client = InferenceClient(self.stub.url, pool_size=2)
+        for _ in range(3):
+            self.assertEqual(client.post_image(data=make_image())["pod_id"], "stub-a")
+
+        stats = client.stats()
+        self.assertEqual(stats["calls"], 3)
+        self.assertEqual(stats["connections_opened"], 1)
+        self.assertEqual(stats["connections_reused"], 2)
+
+    def test_connect_errors_are_retried_then_raised(self):
+        self.stub.stop()
+        client = InferenceClient(self.stub.url, retries=2, backoff=0)
+        with self.assertRaises(requests.ConnectionError):
+            client.post_image(data=make_image())
+        self.assertEqual(client.stats()["errors"], 1)
+
+
+class BalancedClientTests(DetectTestCase):
+    def setUp(self):
+        super().setUp()
+        self.a = StubInferenceServer(pod_id="stub-a").start()
+        self.b = StubInferenceServer(pod_id="stub-b").start()
+        self.addCleanup(self.a.stop)
+        self.addCleanup(self.b.stop)
+        self.lb = BalancedInferenceClient([self.a.url, self.b.url], health_interval=0,
+                                          cb_failures=2, cb_cooldown=60, backoff=0)
+
+    def test_least_outstanding_and_round_robin(self):
+        pods = [self.lb.post_image(data=b"x")["pod_id"] for _ in range(4)]
+        self.assertEqual(sorted(pods), ["stub-a", "stub-a", "stub-b", "stub-b"])
+
+        self.lb.replicas[0].in_flight = 5   # replica a sedang sibuk
+        pods = {self.lb.post_image(data=b"x")["pod_id"] for _ in range(3)}
+        self.assertEqual(pods, {"stub-b"})
+
+    def test_failing_replica_is_ejected(self):
+        self.a.fail_status = 500
+        pods = [self.lb.post_image(data=b"x")["pod_id"] for _ in range(6)]
+        self.assertEqual(set(pods), {"stub-b"})   # failover, tidak ada error ke caller
+        self.assertEqual(self.lb.stats()["replicas"][0]["circuit"], "open")
+        self.assertEqual(self.a.hits["/infer"], 2)   # setelah 2 gagal tidak dicoba lagi
+
+    def test_unhealthy_replica_is_skipped(self):
+        self.b.healthy = False
+        self.lb.check_health()
+        pods = {self.lb.post_image(data=b"x")["pod_id"] for _ in range(3)}
+        self.assertEqual(pods, {"stub-a"})
+
+    def test_client_errors_do_not_eject(self):
+        self.a.fail_status = self.b.fail_status = 415
+        for _ in range(3):
+            with self.assertRaises(requests.HTTPError):
+                self.lb.post_image(data=b"x")
+        self.assertTrue(all(r["circuit"] == "closed" for r in self.lb.stats()["replicas"]))
+
+    def test_serving_pod_is_recorded_on_detection(self):
+        self.a.stop()
+        with mock.patch.object(cache, "CACHE_ENABLED", False), \
+                mock.patch("detect_svc.services.inference_client", return_value=self.lb):
+            r = self.client.post("/api/detect/detect", {"file_id": self.put_upload()}, format="json")
+        self.assertEqual(r.status_code, 200)
+        self.assertEqual(r.json()["pod_id"], "stub-b")
+
+
+class _InlineExecutor:
+    def submit(self, fn, *args):
+        fn(*args)
+
+
+class AnnotationTests(DetectTestCase):
+    def test_font_and_label_are_rendered_once(self):
+        from . import services
+
+        services._font.cache_clear()
+        services._label_mask.cache_clear()
+        img = Image.new("RGB", (200, 100))
+        for _ in range(3):
+            services.render_annotations(img, FAKE_RESULT["items"])
+        self.assertEqual(services._font.cache_info().misses, 1)
+        self.assertEqual(services._label_mask.cache_info().hits, 2)
+
+    def test_label_composite_stays_inside_label(self):
+        from . import services
+
+        img = services.render_annotations(Image.new("RGB", (200, 200), (0, 0, 0)), [
+            {"klass": "Safety helmet", "confidence": 0.9, "x": 50, "y": 100, "w": 40, "h": 40},
+        ])
+        self.assertEqual(img.getpixel((150, 20)), (0, 0, 0))     # jauh dari box: tidak tersentuh
+        self.assertEqual(img.getpixel((50, 120)), (0, 255, 255))  # garis bbox
+
+    @mock.patch.object(cache, "CACHE_ENABLED", False)
+    @mock.patch.object(cache, "call_inference", return_value=FAKE_RESULT)
+    def test_background_mode_fills_annotated_url_after_response(self, _):
+        with mock.patch.object(pipeline, "ANNOTATE_MODE", "background"), \
+                mock.patch.object(pipeline, "annotation_pool", return_value=_InlineExecutor()), \
+                self.captureOnCommitCallbacks(execute=True) as callbacks:
+            r = self.client.post("/api/detect/detect", {"file_id": self.put_upload()}, format="json")
+
+        self.assertIsNone(r.json()["annotated_url"])
+        self.assertEqual(len(callbacks), 2)   # annotate + bangunkan live feed
+        self.assertIn(feed.notify, callbacks)
+        det = self.client.get(f"/api/detect/results/{r.json()['id']}").json()
+        self.assertTrue(det["annotated_url"].startswith("/media/annotated/"))
+
+
+class VariantTests(DetectTestCase):
+    @mock.patch.object(cache, "CACHE_ENABLED", False)
+    def test_variants_are_content_hashed_and_exposed(self):
+        file_id = self.put_upload(data=make_image((2000, 1000)))
+        with mock.patch.object(cache, "call_inference", return_value=FAKE_RESULT):
+            det = self.client.post("/api/detect/detect", {"file_id": file_id}, format="json").json()
+        urls = det["variants"]
+        self.assertEqual(set(urls), {"thumb", "medium"})
+        for name, side in (("thumb", 320), ("medium", 1280)):
+            path = os.path.join(self.media, urls[name][len("/media/"):])
+            with open(path, "rb") as f:
+                data = f.read()
+            self.assertTrue(os.path.basename(path).startswith(hashlib.sha256(data).hexdigest()[:32]))
+            im = Image.open(io.BytesIO(data))
+            self.assertEqual((im.format, max(im.size)), ("WEBP", side))
+        self.assertEqual(self.client.get("/api/detect/results").json()["results"][0]["variants"], urls)
+        self.assertEqual(self.client.get("/api/detect/summary").json()["latest"][0]["variants"], urls)
+
+        # tanpa box: varian dari upload; isi sama → file (dan URL) sama
+        empty = dict(FAKE_RESULT, items=[])
+        with mock.patch.object(cache, "call_inference", return_value=empty):
+            a = pipeline.run_detection(file_id)
+            b = pipeline.run_detection(file_id)
+        self.assertIsNone(a.annotated_url)
+        self.assertEqual(a.variants, b.variants)
+        self.assertNotEqual(a.variants, urls)
+        self.assertEqual(len(os.listdir(os.path.join(self.media, "variants"))), 4)
+
+    def test_build_variants_backfills_old_detections(self):
+        file_id = self.put_upload()
+        old = Detection.objects.create(filename="a.jpg", file_url="/media/uploads/" + file_id)
+        gone = Detection.objects.create(filename="b.jpg", file_url="/media/uploads/missing.jpg")
+        call_command("build_variants", stdout=io.StringIO())
+        old.refresh_from_db()
+        gone.refresh_from_db()
+        self.assertEqual(set(old.variants), {"thumb", "medium"})
+        self.assertEqual(gone.variants, {})
+
+
+class RollupTests(DetectTestCase):
+    TWO_ITEMS = dict(FAKE_RESULT, items=[
+        {"klass": "Safety helmet", "confidence": 0.8, "x": 1, "y": 2, "w": 10, "h": 12},
+        {"klass": "Hand gloves", "confidence": 0.6, "x": 5, "y": 5, "w": 8, "h": 8},
+    ])
+
+    @mock.patch.object(cache, "CACHE_ENABLED", False)
+    def test_detect_increments_rollup(self):
+        with mock.patch.object(cache, "call_inference", return_value=self.TWO_ITEMS):
+            for i in range(2):
+                self.client.post("/api/detect/detect", {"file_id": self.put_upload(f"{i}.jpg")}, format="json")
+
+        day = DailySummary.objects.get(day=timezone.localdate())
+        self.assertEqual((day.images, day.total_objects), (2, 4))
+        self.assertEqual(dict(DailyClassCount.objects.values_list("klass", "count")),
+                         {"Safety helmet": 2, "Hand gloves": 2})
+
+    def test_summary_matches_raw_queries(self):
+        now = timezone.now()
+        for age, result in ((0, FAKE_RESULT), (0, self.TWO_ITEMS), (3, self.TWO_ITEMS), (20, FAKE_RESULT)):
+            det, rows = pipeline.build_detection("x.jpg", result)
+            det.save()
+            DetectionItem.objects.bulk_create(rows)
+            Detection.objects.filter(id=det.id).update(created_at=now - timedelta(days=age))
+        rollup.rebuild()
+
+        for days in (1, 7, 30):
+            fast = self.client.get(f"/api/detect/summary?days={days}").json()
+            raw = rollup.raw_summary(days)
+            self.assertEqual(fast["total_images"], raw["total_images"])
+            self.assertEqual(fast["total_objects"], raw["total_objects"])
+            self.assertAlmostEqual(fast["avg_conf"], raw["avg_conf"], places=3)
+            self.assertEqual(fast["series"], raw["series"])
+            self.assertEqual(sorted(fast["by_class"], key=str), sorted(raw["by_class"], key=str))
+        self.assertEqual(fast["total_images"], 4)
+
+
+    def test_delete_keeps_summary_in_sync(self):
+        dets = []
+        for storage_mode, result in (("rows", FAKE_RESULT), ("rows", self.TWO_ITEMS),
+                                     ("packed", self.TWO_ITEMS), ("packed", FAKE_RESULT)):
+            with mock.patch.object(pipeline, "DETECTION_STORAGE", storage_mode):
+                det, rows = pipeline.build_detection("x.jpg", result)
+            det.save()
+            DetectionItem.objects.bulk_create(rows)
+            rollup.record([(det, columns.class_confidences(result))])
+            dets.append(det)
+
+        dets[1].delete()                                         # rows, CASCADE ke DetectionItem
+        Detection.objects.filter(id__in=[dets[2].id]).delete()   # packed, queryset (admin)
+
+        fast, raw = rollup.summary(7), rollup.raw_summary(7)
+        self.assertEqual((fast["total_images"], fast["total_objects"]), (2, 2))
+        for k in ("total_images", "total_objects", "avg_conf", "series", "by_class"):
+            self.assertEqual(fast[k], raw[k], k)
+        self.assertEqual(fast["by_class"], [{"klass": "Safety helmet", "count": 2}])
+
+
+class ResultsListTests(DetectTestCase):
+    def make(self, n, klass="Safety helmet", model_version="1.0", age_days=0):
+        now = timezone.now()
+        for _ in range(n):
+            result = dict(FAKE_RESULT, model_version=model_version,
+                          items=[dict(FAKE_RESULT["items"][0], klass=klass)] * 2)
+            det, rows = pipeline.build_detection("x.jpg", result)
+            det.save()
+            DetectionItem.objects.bulk_create(rows)
+            Detection.objects.filter(id=det.id).update(created_at=now - timedelta(days=age_days))
+
+    def test_cursor_pages_are_complete_and_slim(self):
+        self.make(7)
+        seen, url = [], "/api/detect/results?page_size=3"
+        while url:
+            with self.assertNumQueries(1):
+                body = self.client.get(url).json()
+            self.assertNotIn("items", body["results"][0])
+            seen += [r["id"] for r in body["results"]]
+            url = body["next"]
+        self.assertEqual(len(seen), 7)
+        self.assertEqual(len(set(seen)), 7)
+
+        detail = self.client.get(f"/api/detect/results/{seen[0]}").json()
+        self.assertEqual(len(detail["items"]), 2)
+
+    def test_filters(self):
+        self.make(2, klass="Hand gloves", model_version="2.0")
+        self.make(3, age_days=10)
+
+        def count(q):
+            return len(self.client.get(f"/api/detect/results?{q}").json()["results"])
+
+        self.assertEqual(count("klass=Hand%20gloves"), 2)
+        self.assertEqual(count("model_version=1.0"), 3)
+        since = (timezone.localdate() - timedelta(days=1)).isoformat()
+        self.assertEqual(count(f"from={since}"), 2)
+        self.assertEqual(count(f"to={since}"), 3)
+        self.assertEqual(self.client.get("/api/detect/results?from=kemarin").status_code, 400)
+        for bad in ("2024-02-30", "2024-01-01T25:00:00"):
+            r = self.client.get(f"/api/detect/results?from={bad}")
+            self.assertEqual((r.status_code, r.json()["detail"]), (400, "from: invalid date or datetime"))
+
+
+class QueryPlanTests(DetectTestCase):
+    """
+    EXPLAIN query yang dijalankan endpoint panas: tabel detection/item tidak
+    boleh di-scan penuh atau di-sort tanpa index (SQLite dan Postgres).
+    """
+    IMAGES, DAYS = 3000, 60
+    BIG_TABLES = ("detections_detection", "detections_detectionitem")
+
+    @classmethod
+    def setUpTestData(cls):
+        klasses = ["Safety helmet", "Hand gloves", "No safety glasses", "Wearpack"]
+        dets, rows = [], []
+        for i in range(cls.IMAGES):
+            det = Detection(filename=f"{i}.jpg", file_url=f"/media/uploads/{i}.jpg",
+                            model_version="1.0" if i % 3 else "2.0", total_objects=3, avg_conf=0.5)
+            dets.append(det)
+            rows += [DetectionItem(detection=det, klass=klasses[(i + k) % 4], confidence=0.5,
+                                   x=0, y=0, w=5, h=5) for k in range(3)]
+        Detection.objects.bulk_create(dets, batch_size=1000)
+        DetectionItem.objects.bulk_create(rows, batch_size=1000)
+        now = timezone.now()
+        per_day = cls.IMAGES // cls.DAYS
+        for d in range(cls.DAYS):
+            ids = [det.id for det in dets[d * per_day:(d + 1) * per_day]]
+            Detection.objects.filter(id__in=ids).update(created_at=now - timedelta(days=d))
+        rollup.rebuild()
+        with connection.cursor() as c:
+            c.execute("ANALYZE")
+
+    def plan(self, sql):
+        with connection.cursor() as c:
+            c.execute(f"{connection.ops.explain_query_prefix()} {sql}")
+            return "\n".join(" ".join(map(str, row)) for row in c.fetchall())
+
+    def assertIndexed(self, url, sorted_by_index=False):
+        with CaptureQueriesContext(connection) as ctx:
+            self.assertEqual(self.client.get(url).status_code, 200)
+        checked = 0
+        for q in ctx.captured_queries:
+            sql = q["sql"]
+            if not any(t in sql for t in self.BIG_TABLES):
+                continue
+            plan = self.plan(sql)
+            checked += 1
+            for table in self.BIG_TABLES:
+                full_scan = re.search(rf"(SCAN {table}$|SCAN {table} (?!USING)|Seq Scan on {table}\b)",
+                                      plan, re.M)
+                self.assertIsNone(full_scan, f"full scan {table}:\n{sql}\n{plan}")
+            if sorted_by_index and "ORDER BY" in sql:
+                self.assertNotRegex(plan, r"TEMP B-TREE FOR ORDER BY|\bSort\b", f"{sql}\n{plan}")
+        self.assertGreater(checked, 0)
+
+    def test_results_list_uses_index(self):
+        first = self.client.get("/api/detect/results?page_size=20").json()
+        self.assertIndexed("/api/detect/results?page_size=20", sorted_by_index=True)
+        self.assertIndexed(first["next"].split("testserver", 1)[1], sorted_by_index=True)
+        self.assertIndexed("/api/detect/results?klass=Hand%20gloves", sorted_by_index=True)
+        self.assertIndexed("/api/detect/results?model_version=2.0", sorted_by_index=True)
+        since = (timezone.localdate() - timedelta(days=3)).isoformat()
+        self.assertIndexed(f"/api/detect/results?from={since}", sorted_by_index=True)
+
+    def test_result_detail_uses_index(self):
+        det = Detection.objects.order_by("-created_at").first()
+        self.assertIndexed(f"/api/detect/results/{det.id}")
+
+    def test_summary_uses_index(self):
+        for days in (1, 30, 90):
+            self.assertIndexed(f"/api/detect/summary?days={days}")
+
+
+class PackedStorageTests(DetectTestCase):
+    ITEMS = [
+        {"klass": "Safety helmet", "confidence": 0.9, "x": 1, "y": 2, "w": 10, "h": 12},
+        {"klass": "Hand gloves", "confidence": 0.25, "x": 300, "y": 40, "w": 7, "h": 9},
+        {"klass": "Safety helmet", "confidence": 0.5, "x": 0, "y": 0, "w": 1920, "h": 1080},
+    ]
+
+    def setUp(self):
+        super().setUp()
+        p = mock.patch.object(pipeline, "DETECTION_STORAGE", "packed")
+        p.start()
+        self.addCleanup(p.stop)
+        p = mock.patch.object(cache, "CACHE_ENABLED", False)
+        p.start()
+        self.addCleanup(p.stop)
+
+    def test_round_trip(self):
+        blob, classes = packing.pack(self.ITEMS)
+        self.assertEqual(len(blob), packing.RECORD.size * 3)
+        self.assertEqual(packing.class_table(classes), ["Safety helmet", "Hand gloves"])
+        out = packing.unpack(blob, classes)
+        self.assertEqual([{k: v for k, v in o.items() if k != "id"} for o in out], self.ITEMS)
+
+    def test_api_shape_matches_row_storage(self):
+        result = dict(FAKE_RESULT, items=self.ITEMS)
+        with mock.patch.object(cache, "call_inference", return_value=result):
+            body = self.client.post("/api/detect/detect", {"file_id": self.put_upload()}, format="json").json()
+
+        self.assertEqual(DetectionItem.objects.count(), 0)
+        detail = self.client.get(f"/api/detect/results/{body['id']}").json()
+        self.assertEqual(detail["items"], body["items"])
+        self.assertEqual([i["klass"] for i in detail["items"]], [i["klass"] for i in self.ITEMS])
+        self.assertEqual(len({i["id"] for i in detail["items"]}), 3)
+        self.assertEqual(len(self.client.get("/api/detect/results?klass=Hand%20gloves").json()["results"]), 1)
+        self.assertEqual(self.client.get("/api/detect/results?klass=Hand").json()["results"], [])
+
+        rollup.rebuild()
+        self.assertEqual(rollup.summary(1)["by_class"], rollup.raw_summary(1)["by_class"])
+        self.assertEqual(rollup.summary(1)["by_class"][0], {"klass": "Safety helmet", "count": 2})
+
+    def test_pack_command_migrates_both_ways(self):
+        with mock.patch.object(pipeline, "DETECTION_STORAGE", "rows"):
+            det, rows = pipeline.build_detection("x.jpg", dict(FAKE_RESULT, items=self.ITEMS))
+            det.save()
+            DetectionItem.objects.bulk_create(rows)
+        before = self.client.get(f"/api/detect/results/{det.id}").json()["items"]
+
+        call_command("pack_detections", stdout=io.StringIO())
+        det.refresh_from_db()
+        self.assertIsNotNone(det.boxes)
+        self.assertEqual(DetectionItem.objects.count(), 0)
+        packed = self.client.get(f"/api/detect/results/{det.id}").json()["items"]
+        strip = lambda items: [{k: v for k, v in i.items() if k != "id"} for i in items]
+        self.assertEqual(strip(packed), strip(before))
+
+        call_command("pack_detections", "--unpack", stdout=io.StringIO())
+        self.assertEqual(DetectionItem.objects.count(), 3)
+        self.assertEqual(strip(self.client.get(f"/api/detect/results/{det.id}").json()["items"]),
+                         strip(before))
+
+
+class ColumnarResultTests(DetectTestCase):
+    ITEMS = PackedStorageTests.ITEMS
+
+    def setUp(self):
+        super().setUp()
+        self.stub = StubInferenceServer(items=self.ITEMS).start()
+        self.addCleanup(self.stub.stop)
+        for p in (mock.patch.object(cache, "CACHE_ENABLED", False),
+                  mock.patch("detect_svc.services.inference_client",
+                             return_value=InferenceClient(self.stub.url))):
+            p.start()
+            self.addCleanup(p.stop)
+
+    def detect(self):
+        r = self.client.post("/api/detect/detect", {"file_id": self.put_upload()}, format="json")
+        self.assertEqual(r.status_code, 200)
+        return [{k: v for k, v in i.items() if k != "id"} for i in r.json()["items"]]
+
+    def test_columns_and_items_store_the_same_rows(self):
+        self.assertIn("boxes", services.call_inference(data=b"x"))
+        columnar = self.detect()
+        self.stub.columns = False   # inference versi lama: ?format diabaikan
+        self.assertIn("items", services.call_inference(data=b"x"))
+        self.assertEqual(self.detect(), columnar)
+        self.assertCountEqual(columnar, self.ITEMS)
+
+        det = Detection.objects.first()
+        self.assertEqual(det.total_objects, 3)
+        self.assertAlmostEqual(det.avg_conf, 0.55)
+        self.assertEqual(DailyClassCount.objects.get(klass="Safety helmet").count, 4)
+
+        out = pipeline.run_detection_batch([self.put_upload("b.jpg")])
+        self.assertEqual(out[0]["detection"].items.count(), 3)
+
+    def test_packed_and_rescale_from_columns(self):
+        with mock.patch.object(pipeline, "DETECTION_STORAGE", "packed"):
+            det, rows = pipeline.build_detection("x.jpg", {"boxes": to_columns(self.ITEMS)})
+        self.assertEqual(rows, [])
+        self.assertEqual((det.boxes, det.box_classes), packing.pack(self.ITEMS))
+
+        factors = (2.5, 2.0, 4000, 2000)
+        items = preprocess.rescale({"items": [dict(i) for i in self.ITEMS]}, factors)["items"]
+        boxes = preprocess.rescale({"boxes": to_columns(self.ITEMS)}, factors)["boxes"]
+        for k in ("x", "y", "w", "h"):
+            self.assertEqual(boxes[k], [i[k] for i in items])
+
+
+class UploadTests(DetectTestCase):
+    def upload(self, url, data, name="a.jpg", content_type="image/jpeg"):
+        return self.client.post(url, {"file": SimpleUploadedFile(name, data, content_type=content_type)},
+                                format="multipart")
+
+    def stored(self):
+        return sorted(os.listdir(os.path.join(self.media, "uploads")))
+
+    def test_identical_content_is_stored_once(self):
+        data = make_image()
+        first = self.upload("/api/detect/upload", data).json()
+        second = self.upload("/api/detect/upload", data, name="other.jpg").json()
+        third = self.upload("/api/detect/upload", make_image(color=(1, 2, 3))).json()
+
+        self.assertEqual(first["file_id"], second["file_id"])
+        self.assertEqual((first["duplicate"], second["duplicate"]), (False, True))
+        self.assertNotEqual(first["file_id"], third["file_id"])   # nama sama, isi beda
+        self.assertEqual(self.stored(), sorted([first["file_id"], third["file_id"]]))
+        with open(os.path.join(self.media, "uploads", first["file_id"]), "rb") as f:
+            self.assertEqual(f.read(), data)
+
+    def test_rejected_upload_leaves_no_temp_file(self):
+        self.assertEqual(self.upload("/api/detect/upload", b"GIF89a", content_type="image/gif").status_code, 415)
+        with mock.patch.object(storage, "MAX_UPLOAD_BYTES", 100):
+            self.assertEqual(self.upload("/api/detect/upload", make_image()).status_code, 413)
+        self.assertEqual(os.listdir(os.path.join(self.media, ".tmp")), [])
+        self.assertFalse(os.path.exists(os.path.join(self.media, "uploads")))
+
+    def test_temp_file_is_not_addressable_as_file_id(self):
+        seen = []
+        commit = storage.commit
+
+        def check_then_commit(upload, *args):
+            tmp = upload.temporary_file_path()
+            r = self.client.post("/api/detect/detect", {"file_id": os.path.basename(tmp)}, format="json")
+            seen.append((os.path.dirname(tmp), r.status_code))
+            return commit(upload, *args)
+
+        with mock.patch.object(storage, "commit", side_effect=check_then_commit):
+            self.assertEqual(self.upload("/api/detect/upload", make_image()).status_code, 200)
+        self.assertEqual(seen, [(os.path.join(self.media, ".tmp"), 404)])
+        self.assertEqual(os.listdir(os.path.join(self.media, ".tmp")), [])
+
+    @mock.patch.object(cache, "CACHE_ENABLED", False)
+    def test_upload_detect_streams_bytes_to_inference(self):
+        stub = StubInferenceServer(pod_id="stub-a").start()
+        self.addCleanup(stub.stop)
+        data = make_image(size=(640, 480))
+        with mock.patch("detect_svc.services.inference_client", return_value=InferenceClient(stub.url)):
+            r = self.upload("/api/detect/upload-detect", data, name="site.jpg")
+
+        body = r.json()
+        self.assertEqual(r.status_code, 200)
+        self.assertEqual((body["filename"], body["pod_id"], body["duplicate"]), ("site.jpg", "stub-a", False))
+        self.assertEqual(len(body["items"]), 1)
+        self.assertIn(data, stub.bodies[0])
+        self.assertEqual(self.stored(), [body["file_url"].rsplit("/", 1)[1]])
+
+    @mock.patch.object(cache, "CACHE_ENABLED", False)
+    @mock.patch.object(preprocess, "PRERESIZE", True)
+    def test_preresize_streams_only_images_sent_as_is(self):
+        stub = StubInferenceServer().start()
+        self.addCleanup(stub.stop)
+        small, large = make_image(size=(640, 480)), make_image(size=(1600, 1200))
+        with mock.patch("detect_svc.services.inference_client", return_value=InferenceClient(stub.url)), \
+                mock.patch.object(storage, "stream_inference", wraps=storage.stream_inference) as stream:
+            for data in (small, large):
+                self.assertEqual(self.upload("/api/detect/upload-detect", data).status_code, 200)
+
+        self.assertEqual(stream.call_count, 1)
+        self.assertIn(small, stub.bodies[0])
+        self.assertNotIn(large, stub.bodies[1])    # dikecilkan dulu setelah upload selesai
+
+
+class _RedBoxInference:
+    """Inference palsu: decode seperti inference asli, box = area merah di gambar."""
+
+    def __init__(self):
+        self.sent = []
+
+    def detect(self, data):
+        self.sent.append(len(data))
+        im = ImageOps.exif_transpose(Image.open(io.BytesIO(data))).convert("RGB")
+        r, g, _ = im.split()
+        mask = ImageChops.multiply(r.point(lambda v: 255 if v > 160 else 0),
+                                   g.point(lambda v: 255 if v < 90 else 0))
+        x1, y1, x2, y2 = mask.getbbox()
+        return {"klass": "Safety helmet", "confidence": 0.9, "x": x1, "y": y1, "w": x2 - x1, "h": y2 - y1}
+
+    def post_image(self, path="/infer", file_path=None, data=None, params=None):
+        if data is None:
+            with open(file_path, "rb") as f:
+                data = f.read()
+        return {"model_version": "1.0", "pod_id": "fake", "items": [self.detect(data)]}
+
+    def post_images(self, file_paths, path="/infer/batch", params=None):
+        results = []
+        for i, p in enumerate(file_paths):
+            if not isinstance(p, bytes):
+                with open(p, "rb") as f:
+                    p = f.read()
+            results.append({"index": i, "items": [self.detect(p)]})
+        return {"model_version": "1.0", "pod_id": "fake", "results": results}
+
+
+class PreResizeTests(TestCase):
+    BOX = (1200, 500, 1800, 1100)
+
+    def photo(self, orientation=1, size=(3000, 2000)):
+        im = Image.new("RGB", size, (70, 90, 110))
+        ImageDraw.Draw(im).rectangle(self.BOX, fill=(230, 20, 20))
+        exif = Image.Exif()
+        exif[0x0112] = orientation
+        buf = io.BytesIO()
+        im.save(buf, "JPEG", quality=95, exif=exif)
+        return buf.getvalue()
+
+    def infer(self, data, preresize):
+        fake = _RedBoxInference()
+        with mock.patch.object(services, "inference_client", return_value=fake), \
+                mock.patch.object(preprocess, "PRERESIZE", preresize):
+            item = services.call_inference(data=data)["items"][0]
+        return item, fake.sent[0]
+
+    def test_boxes_match_full_resolution_coordinates(self):
+        for orientation in (1, 6):
+            data = self.photo(orientation)
+            full, full_bytes = self.infer(data, False)
+            small, small_bytes = self.infer(data, True)
+            for k in ("x", "y", "w", "h"):
+                # skala 3000 → 640: 1 piksel kecil ≈ 4.7 piksel asli
+                self.assertAlmostEqual(small[k], full[k], delta=5, msg=f"orientation {orientation}: {k}")
+            self.assertLess(small_bytes, full_bytes / 5)
+
+    def test_tiled_skips_preresize(self):
+        data = self.photo()
+        fake = mock.Mock()
+        fake.post_image.return_value = dict(FAKE_RESULT)
+        with mock.patch.object(services, "inference_client", return_value=fake), \
+                mock.patch.object(preprocess, "PRERESIZE", True):
+            services.call_inference(data=data, tiled=True)
+        self.assertIs(fake.post_image.call_args.kwargs["data"], data)
+        self.assertEqual(fake.post_image.call_args.kwargs["params"]["tiled"], 1)
+
+    def test_small_upright_image_is_sent_unchanged(self):
+        data = make_image(size=(320, 240))
+        self.assertEqual(preprocess.shrink(data), (data, None))
+
+    def test_sent_as_is_reads_only_the_header(self):
+        small = make_image(size=(320, 240))
+        self.assertIsNone(preprocess.sent_as_is(small[:20]))
+        self.assertTrue(preprocess.sent_as_is(small[:len(small) // 2]))
+        self.assertFalse(preprocess.sent_as_is(self.photo()[:4096]))
+        self.assertFalse(preprocess.sent_as_is(self.photo(orientation=6, size=(320, 240))))
+
+    def test_batch_rescales_each_result(self):
+        tmp = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, tmp, ignore_errors=True)
+        paths = []
+        for i, size in enumerate([(3000, 2000), (2400, 1800)]):
+            paths.append(os.path.join(tmp, f"{i}.jpg"))
+            with open(paths[-1], "wb") as f:
+                f.write(self.photo(size=size))
+        fake = _RedBoxInference()
+        with mock.patch.object(services, "inference_client", return_value=fake), \
+                mock.patch.object(preprocess, "PRERESIZE", True):
+            results = services.call_inference_batch(paths)["results"]
+        for r in results:
+            box = r["items"][0]
+            self.assertAlmostEqual(box["x"], self.BOX[0], delta=8)
+            self.assertAlmostEqual(box["x"] + box["w"], self.BOX[2] + 1, delta=8)
+
+
+class IngestTests(DetectTestCase):
+    def setUp(self):
+        super().setUp()
+        self.fake = _RedBoxInference()
+        for target, attr, value in ((cache, "CACHE_ENABLED", False), (preprocess, "PRERESIZE", False),
+                                    (services, "inference_client", lambda: self.fake)):
+            p = mock.patch.object(target, attr, value)
+            p.start()
+            self.addCleanup(p.stop)
+
+    def frame(self, x):
+        im = Image.new("RGB", (320, 240), (70, 90, 110))
+        ImageDraw.Draw(im).rectangle((x, 60, x + 60, 140), fill=(230, 20, 20))
+        return im
+
+    def sample_video(self, n=40, fps=10):
+        """40 frame @10fps: box diam di x=40 (frame 0-19), lalu pindah ke x=200 (20-39)."""
+        import cv2
+        import numpy as np
+
+        path = os.path.join(self.media, "sample.avi")
+        out = cv2.VideoWriter(path, cv2.VideoWriter_fourcc(*"MJPG"), fps, (320, 240))
+        for i in range(n):
+            out.write(np.asarray(self.frame(40 if i < n // 2 else 200))[:, :, ::-1].copy())
+        out.release()
+        with open(path, "rb") as f:
+            return f.read()
+
+    def post_video(self, **params):
+        video = SimpleUploadedFile("cam1.avi", self.sample_video(), content_type="video/x-msvideo")
+        params.setdefault("async", 0)   # video default async (job)
+        return self.client.post("/api/detect/ingest", dict(params, file=video), format="multipart")
+
+    def test_video_near_duplicates_are_skipped(self):
+        body = self.post_video(sample_fps=10).json()
+
+        self.assertEqual(body["status"], "done")
+        self.assertEqual((body["frames_sampled"], body["frames_skipped"], body["frames_detected"]), (40, 38, 2))
+        self.assertEqual([d["frame_index"] for d in body["detections"]], [0, 20])
+        self.assertEqual([d["frame_ms"] for d in body["detections"]], [0, 2000])
+        self.assertEqual(Detection.objects.filter(session_id=body["session_id"]).count(), 2)
+        self.assertEqual(len(self.fake.sent), 2)
+        # box frame 20 ada di posisi baru
+        det = Detection.objects.get(session_id=body["session_id"], frame_index=20)
+        self.assertAlmostEqual(det.items.get().x, 200, delta=2)
+
+    def test_sampling_and_keyframes(self):
+        body = self.post_video(sample_fps=5).json()
+        self.assertEqual((body["frames_sampled"], body["frames_detected"]), (20, 2))
+
+        body = self.post_video(sample_fps=10, keyframe_every=5).json()
+        self.assertEqual([d["frame_index"] for d in body["detections"]], [0, 6, 12, 18, 20, 26, 32, 38])
+
+    def test_uploaded_frame_sequence(self):
+        ids = []
+        for i, x in enumerate([40, 40, 41, 200]):
+            buf = io.BytesIO()
+            self.frame(x).save(buf, "JPEG", quality=95)
+            ids.append(self.put_upload(f"f{i}.jpg", buf.getvalue()))
+
+        body = self.client.post("/api/detect/ingest", {"file_ids": ids}, format="json").json()
+        self.assertEqual(body["kind"], "frames")
+        self.assertEqual([d["frame_index"] for d in body["detections"]], [0, 3])
+
+        status = self.client.get(f"/api/detect/ingest/{body['session_id']}").json()
+        self.assertEqual(status["frames_detected"], 2)
+
+    @mock.patch.object(jobs, "JOB_EMBEDDED", False)
+    def test_async_ingest_is_a_job_that_resumes(self):
+        r = self.client.post("/api/detect/ingest?sample_fps=10", {"file": SimpleUploadedFile(
+            "cam1.avi", self.sample_video(), content_type="video/x-msvideo")}, format="multipart")
+        self.assertEqual(r.status_code, 202)   # video tanpa ?async → job
+        body = r.json()
+        self.assertEqual(body["status"], "running")
+        self.assertEqual(DetectionJob.objects.get(id=body["job_id"]).ingest_id, uuid.UUID(body["session_id"]))
+        self.assertEqual(jobs.run_pending(), 1)
+        status = self.client.get(f"/api/detect/ingest/{body['session_id']}").json()
+        self.assertEqual((status["status"], status["frames_detected"]), ("done", 2))
+
+        # worker mati setelah batch pertama (frame 0) tersimpan → job di-requeue dan dilanjutkan
+        self.fake.sent.clear()
+        video = self.put_upload("cam2.avi", self.sample_video())
+        session = IngestSession.objects.create(kind=IngestSession.VIDEO, source="cam2.avi", file_id=video,
+                                               sample_fps=10, resume_index=0, frames_sampled=1,
+                                               frames_detected=1)
+        job = jobs.enqueue_ingest(session)
+        DetectionJob.objects.filter(id=job.id).update(
+            status=DetectionJob.RUNNING, updated_at=timezone.now() - timedelta(seconds=jobs.JOB_STALE_AFTER + 1))
+        self.assertEqual(jobs.requeue_stale(), 1)
+        self.assertEqual(jobs.run_pending(), 1)
+        session.refresh_from_db()
+        self.assertEqual((session.status, session.frames_sampled, session.frames_skipped, session.frames_detected),
+                         (IngestSession.DONE, 40, 38, 2))
+        self.assertEqual(len(self.fake.sent), 1)   # hanya frame 20 yang diinferensi
+        self.assertEqual(list(session.detections.values_list("frame_index", flat=True)), [20])
+
+    def test_rejects_non_video(self):
+        r = self.client.post("/api/detect/ingest",
+                             {"file": SimpleUploadedFile("a.jpg", make_image(), content_type="image/jpeg")},
+                             format="multipart")
+        self.assertEqual(r.status_code, 415)
+
+
+class MetricsTests(DetectTestCase):
+    @mock.patch.object(cache, "CACHE_ENABLED", False)
+    def test_request_id_and_server_timing(self):
+        stub = StubInferenceServer(pod_id="stub-a").start()
+        self.addCleanup(stub.stop)
+        stub.server_timing = "decode;dur=2.0, forward;dur=15.5"
+        file_id = self.put_upload()
+        with mock.patch("detect_svc.services.inference_client", return_value=InferenceClient(stub.url)):
+            r = self.client.post("/api/detect/detect", {"file_id": file_id}, format="json",
+                                 HTTP_X_REQUEST_ID="req-123")
+
+        self.assertEqual(r.status_code, 200)
+        self.assertEqual(r["X-Request-ID"], "req-123")
+        self.assertEqual(stub.headers[0]["X-Request-ID"], "req-123")
+        timing = dict(metrics.parse_server_timing(r["Server-Timing"]))
+        for name in ("cache", "inference", "db", "annotate", "total"):
+            self.assertIn(name, timing)
+        self.assertAlmostEqual(timing["infer_forward"], 0.0155)
+        self.assertGreaterEqual(timing["total"], timing["inference"])
+
+        # id dari client yang formatnya aneh diganti
+        r = self.client.get("/api/detect/results", HTTP_X_REQUEST_ID="bad id!")
+        self.assertRegex(r["X-Request-ID"], r"^[0-9a-f]{32}$")
+
+    def test_metrics_endpoint(self):
+        route = "api/detect/results/<uuid:id>"
+        before = metrics.REQUESTS.value(method="GET", route=route, status=404)
+        self.client.get("/api/detect/results/00000000-0000-0000-0000-000000000000")
+        self.assertEqual(metrics.REQUESTS.value(method="GET", route=route, status=404), before + 1)
+
+        r = APIClient().get("/metrics")   # tanpa login (di-scrape langsung, bukan lewat /api/)
+        self.assertEqual(r.status_code, 200)
+        self.assertTrue(r["Content-Type"].startswith("text/plain; version=0.0.4"))
+        text = r.content.decode()
+        self.assertIn('gateway_requests_total{method="GET",route="%s",status="404"}' % route, text)
+        self.assertIn('gateway_request_seconds_bucket{method="GET",route="%s",le="+Inf"}' % route, text)
+        self.assertIn("# TYPE gateway_stage_seconds histogram", text)
+        self.assertIn("# TYPE gateway_inference_cache_events_total counter", text)   # rate() bisa dipakai
+
+    def test_multiprocess_render_sums_workers(self):
+        root = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, root, ignore_errors=True)
+        reg = metrics.Registry(multiproc_dir=root)
+        c = reg.counter("t_total", "test", ("k",))
+        h = reg.histogram("t_seconds", "test", buckets=(1.0,))
+        reg.gauge("t_depth", "test", lambda: 2)
+        with mock.patch.object(reg, "changed"):   # tanpa thread flush di test
+            c.inc(k="a")
+            h.observe(0.5)
+
+        dead = int(subprocess.run([sys.executable, "-c", "import os; print(os.getpid())"],
+                                  capture_output=True, text=True).stdout)
+        for pid, n in ((os.getppid(), 10), (dead, 100)):   # worker lain yang hidup dan yang sudah mati
+            with open(os.path.join(root, f"{pid}-1.json"), "w") as f:
+                json.dump({"pid": pid, "started": 1, "metrics": {
+                    "t_total": [[["a"], n]], "t_seconds": [[[], [1, 0.25, 1]]], "t_depth": [[[], 5]]}}, f)
+        reg.flush()   # snapshot proses sendiri tidak dihitung dua kali
+
+        samples = dict(line.rsplit(" ", 1) for line in reg.render().splitlines() if not line.startswith("#"))
+        self.assertEqual(samples['t_total{k="a"}'], "111")    # counter: termasuk worker yang sudah mati
+        self.assertEqual(samples['t_seconds_count'], "3")
+        self.assertEqual(samples['t_seconds_bucket{le="1.0"}'], "3")
+        self.assertEqual(samples['t_seconds_sum'], "1.0")
+        self.assertEqual(samples['t_depth'], "7")             # gauge: hanya proses yang masih hidup
+
+    def test_histogram_buckets_are_cumulative(self):
+        h = metrics.Histogram("t_seconds", "test", ("stage",), buckets=(0.1, 1.0))
+        for v in (0.05, 0.5, 5.0):
+            h.observe(v, stage="x")
+        samples = dict(h.samples())
+        self.assertEqual(samples['t_seconds_bucket{stage="x",le="0.1"}'], 1)
+        self.assertEqual(samples['t_seconds_bucket{stage="x",le="1.0"}'], 2)
+        self.assertEqual(samples['t_seconds_bucket{stage="x",le="+Inf"}'], 3)
+        self.assertAlmostEqual(samples['t_seconds_sum{stage="x"}'], 5.55)
+
+
+class AsyncDetectTests(DetectTestCase):
+    """detect lewat ASGI (GATEWAY_ASYNC=1, async_views.detect)."""
+
+    def setUp(self):
+        super().setUp()
+        from .management.commands.bench_detect import reload_urlconf
+
+        self.stub = StubInferenceServer(pod_id="stub-a", latency=0.3).start()
+        self.addCleanup(self.stub.stop)
+        self.addCleanup(reload_urlconf)
+        for p in (override_settings(GATEWAY_ASYNC=True),
+                  mock.patch.object(cache, "CACHE_ENABLED", False),
+                  mock.patch.object(jobs, "JOB_EMBEDDED", False),
+                  mock.patch("detect_svc.services.async_inference_client",
+                             return_value=AsyncInferenceClient(self.stub.url))):
+            p.enable() if hasattr(p, "enable") else p.start()
+            self.addCleanup(p.disable if hasattr(p, "disable") else p.stop)
+        reload_urlconf()
+        self.aclient = AsyncClient()
+        self.auth = {"Authorization": f"Bearer {AccessToken.for_user(self.user)}"}
+
+    def detect(self, body, path="/api/detect/detect", auth=True, **headers):
+        headers = dict(self.auth, **headers) if auth else headers
+        return async_to_sync(self.aclient.post)(path, body, content_type="application/json",
+                                                headers=headers)
+
+    def test_same_responses_as_sync_view(self):
+        file_id = self.put_upload()
+        r = self.detect({"file_id": file_id}, **{"X-Request-ID": "req-async"})
+        self.assertEqual(r.status_code, 200)
+        det = Detection.objects.get()
+        self.assertEqual(r.json(), DetectionSerializer(det).data)
+        self.assertEqual(det.items.count(), 1)
+        self.assertEqual(r["X-Request-ID"], "req-async")
+        self.assertEqual(self.stub.headers[0]["X-Request-ID"], "req-async")
+        timing = dict(metrics.parse_server_timing(r["Server-Timing"]))
+        for name in ("inference", "db", "total"):
+            self.assertIn(name, timing)
+
+        r = self.detect({"file_id": file_id}, auth=False)
+        self.assertEqual((r.status_code, r.json()["detail"]), (401, "Authentication credentials were not provided."))
+        self.assertEqual(self.detect({}).json(), {"detail": "file_id required"})
+        self.assertEqual(self.detect({"file_id": "nope.jpg"}).status_code, 404)
+
+        r = self.detect({"file_id": file_id}, path="/api/detect/detect?async=1")
+        self.assertEqual(r.status_code, 202)
+        self.assertEqual(DetectionJob.objects.get(id=r.json()["job_id"]).status, DetectionJob.QUEUED)
+
+        self.stub.fail_status = 500
+        r = self.detect({"file_id": file_id})
+        self.assertEqual(r.status_code, 500)
+        self.assertTrue(r.json()["detail"].startswith("inference error"))
+        self.stub.stop()
+        r = self.detect({"file_id": file_id})
+        self.assertEqual(r.json()["detail"], "inference backend unavailable: ConnectionError")
+        self.assertEqual(r.status_code, 502)
+
+    def test_job_long_poll_waits_for_completion(self):
+        job = jobs.enqueue(self.put_upload())
+        url = f"/api/detect/jobs/{job.id}?wait=10"
+
+        async def finish_later():
+            poll = asyncio.ensure_future(self.aclient.get(url, headers=self.auth))
+            await asyncio.sleep(0.5)
+            self.assertFalse(poll.done())
+            await sync_to_async(DetectionJob.objects.filter(id=job.id).update)(status=DetectionJob.DONE)
+            return await poll
+
+        t0 = time.monotonic()
+        r = async_to_sync(finish_later)()
+        self.assertLess(time.monotonic() - t0, 5.0)
+        self.assertEqual((r.status_code, r.json()["status"]), (200, "done"))
+        r = async_to_sync(self.aclient.get)(f"/api/detect/jobs/{uuid.uuid4()}", headers=self.auth)
+        self.assertEqual(r.status_code, 404)
+        r = async_to_sync(self.aclient.get)(url)
+        self.assertEqual(r.status_code, 401)
+
+    def test_db_connection_released_before_inference(self):
+        # tiap helper ORM melepas koneksinya → request tidak memegang koneksi pool
+        # selama menunggu inference (konkurensi tidak dibatasi DB_POOL_MAX)
+        events = []
+
+        async def infer(data, tiled=False):
+            events.append("inference")
+            return dict(FAKE_RESULT)
+
+        conn = mock.Mock()
+        conn.close.side_effect = lambda: events.append("release")
+        with mock.patch.object(services, "connection", conn), \
+                mock.patch.object(cache, "call_inference_async", infer):
+            r = self.detect({"file_id": self.put_upload()})
+        self.assertEqual(r.status_code, 200)
+        # _prepare + baca/lookup cache | simpan Detection + serialize
+        self.assertEqual(events, ["release", "release", "inference", "release", "release"])
+
+    def test_concurrent_detects_wait_together(self):
+        file_id = self.put_upload()
+
+        async def burst(n):
+            return await asyncio.gather(*[
+                self.aclient.post("/api/detect/detect", {"file_id": file_id},
+                                  content_type="application/json", headers=self.auth)
+                for _ in range(n)])
+
+        t = time.perf_counter()
+        responses = async_to_sync(burst)(20)
+        # 20 x latency stub 0.3s bila berurutan; async → semua menunggu inference bersamaan
+        self.assertLess(time.perf_counter() - t, 3.0)
+        self.assertEqual([r.status_code for r in responses], [200] * 20)
+        self.assertEqual(Detection.objects.count(), 20)
+
+
+class LiveFeedTests(DetectTestCase):
+    """Live feed SSE (feed.py, async_views.stream)."""
+
+    def events(self, messages):
+        return [(m.split("\n")[0][len("event: "):], json.loads(m.split("\n")[1][len("data: "):]))
+                for m in messages]
+
+    def test_poller_emits_new_detections_once(self):
+        poller = feed.Poller(now=timezone.now() - timedelta(seconds=1))
+        self.assertEqual(poller.poll(), [])
+
+        with mock.patch.object(pipeline, "ANNOTATE_MODE", "background"):
+            det = pipeline.save_detection(self.put_upload(), dict(FAKE_RESULT), "", filename="a.jpg")
+        events = self.events(poller.poll())
+        self.assertEqual([e for e, _ in events], ["detection", "summary"])
+        self.assertEqual(events[0][1]["id"], str(det.id))
+        self.assertEqual(events[1][1], {"date": timezone.localdate().isoformat(), "images": 1,
+                                        "objects": 1, "conf_sum": 0.9, "by_class": {"Safety helmet": 1}})
+        # sudah terkirim → tidak dikirim lagi; annotate belum selesai → belum ada update
+        self.assertEqual(poller.poll(), [])
+
+        Detection.objects.filter(id=det.id).update(annotated_url="/media/annotated/x.jpg")
+        events = self.events(poller.poll())
+        self.assertEqual(events, [("update", {"id": str(det.id), "annotated_url": "/media/annotated/x.jpg",
+                                              "variants": None})])
+        self.assertEqual(poller.poll(), [])
+
+    def test_burst_larger_than_batch_is_paged(self):
+        poller = feed.Poller(now=timezone.now() - timedelta(seconds=1))
+        n = feed.FEED_BATCH + 50   # semua di dalam jendela FEED_LAG
+        Detection.objects.bulk_create([Detection(filename=f"{i}.jpg", file_url="/media/uploads/x.jpg",
+                                                 annotated_url="", total_objects=0) for i in range(n)])
+        first = [e for e, _ in self.events(poller.poll())]
+        self.assertEqual(first.count("detection"), feed.FEED_BATCH)
+        second = [e for e, _ in self.events(poller.poll())]
+        self.assertEqual(second.count("detection"), 50)
+
+        det = Detection.objects.create(filename="new.jpg", file_url="/media/uploads/x.jpg", annotated_url="")
+        events = self.events(poller.poll())
+        self.assertEqual([d["id"] for e, d in events if e == "detection"], [str(det.id)])
+        self.assertEqual(poller.poll(), [])
+
+        # commit terlambat: created_at lebih lama dari cursor, masih di dalam FEED_LAG
+        late = Detection.objects.create(filename="late.jpg", file_url="/media/uploads/x.jpg", annotated_url="")
+        Detection.objects.filter(id=late.id).update(created_at=det.created_at - timedelta(seconds=2))
+        events = self.events(poller.poll())
+        self.assertEqual([d["id"] for e, d in events if e == "detection"], [str(late.id)])
+        self.assertEqual(poller.poll(), [])
+
+    def test_stream_needs_asgi(self):
+        # WSGI: stream tidak didaftarkan (iterator async tak berujung memegang worker selamanya)
+        self.assertEqual(self.client.post("/api/detect/stream/ticket").status_code, 501)
+        self.assertEqual(self.client.get("/api/detect/stream").status_code, 404)
+
+    def test_stream(self):
+        from .management.commands.bench_detect import reload_urlconf
+
+        broker = feed.Broker()
+        self.addCleanup(reload_urlconf)   # dijalankan terakhir, setelah GATEWAY_ASYNC dikembalikan
+        for p in (override_settings(GATEWAY_ASYNC=True),
+                  mock.patch.object(feed, "broker", broker),
+                  mock.patch.object(feed.Broker, "_run", lambda self: None)):   # tanpa thread poller
+            p.enable() if hasattr(p, "enable") else p.start()
+            self.addCleanup(p.disable if hasattr(p, "disable") else p.stop)
+        reload_urlconf()
+        aclient = AsyncClient()
+        self.assertEqual(APIClient().post("/api/detect/stream/ticket").status_code, 401)
+        r = self.client.post("/api/detect/stream/ticket")
+        self.assertEqual(r.status_code, 201)
+        ticket = r.json()["ticket"]
+
+        async def read():
+            r = await aclient.get("/api/detect/stream")
+            self.assertEqual(r.status_code, 401)
+            r = await aclient.get("/api/detect/stream", {"ticket": "bad"})
+            self.assertEqual(r.status_code, 401)
+
+            r = await aclient.get("/api/detect/stream", {"ticket": ticket})
+            self.assertEqual((r.status_code, r["Content-Type"]), (200, "text/event-stream"))
+            self.assertEqual(r["Cache-Control"], "no-cache")
+            it = aiter(r.streaming_content)
+            first = (await anext(it)).decode()
+            self.assertEqual(broker.subscribers(), 1)
+            broker.publish([feed.message("detection", {"id": "x"})])
+            second = (await anext(it)).decode()
+            await it.aclose()
+
+            # sekali pakai
+            r = await aclient.get("/api/detect/stream", {"ticket": ticket})
+            self.assertEqual(r.status_code, 401)
+            return first, second
+
+        first, second = async_to_sync(read)()
+        self.assertTrue(first.startswith("retry: 3000\nevent: ready\n"))
+        self.assertEqual(second, 'event: detection\ndata: {"id": "x"}\n\n')
+        self.assertEqual(broker.subscribers(), 0)
+
+        expired = feed.issue_ticket(self.user, now=timezone.now() - feed.FEED_TICKET_TTL * 2)
+        self.assertIsNone(feed.redeem_ticket(expired))
+
+
+class PostprocessTests(TestCase):
+    """inference_svc/postprocess.py: versi vektor == loop per box lama (bench_postprocess.py)."""
+
+    def setUp(self):
+        self.post = inference_module("postprocess")
+        self.bench = inference_module("bench_postprocess")
+
+    def det(self, boxes, conf, cls):
+        import numpy as np
+
+        return self.bench.Detections(np.array(boxes, np.float32).reshape(-1, 4),
+                                     np.array(conf, np.float32), np.array(cls, np.int64))
+
+    def assert_parity(self, det, W, H, names):
+        items = self.post.parse_result(det, W, H, names)
+        self.assertEqual(items, self.bench.parse_result_loop(det, W, H, names))
+        # kolom → item lagi harus sama persis dengan format items
+        cols = self.post.parse_columns(det, W, H, names)
+        self.assertEqual(items, [
+            {"klass": cols["classes"][i], "confidence": c, "x": x, "y": y, "w": w, "h": h}
+            for i, c, x, y, w, h in zip(cols["cls"], cols["conf"], cols["x"], cols["y"], cols["w"], cols["h"])
+        ])
+        return items
+
+    def test_matches_loop_on_random_boxes(self):
+        # sampai max_det (300) box per gambar, sebagian keluar batas gambar
+        for seed in range(20):
+            det, W, H = self.bench.synthetic(300, seed=seed)
+            self.assertEqual(len(self.assert_parity(det, W, H, self.bench.NAMES)), 300)
+
+    def test_empty(self):
+        empty = self.det([], [], [])
+        self.assertEqual(self.assert_parity(empty, 640, 480, self.bench.NAMES), [])
+        self.assertEqual(self.post.parse_columns(empty, 640, 480, self.bench.NAMES),
+                         {"classes": [], "cls": [], "conf": [], "x": [], "y": [], "w": [], "h": []})
+
+    def test_max_det_truncated_detections(self):
+        # backend memotong ke max_det box dengan confidence tertinggi; parse menjaga urutan itu
+        det, W, H = self.bench.synthetic(500, seed=3)
+        keep = det.conf.argsort()[::-1][:300]
+        top = self.bench.Detections(det.xyxy[keep], det.conf[keep], det.cls[keep])
+        items = self.assert_parity(top, W, H, self.bench.NAMES)
+        self.assertEqual(len(items), 300)
+        conf = [i["confidence"] for i in items]
+        self.assertEqual(conf, sorted(conf, reverse=True))
+
+    def test_class_name_mapping(self):
+        det = self.det([[0, 0, 10, 10]] * 5, [0.9] * 5, [0, 5, 2, 99, -1])
+        names = {0: "helmet", 5: "vest"}   # id bolong + id di luar tabel
+        items = self.assert_parity(det, 100, 100, names)
+        self.assertEqual([i["klass"] for i in items], ["helmet", "vest", "2", "99", "-1"])
+        names[2] = "gloves"                # dict yang sama diubah (hot-reload) → tabel dibangun ulang
+        items = self.assert_parity(det, 100, 100, names)
+        self.assertEqual([i["klass"] for i in items], ["helmet", "vest", "gloves", "99", "-1"])
+        self.assertEqual(self.assert_parity(det, 100, 100, {})[0]["klass"], "0")
+
+    def test_clipping_and_rounding(self):
+        det = self.det([[-5.7, -1, 50.9, 30.2], [630, 470, 700, 500], [20, 20, 10, 10]],
+                       [0.123456, 0.99996, 0.5], [0, 0, 0])
+        items = self.assert_parity(det, 640, 480, {0: "helmet"})
+        self.assertEqual([(i["x"], i["y"], i["w"], i["h"]) for i in items],
+                         [(0, 0, 50, 30), (630, 470, 9, 9), (20, 20, 0, 0)])
+        self.assertEqual([i["confidence"] for i in items], [0.1235, 1.0, 0.5])
+
+
+class ExportedBackendTests(TestCase):
+    """backends.ExportedBackend: letterbox + NMS numpy → box di koordinat gambar asli (tanpa runtime)."""
+
+    def setUp(self):
+        import numpy as np
+
+        self.np = np
+        backends = self.backends = inference_module("backends")
+        root = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, root, ignore_errors=True)
+        open(os.path.join(root, "model.synthetic"), "wb").close()
+
+        class Synthetic(backends.ExportedBackend):
+            name, suffix = "synthetic", ".synthetic"
+            pred = None
+
+            def _load(self):
+                self.batches = []
+
+            def _forward(self, batch):
+                self.batches.append(batch)
+                return self.pred[None]
+
+        self.be = Synthetic(os.path.join(root, "model.pt"), conf=0.25, iou=0.7, imgsz=640)
+
+    def raw(self, rows, nc=3):
+        """[(cx, cy, w, h, kelas, skor)] di ruang letterbox → output mentah (4+nc, anchors)."""
+        pred = self.np.zeros((4 + nc, len(rows)), self.np.float32)
+        for i, (cx, cy, w, h, k, score) in enumerate(rows):
+            pred[:4, i] = (cx, cy, w, h)
+            pred[4 + k, i] = score
+        return pred
+
+    def test_boxes_back_in_original_coordinates(self):
+        # 1280x720 → skala 0.5 jadi 640x360, padding 140 px atas & bawah
+        img = self.np.zeros((720, 1280, 3), self.np.uint8)
+        self.be.pred = self.raw([
+            (100, 290, 100, 100, 0, 0.9),    # gambar asli (100,200)-(300,400)
+            (102, 292, 100, 100, 0, 0.8),    # tumpang tindih kelas sama → di-suppress
+            (100, 290, 100, 100, 1, 0.7),    # posisi sama, kelas lain → tetap
+            (500, 150, 40, 60, 2, 0.6),      # sebagian di padding atas → di-clip ke y=0
+            (300, 300, 50, 50, 0, 0.2),      # di bawah conf
+        ])
+        [det], timing = self.be.predict_timed([img])
+
+        [batch] = self.be.batches
+        self.assertEqual(batch.shape, (1, 3, 640, 640))
+        self.assertAlmostEqual(float(batch[0, 0, 0, 0]), 114 / 255, places=5)     # padding
+        self.assertAlmostEqual(float(batch[0, 0, 320, 320]), 0.0, places=5)       # isi gambar
+        self.assertEqual(set(timing), {"preprocess", "forward", "nms"})
+
+        self.assertEqual(det.cls.tolist(), [0, 1, 2])
+        self.np.testing.assert_allclose(det.conf, [0.9, 0.7, 0.6], rtol=1e-6)
+        self.np.testing.assert_allclose(det.xyxy, [[100, 200, 300, 400],
+                                                   [100, 200, 300, 400],
+                                                   [960, 0, 1040, 80]], atol=1e-3)
+
+    def test_max_det_keeps_highest_scores(self):
+        self.be.max_det = 2
+        rows = [(50 + 100 * i, 320, 40, 40, 0, 0.3 + 0.1 * i) for i in range(5)]   # tidak saling tumpang
+        det = self.be._postprocess(self.raw(rows), 1.0, (0, 0), (640, 640))
+        self.np.testing.assert_allclose(det.conf, [0.7, 0.6], rtol=1e-6)
+        self.np.testing.assert_allclose(det.xyxy[0], [430, 300, 470, 340], atol=1e-3)
+
+    def test_nothing_above_conf(self):
+        det = self.be._postprocess(self.raw([(10, 10, 5, 5, 0, 0.1)]), 1.0, (0, 0), (640, 640))
+        self.assertEqual((det.xyxy.shape, len(det.conf)), ((0, 4), 0))
+
+
+class MicroBatcherTests(TestCase):
+    """inference_svc/batching.py: kapan batch di-flush, ke mana hasil kembali, admission, stop()."""
+
+    def setUp(self):
+        self.batching = inference_module("batching")
+        self.batches = []
+        self.release = threading.Event()
+        self.addCleanup(self.release.set)
+
+    def predict(self, sources):
+        self.batches.append(list(sources))
+        return [x * 10 for x in sources]
+
+    def blocking(self, sources):
+        self.release.wait(5)
+        return self.predict(sources)
+
+    def batcher(self, fn=None, **kw):
+        return self.batching.MicroBatcher(fn or self.predict, **kw)
+
+    def run_async(self, coro):
+        return asyncio.run(asyncio.wait_for(coro, 10))
+
+    def test_flush_when_batch_is_full(self):
+        b = self.batcher(max_batch=4, max_wait_ms=10_000)
+
+        async def go():
+            t0 = time.perf_counter()
+            out = await asyncio.gather(*(b.submit(i) for i in range(4)))
+            await b.stop()
+            return out, time.perf_counter() - t0
+
+        out, elapsed = self.run_async(go())
+        self.assertLess(elapsed, 5)   # tidak menunggu window 10 detik
+        self.assertEqual(out, [(0, 4), (10, 4), (20, 4), (30, 4)])
+        self.assertEqual(self.batches, [[0, 1, 2, 3]])
+
+    def test_flush_at_end_of_window(self):
+        b = self.batcher(max_batch=8, max_wait_ms=100)
+
+        async def go():
+            t0 = time.perf_counter()
+            out = await asyncio.gather(*(b.submit(i) for i in range(3)))
+            await b.stop()
+            return out, time.perf_counter() - t0
+
+        out, elapsed = self.run_async(go())
+        self.assertGreaterEqual(elapsed, 0.09)
+        self.assertEqual([n for _, n in out], [3, 3, 3])
+        self.assertEqual(b.stats()["batch_sizes"], {"3": 1})
+
+    def test_results_go_back_to_their_caller_in_order(self):
+        b = self.batcher(max_batch=8, max_wait_ms=50)
+
+        async def go():
+            many, one = await asyncio.gather(b.submit_many([1, 2, 3]), b.submit(5))
+            await b.stop()
+            return many, one
+
+        many, one = self.run_async(go())
+        self.assertEqual([r for r, _ in many], [10, 20, 30])
+        self.assertEqual(one, (50, 4))
+
+    def test_failed_batch_fails_every_member(self):
+        def boom(_):
+            raise RuntimeError("forward failed")
+
+        b = self.batcher(boom, max_batch=8, max_wait_ms=50)
+
+        async def go():
+            out = await asyncio.gather(*(b.submit(i) for i in range(3)), return_exceptions=True)
+            await b.stop()
+            return out
+
+        out = self.run_async(go())
+        self.assertEqual([str(e) for e in out], ["forward failed"] * 3)
+        self.assertTrue(all(isinstance(e, RuntimeError) for e in out))
+
+    def test_queue_full_when_max_pending_reached(self):
+        b = self.batcher(self.blocking, max_batch=1, max_wait_ms=0, max_pending=1)
+
+        async def go():
+            first = asyncio.ensure_future(b.submit(1))
+            await asyncio.sleep(0.05)
+            with self.assertRaises(self.batching.QueueFull):
+                await b.submit(2)
+            with self.assertRaises(self.batching.QueueFull):
+                await b.submit_many([3])
+            self.assertFalse(b.has_capacity())
+            self.release.set()
+            out = await first
+            await b.stop()
+            return out
+
+        self.assertEqual(self.run_async(go()), (10, 1))
+        self.assertEqual(b.stats()["rejected"], 2)
+        self.assertEqual(b.pending, 0)
+
+    def test_stop_fails_queued_items(self):
+        b = self.batcher(self.blocking, max_batch=1, max_wait_ms=0, max_concurrency=1)
+
+        async def go():
+            running = asyncio.ensure_future(b.submit(0))
+            while b.running == 0:
+                await asyncio.sleep(0.01)
+            queued = [asyncio.ensure_future(b.submit(i)) for i in range(1, 11)]
+            await asyncio.sleep(0.05)
+            stopping = asyncio.ensure_future(b.stop())
+            done = await asyncio.gather(*queued, return_exceptions=True)   # tidak menggantung
+            self.release.set()
+            await stopping
+            return await running, done
+
+        first, queued = self.run_async(go())
+        self.assertEqual(first, (0, 1))   # batch yang sudah jalan tetap selesai
+        self.assertEqual(len(queued), 10)
+        self.assertTrue(all(isinstance(e, self.batching.Stopped) for e in queued))
+
+    def test_stop_during_window_fails_collected_items(self):
+        b = self.batcher(max_batch=8, max_wait_ms=10_000)
+
+        async def go():
+            futs = [asyncio.ensure_future(b.submit(i)) for i in range(2)]
+            await asyncio.sleep(0.05)   # keduanya sudah diambil _collect, menunggu window
+            await b.stop()
+            return await asyncio.gather(*futs, return_exceptions=True)
+
+        out = self.run_async(go())
+        self.assertTrue(all(isinstance(e, self.batching.Stopped) for e in out))
+        self.assertEqual(self.batches, [])
+
+
+class TilingTests(TestCase):
+    """inference_svc/tiling.py: grid window + penggabungan box antar tile."""
+
+    def setUp(self):
+        self.tiling = inference_module("tiling")
+        self.backends = inference_module("backends")
+
+    def test_grid_4k(self):
+        W, H = 3840, 2160
+        windows = self.tiling.grid(W, H, 640, 0.2, 16)
+        # 640 → 8x4 = 32 tile > 16: tile diperbesar sampai muat
+        self.assertEqual(len(windows), 15)
+        sizes = {(x1 - x0, y1 - y0) for x0, y0, x1, y1 in windows}
+        self.assertEqual(sizes, {(1002, 1002)})
+        self.assertEqual((min(w[0] for w in windows), max(w[2] for w in windows)), (0, W))
+        self.assertEqual((min(w[1] for w in windows), max(w[3] for w in windows)), (0, H))
+        for axis in (0, 1):
+            starts = sorted({w[axis] for w in windows})
+            ends = sorted({w[axis + 2] for w in windows})
+            for end, nxt in zip(ends, starts[1:]):
+                self.assertGreaterEqual(end - nxt, 0.2 * 1002)   # bertumpuk ≥ overlap
+
+        full = self.tiling.grid(W, H, 640, 0.2, 16, full=True)
+        self.assertEqual(full, windows + [(0, 0, W, H)])
+
+    def test_grid_small_image_is_one_window(self):
+        self.assertEqual(self.tiling.grid(500, 400, 640), [(0, 0, 500, 400)])
+        # grid sudah gambar utuh → full=True tidak menambah window kedua
+        self.assertEqual(self.tiling.grid(500, 400, 640, full=True), [(0, 0, 500, 400)])
+        self.assertEqual(self.tiling.grid(3840, 2160, 640, 0.2, 1, full=True), [(0, 0, 3840, 2160)])
+
+    def det(self, boxes, conf, cls):
+        import numpy as np
+
+        return self.backends.Detections(np.array(boxes, np.float32).reshape(-1, 4),
+                                        np.array(conf, np.float32), np.array(cls, np.int64))
+
+    def test_merge_joins_box_split_across_tiles(self):
+        windows = [(0, 0, 640, 640), (512, 0, 1152, 640)]
+        # objek x 500..700: potongan kiri di tile pertama, sisanya di tile kedua (koordinat tile)
+        left = self.det([[500, 100, 640, 300]], [0.7], [0])
+        right = self.det([[0, 100, 188, 300], [300, 50, 400, 150]], [0.9, 0.8], [0, 1])
+        out = self.tiling.merge([left, right], windows, 1152, 640)
+        self.assertEqual(len(out.conf), 2)
+        by_cls = {int(c): (box.tolist(), float(p)) for box, p, c in zip(out.xyxy, out.conf, out.cls)}
+        self.assertEqual(by_cls[0][0], [500, 100, 700, 300])
+        self.assertAlmostEqual(by_cls[0][1], 0.9, places=5)
+        self.assertEqual(by_cls[1][0], [812, 50, 912, 150])
+
+    def test_merge_keeps_other_classes_and_empty(self):
+        windows = [(0, 0, 640, 640)]
+        same_place = self.det([[10, 10, 100, 100], [10, 10, 100, 100]], [0.9, 0.8], [0, 1])
+        self.assertEqual(len(self.tiling.merge([same_place], windows, 640, 640).conf), 2)
+        empty = self.tiling.merge([self.det([], [], [])], windows, 640, 640)
+        self.assertEqual(empty.xyxy.shape, (0, 4))
+
+
+class ModelRegistryTests(TestCase):
+    """inference_svc/model_registry.py: folder versi + file ACTIVE."""
+
+    def setUp(self):
+        self.root = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, self.root, ignore_errors=True)
+        self.registry = inference_module("model_registry").ModelRegistry(self.root)
+
+    def add(self, version, weights=True):
+        os.makedirs(os.path.join(self.root, version))
+        if weights:
+            open(os.path.join(self.root, version, "model.pt"), "wb").close()
+
+    def test_versions_in_natural_order(self):
+        for v in ("1.10", "1.9", "2.0-rc1", "1.0"):
+            self.add(v)
+        self.add("1.11", weights=False)        # belum ada weights → bukan versi
+        os.makedirs(os.path.join(self.root, "bad name"))
+        self.assertEqual(self.registry.versions(), ["1.0", "1.9", "1.10", "2.0-rc1"])
+        self.assertEqual(self.registry.initial(), "2.0-rc1")
+        self.assertEqual(self.registry.weights_path("1.9"), os.path.join(self.root, "1.9", "model.pt"))
+        for bad in ("1.11", "..", "../1.0", "", None):
+            with self.assertRaises(KeyError):
+                self.registry.weights_path(bad)
+
+    def test_active_and_initial(self):
+        self.assertEqual(self.registry.versions(), [])
+        self.assertIsNone(self.registry.initial())          # registry kosong → WEIGHTS_PATH lama
+        self.add("1.0")
+        self.add("1.1")
+        self.assertIsNone(self.registry.active())
+        self.registry.set_active("1.0")
+        self.assertEqual(self.registry.active(), "1.0")
+        self.assertEqual(self.registry.initial(), "1.0")    # ACTIVE menang atas versi terbaru
+        self.assertEqual(self.registry.initial("1.1"), "1.1")
+        with self.assertRaises(KeyError):
+            self.registry.initial("3.0")
+        self.registry.set_active("3.0")                     # ACTIVE menunjuk versi yang sudah dihapus
+        self.assertIsNone(self.registry.active())
+        self.assertEqual(self.registry.initial(), "1.1")
+        self.assertEqual(sorted(os.listdir(self.root)), ["1.0", "1.1", "ACTIVE"])   # tanpa sisa .tmp
+
+
+class InferenceAppTests(TestCase):
+    """inference_svc/app.py dengan backend palsu: readiness, endpoint admin, ganti versi."""
+
+    @classmethod
+    def setUpClass(cls):
+        super().setUpClass()
+        backends = inference_module("backends")
+
+        class FakeBackend(backends.Backend):
+            name = "fake"
+            broken = set()   # weights_path yang gagal saat warm-up
+            gate = None      # threading.Event: forward pass menunggu sampai di-set (backend lambat)
+
+            def predict_timed(self, images):
+                if self.gate is not None:
+                    self.gate.wait(5)
+                if self.weights_path in self.broken:
+                    raise RuntimeError("bad weights")
+                return [backends._empty() for _ in images], {"preprocess": 0.0, "forward": 0.0, "nms": 0.0}
+
+        cls.Fake = FakeBackend
+        cls.root = tempfile.mkdtemp()
+        cls.addClassCleanup(shutil.rmtree, cls.root, ignore_errors=True)
+        for v in ("1.0", "1.1"):
+            os.makedirs(os.path.join(cls.root, v))
+            open(os.path.join(cls.root, v, "model.pt"), "wb").close()
+
+        # app.py me-load model saat diimpor → env + backend palsu harus ada sebelumnya
+        for p in (mock.patch.dict(backends.BACKENDS, fake=FakeBackend),
+                  mock.patch.dict(os.environ, INFER_BACKEND="fake", MODEL_REGISTRY=cls.root,
+                                  INFER_MODEL_VERSION="1.0", INFER_ADMIN_TOKEN="s3cret",
+                                  INFER_WARMUP_RUNS="1")):
+            p.start()
+            cls.addClassCleanup(p.stop)
+        sys.modules.pop("app", None)
+        cls.addClassCleanup(sys.modules.pop, "app", None)
+        cls.app = inference_module("app")
+        cls.addClassCleanup(cls.app.loader.shutdown)
+        cls.addClassCleanup(cls.app.executor.shutdown)
+
+        from fastapi.testclient import TestClient
+
+        cls.http = TestClient(cls.app.app)   # tanpa `with`: startup (warm-up, batcher) dipanggil manual
+
+    def setUp(self):
+        active = os.path.join(self.root, "ACTIVE")
+        if os.path.exists(active):
+            os.remove(active)
+        self.Fake.broken.clear()
+        self.app.model = self.app.load_model("1.0")
+        self.app.model_state.update(ready=False, loading=None, last_error=None, switched_at=None)
+
+    def admin(self, method, path, token="s3cret"):
+        return self.http.request(method, path, headers={"X-Admin-Token": token} if token else {})
+
+    def load(self, version):
+        r = self.admin("POST", f"/admin/models/{version}/load")
+        self.app.loader.submit(lambda: None).result()   # loader 1 thread → switch_model sudah selesai
+        return r
+
+    def test_healthz_503_until_warm(self):
+        r = self.http.get("/healthz")
+        self.assertEqual((r.status_code, r.json()), (503, {"status": "warming", "model_version": "1.0"}))
+        self.Fake.broken.add(self.app.model.backend.weights_path)
+        self.app._warm_start()
+        self.assertEqual(self.http.get("/healthz").status_code, 503)
+        self.assertTrue(self.app.model_state["last_error"].startswith("warm-up 1.0: RuntimeError"))
+        self.Fake.broken.clear()
+        self.app._warm_start()
+        r = self.http.get("/healthz")
+        self.assertEqual((r.status_code, r.json()), (200, {"status": "ok", "model_version": "1.0"}))
+
+    def test_metrics_types(self):
+        text = self.http.get("/metrics").text
+        self.assertIn("# TYPE inference_batcher_events_total counter", text)
+        self.assertIn('inference_batcher_events_total{event="rejected"} 0', text)
+        self.assertIn('inference_batcher{field="queue_depth"} 0', text)
+        self.assertIn('inference_model_info{version="1.0",backend="fake",ready="false"} 1', text)
+
+    def test_infer_during_shutdown_is_503(self):
+        with mock.patch.object(self.app.batcher, "submit_many", side_effect=self.app.Stopped()):
+            r = self.http.post("/infer", files={"file": ("a.jpg", make_image(), "image/jpeg")})
+        self.assertEqual((r.status_code, r.json()["detail"]), (503, "inference shutting down"))
+        self.assertEqual(r.headers["Retry-After"], str(self.app.RETRY_AFTER_S))
+
+    def test_admission_when_saturated(self):
+        from concurrent.futures import ThreadPoolExecutor
+
+        import httpx
+
+        self.app.model_state["ready"] = True
+        self.Fake.gate = threading.Event()
+        self.addCleanup(setattr, self.Fake, "gate", None)
+        self.addCleanup(self.Fake.gate.set)
+        pool = ThreadPoolExecutor(1)
+        self.addCleanup(pool.shutdown)
+        batcher = self.app.MicroBatcher(self.app.predict_batch_timed, max_batch=8, max_wait_ms=0,
+                                        executor=pool, max_concurrency=1, max_pending=1)
+        image = lambda: ("a.jpg", make_image(), "image/jpeg")
+
+        async def go():
+            transport = httpx.ASGITransport(app=self.app.app)
+            async with httpx.AsyncClient(transport=transport, base_url="http://inference") as c:
+                slow = asyncio.ensure_future(c.post("/infer", files={"file": image()}))
+                while batcher.running == 0:
+                    await asyncio.sleep(0.01)
+                t0 = time.perf_counter()
+                health = await c.get("/healthz")
+                health_s = time.perf_counter() - t0
+                busy = await c.post("/infer", files={"file": image()})
+                batch = await c.post("/infer/batch", files=[("files", image()), ("files", image())])
+                self.Fake.gate.set()
+                done = await slow
+                await batcher.stop()
+                return health, health_s, busy, batch, done
+
+        with mock.patch.object(self.app, "batcher", batcher):
+            health, health_s, busy, batch, done = asyncio.run(asyncio.wait_for(go(), 10))
+        # event loop tetap bebas walau satu-satunya worker sedang forward
+        self.assertEqual(health.status_code, 200)
+        self.assertLess(health_s, 0.5)
+        for r in (busy, batch):
+            self.assertEqual((r.status_code, r.json()["detail"]), (503, "inference queue full"))
+            self.assertEqual(r.headers["Retry-After"], str(self.app.RETRY_AFTER_S))
+        self.assertEqual(done.status_code, 200)
+        self.assertEqual(batcher.stats()["items"], 1)   # tidak ada gambar batch yang ikut diproses
+
+    def test_batch_is_rejected_as_a_whole(self):
+        batcher = self.app.MicroBatcher(self.app.predict_batch_timed, max_pending=1)
+        files = [("files", ("a.jpg", make_image(), "image/jpeg"))] * 2
+        with mock.patch.object(self.app, "batcher", batcher):
+            r = self.http.post("/infer/batch", files=files)   # 2 gambar > max_pending, walau antrean kosong
+        self.assertEqual(r.status_code, 503)
+        self.assertEqual((batcher.stats()["items"], batcher.rejected), (0, 1))
+
+    def test_torch_runs_one_batch_at_a_time(self):
+        self.assertEqual(self.app.parallel_workers("torch", 4), 1)
+        self.assertEqual(self.app.parallel_workers("onnx", 4), 4)
+        self.assertEqual(self.app.parallel_workers("fake", 0), 1)
+
+    def test_admin_requires_token(self):
+        for token in (None, "wrong"):
+            self.assertEqual(self.admin("GET", "/admin/models", token).status_code, 403)
+            self.assertEqual(self.admin("POST", "/admin/models/1.1/load", token).status_code, 403)
+        r = self.admin("GET", "/admin/models")
+        self.assertEqual(r.status_code, 200)
+        self.assertEqual((r.json()["active"], r.json()["versions"]), ("1.0", ["1.0", "1.1"]))
+        with mock.patch.object(self.app, "INFER_ADMIN_TOKEN", ""):   # token kosong → admin mati
+            self.assertEqual(self.admin("GET", "/admin/models", "").status_code, 403)
+
+    def test_load_unknown_or_while_loading(self):
+        self.assertEqual(self.load("9.9").status_code, 404)
+        self.app.model_state["loading"] = "1.1"
+        r = self.load("1.1")
+        self.assertEqual((r.status_code, r.json()["detail"]), (409, "already loading 1.1"))
+        self.assertEqual(self.app.model.version, "1.0")
+
+    def test_switch_persists_active_before_serving(self):
+        set_active = self.app.registry.set_active
+
+        def check_then_persist(version):
+            self.assertEqual(self.app.model.version, "1.0")   # traffic belum dialihkan
+            set_active(version)
+
+        with mock.patch.object(self.app.registry, "set_active", side_effect=check_then_persist):
+            r = self.load("1.1")
+        self.assertEqual((r.status_code, r.json()), (202, {"status": "loading", "version": "1.1", "active": "1.0"}))
+        self.assertEqual(self.app.model.version, "1.1")
+        self.assertEqual(self.app.registry.active(), "1.1")
+        state = self.admin("GET", "/admin/models").json()
+        self.assertEqual((state["active"], state["loading"], state["last_error"], state["ready"]),
+                         ("1.1", None, None, True))
+
+    def test_failed_load_or_persist_keeps_old_version(self):
+        self.Fake.broken.add(os.path.join(self.root, "1.1", "model.pt"))
+        self.load("1.1")
+        self.assertEqual(self.app.model.version, "1.0")
+        self.assertTrue(self.app.model_state["last_error"].startswith("load 1.1: RuntimeError"))
+        self.assertIsNone(self.app.registry.active())
+
+        self.Fake.broken.clear()
+        with mock.patch.object(self.app.registry, "set_active", side_effect=PermissionError("read-only")):
+            self.load("1.1")
+        self.assertEqual(self.app.model.version, "1.0")
+        self.assertEqual(self.app.model_state["last_error"], "persist ACTIVE 1.1: PermissionError: read-only")
+        self.assertIsNone(self.app.model_state["loading"])
+
+
+class DecodeParityTests(TestCase):
+    """
+    Paritas akurasi decode_image (array langsung ke model) vs path lama
+    (PIL → temp JPEG q95 → cv2.imread), dengan model asli. Di-skip kalau
+    ultralytics / weights tidak ada. Gambar: folder PARITY_IMAGES, atau
+    gambar sintetis (EXIF rotate, PNG RGBA, grayscale) kalau tidak di-set.
+    Box dengan confidence < CONF_THRESH + MARGIN boleh muncul di satu sisi
+    saja (re-encode JPEG bisa menggeser skor sedikit di sekitar threshold).
+    """
+    IOU_MIN, CONF_TOL, MARGIN = 0.85, 0.05, 0.05
+
+    @classmethod
+    def setUpClass(cls):
+        super().setUpClass()
+        if importlib.util.find_spec("ultralytics") is None:
+            raise unittest.SkipTest("ultralytics tidak terpasang")
+        # app.py memakai path weights relatif terhadap folder inference_svc
+        cwd = os.getcwd()
+        os.chdir(INFERENCE_DIR)
+        try:
+            sys.modules.pop("app", None)
+            cls.app = inference_module("app")
+        except (FileNotFoundError, KeyError) as e:
+            raise unittest.SkipTest(f"weights model tidak ada: {e}")
+        finally:
+            os.chdir(cwd)
+        cls.addClassCleanup(sys.modules.pop, "app", None)
+        import cv2
+
+        cls.cv2 = cv2
+
+    def images(self):
+        folder = os.getenv("PARITY_IMAGES")
+        if folder:
+            paths = sorted(os.path.join(folder, n) for n in os.listdir(folder)
+                           if n.lower().endswith((".jpg", ".jpeg", ".png")))
+            self.assertTrue(paths, f"tidak ada gambar di {folder}")
+            return paths
+        root = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, root, ignore_errors=True)
+        base = Image.new("RGB", (960, 640), (90, 120, 60))
+        draw = ImageDraw.Draw(base)
+        for i in range(6):
+            draw.rectangle([60 + 140 * i, 200, 150 + 140 * i, 420], fill=(30 * i, 200 - 20 * i, 120))
+        exif = Image.Exif()
+        exif[0x0112] = 6   # orientasi: rotate 90° saat ditampilkan
+        variants = {"plain.jpg": (base, {"quality": 90}), "exif.jpg": (base, {"exif": exif}),
+                    "rgba.png": (base.convert("RGBA"), {}), "gray.png": (base.convert("L"), {})}
+        for name, (img, kw) in variants.items():
+            img.save(os.path.join(root, name), **kw)
+        return [os.path.join(root, n) for n in sorted(variants)]
+
+    def legacy_items(self, path):
+        app = self.app
+        pil = ImageOps.exif_transpose(Image.open(path)).convert("RGB")
+        with tempfile.NamedTemporaryFile(suffix=".jpg") as tmp:
+            pil.save(tmp.name, "JPEG", quality=95)
+            # ultralytics membaca path dengan cv2.imread (BGR) → tiru persis
+            res = app.predict_batch([self.cv2.imread(tmp.name)])[0]
+        W, H = pil.size
+        return app.parse_result(res, W, H)
+
+    def array_items(self, path):
+        app = self.app
+        with open(path, "rb") as f:
+            img = app.decode_image(f.read())
+        res = app.predict_batch([img])[0]
+        H, W = img.shape[:2]
+        return app.parse_result(res, W, H)
+
+    @staticmethod
+    def iou(a, b):
+        iw = max(0, min(a["x"] + a["w"], b["x"] + b["w"]) - max(a["x"], b["x"]))
+        ih = max(0, min(a["y"] + a["h"], b["y"] + b["h"]) - max(a["y"], b["y"]))
+        union = a["w"] * a["h"] + b["w"] * b["h"] - iw * ih
+        return iw * ih / union if union > 0 else 0.0
+
+    def mismatches(self, old, new):
+        """Greedy matching per kelas → list pesan (kosong = paritas OK)."""
+        sure = self.app.CONF_THRESH + self.MARGIN
+        errors, unmatched = [], list(new)
+        for a in sorted(old, key=lambda i: -i["confidence"]):
+            same = [b for b in unmatched if b["klass"] == a["klass"]]
+            best = max(same, key=lambda b: self.iou(a, b), default=None)
+            if best is not None and self.iou(a, best) >= self.IOU_MIN:
+                unmatched.remove(best)
+                if abs(best["confidence"] - a["confidence"]) > self.CONF_TOL:
+                    errors.append(f"conf drift {a['klass']}: {a['confidence']} vs {best['confidence']}")
+            elif a["confidence"] >= sure:
+                errors.append(f"missing in array path: {a}")
+        errors += [f"extra in array path: {b}" for b in unmatched if b["confidence"] >= sure]
+        return errors
+
+    def test_array_path_matches_legacy_jpeg_path(self):
+        for path in self.images():
+            with self.subTest(image=os.path.basename(path)):
+                self.assertEqual(self.mismatches(self.legacy_items(path), self.array_items(path)), [])
+
+
+class BenchHarnessTests(TestCase):
+    def test_stub_latency(self):
+        stub = StubInferenceServer(latency=0.05, per_image=0.01).start()
+        self.addCleanup(stub.stop)
+        c = InferenceClient(stub.url)
+        t = time.perf_counter()
+        c.post_image(data=make_image())
+        self.assertGreaterEqual(time.perf_counter() - t, 0.05)
+        t = time.perf_counter()
+        c.post_images([make_image()] * 3)
+        self.assertGreaterEqual(time.perf_counter() - t, 0.07)
+
+    def test_percentiles_and_corpus(self):
+        from .management.commands.bench_detect import percentiles, synthetic_corpus
+
+        self.assertEqual(percentiles(list(range(1, 101))), (50.5, 95.05, 99.01))
+        self.assertEqual(percentiles([7.0]), (7.0, 7.0, 7.0))
+        corpus = synthetic_corpus(3, (320, 240))
+        self.assertEqual(len(set(corpus)), 3)
+        self.assertEqual(corpus, synthetic_corpus(3, (320, 240)))   # deterministik antar run
+        self.assertEqual(Image.open(io.BytesIO(corpus[0])).size, (320, 240))
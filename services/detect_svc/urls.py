@@ -1,11 +1,29 @@
+from django.conf import settings
 from django.urls import path
-from . import views
+from . import async_views, views
+
+# GATEWAY_ASYNC=1 (uvicorn asgi:application) → detect tanpa memegang thread (async_views.py)
+detect = async_views.detect if settings.GATEWAY_ASYNC else views.DetectView.as_view()
+job_detail = async_views.job_detail if settings.GATEWAY_ASYNC else views.JobDetailView.as_view()
 
 urlpatterns = [
     path("health/", views.HealthView.as_view()),
     path("upload", views.UploadView.as_view()),
-    path("detect", views.DetectView.as_view()),
+    path("upload-detect", views.UploadDetectView.as_view()),
+    path("detect", detect),
+    path("detect/batch", views.DetectBatchView.as_view()),
+    path("stream/ticket", views.StreamTicketView.as_view()),
+    path("ingest", views.IngestView.as_view()),
+    path("ingest/<uuid:id>", views.IngestDetailView.as_view()),
+    path("jobs", views.JobQueueView.as_view()),
+    path("jobs/<uuid:id>", job_detail),
     path("results", views.ResultsListView.as_view()),
-    path("results/<int:id>", views.ResultDetailView.as_view()),
+    path("results/<uuid:id>", views.ResultDetailView.as_view()),
     path("summary", views.summary),
-]
\ No newline at end of file
+    path("cache", views.CacheStatsView.as_view()),
+    path("inference/stats", views.InferenceStatsView.as_view()),
+]
+
+# live feed SSE butuh ASGI (lihat async_views.py); di WSGI tiket menjawab 501
+if settings.GATEWAY_ASYNC:
+    urlpatterns.append(path("stream", async_views.stream))
\ No newline at end of file
@@ -0,0 +1,76 @@
+"""
+Turunan gambar untuk dashboard: thumbnail + medium (WebP) per detection.
+
+List / history / latest cukup memuat thumbnail beberapa KB, bukan upload asli
+(sampai 20 MB) atau annotated JPEG kualitas 90. Nama file diambil dari sha256
+isinya, jadi isi di balik sebuah URL tidak pernah berubah dan nginx boleh
+menyajikan /media/variants/ dengan Cache-Control immutable
+(deploy/nginx-gateway.conf).
+
+Dibuat sekali per detection di job annotate (pipeline.render_images): dari
+gambar annotated yang masih di memori, atau dari upload kalau tidak ada box.
+Hasilnya Detection.variants = {"thumb": url, "medium": url}.
+"""
+import hashlib
+import io
+import os
+import tempfile
+
+from django.conf import settings
+from PIL import Image, ImageOps, features
+
+VARIANTS_ENABLED = os.getenv("VARIANTS_ENABLED", "1").lower() in ("1", "true", "yes", "on")
+# sisi terpanjang (piksel) per varian
+SIZES = {
+    "thumb": int(os.getenv("VARIANT_THUMB_SIDE", "320")),
+    "medium": int(os.getenv("VARIANT_MEDIUM_SIDE", "1280")),
+}
+QUALITY = int(os.getenv("VARIANT_QUALITY", "80"))
+# WebP kalau Pillow punya libwebp; VARIANT_FORMAT=jpeg untuk klien lama
+FORMAT = ("WEBP" if os.getenv("VARIANT_FORMAT", "webp").lower() == "webp" and features.check("webp")
+          else "JPEG")
+_EXT = {"WEBP": ".webp", "JPEG": ".jpg"}
+_SAVE_OPTS = {"WEBP": {"method": 2}, "JPEG": {"optimize": True, "progressive": True}}
+
+
+def variants_dir():
+    path = os.path.join(settings.MEDIA_ROOT, "variants")
+    os.makedirs(path, exist_ok=True)
+    return path
+
+
+def open_source(path):
+    """Buka upload untuk diturunkan; JPEG besar langsung di-decode di skala kecil (draft)."""
+    img = Image.open(path)
+    side = max(SIZES.values())
+    img.draft("RGB", (side, side))
+    return ImageOps.exif_transpose(img).convert("RGB")
+
+
+def _store(data, name):
+    file_name = f"{hashlib.sha256(data).hexdigest()[:32]}_{name}{_EXT[FORMAT]}"
+    final = os.path.join(variants_dir(), file_name)
+    if not os.path.exists(final):   # isi sama → file sama, tidak ditulis ulang
+        with tempfile.NamedTemporaryFile(dir=variants_dir(), prefix=".variant-", delete=False) as tmp:
+            tmp.write(data)
+        os.chmod(tmp.name, 0o644)   # dibaca nginx
+        os.replace(tmp.name, final)
+    return settings.MEDIA_URL + "variants/" + file_name
+
+
+def render(img):
+    """
+    Semua varian dari `img` (PIL RGB, tidak diubah). Return {nama: MEDIA_URL}.
+    Varian kecil diturunkan dari varian yang lebih besar (resize lebih murah).
+    """
+    out = {}
+    cur = img
+    for name, side in sorted(SIZES.items(), key=lambda kv: -kv[1]):
+        if max(cur.size) > side:
+            if cur is img:
+                cur = img.copy()
+            cur.thumbnail((side, side))
+        buf = io.BytesIO()
+        cur.save(buf, FORMAT, quality=QUALITY, **_SAVE_OPTS[FORMAT])
+        out[name] = _store(buf.getvalue(), name)
+    return out
@@ -1,23 +1,28 @@
 import os
-import statistics
-from datetime import timedelta
+import time
 import socket
+from datetime import datetime, timedelta
 
 import requests
 from django.conf import settings
+from django.db.models import Exists, OuterRef, Q, prefetch_related_objects
 from django.utils import timezone
-from django.db.models import Count, Avg, Sum
-from django.db.models.functions import TruncDate
+from django.utils.dateparse import parse_date, parse_datetime
 
 from rest_framework import views, generics
 from rest_framework.response import Response
-from rest_framework.parsers import MultiPartParser, FormParser, JSONParser
+from rest_framework.parsers import FormParser, JSONParser
 from rest_framework.decorators import api_view, permission_classes
+from rest_framework.exceptions import ParseError
+from rest_framework.pagination import CursorPagination
 from rest_framework.permissions import AllowAny, IsAuthenticated
 
-from .models import Detection, DetectionItem
-from .serializers import DetectionSerializer
-from .services import call_inference, draw_boxes_and_save
+from .models import Detection, DetectionItem, DetectionJob, IngestSession
+from .serializers import DetectionListSerializer, DetectionSerializer
+from . import cache, feed, ingest, jobs, metrics, rollup, storage
+from .services import async_inference_client, call_inference, inference_client
+from .pipeline import BATCH_MAX_FILES, run_detection, run_detection_batch, save_detection, upload_path
+from .storage import StreamingUploadParser, TeeUploadParser, VideoUploadParser
 
 
 class HealthView(views.APIView):
@@ -27,40 +32,92 @@ class HealthView(views.APIView):
         return Response({"status": "ok", "pod": socket.gethostname()})
 
 
+def _check_upload(f):
+    """Response error untuk upload yang ditolak (file sementara dibuang), None kalau valid."""
+    if not f:
+        return Response({"detail": "file required"}, status=400)
+    if f.too_large:
+        storage.discard(f)
+        return Response({"detail": "file too large"}, status=413)
+    if f.content_type not in storage.EXTENSIONS:
+        storage.discard(f)
+        return Response({"detail": "only jpg/png"}, status=415)
+    return None
+
+
 class UploadView(views.APIView):
     """
-    Terima file gambar dan simpan ke MEDIA_ROOT/uploads, return {file_id, file_url}
+    Terima file gambar dan simpan ke MEDIA_ROOT/uploads dengan nama sha256 isinya,
+    return {file_id, file_url, filename, duplicate}. File yang isinya sama dengan
+    upload sebelumnya tidak disimpan ulang (duplicate: true, file_id yang lama).
     """
-    parser_classes = (MultiPartParser, FormParser)
+    parser_classes = (StreamingUploadParser, FormParser)
     permission_classes = [IsAuthenticated]
 
     def post(self, request):
-        f = request.FILES.get("file")
-        if not f:
-            return Response({"detail": "file required"}, status=400)
-        if f.size > 20 * 1024 * 1024:
-            return Response({"detail": "file too large"}, status=413)
-        if f.content_type not in ("image/jpeg", "image/png"):
-            return Response({"detail": "only jpg/png"}, status=415)
-
-        save_dir = os.path.join(settings.MEDIA_ROOT, "uploads")
-        os.makedirs(save_dir, exist_ok=True)
-
-        fname = f"{timezone.now().strftime('%Y%m%d%H%M%S')}_{f.name}"
-        fpath = os.path.join(save_dir, fname)
-        with open(fpath, "wb+") as dst:
-            for c in f.chunks():
-                dst.write(c)
+        with metrics.stage("upload"):   # body di-parse (dan di-hash) saat FILES pertama diakses
+            f = request.FILES.get("file")
+        error = _check_upload(f)
+        if error is not None:
+            return error
 
+        file_id, created = storage.commit(f)
         return Response({
-            "file_id": fname,
-            "file_url": settings.MEDIA_URL + "uploads/" + fname
+            "file_id": file_id,
+            "file_url": settings.MEDIA_URL + "uploads/" + file_id,
+            "filename": f.name,
+            "duplicate": not created,
         })
 
 
+class UploadDetectView(views.APIView):
+    """
+    Upload + deteksi dalam satu request. Byte gambar di-stream ke inference
+    sambil disimpan ke disk, jadi file tidak perlu dibaca ulang dari disk.
+    Balas sama seperti DetectView (+ "duplicate").
+    """
+    parser_classes = (TeeUploadParser, FormParser)
+    permission_classes = [IsAuthenticated]
+
+    def post(self, request):
+        with metrics.stage("upload"):
+            f = request.FILES.get("file")
+        error = _check_upload(f)
+        if error is not None:
+            return error
+        file_id, created = storage.commit(f)
+
+        try:
+            # hash baru diketahui setelah upload selesai; kalau ada di cache,
+            # hasil stream diabaikan
+            key, config, result = cache.lookup(digest=f.digest)
+            if result is None:
+                if f.inference is not None:
+                    # sebagian besar sudah berjalan selama upload; ini sisa tunggunya
+                    with metrics.stage("inference"):
+                        result = f.inference.result()
+                else:
+                    result = call_inference(file_path=upload_path(file_id))
+                cache.store(key, config, result)
+            det = save_detection(file_id, result, upload_path(file_id), filename=f.name)
+        except (requests.ConnectionError, requests.Timeout) as e:
+            return Response(
+                {"detail": f"inference backend unavailable: {e.__class__.__name__}"},
+                status=502
+            )
+        except Exception as e:
+            return Response({"detail": f"inference error: {e}"}, status=500)
+
+        return Response(dict(DetectionSerializer(det).data, duplicate=not created))
+
+
 class DetectView(views.APIView):
     """
     Jalankan inferensi untuk file yang sudah diupload.
+    Body {"file_id": ..., "async": true} (atau ?async=1) → masuk antrean job,
+    langsung balas 202 + job_id; status dipantau di GET jobs/<job_id>.
+    "tiled": true (atau ?tiled=1) → inference mode tile untuk foto resolusi
+    tinggi (objek kecil tidak hilang saat di-resize; lebih lambat).
     """
     parser_classes = (JSONParser,)
     permission_classes = [IsAuthenticated]
@@ -70,13 +127,17 @@ class DetectView(views.APIView):
         if not file_id:
             return Response({"detail": "file_id required"}, status=400)
 
-        src_path = os.path.join(settings.MEDIA_ROOT, "uploads", file_id)
-        if not os.path.exists(src_path):
+        if not os.path.exists(upload_path(file_id)):
             return Response({"detail": "file not found"}, status=404)
 
+        tiled = _truthy(request.data.get("tiled")) or _truthy(request.query_params.get("tiled"))
+        if _truthy(request.data.get("async")) or _truthy(request.query_params.get("async")):
+            job = jobs.enqueue(file_id, tiled=tiled)
+            return Response(_job_payload(job, depth=True), status=202)
+
         # panggil inference, tangkap error jaringan supaya 502 bukan 500
         try:
-            result = call_inference(src_path)
+            det = run_detection(file_id, tiled=tiled)
         except (requests.ConnectionError, requests.Timeout) as e:
             return Response(
                 {"detail": f"inference backend unavailable: {e.__class__.__name__}"},
@@ -85,39 +146,299 @@ class DetectView(views.APIView):
         except Exception as e:
             return Response({"detail": f"inference error: {e}"}, status=500)
 
-        items = result.get("items", [])
+        return Response(DetectionSerializer(det).data)
 
-        det = Detection.objects.create(
-            filename=file_id,
-            file_url=settings.MEDIA_URL + "uploads/" + file_id,
-            model_version=result.get("model_version", "1.0"),
-            pod_id=result.get("pod_id", "inference-local"),
-            total_objects=len(items),
-            avg_conf=statistics.fmean([i["confidence"] for i in items]) if items else 0.0,
-        )
 
-        DetectionItem.objects.bulk_create([
-            DetectionItem(detection=det, **i) for i in items
-        ])
+class DetectBatchView(views.APIView):
+    """
+    POST {"file_ids": [...]} → deteksi banyak file yang sudah diupload sekaligus.
+    Balas hasil per file (urutan sama): detection atau error + status_code.
+    """
+    parser_classes = (JSONParser,)
+    permission_classes = [IsAuthenticated]
 
-        annotated_url = draw_boxes_and_save(src_path, items) if items else None
-        if annotated_url:
-            det.annotated_url = annotated_url
-            det.save(update_fields=["annotated_url"])
+    def post(self, request):
+        file_ids = request.data.get("file_ids")
+        if not isinstance(file_ids, list) or not file_ids:
+            return Response({"detail": "file_ids (list) required"}, status=400)
+        if len(file_ids) > BATCH_MAX_FILES:
+            return Response({"detail": f"max {BATCH_MAX_FILES} files per batch"}, status=413)
+
+        results = run_detection_batch(file_ids)
+        # items semua detection dalam 1 query, bukan 1 query per detection
+        prefetch_related_objects([r["detection"] for r in results if "detection" in r], "items")
+        for r in results:
+            if "detection" in r:
+                r["detection"] = DetectionSerializer(r["detection"]).data
+        return Response({
+            "total": len(results),
+            "succeeded": sum("detection" in r for r in results),
+            "results": results,
+        })
 
-        return Response(DetectionSerializer(det).data)
+
+def _truthy(v):
+    return v is True or str(v).lower() in ("1", "true", "yes", "on")
+
+
+def _job_payload(job, depth=False):
+    data = {
+        "job_id": str(job.id),
+        "status": job.status,
+        "file_id": job.file_id,
+        "tiled": job.tiled,
+        "attempts": job.attempts,
+        "error": job.error or None,
+        "created_at": job.created_at.isoformat(),
+        "updated_at": job.updated_at.isoformat(),
+        "detection": DetectionSerializer(job.detection).data if job.detection_id else None,
+    }
+    if depth:
+        data["queue_depth"] = jobs.queue_depth()
+    return data
+
+
+# long-poll GET jobs/<id>?wait=N: di ASGI menunggu lewat asyncio.sleep (async_views.job_detail,
+# tanpa memegang thread); di WSGI tiap detik tunggu memegang satu worker sync → dibatasi
+# DETECT_JOB_WAIT_MAX_SYNC (default 0: langsung balas, client polling sendiri)
+JOB_WAIT_MAX = 30.0
+JOB_WAIT_MAX_SYNC = float(os.getenv("DETECT_JOB_WAIT_MAX_SYNC", "0"))
+JOB_WAIT_STEP = 0.25
+
+
+def _job_wait(request, cap):
+    try:
+        return max(0.0, min(float(request.GET.get("wait", "0")), cap))
+    except ValueError:
+        return 0.0
+
+
+def _job_state(id):
+    """(selesai?, payload) job, atau None kalau tidak ada."""
+    job = DetectionJob.objects.select_related("detection").filter(id=id).first()
+    if job is None:
+        return None
+    return job.status in JobDetailView.TERMINAL, _job_payload(job)
+
+
+class JobDetailView(views.APIView):
+    """
+    GET jobs/<id>?wait=N → long-poll: tunggu maksimal N detik sampai job
+    selesai/gagal, lalu balas status terakhir. N dibatasi JOB_WAIT_MAX_SYNC
+    di sini (WSGI) dan JOB_WAIT_MAX di versi async.
+    """
+    permission_classes = [IsAuthenticated]
+    TERMINAL = (DetectionJob.DONE, DetectionJob.FAILED)
+
+    def get(self, request, id):
+        deadline = time.monotonic() + _job_wait(request, JOB_WAIT_MAX_SYNC)
+        while True:
+            state = _job_state(id)
+            if state is None:
+                return Response({"detail": "job not found"}, status=404)
+            done, payload = state
+            if done or time.monotonic() >= deadline:
+                return Response(payload)
+            time.sleep(JOB_WAIT_STEP)
+
+
+class JobQueueView(views.APIView):
+    """Kedalaman antrean job per status."""
+    permission_classes = [IsAuthenticated]
+
+    def get(self, _):
+        return Response({"queue_depth": jobs.queue_depth(), "workers": jobs.JOB_WORKERS})
+
+
+def _float_param(request, name, default, lo, hi):
+    raw = request.data.get(name, request.query_params.get(name))
+    if raw in (None, ""):
+        return default
+    try:
+        return max(lo, min(float(raw), hi))
+    except (TypeError, ValueError):
+        raise ParseError(f"{name}: expected a number")
+
+
+def _session_payload(session, detections=False):
+    data = {
+        "session_id": str(session.id),
+        "kind": session.kind,
+        "source": session.source,
+        "status": session.status,
+        "sample_fps": session.sample_fps,
+        "frames_sampled": session.frames_sampled,
+        "frames_skipped": session.frames_skipped,
+        "frames_detected": session.frames_detected,
+        "frames_failed": session.frames_failed,
+        "error": session.error or None,
+        "created_at": session.created_at.isoformat(),
+        "updated_at": session.updated_at.isoformat(),
+    }
+    if detections:
+        dets = session.detections.defer("boxes", "box_classes").order_by("frame_index")
+        data["detections"] = [
+            dict(DetectionListSerializer(d).data, frame_index=d.frame_index, frame_ms=d.frame_ms)
+            for d in dets
+        ]
+    return data
+
+
+class IngestView(views.APIView):
+    """
+    Ingest CCTV: satu Detection per frame sampel, frame hampir-duplikat dilewati.
+      multipart "file" = video (mp4/avi/mov/mkv/webm), atau
+      JSON {"file_ids": [...]} = urutan frame yang sudah diupload.
+    Opsi (form/JSON/query): sample_fps, diff_threshold, keyframe_every, async
+    (default: 1 untuk video, 0 untuk file_ids).
+    async → 202 + session_id + job_id: dijalankan worker job (jobs.py),
+    progres di GET ingest/<id>.
+    """
+    parser_classes = (VideoUploadParser, FormParser, JSONParser)
+    permission_classes = [IsAuthenticated]
+
+    def post(self, request):
+        sample_fps = _float_param(request, "sample_fps", ingest.INGEST_SAMPLE_FPS, 0.01, 120)
+        options = {
+            "diff_threshold": _float_param(request, "diff_threshold", ingest.INGEST_DIFF_THRESHOLD, 0, 255),
+            "keyframe_every": int(_float_param(request, "keyframe_every", ingest.INGEST_KEYFRAME_EVERY, 0, 10000)),
+        }
+        raw_async = request.data.get("async", request.query_params.get("async"))
+
+        f = request.FILES.get("file")
+        # video (sampai INGEST_MAX_BYTES) default async: ratusan frame tidak diproses di dalam request
+        background = f is not None if raw_async in (None, "") else _truthy(raw_async)
+        if f is not None:
+            if f.too_large:
+                storage.discard(f)
+                return Response({"detail": "file too large"}, status=413)
+            if f.content_type not in storage.VIDEO_EXTENSIONS:
+                storage.discard(f)
+                return Response({"detail": "only mp4/avi/mov/mkv/webm video"}, status=415)
+            file_id, _ = storage.commit(f, storage.VIDEO_EXTENSIONS)
+            session = IngestSession.objects.create(kind=IngestSession.VIDEO, source=f.name or file_id,
+                                                   file_id=file_id, sample_fps=sample_fps, **options)
+        else:
+            file_ids = request.data.get("file_ids")
+            if not isinstance(file_ids, list) or not file_ids:
+                return Response({"detail": "video file or file_ids (list) required"}, status=400)
+            if len(file_ids) > ingest.INGEST_MAX_FRAMES:
+                return Response({"detail": f"max {ingest.INGEST_MAX_FRAMES} frames"}, status=413)
+            missing = [i for i in file_ids if not os.path.exists(upload_path(str(i)))]
+            if missing:
+                return Response({"detail": "file not found", "file_ids": missing}, status=404)
+            session = IngestSession.objects.create(kind=IngestSession.FRAMES, source="frames",
+                                                   file_ids=[str(i) for i in file_ids], **options)
+
+        if background:
+            # DetectionJob: selamat dari restart gateway (requeue + lanjut dari resume_index)
+            job = jobs.enqueue_ingest(session)
+            return Response(dict(_session_payload(session), job_id=str(job.id)), status=202)
+        session = ingest.run_session(session)
+        return Response(_session_payload(session, detections=True))
+
+
+class IngestDetailView(views.APIView):
+    permission_classes = [IsAuthenticated]
+
+    def get(self, request, id):
+        session = IngestSession.objects.filter(id=id).first()
+        if session is None:
+            return Response({"detail": "session not found"}, status=404)
+        return Response(_session_payload(session, detections=True))
+
+
+class StreamTicketView(views.APIView):
+    """Tiket sekali pakai (FEED_TICKET_TTL) untuk GET /api/detect/stream?ticket=."""
+    permission_classes = [IsAuthenticated]
+
+    def post(self, request):
+        if not settings.GATEWAY_ASYNC:
+            return Response({"detail": "live feed requires the ASGI gateway (GATEWAY_ASYNC=1)"}, status=501)
+        return Response({"ticket": feed.issue_ticket(request.user),
+                         "expires_in": int(feed.FEED_TICKET_TTL.total_seconds())}, status=201)
+
+
+class CacheStatsView(views.APIView):
+    """Statistik cache hasil inferensi (hit/miss per tier)."""
+    permission_classes = [IsAuthenticated]
+
+    def get(self, _):
+        return Response(cache.stats())
+
+
+class InferenceStatsView(views.APIView):
+    """Statistik client gateway → inference (latency, reuse koneksi) untuk proses ini."""
+    permission_classes = [IsAuthenticated]
+
+    def get(self, _):
+        data = inference_client().stats()
+        if settings.GATEWAY_ASYNC:
+            data["async"] = async_inference_client().stats()   # client httpx view async
+        return Response(data)
+
+
+class ResultsPagination(CursorPagination):
+    """Keyset pagination: halaman berikut = WHERE (created_at, id) < cursor, tanpa OFFSET."""
+    ordering = ("-created_at", "-id")
+    page_size = 50
+    page_size_query_param = "page_size"
+    max_page_size = 200
+
+
+def _parse_bound(value, name):
+    """ISO datetime atau tanggal saja → (datetime aware, date_only)."""
+    try:
+        # format benar tapi tanggal tidak ada (2024-02-30, jam 25) → ValueError dari parser
+        dt = parse_datetime(value)
+        d = parse_date(value) if dt is None else None
+    except ValueError:
+        raise ParseError(f"{name}: invalid date or datetime")
+    date_only = dt is None
+    if date_only:
+        if d is None:
+            raise ParseError(f"{name}: expected ISO date or datetime")
+        dt = datetime.combine(d, datetime.min.time())
+    if timezone.is_naive(dt):
+        dt = timezone.make_aware(dt)
+    return dt, date_only
 
 
 class ResultsListView(generics.ListAPIView):
+    """
+    GET ?from=&to=&klass=&model_version=&page_size=&cursor=
+    `to` berupa tanggal saja berarti sampai akhir hari itu.
+    """
     permission_classes = [IsAuthenticated]
-    serializer_class = DetectionSerializer
-    queryset = Detection.objects.all().order_by("-created_at")
+    serializer_class = DetectionListSerializer
+    pagination_class = ResultsPagination
+
+    def get_queryset(self):
+        qs = Detection.objects.defer("boxes", "box_classes")   # blob box tidak perlu di list
+        p = self.request.query_params
+        if p.get("from"):
+            qs = qs.filter(created_at__gte=_parse_bound(p["from"], "from")[0])
+        if p.get("to"):
+            to, date_only = _parse_bound(p["to"], "to")
+            if date_only:
+                qs = qs.filter(created_at__lt=to + timedelta(days=1))
+            else:
+                qs = qs.filter(created_at__lte=to)
+        if p.get("model_version"):
+            qs = qs.filter(model_version=p["model_version"])
+        if p.get("klass"):
+            # EXISTS, bukan JOIN + DISTINCT: satu baris per detection tetap;
+            # detection packed dicocokkan lewat tabel kelasnya
+            klass = p["klass"]
+            qs = qs.filter(Exists(DetectionItem.objects.filter(detection=OuterRef("pk"), klass=klass))
+                           | Q(box_classes__contains=f"\n{klass}\n"))
+        return qs
 
 
 class ResultDetailView(generics.RetrieveAPIView):
     permission_classes = [IsAuthenticated]
     serializer_class = DetectionSerializer
-    queryset = Detection.objects.all()
+    queryset = Detection.objects.prefetch_related("items")
     lookup_field = "id"
 
 
@@ -125,7 +446,7 @@ class ResultDetailView(generics.RetrieveAPIView):
 @permission_classes([IsAuthenticated])
 def summary(request):
     """
-    GET ?days=7 (1..90)
+    GET ?days=7 (1..90): hari ini + (days-1) hari kalender sebelumnya.
     """
     try:
         days = int(request.GET.get("days", "7"))
@@ -133,48 +454,5 @@ def summary(request):
     except ValueError:
         days = 7
 
-    end = timezone.now()
-    start = end - timedelta(days=days)
-
-    q = Detection.objects.filter(created_at__gte=start, created_at__lte=end).order_by("-created_at")
-
-    total_images = q.count()
-    total_objects = q.aggregate(s=Sum("total_objects"))["s"] or 0
-    avg_conf = q.aggregate(a=Avg("avg_conf"))["a"] or 0.0
-
-    per_day = (
-        q.annotate(day=TruncDate("created_at"))
-         .values("day")
-         .annotate(images=Count("id"), avg_conf=Avg("avg_conf"), objects=Sum("total_objects"))
-         .order_by("day")
-    )
-    series = [{
-        "date": d["day"].isoformat(),
-        "images": d["images"],
-        "avg_conf": round(float(d["avg_conf"] or 0.0), 3),
-        "objects": int(d["objects"] or 0),
-    } for d in per_day]
-
-    items_q = DetectionItem.objects.filter(detection__in=q)
-    per_class = items_q.values("klass").annotate(count=Count("id")).order_by("-count")
-    by_class = [{"klass": r["klass"] or "Unknown", "count": r["count"]} for r in per_class]
-
-    latest = [{
-        "id": r.id,
-        "created_at": r.created_at.isoformat(),
-        "filename": r.filename,
-        "annotated_url": r.annotated_url,
-        "file_url": r.file_url,
-        "total_objects": r.total_objects or 0,
-        "avg_conf": round(float(r.avg_conf or 0.0), 3),
-    } for r in q[:5]]
-
-    return Response({
-        "range_days": days,
-        "total_images": total_images,
-        "total_objects": total_objects,
-        "avg_conf": round(float(avg_conf), 3),
-        "series": series,
-        "by_class": by_class,
-        "latest": latest,
-    })
\ No newline at end of file
+    # dari rollup harian (rollup.py): O(jumlah hari), bukan scan semua item
+    return Response(rollup.summary(days))
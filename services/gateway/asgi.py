@@ -1,5 +1,5 @@
 """
-ASGI config for config project.
+ASGI config for the gateway.
 
 It exposes the ASGI callable as a module-level variable named ``application``.
 
@@ -11,6 +11,12 @@ import os
 
 from django.core.asgi import get_asgi_application
 
-os.environ.setdefault('DJANGO_SETTINGS_MODULE', 'config.settings')
+os.environ.setdefault('DJANGO_SETTINGS_MODULE', 'settings')
 
 application = get_asgi_application()
+
+# worker job embedded (DETECT_JOB_EMBEDDED=1): ambil job queued / stale dari
+# sebelum restart tanpa menunggu enqueue berikutnya
+from detect_svc import jobs  # noqa: E402
+
+jobs.start_embedded()
@@ -39,6 +39,7 @@ INSTALLED_APPS = [
 # === Middleware ===
 MIDDLEWARE = [
     "corsheaders.middleware.CorsMiddleware",
+    "detect_svc.middleware.RequestMetricsMiddleware",
     "django.middleware.security.SecurityMiddleware",
     "django.contrib.sessions.middleware.SessionMiddleware",
     "django.middleware.common.CommonMiddleware",
@@ -52,11 +53,16 @@ MIDDLEWARE = [
 CORS_ALLOW_ALL_ORIGINS = os.getenv("CORS_ALLOW_ALL", "1") in ("1", "true", "True")
 if not CORS_ALLOW_ALL_ORIGINS:
     CORS_ALLOWED_ORIGINS = os.getenv("CORS_ALLOWED_ORIGINS", "").split(",")
+# header tracing boleh dibaca frontend (fetch dari origin lain)
+CORS_EXPOSE_HEADERS = ["X-Request-ID", "Server-Timing"]
 CSRF_TRUSTED_ORIGINS = [u for u in os.getenv("CSRF_TRUSTED_ORIGINS", "http://localhost,http://127.0.0.1").split(",") if u]
 
-# === URL / WSGI ===
+# === URL / WSGI / ASGI ===
 ROOT_URLCONF = "urls"
 WSGI_APPLICATION = "wsgi.application"
+ASGI_APPLICATION = "asgi.application"
+# 1 → endpoint detect async (detect_svc/async_views.py); jalankan dengan uvicorn asgi:application
+GATEWAY_ASYNC = os.getenv("GATEWAY_ASYNC", "0").lower() in ("1", "true", "yes", "on")
 
 TEMPLATES = [{
     "BACKEND": "django.template.backends.django.DjangoTemplates",
@@ -104,6 +110,13 @@ else:
             "CONN_MAX_AGE": 60,
         }
     }
+    if GATEWAY_ASYNC:
+        # ASGI: kode sync jalan di thread per request → koneksi persisten tidak
+        # terpakai ulang; pakai pool psycopg (Django ≥ 5.1) sebagai gantinya
+        DATABASES["default"]["CONN_MAX_AGE"] = 0
+        DATABASES["default"]["OPTIONS"] = {
+            "pool": {"min_size": 2, "max_size": int(os.getenv("DB_POOL_MAX", "20"))},
+        }
 
 # === Inference ===
 INFERENCE_URL = os.getenv("INFERENCE_URL", "http://inference:8001")
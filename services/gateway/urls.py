@@ -1,6 +1,8 @@
 from django.contrib import admin
 from django.urls import path, include
-from django.http import JsonResponse
+from django.http import HttpResponse, JsonResponse
+
+from detect_svc import metrics
 
 # JWT views
 from rest_framework_simplejwt.views import (
@@ -12,9 +14,14 @@ from rest_framework_simplejwt.views import (
 def health(_):
     return JsonResponse({"status": "ok"})
 
+def metrics_view(_):
+    # tidak lewat /api/ → tidak diekspos nginx; di-scrape langsung ke gateway:8000
+    return HttpResponse(metrics.REGISTRY.render(), content_type=metrics.CONTENT_TYPE)
+
 urlpatterns = [
     path("", health),
     path("api/health/", health),
+    path("metrics", metrics_view),
 
     # Auth (JWT) – pakai views langsung, bukan include()
     path("api/auth/token/", TokenObtainPairView.as_view(), name="token_obtain_pair"),
@@ -1,7 +1,19 @@
-from fastapi import FastAPI, UploadFile, File, HTTPException
-import io, socket, tempfile                                # ✨ CHANGED
+from fastapi import FastAPI, UploadFile, File, Header, HTTPException, Query, Request, Response
+from fastapi.concurrency import run_in_threadpool
+from fastapi.responses import JSONResponse
+import asyncio, hmac, io, os, re, socket, time, uuid
+from collections import namedtuple
+from typing import List
+from concurrent.futures import ThreadPoolExecutor
+import numpy as np
 from PIL import Image, ImageOps                           # ✨ CHANGED
-from ultralytics import YOLO
+
+import metrics
+import postprocess
+import tiling
+from backends import BACKENDS, load_backend
+from batching import MicroBatcher, QueueFull, Stopped
+from model_registry import ModelRegistry
 
 # ==== KONFIG FIX (tanpa .env) ====
 WEIGHTS_PATH = "models/bestardhika.pt"
@@ -12,62 +24,535 @@ MAX_DET      = 300
 DEVICE       = "cpu"
 MODEL_VERSION = "1.0"
 
-model = YOLO(WEIGHTS_PATH).to(DEVICE)
+# runtime model: torch | onnx | openvino | torchscript (lihat backends.py)
+INFER_BACKEND = os.getenv("INFER_BACKEND", "torch")
+
+# ==== Micro-batching (boleh di-override lewat env) ====
+# BATCH_MAX_SIZE=1 → praktis sama dengan tanpa batching
+BATCH_MAX_SIZE    = int(os.getenv("BATCH_MAX_SIZE", "8"))
+BATCH_MAX_WAIT_MS = float(os.getenv("BATCH_MAX_WAIT_MS", "10"))
+
+# ==== Worker pool & admission ====
+# INFER_WORKERS   : jumlah batch yang boleh jalan paralel (thread pool); hanya
+#                   untuk backend export (onnx / openvino / torchscript). torch
+#                   (ultralytics) tidak bisa predict paralel pada satu model →
+#                   selalu 1 worker, paralelisme lewat INFER_THREADS (intra-op)
+# INFER_THREADS   : intra-op thread runtime; default CPU dibagi rata ke worker
+#                   (TORCH_THREADS tetap diterima untuk kompatibilitas)
+# INFER_QUEUE_MAX : maksimal request antre+jalan; lebih dari itu → 503
+def parallel_workers(backend, requested):
+    """Worker efektif: backend yang tidak aman dipanggil paralel dibatasi 1."""
+    cls = BACKENDS.get(backend.lower())
+    return max(1, requested) if cls is None or cls.concurrent else 1
+
+
+INFER_WORKERS   = parallel_workers(INFER_BACKEND, int(os.getenv("INFER_WORKERS", "1")))
+INFER_THREADS   = max(1, int(os.getenv("INFER_THREADS") or os.getenv("TORCH_THREADS") or "0")
+                  or (os.cpu_count() or 1) // INFER_WORKERS)
+INFER_QUEUE_MAX = int(os.getenv("INFER_QUEUE_MAX", "64"))
+RETRY_AFTER_S   = int(os.getenv("RETRY_AFTER_S", "2"))
+# maksimal jumlah file per request /infer/batch
+INFER_BATCH_MAX_FILES = int(os.getenv("INFER_BATCH_MAX_FILES", "64"))
+
+# ==== Mode tile (?tiled=1, lihat tiling.py) ====
+# TILE_SIZE     : sisi window (piksel gambar asli), TILE_OVERLAP: fraksi tumpang tindih
+# TILE_MAX      : maksimal window per gambar (window diperbesar kalau lebih)
+# TILE_MIN_SIDE : sisi terpanjang di bawah ini → tetap fast path walau ?tiled=1
+# TILE_FULL     : gambar utuh ikut di-inference (objek besar yang terpotong antar tile)
+# TILE_MATCH    : ambang IoS penggabungan box antar tile
+TILE_SIZE     = int(os.getenv("INFER_TILE_SIZE", str(IMG_SIZE)))
+TILE_OVERLAP  = float(os.getenv("INFER_TILE_OVERLAP", "0.2"))
+TILE_MAX      = int(os.getenv("INFER_TILE_MAX", "16"))
+TILE_MIN_SIDE = int(os.getenv("INFER_TILE_MIN_SIDE", str(2 * IMG_SIZE)))
+TILE_FULL     = os.getenv("INFER_TILE_FULL", "1") == "1"
+TILE_MATCH    = float(os.getenv("INFER_TILE_MATCH", "0.6"))
+
+# ==== Registry model & hot-reload (lihat model_registry.py) ====
+# MODEL_REGISTRY      : folder versi weights
+# INFER_MODEL_VERSION : versi saat start (default: ACTIVE → terbaru → WEIGHTS_PATH lama)
+# INFER_WARMUP_RUNS   : forward pass sintetis sebelum /healthz hijau dan sebelum ganti versi
+# INFER_ADMIN_TOKEN   : header X-Admin-Token untuk /admin/*; kosong → endpoint admin mati
+MODEL_REGISTRY    = os.getenv("MODEL_REGISTRY", "models/registry")
+WARMUP_RUNS       = int(os.getenv("INFER_WARMUP_RUNS", "2"))
+INFER_ADMIN_TOKEN = os.getenv("INFER_ADMIN_TOKEN", "")
+
+LoadedModel = namedtuple("LoadedModel", "version backend")
+registry = ModelRegistry(MODEL_REGISTRY)
+
+
+def load_model(version=None):
+    """Versi di registry (None → WEIGHTS_PATH lama sebagai MODEL_VERSION) → LoadedModel."""
+    # setting thread runtime berlaku per-proses, jadi dibagi berdasarkan jumlah worker
+    backend = load_backend(
+        INFER_BACKEND,
+        registry.weights_path(version) if version else WEIGHTS_PATH,
+        conf=CONF_THRESH,
+        iou=IOU_THRESH,
+        imgsz=IMG_SIZE,
+        max_det=MAX_DET,
+        device=DEVICE,
+        threads=INFER_THREADS,
+    )
+    return LoadedModel(version or MODEL_VERSION, backend)
+
+
+def warmup(backend, runs=WARMUP_RUNS):
+    """Forward pass gambar sintetis (batch 1 dan BATCH_MAX_SIZE) → request pertama tidak bayar cold start."""
+    img = np.random.default_rng(0).integers(0, 256, (IMG_SIZE, IMG_SIZE, 3), dtype=np.uint8)
+    for _ in range(runs):
+        for n in sorted({1, BATCH_MAX_SIZE}):
+            backend.predict([img] * n)
+
+
+# model yang sedang melayani; saat ganti versi diganti utuh (satu assignment),
+# batch yang sudah berjalan selesai dengan model yang dipegangnya
+model = load_model(registry.initial(os.getenv("INFER_MODEL_VERSION") or None))
+# ready: warm-up model aktif sudah selesai (readiness /healthz)
+model_state = {"ready": False, "loading": None, "last_error": None, "switched_at": None}
 app = FastAPI(title="Inference Service", version=MODEL_VERSION)
 
+
+def predict_batch(images):
+    """Satu forward pass untuk banyak gambar; return list Detections (urutan sama)."""
+    return model.backend.predict(images)
+
+
+def predict_batch_timed(images):
+    """
+    Versi untuk batcher: hasil per gambar (Detections, {stage: detik}, LoadedModel).
+    Durasi stage milik seluruh batch → itulah yang dialami tiap request di dalamnya.
+    """
+    m = model   # satu model untuk seluruh batch walau versi diganti di tengah jalan
+    dets, timing = m.backend.predict_timed(images)
+    metrics.BATCH_SIZE.observe(len(images))
+    for stage, seconds in timing.items():
+        metrics.STAGE_SECONDS.observe(seconds, stage=stage)
+    return [(d, timing, m) for d in dets]
+
+
+def _warm_start():
+    try:
+        warmup(model.backend)
+    except Exception as e:
+        model_state["last_error"] = f"warm-up {model.version}: {e.__class__.__name__}: {e}"
+        return
+    model_state["ready"] = True
+
+
+def switch_model(version):
+    """Load + warm-up versi baru (di thread loader), lalu alihkan traffic ke versi itu."""
+    global model
+    t0 = time.perf_counter()
+    try:
+        try:
+            new = load_model(version)
+            warmup(new.backend)
+        except Exception as e:
+            model_state["last_error"] = f"load {version}: {e.__class__.__name__}: {e}"
+            metrics.MODEL_LOADS.inc(result="error")
+            return
+        # ACTIVE ditulis dulu baru traffic dialihkan: gagal tulis → versi lama tetap
+        # melayani dan tetap yang dipakai setelah restart (tidak pernah beda diam-diam)
+        try:
+            registry.set_active(version)
+        except OSError as e:
+            model_state["last_error"] = f"persist ACTIVE {version}: {e.__class__.__name__}: {e}"
+            metrics.MODEL_LOADS.inc(result="persist_error")
+            return
+        model = new
+        model_state.update(ready=True, last_error=None, switched_at=time.time())
+        metrics.MODEL_LOADS.inc(result="ok")
+    finally:
+        metrics.MODEL_LOAD_SECONDS.observe(time.perf_counter() - t0)
+        model_state["loading"] = None
+
+
+# load model baru tidak boleh memakai worker inference; satu load dalam satu waktu
+loader = ThreadPoolExecutor(max_workers=1, thread_name_prefix="model-load")
+
+
+executor = ThreadPoolExecutor(max_workers=INFER_WORKERS, thread_name_prefix="infer")
+batcher = MicroBatcher(
+    predict_batch_timed,
+    max_batch=BATCH_MAX_SIZE,
+    max_wait_ms=BATCH_MAX_WAIT_MS,
+    executor=executor,
+    max_concurrency=INFER_WORKERS,
+    max_pending=INFER_QUEUE_MAX,
+)
+
+
+metrics.REGISTRY.gauge(
+    "inference_model_info", "Model yang sedang melayani (1) dan status readiness",
+    lambda: {(model.version, model.backend.name, str(model_state["ready"]).lower()): 1},
+    ("version", "backend", "ready"), multiprocess="max")
+metrics.REGISTRY.gauge(
+    "inference_batcher", "Status micro-batcher saat ini (lihat /stats)",
+    lambda: {(k,): v for k, v in batcher.stats().items()
+             if k in ("queue_depth", "pending", "running_batches")},
+    ("field",))
+metrics.REGISTRY.counter_fn(
+    "inference_batcher_events_total", "Request ditolak (rejected), batch, dan gambar (items) micro-batcher",
+    lambda: {(k,): v for k, v in batcher.stats().items() if k in ("rejected", "batches", "items")},
+    ("event",))
+
+_REQUEST_ID_RE = re.compile(r"^[A-Za-z0-9._:-]{1,128}$")
+_route_paths = None
+
+
+def _route(request):
+    # hanya path route yang terdaftar jadi label (path sembarang → "unmatched")
+    global _route_paths
+    if _route_paths is None:
+        _route_paths = {getattr(r, "path", None) for r in app.routes}
+    return request.url.path if request.url.path in _route_paths else "unmatched"
+
+
+@app.middleware("http")
+async def _observe(request: Request, call_next):
+    """
+    Metrics per request + X-Request-ID (dari gateway, atau dibuat baru) +
+    Server-Timing berisi stage yang diisi endpoint di request.state.timings.
+    """
+    request_id = request.headers.get("x-request-id") or ""
+    if not _REQUEST_ID_RE.match(request_id):
+        request_id = uuid.uuid4().hex
+    request.state.timings = {}
+    t0 = time.perf_counter()
+    status = 500
+    try:
+        response = await call_next(request)
+        status = response.status_code
+        response.headers["X-Request-ID"] = request_id
+        if request.state.timings:
+            response.headers["Server-Timing"] = metrics.server_timing(request.state.timings)
+        return response
+    finally:
+        elapsed = time.perf_counter() - t0
+        path = _route(request)
+        metrics.REQUESTS.inc(method=request.method, path=path, status=status)
+        metrics.REQUEST_SECONDS.observe(elapsed, method=request.method, path=path)
+        if status >= 500:
+            metrics.REQUEST_ERRORS.inc(method=request.method, path=path)
+
+
+def _stage(request, name, seconds):
+    """Catat durasi stage ke histogram dan ke Server-Timing request ini (dijumlah)."""
+    if name not in ("preprocess", "forward", "nms"):   # tiga ini sudah dicatat per batch
+        metrics.STAGE_SECONDS.observe(seconds, stage=name)
+    t = request.state.timings
+    t[name] = t.get(name, 0.0) + seconds
+
+
+@app.on_event("startup")
+async def _start_batcher():
+    batcher.start()
+
+
+@app.on_event("startup")
+async def _warm_up():
+    # warm-up di thread loader; /healthz 503 sampai selesai
+    asyncio.get_running_loop().run_in_executor(loader, _warm_start)
+
+
+@app.on_event("shutdown")
+async def _stop_batcher():
+    await batcher.stop()
+    executor.shutdown(wait=False)
+    loader.shutdown(wait=False)
+
+
+# endpoint ringan dibuat async → langsung dilayani event loop,
+# tidak ikut antre di threadpool walau inference sedang penuh
 @app.get("/healthz")
-def healthz():
-    return {"status": "ok", "model_version": MODEL_VERSION}
+async def healthz():
+    # readiness: hijau hanya setelah warm-up model aktif selesai
+    if not model_state["ready"]:
+        return JSONResponse({"status": "warming", "model_version": model.version}, status_code=503)
+    return {"status": "ok", "model_version": model.version}
+
+
+@app.get("/config")
+async def config():
+    # dipakai gateway sebagai bagian dari key cache hasil inferensi
+    return {
+        "model_version": model.version,
+        "conf": CONF_THRESH,
+        "iou": IOU_THRESH,
+        "imgsz": IMG_SIZE,
+        "max_det": MAX_DET,
+        "backend": model.backend.name,
+        # ikut jadi bagian key cache gateway untuk hasil ?tiled=1
+        "tiling": f"{TILE_SIZE}/{TILE_OVERLAP}/{TILE_MAX}/{TILE_MIN_SIDE}/{int(TILE_FULL)}/{TILE_MATCH}",
+    }
+
+
+@app.get("/metrics")
+async def metrics_endpoint():
+    return Response(metrics.REGISTRY.render(), media_type=metrics.CONTENT_TYPE)
+
+
+@app.get("/stats")
+async def stats():
+    return {"batching": batcher.stats(), "backend": model.backend.name, "threads": INFER_THREADS,
+            "model_version": model.version, "ready": model_state["ready"]}
+
+
+def _check_admin(token):
+    if not INFER_ADMIN_TOKEN or not hmac.compare_digest(token or "", INFER_ADMIN_TOKEN):
+        raise HTTPException(status_code=403, detail="admin token required")
+
+
+@app.get("/admin/models")
+async def admin_models(x_admin_token: str = Header(None)):
+    _check_admin(x_admin_token)
+    return {
+        "active": model.version,
+        "backend": model.backend.name,
+        "versions": registry.versions(),
+        **model_state,
+    }
+
+
+@app.post("/admin/models/{version}/load", status_code=202)
+async def admin_load(version: str, x_admin_token: str = Header(None)):
+    """
+    Load versi dari registry di background, warm-up, lalu alihkan traffic.
+    Selama proses, versi lama tetap melayani; status di GET /admin/models.
+    """
+    _check_admin(x_admin_token)
+    try:
+        registry.weights_path(version)
+    except KeyError:
+        raise HTTPException(status_code=404, detail=f"version {version} not in registry")
+    # cek + set di event loop (satu thread) → tidak ada dua load bersamaan
+    if model_state["loading"]:
+        raise HTTPException(status_code=409, detail=f"already loading {model_state['loading']}")
+    model_state["loading"] = version
+    loader.submit(switch_model, version)
+    return {"status": "loading", "version": version, "active": model.version}
+
+
+def _busy(detail="inference queue full"):
+    return HTTPException(
+        status_code=503,
+        detail=detail,
+        headers={"Retry-After": str(RETRY_AFTER_S)},
+    )
+
+
+def decode_image(content: bytes):
+    """
+    Decode bytes upload → array BGR (H, W, 3) uint8, orientasi EXIF sudah dibetulkan.
+    Ultralytics menganggap input numpy berformat BGR (konvensi cv2), jadi urutan
+    channel RGB dari PIL dibalik di sini. Tidak ada encode ulang / file sementara.
+    """
+    pil = Image.open(io.BytesIO(content))
+    pil = ImageOps.exif_transpose(pil).convert("RGB")
+    return np.ascontiguousarray(np.asarray(pil)[:, :, ::-1])
+
+
+def parse_result(det, W, H, names=None):
+    """Detections backend → list item {klass, confidence, x, y, w, h} (pixel)."""
+    return postprocess.parse_result(det, W, H, model.backend.names if names is None else names)
+
+
+# ?format=items (default) → "items": list dict per box
+# ?format=columns         → "boxes": array paralel (postprocess.parse_columns)
+FORMAT_QUERY = Query("items", alias="format", pattern="^(%s)$" % "|".join(postprocess.FORMATS))
+# ?tiled=1 → gambar besar dipecah jadi tile (tiling.py); gambar kecil tetap fast path
+TILED_QUERY = Query(False, alias="tiled")
+
+
+def _output(res, W, H, fmt, names):
+    if fmt == "columns":
+        return {"boxes": postprocess.parse_columns(res, W, H, names)}
+    return {"items": parse_result(res, W, H, names)}
+
 
 @app.get("/labels")
-def labels():
-    return {"names": model.model.names}
+async def labels():
+    return {"names": model.backend.names}
+
+
+def _record_batch(request, waited, outs):
+    """
+    waited = lama submit (antre + forward batch); sisanya setelah stage model = queue.
+    Item satu request bisa terpecah ke beberapa batch: stage model tiap batch dihitung sekali.
+    """
+    batch_timings = {id(timing): timing for (_, timing, _), _ in outs}
+    merged = {}
+    for timing in batch_timings.values():
+        for name, seconds in timing.items():
+            merged[name] = merged.get(name, 0.0) + seconds
+    for name, seconds in merged.items():
+        _stage(request, name, seconds)
+    _stage(request, "queue", max(0.0, waited - sum(merged.values())))
+
+
+def _windows(img):
+    """Window tile untuk satu gambar, atau None (fast path: gambar kecil)."""
+    H, W = img.shape[:2]
+    if max(W, H) < TILE_MIN_SIDE:
+        return None
+    return tiling.grid(W, H, TILE_SIZE, TILE_OVERLAP, TILE_MAX, full=TILE_FULL)
+
+
+def _slice(images, tiled):
+    """→ (sumber untuk batcher, [(window | None, start, end)] per gambar)."""
+    sources, plans = [], []
+    for img in images:
+        windows = _windows(img) if tiled else None
+        start = len(sources)
+        sources.extend(tiling.crops(img, windows) if windows else [img])
+        plans.append((windows, start, len(sources)))
+    return sources, plans
+
+
+def _merge(images, plans, outs):
+    """Hasil batcher per sumber → [(Detections, batch_size, jumlah tile, LoadedModel)] per gambar."""
+    results = []
+    for img, (windows, a, b) in zip(images, plans):
+        part = outs[a:b]
+        batch_size = max(n for _, n in part)
+        # tile satu gambar bisa jatuh di dua versi kalau model diganti tepat di
+        # tengah; yang dilaporkan versi tile terakhir (gambar utuh)
+        m = part[-1][0][2]
+        if windows is None:
+            results.append((part[0][0][0], batch_size, 1, m))
+            continue
+        H, W = img.shape[:2]
+        det = tiling.merge([res for (res, _, _), _ in part], windows, W, H, TILE_MATCH, MAX_DET)
+        results.append((det, batch_size, len(windows), m))
+    return results
+
+
+async def _predict(request, images, tiled=False):
+    """
+    Gambar → [(Detections, batch_size, tiles, LoadedModel)] lewat micro-batcher. Semua tile
+    masuk antrean sekaligus, jadi dibagi ke forward pass (BATCH_MAX_SIZE) yang
+    jalan paralel di INFER_WORKERS worker. Raise QueueFull kalau antrean penuh.
+    """
+    if tiled:
+        t0 = time.perf_counter()
+        sources, plans = await run_in_threadpool(_slice, images, True)
+        _stage(request, "tile", time.perf_counter() - t0)
+    else:
+        sources, plans = _slice(images, False)
+
+    t1 = time.perf_counter()
+    outs = await batcher.submit_many(sources) if sources else []
+    t2 = time.perf_counter()
+    _record_batch(request, t2 - t1, outs)
+    if not tiled:
+        return _merge(images, plans, outs)
+    results = await run_in_threadpool(_merge, images, plans, outs)
+    _stage(request, "merge", time.perf_counter() - t2)
+    return results
+
 
 @app.post("/infer")
-async def infer(file: UploadFile = File(...)):
+async def infer(request: Request, file: UploadFile = File(...), fmt: str = FORMAT_QUERY,
+                tiled: bool = TILED_QUERY):
     if file.content_type not in ("image/jpeg", "image/png"):
         raise HTTPException(status_code=415, detail="only jpg/png")
 
+    # tolak lebih awal sebelum buang CPU untuk decode
+    if not batcher.has_capacity():
+        batcher.rejected += 1
+        raise _busy()
+
+    t0 = time.perf_counter()
     content = await file.read()
+    t1 = time.perf_counter()
+    _stage(request, "read", t1 - t0)
     try:
-        # perbaiki orientasi EXIF dan pastikan RGB
-        pil = Image.open(io.BytesIO(content))
-        pil = ImageOps.exif_transpose(pil).convert("RGB")   # ✨ CHANGED
+        # perbaiki orientasi EXIF, langsung jadi array (tanpa temp JPEG)
+        img = await run_in_threadpool(decode_image, content)
     except Exception:
         raise HTTPException(status_code=400, detail="invalid image")
+    t2 = time.perf_counter()
+    _stage(request, "decode", t2 - t1)
 
-    # ✅ simpan ke file sementara → predict pakai PATH (persis Colab)
-    with tempfile.NamedTemporaryFile(suffix=".jpg", delete=True) as tmp:   # ✨ CHANGED
-        pil.save(tmp.name, "JPEG", quality=95)                              # ✨ CHANGED
-        try:
-            res = model.predict(
-                source=tmp.name,          # ✨ CHANGED (path, bukan numpy)
-                conf=CONF_THRESH,
-                iou=IOU_THRESH,
-                imgsz=IMG_SIZE,
-                max_det=MAX_DET,
-                device=DEVICE,
-                agnostic_nms=False,       # ✨ CHANGED
-                verbose=False,
-            )[0]
-        except Exception as e:
-            raise HTTPException(status_code=500, detail=f"infer error: {e}")
+    try:
+        # digabung dengan request lain yang datang bersamaan (micro-batch)
+        [(res, batch_size, tiles, m)] = await _predict(request, [img], tiled)
+    except QueueFull:
+        raise _busy()
+    except Stopped:
+        raise _busy("inference shutting down")
+    except Exception as e:
+        raise HTTPException(status_code=500, detail=f"infer error: {e}")
+    t3 = time.perf_counter()
 
     # parse ke xywh (pixel)
-    items = []
-    if res.boxes is not None:
-        W, H = pil.size
-        xyxy = res.boxes.xyxy.cpu().numpy()
-        cls  = res.boxes.cls.cpu().numpy()
-        conf = res.boxes.conf.cpu().numpy()
-        names = res.names
-        for (x1,y1,x2,y2), c, p in zip(xyxy, cls, conf):
-            x1, y1 = int(max(0, x1)), int(max(0, y1))
-            x2, y2 = int(min(W-1, x2)), int(min(H-1, y2))
-            items.append({
-                "klass": names.get(int(c), str(int(c))),
-                "confidence": float(round(float(p), 4)),
-                "x": x1, "y": y1, "w": max(0, x2-x1), "h": max(0, y2-y1),
-            })
-
-    return {"model_version": MODEL_VERSION, "pod_id": socket.gethostname(), "items": items}
\ No newline at end of file
+    H, W = img.shape[:2]
+    out = _output(res, W, H, fmt, m.backend.names)
+    _stage(request, "parse", time.perf_counter() - t3)
+
+    body = {
+        "model_version": m.version,
+        "pod_id": socket.gethostname(),
+        "batch_size": batch_size,
+        **out,
+    }
+    if tiled:
+        body["tiles"] = tiles
+    return body
+
+
+@app.post("/infer/batch")
+async def infer_batch(request: Request, files: List[UploadFile] = File(...),
+                      fmt: str = FORMAT_QUERY, tiled: bool = TILED_QUERY):
+    """
+    Banyak gambar dalam satu request. Semua gambar yang valid masuk antrean
+    batcher sekaligus (jadi ikut satu/lebih forward pass bersama).
+    Error per file (format/decode) dilaporkan per index, bukan menggagalkan semua.
+    """
+    if len(files) > INFER_BATCH_MAX_FILES:
+        raise HTTPException(status_code=413, detail=f"max {INFER_BATCH_MAX_FILES} files")
+    if not batcher.has_capacity(len(files)):
+        batcher.rejected += 1
+        raise _busy()
+
+    results = [None] * len(files)
+    images, index = [], []
+    for i, f in enumerate(files):
+        if f.content_type not in ("image/jpeg", "image/png"):
+            results[i] = {"index": i, "status_code": 415, "error": "only jpg/png"}
+            continue
+        t0 = time.perf_counter()
+        content = await f.read()
+        t1 = time.perf_counter()
+        _stage(request, "read", t1 - t0)
+        try:
+            images.append(await run_in_threadpool(decode_image, content))
+            index.append(i)
+        except Exception:
+            results[i] = {"index": i, "status_code": 400, "error": "invalid image"}
+        _stage(request, "decode", time.perf_counter() - t1)
+
+    try:
+        outs = await _predict(request, images, tiled)
+    except QueueFull:
+        raise _busy()
+    except Stopped:
+        raise _busy("inference shutting down")
+    except Exception as e:
+        raise HTTPException(status_code=500, detail=f"infer error: {e}")
+    t3 = time.perf_counter()
+
+    for i, img, (res, batch_size, tiles, m) in zip(index, images, outs):
+        H, W = img.shape[:2]
+        results[i] = {"index": i, "batch_size": batch_size, "model_version": m.version,
+                      **_output(res, W, H, fmt, m.backend.names)}
+        if tiled:
+            results[i]["tiles"] = tiles
+    _stage(request, "parse", time.perf_counter() - t3)
+
+    return {
+        # per gambar ada model_version sendiri (bisa beda kalau versi diganti di tengah request)
+        "model_version": outs[0][3].version if outs else model.version,
+        "pod_id": socket.gethostname(),
+        "results": results,
+    }
@@ -0,0 +1,339 @@
+"""
+Runtime model yang bisa dipilih saat startup (env INFER_BACKEND):
+
+    torch        → ultralytics YOLO(.pt) (default, perilaku lama)
+    onnx         → ONNX Runtime, file  <weights>.onnx
+    openvino     → OpenVINO,     folder <weights>_openvino_model/
+    torchscript  → TorchScript,  file  <weights>.torchscript
+
+Semua backend menerima list array BGR uint8 (H, W, 3) dan mengembalikan
+list Detections dalam koordinat pixel gambar asli, jadi post-processing
+di app.py (klass, confidence, x/y/w/h) sama persis untuk semua backend.
+
+predict_timed() mengembalikan juga durasi per stage batch itu
+(preprocess / forward / nms, detik) untuk metrics & Server-Timing.
+
+Backend hasil export memakai pre/post-processing numpy yang meniru
+ultralytics: letterbox ke IMG_SIZE (pad 114), RGB/255, NCHW, lalu
+filter confidence + NMS per kelas + max_det, lalu skala balik ke gambar asli.
+Kalau file export belum ada dan ultralytics terpasang, file dibuat otomatis
+(`YOLO(pt).export(format=..., dynamic=True)`).
+"""
+import ast
+import json
+import os
+import time
+from collections import namedtuple
+
+import numpy as np
+
+# xyxy: (N, 4) float32, conf: (N,) float32, cls: (N,) int64
+Detections = namedtuple("Detections", "xyxy conf cls")
+
+# offset koordinat per kelas supaya NMS tidak lintas kelas (sama dgn ultralytics)
+_MAX_WH = 7680
+
+
+def _empty():
+    return Detections(np.zeros((0, 4), np.float32), np.zeros(0, np.float32), np.zeros(0, np.int64))
+
+
+class Backend:
+    name = "base"
+    # predict boleh dipanggil paralel dari beberapa thread pada instance yang sama
+    concurrent = True
+
+    def __init__(self, weights_path, conf=0.25, iou=0.7, imgsz=640, max_det=300,
+                 device="cpu", threads=None):
+        self.weights_path = weights_path
+        self.conf = conf
+        self.iou = iou
+        self.imgsz = imgsz
+        self.max_det = max_det
+        self.device = device
+        self.threads = threads
+        self.names = {}
+
+    def predict(self, images):
+        """images: list array BGR uint8 → list Detections (urutan sama)."""
+        return self.predict_timed(images)[0]
+
+    def predict_timed(self, images):
+        """Seperti predict, plus {stage: detik} untuk seluruh batch."""
+        raise NotImplementedError
+
+
+# ============================================================
+# PyTorch (ultralytics)
+# ============================================================
+class TorchBackend(Backend):
+    name = "torch"
+    # satu instance YOLO tidak mendukung predict paralel (ultralytics versi baru
+    # menguncinya secara internal) → worker tambahan hanya antre di lock itu
+    concurrent = False
+
+    def __init__(self, weights_path, **kw):
+        super().__init__(weights_path, **kw)
+        import torch
+        from ultralytics import YOLO
+
+        if self.threads:
+            torch.set_num_threads(self.threads)
+        try:
+            torch.set_num_interop_threads(1)
+        except RuntimeError:
+            pass  # sudah di-set (mis. reload) → abaikan
+
+        self.model = YOLO(weights_path).to(self.device)
+        self.names = dict(self.model.model.names)
+
+    def predict_timed(self, images):
+        results = self.model.predict(
+            source=images,
+            conf=self.conf,
+            iou=self.iou,
+            imgsz=self.imgsz,
+            max_det=self.max_det,
+            device=self.device,
+            agnostic_nms=False,
+            verbose=False,
+        )
+        out = []
+        for res in results:
+            if res.boxes is None:
+                out.append(_empty())
+                continue
+            out.append(Detections(
+                res.boxes.xyxy.cpu().numpy().astype(np.float32),
+                res.boxes.conf.cpu().numpy().astype(np.float32),
+                res.boxes.cls.cpu().numpy().astype(np.int64),
+            ))
+        # res.speed: ms per gambar (rata-rata batch) → total batch dalam detik
+        speed = results[0].speed if results else {}
+        n = len(results)
+        timing = {
+            "preprocess": (speed.get("preprocess") or 0.0) * n / 1000.0,
+            "forward": (speed.get("inference") or 0.0) * n / 1000.0,
+            "nms": (speed.get("postprocess") or 0.0) * n / 1000.0,
+        }
+        return out, timing
+
+
+# ============================================================
+# Model hasil export (pre/post-processing numpy)
+# ============================================================
+def letterbox(img, size, color=114):
+    """Resize dengan rasio tetap + padding ke (size, size). Return (img, gain, (padw, padh))."""
+    import cv2
+
+    h, w = img.shape[:2]
+    r = min(size / h, size / w)
+    nw, nh = int(round(w * r)), int(round(h * r))
+    dw, dh = (size - nw) / 2, (size - nh) / 2
+    if (w, h) != (nw, nh):
+        img = cv2.resize(img, (nw, nh), interpolation=cv2.INTER_LINEAR)
+    top, bottom = int(round(dh - 0.1)), int(round(dh + 0.1))
+    left, right = int(round(dw - 0.1)), int(round(dw + 0.1))
+    img = cv2.copyMakeBorder(img, top, bottom, left, right, cv2.BORDER_CONSTANT,
+                             value=(color, color, color))
+    return img, r, (left, top)
+
+
+def nms(boxes, scores, iou_thresh):
+    """Greedy NMS numpy. boxes xyxy (N, 4). Return index yang dipertahankan."""
+    x1, y1, x2, y2 = boxes.T
+    areas = (x2 - x1).clip(0) * (y2 - y1).clip(0)
+    order = scores.argsort()[::-1]
+    keep = []
+    while order.size:
+        i = order[0]
+        keep.append(i)
+        if order.size == 1:
+            break
+        rest = order[1:]
+        iw = (np.minimum(x2[i], x2[rest]) - np.maximum(x1[i], x1[rest])).clip(0)
+        ih = (np.minimum(y2[i], y2[rest]) - np.maximum(y1[i], y1[rest])).clip(0)
+        inter = iw * ih
+        iou = inter / (areas[i] + areas[rest] - inter + 1e-7)
+        order = rest[iou <= iou_thresh]
+    return np.asarray(keep, dtype=np.int64)
+
+
+class ExportedBackend(Backend):
+    suffix = ""
+
+    def __init__(self, weights_path, **kw):
+        super().__init__(weights_path, **kw)
+        self.path = self.exported_path(weights_path)
+        if not os.path.exists(self.path):
+            self.export(weights_path)
+        self.batchable = True   # False → model hanya terima batch 1, diloop per gambar
+        self._load()
+
+    @classmethod
+    def exported_path(cls, weights_path):
+        return os.path.splitext(weights_path)[0] + cls.suffix
+
+    def export(self, weights_path):
+        try:
+            from ultralytics import YOLO
+        except ImportError:
+            raise RuntimeError(
+                f"{self.path} tidak ada; export dulu: "
+                f"yolo export model={weights_path} format={self.name} imgsz={self.imgsz} dynamic=True"
+            )
+        YOLO(weights_path).export(format=self.name, imgsz=self.imgsz, dynamic=True)
+
+    def _load(self):
+        raise NotImplementedError
+
+    def _forward(self, batch):
+        """batch float32 (N, 3, S, S) → output mentah (N, 4+nc, anchors)."""
+        raise NotImplementedError
+
+    # ---------- pre/post ----------
+    def _preprocess(self, images):
+        tensors, meta = [], []
+        for img in images:
+            lb, r, pad = letterbox(img, self.imgsz)
+            tensors.append(lb[:, :, ::-1].transpose(2, 0, 1))   # BGR→RGB, HWC→CHW
+            meta.append((r, pad, img.shape[:2]))
+        batch = np.ascontiguousarray(np.stack(tensors), dtype=np.float32) / 255.0
+        return batch, meta
+
+    def _postprocess(self, pred, r, pad, shape):
+        pred = pred.T                                 # (anchors, 4+nc)
+        scores_all = pred[:, 4:]
+        cls = scores_all.argmax(1)
+        scores = scores_all[np.arange(len(cls)), cls]
+        m = scores > self.conf
+        if not m.any():
+            return _empty()
+        xywh, scores, cls = pred[m, :4], scores[m], cls[m]
+
+        boxes = np.empty_like(xywh)
+        boxes[:, :2] = xywh[:, :2] - xywh[:, 2:] / 2
+        boxes[:, 2:] = xywh[:, :2] + xywh[:, 2:] / 2
+
+        keep = nms(boxes + cls[:, None] * _MAX_WH, scores, self.iou)[: self.max_det]
+        boxes, scores, cls = boxes[keep], scores[keep], cls[keep]
+
+        # skala balik ke gambar asli
+        h, w = shape
+        boxes[:, [0, 2]] = ((boxes[:, [0, 2]] - pad[0]) / r).clip(0, w)
+        boxes[:, [1, 3]] = ((boxes[:, [1, 3]] - pad[1]) / r).clip(0, h)
+        return Detections(boxes.astype(np.float32), scores.astype(np.float32), cls.astype(np.int64))
+
+    def predict_timed(self, images):
+        if not images:
+            return [], {}
+        t0 = time.perf_counter()
+        batch, meta = self._preprocess(images)
+        t1 = time.perf_counter()
+        if self.batchable:
+            preds = self._forward(batch)
+        else:
+            preds = np.concatenate([self._forward(batch[i:i + 1]) for i in range(len(batch))])
+        t2 = time.perf_counter()
+        out = [self._postprocess(p, *m) for p, m in zip(preds, meta)]
+        t3 = time.perf_counter()
+        return out, {"preprocess": t1 - t0, "forward": t2 - t1, "nms": t3 - t2}
+
+
+class OnnxBackend(ExportedBackend):
+    name = "onnx"
+    suffix = ".onnx"
+
+    def _load(self):
+        import onnxruntime as ort
+
+        opts = ort.SessionOptions()
+        if self.threads:
+            opts.intra_op_num_threads = self.threads
+        opts.inter_op_num_threads = 1
+        self.session = ort.InferenceSession(self.path, sess_options=opts,
+                                            providers=["CPUExecutionProvider"])
+        inp = self.session.get_inputs()[0]
+        self.input_name = inp.name
+        self.batchable = not isinstance(inp.shape[0], int) or inp.shape[0] != 1
+        meta = self.session.get_modelmeta().custom_metadata_map
+        self.names = _parse_names(meta.get("names"))
+
+    def _forward(self, batch):
+        return self.session.run(None, {self.input_name: batch})[0]
+
+
+class OpenVinoBackend(ExportedBackend):
+    name = "openvino"
+    suffix = "_openvino_model"
+
+    def _load(self):
+        import openvino as ov
+
+        core = ov.Core()
+        xml = os.path.join(self.path, os.path.basename(os.path.splitext(self.weights_path)[0]) + ".xml")
+        model = core.read_model(xml)
+        config = {"PERFORMANCE_HINT": "LATENCY"}
+        if self.threads:
+            config["INFERENCE_NUM_THREADS"] = self.threads
+        self.compiled = core.compile_model(model, "CPU", config)
+        self.batchable = model.inputs[0].get_partial_shape()[0].is_dynamic
+        meta_path = os.path.join(self.path, "metadata.yaml")
+        if os.path.exists(meta_path):
+            import yaml
+
+            with open(meta_path) as f:
+                self.names = _parse_names((yaml.safe_load(f) or {}).get("names"))
+
+    def _forward(self, batch):
+        return self.compiled(batch)[self.compiled.output(0)]
+
+
+class TorchScriptBackend(ExportedBackend):
+    name = "torchscript"
+    suffix = ".torchscript"
+
+    def _load(self):
+        import torch
+
+        if self.threads:
+            torch.set_num_threads(self.threads)
+        extra = {"config.txt": ""}
+        self.module = torch.jit.load(self.path, map_location="cpu", _extra_files=extra).eval()
+        # hasil trace ultralytics tidak dijamin aman untuk batch > 1
+        self.batchable = False
+        if extra["config.txt"]:
+            self.names = _parse_names(json.loads(extra["config.txt"]).get("names"))
+
+    def _forward(self, batch):
+        import torch
+
+        with torch.inference_mode():
+            out = self.module(torch.from_numpy(batch))
+        if isinstance(out, (list, tuple)):
+            out = out[0]
+        return out.cpu().numpy()
+
+
+def _parse_names(raw):
+    """names di metadata export bisa dict, list, atau string repr dict."""
+    if raw is None:
+        return {}
+    if isinstance(raw, str):
+        raw = ast.literal_eval(raw)
+    if isinstance(raw, (list, tuple)):
+        raw = dict(enumerate(raw))
+    return {int(k): str(v) for k, v in raw.items()}
+
+
+BACKENDS = {
+    b.name: b for b in (TorchBackend, OnnxBackend, OpenVinoBackend, TorchScriptBackend)
+}
+
+
+def load_backend(name, weights_path, **kw):
+    try:
+        cls = BACKENDS[name.lower()]
+    except KeyError:
+        raise ValueError(f"backend tidak dikenal: {name} (pilihan: {', '.join(BACKENDS)})")
+    return cls(weights_path, **kw)
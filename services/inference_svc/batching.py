@@ -0,0 +1,198 @@
+"""
+Micro-batching untuk /infer.
+
+Request yang datang bersamaan dikumpulkan selama maksimal `max_wait_ms`
+(atau sampai `max_batch` item), lalu dijalankan dalam SATU forward pass.
+Hasil per item dikembalikan ke masing-masing request yang menunggu.
+
+Forward pass dijalankan di executor (thread pool) supaya event loop tetap
+bebas melayani /healthz dkk. Paling banyak `max_concurrency` batch jalan
+bersamaan; selama semua worker sibuk, request baru menumpuk di antrean dan
+otomatis membentuk batch yang lebih besar. Jumlah item yang antre + sedang
+diproses dibatasi `max_pending` → lebih dari itu `QueueFull`. Saat stop(),
+item yang masih antre (belum masuk batch) digagalkan dengan `Stopped`.
+"""
+import asyncio
+import time
+from collections import Counter
+
+
+class QueueFull(Exception):
+    """Antrean admission penuh; caller sebaiknya balas 503 + Retry-After."""
+
+
+class Stopped(Exception):
+    """Batcher dihentikan (shutdown) sebelum item diproses; caller balas 503."""
+
+
+def _fail(items, exc):
+    for _, fut, _ in items:
+        if not fut.done():
+            fut.set_exception(exc)
+
+
+class MicroBatcher:
+    def __init__(self, predict_fn, max_batch=8, max_wait_ms=10.0,
+                 executor=None, max_concurrency=1, max_pending=0):
+        # predict_fn(list_of_sources) -> list_of_results (urutan sama)
+        self.predict_fn = predict_fn
+        self.max_batch = max(1, int(max_batch))
+        self.max_wait = max(0.0, float(max_wait_ms)) / 1000.0
+        self.executor = executor
+        self.max_concurrency = max(1, int(max_concurrency))
+        self.max_pending = max(0, int(max_pending))   # 0 = tanpa batas
+        self.pending = 0
+        self.running = 0
+        self.rejected = 0
+        self._queue = None
+        self._task = None
+        self._slots = None
+        self._inflight = set()
+
+        # statistik batch yang benar-benar terjadi
+        self.batches = 0
+        self.items = 0
+        self.sizes = Counter()
+        self.max_wait_seen_ms = 0.0
+
+    # ---------- lifecycle ----------
+    def start(self):
+        if self._task is None:
+            self._queue = asyncio.Queue()
+            self._slots = asyncio.Semaphore(self.max_concurrency)
+            self._task = asyncio.get_running_loop().create_task(self._run())
+
+    async def stop(self):
+        if self._task is not None:
+            self._task.cancel()
+            try:
+                await self._task
+            except asyncio.CancelledError:
+                pass
+            self._task = None
+        # yang masih antre tidak akan pernah diambil _run → jangan biarkan menunggu selamanya
+        if self._queue is not None:
+            while not self._queue.empty():
+                _fail([self._queue.get_nowait()], Stopped())
+        if self._inflight:
+            await asyncio.gather(*self._inflight, return_exceptions=True)
+
+    # ---------- API ----------
+    def has_capacity(self, n=1):
+        return not self.max_pending or self.pending + n <= self.max_pending
+
+    async def submit(self, source):
+        """
+        Masukkan satu item ke antrean; return (result, batch_size).
+        Raise QueueFull kalau antrean admission sudah penuh.
+        """
+        return (await self.submit_many([source]))[0]
+
+    async def submit_many(self, sources):
+        """
+        Seperti submit untuk banyak item sekaligus (semua diterima atau semua
+        ditolak); return list (result, batch_size) dengan urutan sama.
+        """
+        if self._task is None:
+            self.start()
+        n = len(sources)
+        if not self.has_capacity(n):
+            self.rejected += 1
+            raise QueueFull()
+        self.pending += n
+        try:
+            loop = asyncio.get_running_loop()
+            now = time.perf_counter()
+            futs = []
+            for source in sources:
+                fut = loop.create_future()
+                self._queue.put_nowait((source, fut, now))
+                futs.append(fut)
+            return await asyncio.gather(*futs)
+        finally:
+            self.pending -= n
+
+    def stats(self):
+        return {
+            "max_batch": self.max_batch,
+            "max_wait_ms": round(self.max_wait * 1000.0, 3),
+            "batches": self.batches,
+            "items": self.items,
+            "avg_batch_size": round(self.items / self.batches, 3) if self.batches else 0.0,
+            "batch_sizes": {str(k): v for k, v in sorted(self.sizes.items())},
+            "queue_depth": self._queue.qsize() if self._queue is not None else 0,
+            "max_wait_seen_ms": round(self.max_wait_seen_ms, 3),
+            "workers": self.max_concurrency,
+            "running_batches": self.running,
+            "pending": self.pending,
+            "max_pending": self.max_pending,
+            "rejected": self.rejected,
+        }
+
+    # ---------- loop ----------
+    async def _collect(self):
+        # tunggu item pertama tanpa batas waktu, sisanya dibatasi window
+        batch = [await self._queue.get()]
+        deadline = time.perf_counter() + self.max_wait
+        try:
+            while len(batch) < self.max_batch:
+                remaining = deadline - time.perf_counter()
+                if remaining <= 0:
+                    break
+                try:
+                    batch.append(await asyncio.wait_for(self._queue.get(), remaining))
+                except asyncio.TimeoutError:
+                    break
+        except asyncio.CancelledError:
+            _fail(batch, Stopped())   # stop() di tengah window: item sudah keluar dari antrean
+            raise
+        # ambil yang sudah menumpuk tanpa menunggu lagi
+        while len(batch) < self.max_batch and not self._queue.empty():
+            batch.append(self._queue.get_nowait())
+        return batch
+
+    async def _run(self):
+        while True:
+            # tunggu worker kosong dulu, baru kumpulkan batch berikutnya
+            await self._slots.acquire()
+            try:
+                batch = await self._collect()
+            except BaseException:
+                self._slots.release()
+                raise
+            task = asyncio.get_running_loop().create_task(self._dispatch(batch))
+            self._inflight.add(task)
+            task.add_done_callback(self._inflight.discard)
+
+    async def _dispatch(self, batch):
+        try:
+            await self._execute(batch)
+        finally:
+            self._slots.release()
+
+    async def _execute(self, batch):
+        now = time.perf_counter()
+        # request yang sudah dibatalkan (client putus) tidak perlu diproses
+        batch = [b for b in batch if not b[1].done()]
+        if not batch:
+            return
+        n = len(batch)
+        self.batches += 1
+        self.items += n
+        self.sizes[n] += 1
+        self.max_wait_seen_ms = max(self.max_wait_seen_ms, (now - min(b[2] for b in batch)) * 1000.0)
+
+        loop = asyncio.get_running_loop()
+        self.running += 1
+        try:
+            results = await loop.run_in_executor(
+                self.executor, self.predict_fn, [b[0] for b in batch]
+            )
+        except Exception as e:
+            _fail(batch, e)
+            return
+        finally:
+            self.running -= 1
+        for (_, fut, _), res in zip(batch, results):
+            if not fut.done():
+                fut.set_result((res, n))
@@ -0,0 +1,117 @@
+"""
+Benchmark latency/throughput per backend pada set gambar yang sama.
+
+Pakai:
+    python bench.py path/ke/folder_gambar --backends torch onnx openvino \\
+        --batch 1 8 --runs 3 --json bench_backends.json
+
+Untuk tiap backend × ukuran batch dilaporkan p50/p95 latency per panggilan,
+throughput (gambar/detik), waktu load model, dan total deteksi (sanity check
+bahwa semua backend menghasilkan jumlah box yang mirip).
+"""
+import argparse
+import glob
+import json
+import os
+import sys
+import time
+
+import cv2
+import numpy as np
+
+from backends import load_backend
+
+# samakan dengan konfigurasi di app.py
+WEIGHTS_PATH = "models/bestardhika.pt"
+CONF_THRESH = 0.25
+IOU_THRESH = 0.70
+IMG_SIZE = 640
+MAX_DET = 300
+
+
+def _percentile(xs, q):
+    return float(np.percentile(xs, q)) if xs else 0.0
+
+
+def load_images(folder, limit=None):
+    paths = sorted(
+        p for ext in ("*.jpg", "*.jpeg", "*.png")
+        for p in glob.glob(os.path.join(folder, ext))
+    )[:limit]
+    return [cv2.imread(p) for p in paths]
+
+
+def bench_backend(name, images, batch_sizes, runs, warmup, threads):
+    t0 = time.perf_counter()
+    be = load_backend(name, WEIGHTS_PATH, conf=CONF_THRESH, iou=IOU_THRESH,
+                      imgsz=IMG_SIZE, max_det=MAX_DET, threads=threads)
+    load_s = time.perf_counter() - t0
+
+    for _ in range(warmup):
+        be.predict(images[:1])
+
+    rows = []
+    for bs in batch_sizes:
+        lat, n_img, n_det = [], 0, 0
+        t_start = time.perf_counter()
+        for _ in range(runs):
+            for i in range(0, len(images), bs):
+                chunk = images[i:i + bs]
+                t = time.perf_counter()
+                dets = be.predict(chunk)
+                lat.append((time.perf_counter() - t) * 1000.0)
+                n_img += len(chunk)
+                n_det += sum(len(d.conf) for d in dets)
+        wall = time.perf_counter() - t_start
+        rows.append({
+            "backend": name,
+            "batch": bs,
+            "calls": len(lat),
+            "p50_ms": round(_percentile(lat, 50), 2),
+            "p95_ms": round(_percentile(lat, 95), 2),
+            "per_image_ms": round(wall * 1000.0 / n_img, 2) if n_img else 0.0,
+            "throughput_ips": round(n_img / wall, 2) if wall else 0.0,
+            "detections_per_run": n_det // max(1, runs),
+            "load_s": round(load_s, 2),
+        })
+    return rows
+
+
+def main():
+    ap = argparse.ArgumentParser()
+    ap.add_argument("images", help="folder berisi jpg/png")
+    ap.add_argument("--backends", nargs="+", default=["torch", "onnx"])
+    ap.add_argument("--batch", nargs="+", type=int, default=[1, 8])
+    ap.add_argument("--runs", type=int, default=3)
+    ap.add_argument("--warmup", type=int, default=2)
+    ap.add_argument("--limit", type=int, default=None, help="maks jumlah gambar")
+    ap.add_argument("--threads", type=int, default=os.cpu_count() or 1)
+    ap.add_argument("--json", default=None, help="simpan hasil ke file JSON")
+    args = ap.parse_args()
+
+    images = load_images(args.images, args.limit)
+    if not images:
+        print("tidak ada gambar", file=sys.stderr)
+        return 2
+
+    rows = []
+    for name in args.backends:
+        try:
+            rows += bench_backend(name, images, args.batch, args.runs, args.warmup, args.threads)
+        except Exception as e:
+            print(f"[skip] {name}: {e}", file=sys.stderr)
+
+    cols = ("backend", "batch", "p50_ms", "p95_ms", "per_image_ms", "throughput_ips",
+            "detections_per_run", "load_s")
+    print(" ".join(f"{c:>18}" for c in cols))
+    for r in rows:
+        print(" ".join(f"{r[c]!s:>18}" for c in cols))
+
+    if args.json:
+        with open(args.json, "w") as f:
+            json.dump({"images": len(images), "results": rows}, f, indent=2)
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
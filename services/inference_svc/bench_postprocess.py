@@ -0,0 +1,121 @@
+"""
+Micro-benchmark post-processing: Detections → JSON (postprocess.py),
+tanpa model (box sintetis), jadi bisa dijalankan di mana saja.
+
+Pakai:
+    python bench_postprocess.py --boxes 1 50 300 --batch 1 8 --runs 200 \\
+        --json bench_postprocess.json
+
+Untuk tiap jumlah box × ukuran batch dibandingkan:
+    loop     → versi lama (loop Python per box, disimpan di sini sebagai pembanding)
+    items    → postprocess.parse_result (vektor, output list dict)
+    columns  → postprocess.parse_columns (vektor, output array paralel)
+dengan p50/p95 waktu parse seluruh batch, p50 json.dumps hasilnya (ikut
+dibayar tiap response), ukuran JSON, dan biaya per box. Paritas loop vs
+vektor dicek di test (detect_svc/tests.py PostprocessTests).
+"""
+import argparse
+import json
+import sys
+import time
+
+import numpy as np
+
+from backends import Detections
+from postprocess import parse_columns, parse_result
+
+NAMES = {i: n for i, n in enumerate([
+    "Safety helmet", "Wearpack", "No wearpack", "Dust mask", "No dust mask", "Ear protection",
+    "No ear protection", "Hand gloves", "No hand gloves", "Safety glasses", "No safety glasses",
+    "Safety shoes", "No safety shoes",
+])}
+
+
+def parse_result_loop(det, W, H, names):
+    """Versi lama (sebelum vektorisasi), sebagai pembanding."""
+    items = []
+    if len(det.conf):
+        for (x1,y1,x2,y2), c, p in zip(det.xyxy, det.cls, det.conf):
+            x1, y1 = int(max(0, x1)), int(max(0, y1))
+            x2, y2 = int(min(W-1, x2)), int(min(H-1, y2))
+            items.append({
+                "klass": names.get(int(c), str(int(c))),
+                "confidence": float(round(float(p), 4)),
+                "x": x1, "y": y1, "w": max(0, x2-x1), "h": max(0, y2-y1),
+            })
+    return items
+
+
+PARSERS = {"loop": parse_result_loop, "items": parse_result, "columns": parse_columns}
+
+
+def synthetic(n, W=1920, H=1080, seed=0):
+    """n box acak; sebagian sengaja keluar batas gambar (dipotong oleh parse_result)."""
+    rng = np.random.default_rng(seed)
+    xy = rng.uniform(-20, [W, H], size=(n, 2))
+    wh = rng.uniform(5, 300, size=(n, 2))
+    xyxy = np.concatenate([xy, xy + wh], axis=1).astype(np.float32)
+    conf = rng.uniform(0.25, 1.0, n).astype(np.float32)
+    cls = rng.integers(0, len(NAMES), n).astype(np.int64)
+    return Detections(xyxy, conf, cls), W, H
+
+
+def _percentile(xs, q):
+    return float(np.percentile(xs, q)) if xs else 0.0
+
+
+def bench(mode, boxes, batch, runs, warmup):
+    parse = PARSERS[mode]
+    dets = [synthetic(boxes, seed=i) for i in range(batch)]
+    parse_ms, dumps_ms = [], []
+    body = ""
+    for r in range(warmup + runs):
+        t0 = time.perf_counter()
+        out = [parse(d, W, H, NAMES) for d, W, H in dets]
+        t1 = time.perf_counter()
+        body = json.dumps(out)
+        t2 = time.perf_counter()
+        if r >= warmup:
+            parse_ms.append((t1 - t0) * 1000.0)
+            dumps_ms.append((t2 - t1) * 1000.0)
+    p50 = _percentile(parse_ms, 50)
+    return {
+        "mode": mode,
+        "boxes": boxes,
+        "batch": batch,
+        "runs": runs,
+        "parse_p50_ms": round(p50, 4),
+        "parse_p95_ms": round(_percentile(parse_ms, 95), 4),
+        "dumps_p50_ms": round(_percentile(dumps_ms, 50), 4),
+        "json_bytes": len(body),
+        "per_box_us": round(p50 * 1000.0 / (boxes * batch), 3) if boxes else 0.0,
+    }
+
+
+def main():
+    ap = argparse.ArgumentParser()
+    ap.add_argument("--modes", nargs="+", choices=list(PARSERS), default=list(PARSERS))
+    ap.add_argument("--boxes", nargs="+", type=int, default=[1, 50, 300])
+    ap.add_argument("--batch", nargs="+", type=int, default=[1, 8])
+    ap.add_argument("--runs", type=int, default=200)
+    ap.add_argument("--warmup", type=int, default=10)
+    ap.add_argument("--json", default=None, help="simpan hasil ke file JSON")
+    args = ap.parse_args()
+
+    rows = [bench(m, n, bs, args.runs, args.warmup)
+            for n in args.boxes for bs in args.batch for m in args.modes]
+
+    cols = ("mode", "boxes", "batch", "parse_p50_ms", "parse_p95_ms", "dumps_p50_ms",
+            "json_bytes", "per_box_us")
+    print(" ".join(f"{c:>14}" for c in cols))
+    for r in rows:
+        print(" ".join(f"{r[c]!s:>14}" for c in cols))
+
+    if args.json:
+        with open(args.json, "w") as f:
+            json.dump({"results": rows}, f, indent=2)
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,122 @@
+"""
+Benchmark mode tile (tiling.py): jumlah tile vs latency vs jumlah deteksi.
+
+Pakai:
+    python bench_tiling.py path/ke/folder_foto_4k --backend onnx \\
+        --tile-max 0 4 9 16 --batch 8 --workers 1 2 --json bench_tiling.json
+
+--tile-max 0 = tanpa tile (fast path, satu forward pass gambar utuh) sebagai
+pembanding. Untuk tiap setting × jumlah worker dilaporkan rata-rata tile per
+gambar, p50/p95 latency per gambar (slice + forward semua tile + merge),
+porsi merge, total deteksi, dan deteksi kecil (sisi terpanjang box
+< --small piksel) — kelas yang memang jadi alasan mode tile.
+
+Tile dikirim per chunk --batch ke backend.predict dan chunk dijalankan
+paralel di --workers thread, meniru BATCH_MAX_SIZE / INFER_WORKERS di app.py.
+"""
+import argparse
+import json
+import os
+import sys
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+import numpy as np
+
+import tiling
+from backends import load_backend
+from bench import CONF_THRESH, IMG_SIZE, IOU_THRESH, MAX_DET, WEIGHTS_PATH, load_images
+
+
+def _percentile(xs, q):
+    return float(np.percentile(xs, q)) if xs else 0.0
+
+
+def predict_tiled(be, pool, img, args, tile_max):
+    """Satu gambar → (Detections, jumlah tile, detik merge)."""
+    H, W = img.shape[:2]
+    if not tile_max:
+        return be.predict([img])[0], 1, 0.0
+    windows = tiling.grid(W, H, args.tile_size, args.overlap, tile_max, full=not args.no_full)
+    sources = tiling.crops(img, windows)
+    chunks = [sources[i:i + args.batch] for i in range(0, len(sources), args.batch)]
+    dets = [d for part in pool.map(be.predict, chunks) for d in part]
+    t = time.perf_counter()
+    det = tiling.merge(dets, windows, W, H, args.match, MAX_DET)
+    return det, len(windows), time.perf_counter() - t
+
+
+def bench(be, images, args, tile_max, workers):
+    lat, merge, tiles, n_det, n_small = [], [], 0, 0, 0
+    with ThreadPoolExecutor(max_workers=workers) as pool:
+        for _ in range(args.warmup):
+            predict_tiled(be, pool, images[0], args, tile_max)
+        for _ in range(args.runs):
+            for img in images:
+                t = time.perf_counter()
+                det, n, merge_s = predict_tiled(be, pool, img, args, tile_max)
+                lat.append((time.perf_counter() - t) * 1000.0)
+                merge.append(merge_s * 1000.0)
+                tiles += n
+                n_det += len(det.conf)
+                side = (det.xyxy[:, 2:] - det.xyxy[:, :2]).max(axis=1) if len(det.conf) else []
+                n_small += int(np.sum(np.asarray(side) < args.small))
+    calls = len(lat) or 1
+    return {
+        "tile_max": tile_max,
+        "workers": workers,
+        "tiles_per_image": round(tiles / calls, 2),
+        "p50_ms": round(_percentile(lat, 50), 2),
+        "p95_ms": round(_percentile(lat, 95), 2),
+        "merge_p50_ms": round(_percentile(merge, 50), 3),
+        "detections_per_run": n_det // max(1, args.runs),
+        "small_per_run": n_small // max(1, args.runs),
+    }
+
+
+def main():
+    ap = argparse.ArgumentParser()
+    ap.add_argument("images", help="folder berisi jpg/png (idealnya foto resolusi tinggi)")
+    ap.add_argument("--backend", default="torch")
+    ap.add_argument("--tile-max", nargs="+", type=int, default=[0, 4, 9, 16])
+    ap.add_argument("--tile-size", type=int, default=IMG_SIZE)
+    ap.add_argument("--overlap", type=float, default=0.2)
+    ap.add_argument("--match", type=float, default=0.6, help="ambang IoS merge antar tile")
+    ap.add_argument("--no-full", action="store_true", help="gambar utuh tidak ikut di-inference")
+    ap.add_argument("--batch", type=int, default=8, help="tile per forward pass")
+    ap.add_argument("--workers", nargs="+", type=int, default=[1])
+    ap.add_argument("--threads", type=int, default=None,
+                    help="intra-op thread backend (default: CPU / worker terbesar)")
+    ap.add_argument("--small", type=int, default=32, help="batas sisi box 'kecil' (piksel)")
+    ap.add_argument("--runs", type=int, default=3)
+    ap.add_argument("--warmup", type=int, default=1)
+    ap.add_argument("--limit", type=int, default=None, help="maks jumlah gambar")
+    ap.add_argument("--json", default=None, help="simpan hasil ke file JSON")
+    args = ap.parse_args()
+
+    images = load_images(args.images, args.limit)
+    if not images:
+        print("tidak ada gambar", file=sys.stderr)
+        return 2
+    threads = args.threads or max(1, (os.cpu_count() or 1) // max(args.workers))
+    be = load_backend(args.backend, WEIGHTS_PATH, conf=CONF_THRESH, iou=IOU_THRESH,
+                      imgsz=IMG_SIZE, max_det=MAX_DET, threads=threads)
+
+    rows = [bench(be, images, args, m, w) for m in args.tile_max for w in args.workers]
+
+    cols = ("tile_max", "workers", "tiles_per_image", "p50_ms", "p95_ms", "merge_p50_ms",
+            "detections_per_run", "small_per_run")
+    print(" ".join(f"{c:>18}" for c in cols))
+    for r in rows:
+        print(" ".join(f"{r[c]!s:>18}" for c in cols))
+
+    if args.json:
+        shapes = sorted({f"{im.shape[1]}x{im.shape[0]}" for im in images})
+        with open(args.json, "w") as f:
+            json.dump({"backend": be.name, "images": len(images), "sizes": shapes,
+                       "threads": threads, "results": rows}, f, indent=2)
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,41 @@
+"""
+Metrics format Prometheus untuk inference; implementasi Counter / Histogram /
+Gauge dan mode multiproses (METRICS_MULTIPROC_DIR) ada di promtext.py yang
+dipakai bersama gateway (di image: /app/promtext.py).
+
+    REQUESTS.inc(path="/infer", status=200)
+    STAGE_SECONDS.observe(0.012, stage="forward")
+    REGISTRY.render()   → body GET /metrics
+"""
+import os
+import sys
+
+try:
+    import promtext
+except ImportError:   # dijalankan langsung dari services/inference_svc (di luar image)
+    sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+    import promtext
+
+CONTENT_TYPE = promtext.CONTENT_TYPE
+REGISTRY = promtext.Registry(buckets=(0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0))
+REQUESTS = REGISTRY.counter(
+    "inference_requests_total", "HTTP request per path dan status", ("method", "path", "status"))
+REQUEST_ERRORS = REGISTRY.counter(
+    "inference_request_errors_total", "HTTP request berstatus >= 500 atau exception", ("method", "path"))
+REQUEST_SECONDS = REGISTRY.histogram(
+    "inference_request_seconds", "Latency HTTP request", ("method", "path"))
+STAGE_SECONDS = REGISTRY.histogram(
+    "inference_stage_seconds",
+    "Durasi per stage (read, decode, queue, preprocess, forward, nms, parse)", ("stage",))
+BATCH_SIZE = REGISTRY.histogram(
+    "inference_batch_size", "Jumlah gambar per forward pass", buckets=(1, 2, 4, 8, 16, 32, 64))
+MODEL_LOADS = REGISTRY.counter(
+    "inference_model_loads_total", "Load + warm-up versi model lewat /admin (hot-reload)", ("result",))
+MODEL_LOAD_SECONDS = REGISTRY.histogram(
+    "inference_model_load_seconds", "Durasi load + warm-up versi model",
+    buckets=(1.0, 2.5, 5.0, 10.0, 30.0, 60.0, 120.0, 300.0))
+
+
+def server_timing(timings):
+    """{stage: detik} → nilai header Server-Timing (durasi dalam ms)."""
+    return ", ".join(f"{name};dur={seconds * 1000.0:.1f}" for name, seconds in timings.items())
@@ -0,0 +1,72 @@
+"""
+Registry model lokal: satu folder per versi weights.
+
+    models/registry/
+        1.0/model.pt
+        1.1/model.pt        (+ model.onnx / model_openvino_model/ hasil export, opsional)
+        ACTIVE              ← versi aktif terakhir (ditulis setiap ganti versi)
+
+Versi yang dipakai saat start: env INFER_MODEL_VERSION, lalu ACTIVE, lalu
+versi terbaru di registry. Kalau registry kosong app memakai WEIGHTS_PATH
+lama dengan MODEL_VERSION (perilaku sebelum ada registry).
+"""
+import os
+import re
+
+WEIGHTS_NAME = "model.pt"
+ACTIVE_FILE = "ACTIVE"
+_VERSION_RE = re.compile(r"^[A-Za-z0-9._-]{1,64}$")
+
+
+def _version_key(v):
+    # urutan natural: 1.10 sesudah 1.9
+    return [(0, int(p), "") if p.isdigit() else (1, 0, p) for p in re.split(r"(\d+)", v) if p]
+
+
+class ModelRegistry:
+    def __init__(self, root):
+        self.root = root
+
+    def valid(self, version):
+        return bool(_VERSION_RE.match(version or "")) and version not in (".", "..")
+
+    def weights_path(self, version):
+        """Path weights .pt versi itu; KeyError kalau tidak ada di registry."""
+        if not self.valid(version):
+            raise KeyError(version)
+        path = os.path.join(self.root, version, WEIGHTS_NAME)
+        if not os.path.isfile(path):
+            raise KeyError(version)
+        return path
+
+    def versions(self):
+        try:
+            names = os.listdir(self.root)
+        except FileNotFoundError:
+            return []
+        return sorted((v for v in names if self.valid(v)
+                       and os.path.isfile(os.path.join(self.root, v, WEIGHTS_NAME))), key=_version_key)
+
+    def active(self):
+        try:
+            with open(os.path.join(self.root, ACTIVE_FILE)) as f:
+                version = f.read().strip()
+        except FileNotFoundError:
+            return None
+        return version if version in self.versions() else None
+
+    def set_active(self, version):
+        # tulis ke file sementara lalu rename → tidak pernah terbaca setengah jadi
+        path = os.path.join(self.root, ACTIVE_FILE)
+        tmp = f"{path}.{os.getpid()}.tmp"
+        with open(tmp, "w") as f:
+            f.write(version + "\n")
+        os.replace(tmp, path)
+
+    def initial(self, requested=None):
+        """Versi untuk start; None → registry kosong (pakai WEIGHTS_PATH lama)."""
+        versions = self.versions()
+        if requested:
+            self.weights_path(requested)   # KeyError kalau versi yang diminta tidak ada
+            return requested
+        return self.active() or (versions[-1] if versions else None)
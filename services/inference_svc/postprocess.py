@@ -0,0 +1,80 @@
+"""
+Post-processing hasil backend (Detections) → JSON per gambar.
+
+Semua operasi per box (clip ke batas gambar, xyxy → xywh, pembulatan
+confidence, nama kelas) dikerjakan sebagai operasi array atas seluruh
+tensor; Python hanya menyusun output dari list hasil .tolist().
+
+Dua bentuk output:
+    items   → [{klass, confidence, x, y, w, h}, ...]          (default, format lama)
+    columns → {"classes": [...], "cls": [...], "conf": [...],
+               "x": [...], "y": [...], "w": [...], "h": [...]}
+              array paralel; cls = index ke "classes" (kelas yang muncul saja).
+              Jauh lebih kecil untuk di-serialize/parse saat box banyak.
+
+Dipisah dari app.py supaya bisa dipakai / di-benchmark (bench_postprocess.py)
+tanpa load model.
+"""
+import numpy as np
+
+FORMATS = ("items", "columns")
+
+_table = {"names": None, "snapshot": None, "table": None}
+
+
+def _label_table(names):
+    """names {id: nama} → array object nama per id (dibangun ulang kalau names berubah)."""
+    c = _table
+    if c["names"] is not names or c["snapshot"] != names:
+        size = max(names) + 1 if names else 0
+        c["table"] = np.array([names.get(i, str(i)) for i in range(size)], dtype=object)
+        c["names"], c["snapshot"] = names, dict(names)
+    return c["table"]
+
+
+def class_names(cls, names):
+    """Array id kelas → list nama; id di luar tabel → str(id) (sama seperti names.get)."""
+    table = _label_table(names)
+    if len(cls) and (cls.min() < 0 or cls.max() >= len(table)):
+        return [names.get(int(c), str(int(c))) for c in cls.tolist()]
+    return table[cls].tolist()
+
+
+def to_arrays(det, W, H):
+    """
+    Detections → (cls, conf, xywh) numpy. Pembulatan identik dengan versi
+    loop lama: x1/y1 dipotong ke >= 0, x2/y2 ke <= W-1/H-1, lalu int()
+    (truncate), w/h minimal 0, confidence round 4 digit.
+    """
+    xyxy = np.asarray(det.xyxy, dtype=np.float64).reshape(-1, 4)
+    lo = np.maximum(xyxy[:, :2], 0).astype(np.int64)
+    hi = np.minimum(xyxy[:, 2:], (W - 1, H - 1)).astype(np.int64)
+    xywh = np.concatenate([lo, np.maximum(hi - lo, 0)], axis=1)
+    conf = np.round(np.asarray(det.conf, dtype=np.float64), 4)
+    return np.asarray(det.cls, dtype=np.int64), conf, xywh
+
+
+def parse_result(det, W, H, names):
+    """Detections backend → list item {klass, confidence, x, y, w, h} (pixel)."""
+    if not len(det.conf):
+        return []
+    cls, conf, xywh = to_arrays(det, W, H)
+    return [
+        {"klass": k, "confidence": c, "x": x, "y": y, "w": w, "h": h}
+        for k, c, (x, y, w, h) in zip(class_names(cls, names), conf.tolist(), xywh.tolist())
+    ]
+
+
+def parse_columns(det, W, H, names):
+    """Detections backend → format kolom (lihat docstring modul)."""
+    if not len(det.conf):
+        return {"classes": [], "cls": [], "conf": [], "x": [], "y": [], "w": [], "h": []}
+    cls, conf, xywh = to_arrays(det, W, H)
+    used, index = np.unique(cls, return_inverse=True)
+    x, y, w, h = xywh.T.tolist()
+    return {
+        "classes": class_names(used, names),
+        "cls": index.reshape(-1).tolist(),
+        "conf": conf.tolist(),
+        "x": x, "y": y, "w": w, "h": h,
+    }
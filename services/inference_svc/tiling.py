@@ -0,0 +1,95 @@
+"""
+Inference ter-tile (slicing) untuk foto resolusi tinggi.
+
+Dengan imgsz 640, objek kecil (sarung tangan, kacamata, pelindung telinga)
+di foto 4K tinggal beberapa piksel setelah di-resize. Mode tile memecah
+gambar menjadi window ~TILE_SIZE yang saling bertumpuk, tiap window
+di-inference pada resolusi (hampir) asli, lalu box semua window digeser ke
+koordinat gambar asli dan digabung:
+
+    windows = grid(W, H, 640, 0.2, 16, full=True)   # + (0, 0, W, H)
+    dets    = backend.predict(crops(img, windows))
+    det     = merge(dets, windows, W, H)
+
+Gambar utuh (full=True) ikut sebagai satu "tile" supaya objek besar yang
+terpotong antar tile (wearpack satu badan) tetap terdeteksi utuh.
+
+merge() = greedy NMM per kelas: box diurutkan dari confidence tertinggi,
+box lain yang sebagian besar (IoS ≥ match, intersection / luas box yang
+lebih kecil) berada di dalamnya digabung jadi satu box (union), confidence
+tertinggi dipakai. IoS (bukan IoU) karena potongan objek di tepi tile
+hampir seluruhnya berada di dalam box utuh dari tile tetangga.
+"""
+import numpy as np
+
+from backends import Detections, _empty
+
+
+def _starts(length, size, overlap):
+    if length <= size:
+        return [0]
+    step = max(1, int(size * (1 - overlap)))
+    starts = list(range(0, length - size, step))
+    starts.append(length - size)   # tile terakhir rata dengan tepi gambar
+    return starts
+
+
+def grid(W, H, size, overlap=0.2, max_tiles=16, full=False):
+    """
+    Window (x0, y0, x1, y1) yang menutupi seluruh gambar, bertumpuk `overlap`
+    (fraksi ukuran tile). Kalau jumlahnya > max_tiles, ukuran tile diperbesar
+    (tiap tile lalu di-resize ke imgsz oleh model) sampai muat.
+    full=True: gambar utuh ditambahkan sebagai window terakhir, kecuali grid
+    sudah berupa gambar utuh itu sendiri (tidak di-inference dua kali).
+    """
+    while True:
+        xs, ys = _starts(W, size, overlap), _starts(H, size, overlap)
+        if len(xs) * len(ys) <= max(1, max_tiles):
+            break
+        size = int(size * 1.25) + 1
+    windows = [(x, y, min(x + size, W), min(y + size, H)) for y in ys for x in xs]
+    if full and windows != [(0, 0, W, H)]:
+        windows.append((0, 0, W, H))
+    return windows
+
+
+def crops(img, windows):
+    """Potongan array per window (gambar utuh tidak disalin)."""
+    H, W = img.shape[:2]
+    return [img if (x0, y0, x1, y1) == (0, 0, W, H)
+            else np.ascontiguousarray(img[y0:y1, x0:x1])
+            for x0, y0, x1, y1 in windows]
+
+
+def merge(dets, windows, W, H, match=0.6, max_det=300):
+    """Detections per window → satu Detections dalam koordinat gambar asli."""
+    parts = [(d.xyxy + np.array([x0, y0, x0, y0], np.float32), d.conf, d.cls)
+             for d, (x0, y0, _, _) in zip(dets, windows) if len(d.conf)]
+    if not parts:
+        return _empty()
+    xyxy = np.concatenate([p[0] for p in parts]).astype(np.float32)
+    conf = np.concatenate([p[1] for p in parts]).astype(np.float32)
+    cls = np.concatenate([p[2] for p in parts]).astype(np.int64)
+
+    # offset per kelas → box beda kelas tidak pernah bertumpuk (sama seperti NMS per kelas)
+    shifted = xyxy + cls[:, None].astype(np.float32) * (max(W, H) + 1)
+    x1, y1, x2, y2 = shifted.T
+    areas = (x2 - x1).clip(0) * (y2 - y1).clip(0)
+    order = conf.argsort()[::-1]
+    keep, boxes = [], []
+    while order.size and len(keep) < max_det:
+        i, rest = order[0], order[1:]
+        iw = (np.minimum(x2[i], x2[rest]) - np.maximum(x1[i], x1[rest])).clip(0)
+        ih = (np.minimum(y2[i], y2[rest]) - np.maximum(y1[i], y1[rest])).clip(0)
+        ios = iw * ih / (np.minimum(areas[i], areas[rest]) + 1e-7)
+        group = np.concatenate([[i], rest[ios >= match]])
+        g = xyxy[group]
+        boxes.append((g[:, 0].min(), g[:, 1].min(), g[:, 2].max(), g[:, 3].max()))
+        keep.append(i)
+        order = rest[ios < match]
+
+    keep = np.asarray(keep, dtype=np.int64)
+    out = np.asarray(boxes, dtype=np.float32).reshape(-1, 4)
+    out[:, [0, 2]] = out[:, [0, 2]].clip(0, W)
+    out[:, [1, 3]] = out[:, [1, 3]].clip(0, H)
+    return Detections(out, conf[keep], cls[keep])
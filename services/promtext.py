@@ -0,0 +1,286 @@
+"""
+Metrics format Prometheus (text exposition 0.0.4) tanpa dependency tambahan.
+Dipakai bersama gateway (detect_svc/metrics.py) dan inference
+(inference_svc/metrics.py); masing-masing mendefinisikan metric-nya sendiri.
+
+    REQUESTS = REGISTRY.counter("x_requests_total", "...", ("path", "status"))
+    REQUESTS.inc(path="/infer", status=200)
+    REGISTRY.render()   → body GET /metrics
+
+Nilai disimpan per proses. Dengan beberapa worker (uvicorn --workers N,
+gunicorn) scrape hanya mengenai satu worker, jadi set METRICS_MULTIPROC_DIR
+ke folder yang sama untuk semua worker (dikosongkan saat service start):
+  - tiap proses menulis snapshot nilainya ke <dir>/<pid>-<start>.json setiap
+    METRICS_FLUSH_INTERVAL detik (thread dimulai saat metric pertama berubah)
+    dan saat exit
+  - render() di worker mana pun menjumlahkan snapshot semua proses
+  - counter / histogram proses yang sudah mati tetap ikut dijumlah (total
+    tidak turun saat worker di-restart); gauge hanya dari proses yang masih
+    hidup, digabung sum atau max (parameter `multiprocess` gauge)
+"""
+import atexit
+import json
+import os
+import threading
+import time
+
+CONTENT_TYPE = "text/plain; version=0.0.4; charset=utf-8"
+DEFAULT_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0)
+MULTIPROC_DIR = os.getenv("METRICS_MULTIPROC_DIR", "")
+FLUSH_INTERVAL = float(os.getenv("METRICS_FLUSH_INTERVAL", "5"))
+
+
+def _escape(v):
+    return str(v).replace("\\", "\\\\").replace("\n", "\\n").replace('"', '\\"')
+
+
+def _labels(names, values, extra=()):
+    pairs = list(zip(names, values)) + list(extra)
+    if not pairs:
+        return ""
+    return "{" + ",".join(f'{k}="{_escape(v)}"' for k, v in pairs) + "}"
+
+
+def _num(v):
+    if v == float("inf"):
+        return "+Inf"
+    return repr(float(v)) if isinstance(v, float) else str(v)
+
+
+def _key(labelnames, labels):
+    return tuple(str(labels.get(n, "")) for n in labelnames)
+
+
+class Counter:
+    kind = "counter"
+
+    def __init__(self, name, help, labelnames=()):
+        self.name, self.help, self.labelnames = name, help, tuple(labelnames)
+        self.registry = None
+        self._values = {}
+        self._lock = threading.Lock()
+
+    def inc(self, amount=1, **labels):
+        key = _key(self.labelnames, labels)
+        with self._lock:
+            self._values[key] = self._values.get(key, 0) + amount
+        if self.registry is not None:
+            self.registry.changed()
+
+    def value(self, **labels):
+        return self._values.get(_key(self.labelnames, labels), 0)
+
+    def collect(self):
+        """{tuple label: nilai} proses ini."""
+        with self._lock:
+            return dict(self._values)
+
+    def merge(self, a, b):
+        return a + b
+
+    def format(self, values):
+        for key, v in sorted(values.items()):
+            yield self.name + _labels(self.labelnames, key), v
+
+    def samples(self):
+        return self.format(self.collect())
+
+
+class Histogram:
+    kind = "histogram"
+
+    def __init__(self, name, help, labelnames=(), buckets=DEFAULT_BUCKETS):
+        self.name, self.help, self.labelnames = name, help, tuple(labelnames)
+        self.buckets = tuple(sorted(buckets))
+        self.registry = None
+        self._values = {}    # labels → [count per bucket..., sum, count]
+        self._lock = threading.Lock()
+
+    def observe(self, value, **labels):
+        key = _key(self.labelnames, labels)
+        with self._lock:
+            v = self._values.get(key)
+            if v is None:
+                v = self._values[key] = [0] * (len(self.buckets) + 2)
+            for i, b in enumerate(self.buckets):
+                if value <= b:
+                    v[i] += 1
+            v[-2] += value
+            v[-1] += 1
+        if self.registry is not None:
+            self.registry.changed()
+
+    def count(self, **labels):
+        v = self._values.get(_key(self.labelnames, labels))
+        return v[-1] if v else 0
+
+    def collect(self):
+        with self._lock:
+            return {k: list(v) for k, v in self._values.items()}
+
+    def merge(self, a, b):
+        return [x + y for x, y in zip(a, b)]
+
+    def format(self, values):
+        for key, v in sorted(values.items()):
+            for b, n in zip(self.buckets + (float("inf"),), v[:-2] + [v[-1]]):
+                yield self.name + "_bucket" + _labels(self.labelnames, key, [("le", _num(b))]), n
+            yield self.name + "_sum" + _labels(self.labelnames, key), v[-2]
+            yield self.name + "_count" + _labels(self.labelnames, key), v[-1]
+
+    def samples(self):
+        return self.format(self.collect())
+
+
+class Gauge:
+    """
+    Nilai dibaca saat scrape: fn() → angka, atau {tuple label: angka}.
+    multiprocess: "sum" (mis. kedalaman antrean semua worker) atau "max"
+    (mis. metric info bernilai 1).
+    """
+    kind = "gauge"
+
+    def __init__(self, name, help, fn, labelnames=(), multiprocess="sum"):
+        self.name, self.help, self.labelnames, self.fn = name, help, tuple(labelnames), fn
+        self.multiprocess = multiprocess
+        self.registry = None
+
+    def collect(self):
+        try:
+            value = self.fn()
+        except Exception:
+            return {}
+        if not isinstance(value, dict):
+            value = {(): value}
+        return {tuple(str(x) for x in k): v for k, v in value.items()}
+
+    def merge(self, a, b):
+        return max(a, b) if self.multiprocess == "max" else a + b
+
+    format = Counter.format
+
+    def samples(self):
+        return self.format(self.collect())
+
+
+class CounterFunc(Gauge):
+    """Counter yang nilainya dibaca dari fn() saat scrape (angka yang terus naik milik modul lain)."""
+    kind = "counter"
+
+    def __init__(self, name, help, fn, labelnames=()):
+        super().__init__(name, help, fn, labelnames)
+
+
+def _alive(pid):
+    try:
+        os.kill(pid, 0)
+    except ProcessLookupError:
+        return False
+    except PermissionError:
+        return True
+    return True
+
+
+class Registry:
+    def __init__(self, buckets=DEFAULT_BUCKETS, multiproc_dir=MULTIPROC_DIR, flush_interval=FLUSH_INTERVAL):
+        self.metrics = []
+        self.buckets = buckets   # default histogram registry ini
+        self.multiproc_dir = multiproc_dir or None
+        self.flush_interval = flush_interval
+        self._flusher_pid = None
+        self._started = time.time_ns()
+        self._lock = threading.Lock()
+
+    def register(self, metric):
+        metric.registry = self
+        self.metrics.append(metric)
+        return metric
+
+    def counter(self, *a, **kw):
+        return self.register(Counter(*a, **kw))
+
+    def counter_fn(self, *a, **kw):
+        return self.register(CounterFunc(*a, **kw))
+
+    def histogram(self, name, help, labelnames=(), buckets=None):
+        return self.register(Histogram(name, help, labelnames, buckets or self.buckets))
+
+    def gauge(self, *a, **kw):
+        return self.register(Gauge(*a, **kw))
+
+    # ---------- mode multiproses ----------
+    def changed(self):
+        """Ada nilai yang berubah: pastikan proses ini (juga hasil fork) punya thread flush."""
+        if self.multiproc_dir is None or self._flusher_pid == os.getpid():
+            return
+        with self._lock:
+            if self._flusher_pid == os.getpid():
+                return
+            self._flusher_pid = os.getpid()
+            self._started = time.time_ns()
+        os.makedirs(self.multiproc_dir, exist_ok=True)
+        threading.Thread(target=self._flush_loop, name="metrics-flush", daemon=True).start()
+        atexit.register(self.flush)
+
+    def _flush_loop(self):
+        while True:
+            time.sleep(self.flush_interval)
+            self.flush()
+
+    def _path(self):
+        return os.path.join(self.multiproc_dir, f"{os.getpid()}-{self._started}.json")
+
+    def flush(self):
+        """Tulis snapshot proses ini (tmp + rename → tidak pernah terbaca setengah jadi)."""
+        snapshot = {m.name: [[list(k), v] for k, v in m.collect().items()] for m in self.metrics}
+        path = self._path()
+        tmp = path + ".tmp"
+        try:
+            with open(tmp, "w") as f:
+                json.dump({"pid": os.getpid(), "started": self._started, "metrics": snapshot}, f)
+            os.replace(tmp, path)
+        except OSError:
+            pass
+
+    def _snapshots(self):
+        """Snapshot proses lain → [(masih hidup?, {nama: {tuple label: nilai}})]."""
+        own = os.path.basename(self._path())
+        docs = []
+        try:
+            names = os.listdir(self.multiproc_dir)
+        except FileNotFoundError:
+            return []
+        for name in names:
+            if not name.endswith(".json") or name == own:
+                continue
+            try:
+                with open(os.path.join(self.multiproc_dir, name)) as f:
+                    docs.append(json.load(f))
+            except (OSError, ValueError):
+                continue
+        # pid dipakai ulang setelah worker mati → hanya snapshot terbaru per pid yang "hidup"
+        latest = {}
+        for d in docs:
+            latest[d["pid"]] = max(latest.get(d["pid"], 0), d["started"])
+        return [(d["pid"] != os.getpid() and d["started"] == latest[d["pid"]] and _alive(d["pid"]),
+                 {n: {tuple(k): v for k, v in vals} for n, vals in d["metrics"].items()})
+                for d in docs]
+
+    def _merged(self, m, snapshots):
+        values = m.collect()
+        for alive, metrics in snapshots:
+            if m.kind == "gauge" and not alive:
+                continue
+            for key, v in metrics.get(m.name, {}).items():
+                values[key] = m.merge(values[key], v) if key in values else v
+        return values
+
+    def render(self):
+        snapshots = self._snapshots() if self.multiproc_dir else []
+        lines = []
+        for m in self.metrics:
+            lines.append(f"# HELP {m.name} {m.help}")
+            lines.append(f"# TYPE {m.name} {m.kind}")
+            values = self._merged(m, snapshots) if snapshots else m.collect()
+            lines.extend(f"{name} {_num(v)}" for name, v in m.format(values))
+        return "\n".join(lines) + "\n"